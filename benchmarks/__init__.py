@@ -0,0 +1 @@
+"""Benchmarks for Machine Learning Engineering Agent."""
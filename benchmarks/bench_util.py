@@ -0,0 +1,77 @@
+"""Shared helpers for the benchmarks."""
+
+from typing import Any, Optional
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    """Summarizes timing samples in seconds."""
+    return {
+        "n": len(samples),
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "max": max(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    }
+
+
+def time_call(func, repeats: int, warmup: int = 0) -> dict[str, float]:
+    """Times repeated calls of a function."""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start_time)
+    return summarize(samples)
+
+
+def get_environment() -> dict[str, Any]:
+    """Gets a description of the environment the benchmark runs in."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = ""
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "commit": commit,
+    }
+
+
+def write_results(
+    benchmark_name: str,
+    results: dict[str, Any],
+    output_path: Optional[str] = None,
+) -> dict[str, Any]:
+    """Writes the results in the common output format and prints them."""
+    report = {
+        "benchmark": benchmark_name,
+        "timestamp": time.time(),
+        "environment": get_environment(),
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    print(text)
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(text)
+    return report
@@ -0,0 +1,251 @@
+"""Benchmarks the execution path of the generated code.
+
+Measures, for every selected execution backend, the startup overhead of
+running an empty code through `code_util.execute_code` (cold, in a fresh
+workspace, and warm), and the capture of its output at several stdout
+sizes. The `queue` backend is served by a worker thread of the benchmark.
+Independently of the backends, it measures `extract_performance_from_text`
+on large logs, the materialization of a workspace by `create_workspace` at
+several dataset sizes, and the serialization of the state by `save_state`.
+
+Sizes are given with the units B, KB, MB and GB.
+
+Usage:
+    python -m benchmarks.benchmark_code_util --repeats 5 --backends local,kernel,queue --output code_util.json
+"""
+
+from typing import Any
+import argparse
+import os
+import tempfile
+import threading
+import types
+
+from benchmarks import bench_util
+from machine_learning_engineering.shared_libraries import code_util
+
+
+SIZE_UNITS = {"GB": 1024 ** 3, "MB": 1024 ** 2, "KB": 1024, "B": 1}
+TASK_NAME = "benchmark-task"
+EXEC_TIMEOUT = 600
+EMPTY_CODE = "pass\n"
+OUTPUT_CODE = """import sys
+chunk = "x" * 1023 + "\\n"
+for _ in range({num_chunks}):
+    sys.stdout.write(chunk)
+sys.stdout.write("x" * {remainder})
+"""
+LOG_LINE = "Epoch {epoch}: train loss 0.1234, validation loss 0.2345, learning rate 1e-4\n"
+
+
+def parse_size(text: str) -> int:
+    """Parses a size like `1KB` or `100MB` into bytes."""
+    text = text.strip().upper()
+    for unit, num_bytes in SIZE_UNITS.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * num_bytes)
+    return int(text)
+
+
+def parse_sizes(text: str) -> list[tuple[str, int]]:
+    """Parses comma-separated sizes, keeping their names."""
+    return [(size.strip(), parse_size(size)) for size in text.split(",") if size.strip()]
+
+
+def get_output_code(num_bytes: int) -> str:
+    """Gets a code printing `num_bytes` bytes to stdout."""
+    return OUTPUT_CODE.format(num_chunks=num_bytes // 1024, remainder=num_bytes % 1024)
+
+
+def get_log_text(num_bytes: int) -> str:
+    """Gets a training log of about `num_bytes` bytes ending with the score."""
+    line = LOG_LINE.format(epoch=0)
+    lines = [LOG_LINE.format(epoch=k) for k in range(max(1, num_bytes // len(line)))]
+    return "".join(lines) + "Final Validation Performance: 0.8765\n"
+
+
+def start_queue_worker(queue_dir: str) -> threading.Thread:
+    """Serves the jobs of the `queue` backend until it is idle."""
+    from machine_learning_engineering.shared_libraries import work_queue
+    worker = threading.Thread(
+        target=work_queue.serve,
+        kwargs={
+            "queue_dir": queue_dir,
+            "worker_id": "benchmark-worker",
+            "poll_interval": 0.01,
+            "max_idle_time": 30.0,
+        },
+        daemon=True,
+    )
+    worker.start()
+    return worker
+
+
+def benchmark_backend(
+    tmp_dir: str,
+    backend_name: str,
+    output_sizes: list[tuple[str, int]],
+    repeats: int,
+) -> dict[str, Any]:
+    """Measures the startup and output capture of an execution backend."""
+    workspace_dir = os.path.join(tmp_dir, backend_name)
+    state = {
+        "exec_backend": backend_name,
+        "workspace_dir": workspace_dir,
+        "task_name": TASK_NAME,
+        "exec_queue_dir": os.path.join(tmp_dir, "queue"),
+    }
+    if backend_name == "queue":
+        start_queue_worker(state["exec_queue_dir"])
+
+    def run(code_text: str, run_cwd: str) -> dict[str, Any]:
+        os.makedirs(run_cwd, exist_ok=True)
+        result = code_util.execute_code(code_text, run_cwd, "benchmark.py", EXEC_TIMEOUT, state)
+        if result["returncode"] != 0:
+            raise RuntimeError(f"The code failed on {backend_name}: {result['stderr'][-500:]}")
+        return result
+
+    cold_times = []
+    for k in range(repeats):
+        cold_cwd = os.path.join(workspace_dir, f"cold_{k}")
+        cold_times.append(bench_util.time_call(lambda: run(EMPTY_CODE, cold_cwd), 1)["min"])
+    run_cwd = os.path.join(workspace_dir, TASK_NAME)
+    results = {
+        "startup_cold": bench_util.summarize(cold_times),
+        "startup_warm": bench_util.time_call(lambda: run(EMPTY_CODE, run_cwd), repeats, warmup=1),
+        "output_capture": {},
+    }
+    for size_name, num_bytes in output_sizes:
+        output_code = get_output_code(num_bytes)
+        captured_sizes = []
+        timing = bench_util.time_call(
+            lambda: captured_sizes.append(len(run(output_code, run_cwd)["stdout"])),
+            repeats,
+            warmup=1,
+        )
+        timing["captured_bytes"] = captured_sizes[-1]
+        results["output_capture"][size_name] = timing
+    return results
+
+
+def benchmark_extract_performance(
+    log_sizes: list[tuple[str, int]],
+    repeats: int,
+) -> dict[str, Any]:
+    """Measures the extraction of the score from training logs."""
+    results = {}
+    for size_name, num_bytes in log_sizes:
+        log_text = get_log_text(num_bytes)
+        results[size_name] = bench_util.time_call(
+            lambda: code_util.extract_performance_from_text(log_text), repeats, warmup=1
+        )
+    return results
+
+
+def write_dataset(task_dir: str, num_bytes: int) -> None:
+    """Writes a CSV file of about `num_bytes` bytes and a description."""
+    os.makedirs(task_dir, exist_ok=True)
+    row = "0.123456,0.654321,0.111111,0.999999,1\n"
+    chunk = row * (1024 ** 2 // len(row))
+    with open(os.path.join(task_dir, "train.csv"), "w", encoding="utf-8") as f:
+        f.write("x0,x1,x2,x3,target\n")
+        for _ in range(num_bytes // len(chunk)):
+            f.write(chunk)
+        f.write(row * ((num_bytes % len(chunk)) // len(row)))
+    with open(os.path.join(task_dir, "task_description.txt"), "w", encoding="utf-8") as f:
+        f.write("Predict the target.\n")
+
+
+def benchmark_create_workspace(
+    tmp_dir: str,
+    dataset_sizes: list[tuple[str, int]],
+    repeats: int,
+) -> dict[str, Any]:
+    """Measures the materialization of the workspace of a solution."""
+    from machine_learning_engineering.sub_agents.initialization import agent as initialization_agent
+    results = {}
+    for size_name, num_bytes in dataset_sizes:
+        data_dir = os.path.join(tmp_dir, f"data_{size_name}")
+        write_dataset(os.path.join(data_dir, TASK_NAME), num_bytes)
+        callback_context = types.SimpleNamespace(
+            agent_name="create_workspace_agent_1",
+            state={
+                "data_dir": data_dir,
+                "workspace_dir": os.path.join(tmp_dir, f"workspace_{size_name}"),
+                "task_name": TASK_NAME,
+            },
+        )
+        results[size_name] = bench_util.time_call(
+            lambda: initialization_agent.create_workspace(callback_context), repeats, warmup=1
+        )
+    return results
+
+
+def get_state(num_bytes: int) -> dict[str, Any]:
+    """Gets a state whose execution results hold about `num_bytes` bytes."""
+    state = {"workspace_dir": "", "task_name": TASK_NAME}
+    stdout = get_log_text(64 * 1024)
+    for k in range(max(1, num_bytes // len(stdout))):
+        state[f"exec_result_{k}"] = {
+            "returncode": 0,
+            "stdout": stdout,
+            "stderr": "",
+            "execution_time": 1.0,
+            "score": 0.8765,
+        }
+    return state
+
+
+def benchmark_save_state(
+    tmp_dir: str,
+    state_sizes: list[tuple[str, int]],
+    repeats: int,
+) -> dict[str, Any]:
+    """Measures the serialization of the state at the end of the pipeline."""
+    from google.adk.sessions import state as state_module
+    from machine_learning_engineering import agent
+    results = {}
+    for size_name, num_bytes in state_sizes:
+        value = get_state(num_bytes)
+        value["workspace_dir"] = os.path.join(tmp_dir, f"state_{size_name}")
+        os.makedirs(os.path.join(value["workspace_dir"], TASK_NAME), exist_ok=True)
+        callback_context = types.SimpleNamespace(state=state_module.State(value, {}))
+        results[size_name] = bench_util.time_call(
+            lambda: agent.save_state(callback_context), repeats, warmup=1
+        )
+        results[size_name]["file_bytes"] = os.path.getsize(
+            os.path.join(value["workspace_dir"], TASK_NAME, "final_state.json")
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", type=str, default="")
+    parser.add_argument("--backends", type=str, default="local,kernel,queue")
+    parser.add_argument("--output_sizes", type=str, default="1KB,1MB,100MB")
+    parser.add_argument("--log_sizes", type=str, default="1MB,10MB,100MB")
+    parser.add_argument("--dataset_sizes", type=str, default="10MB,1GB")
+    parser.add_argument("--state_sizes", type=str, default="1MB,10MB,100MB")
+    args = parser.parse_args()
+    results = {"backends": {}}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for backend_name in args.backends.split(","):
+            results["backends"][backend_name] = benchmark_backend(
+                tmp_dir, backend_name, parse_sizes(args.output_sizes), args.repeats
+            )
+        results["extract_performance"] = benchmark_extract_performance(
+            parse_sizes(args.log_sizes), args.repeats
+        )
+        results["create_workspace"] = benchmark_create_workspace(
+            tmp_dir, parse_sizes(args.dataset_sizes), args.repeats
+        )
+        results["save_state"] = benchmark_save_state(
+            tmp_dir, parse_sizes(args.state_sizes), args.repeats
+        )
+    bench_util.write_results("code_util", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
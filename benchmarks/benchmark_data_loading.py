@@ -0,0 +1,81 @@
+"""Benchmarks loading the task inputs from CSV against the converted files.
+
+Converts the CSV files of every task with `data_util.convert_inputs`, then
+times `pd.read_csv` on the original files against `pd.read_parquet` and the
+memory-mapped `pd.read_feather` on the converted ones.
+
+Usage:
+    python -m benchmarks.benchmark_data_loading --repeats 5 --output data_loading.json
+"""
+
+import argparse
+import os
+import tempfile
+
+from benchmarks import bench_util
+from machine_learning_engineering.shared_libraries import data_util
+
+
+TASKS_DIR = os.path.join(bench_util.REPO_ROOT, "machine_learning_engineering", "tasks")
+
+
+def benchmark_task(task_dir: str, output_dir: str, repeats: int) -> dict:
+    """Measures the load times of the CSV files of a task and their conversions."""
+    import pandas as pd
+    results = {}
+    for entry in data_util.convert_inputs(task_dir, output_dir):
+        source_path = os.path.join(task_dir, entry["source"])
+        parquet_path = os.path.join(output_dir, entry["parquet"])
+        feather_path = os.path.join(output_dir, entry["feather"])
+        load_times = {
+            "csv": bench_util.time_call(
+                lambda: pd.read_csv(source_path, low_memory=False), repeats, warmup=1
+            ),
+            "parquet": bench_util.time_call(
+                lambda: pd.read_parquet(parquet_path), repeats, warmup=1
+            ),
+            "feather": bench_util.time_call(
+                lambda: pd.read_feather(feather_path), repeats, warmup=1
+            ),
+        }
+        results[entry["source"]] = {
+            "num_rows": entry["num_rows"],
+            "num_columns": entry["num_columns"],
+            "num_categoricals": entry["num_categoricals"],
+            "memory_before": entry["memory_before"],
+            "memory_after": entry["memory_after"],
+            "conversion_time": entry["conversion_time"],
+            "load_time": load_times,
+            "speedup_parquet": load_times["csv"]["median"] / load_times["parquet"]["median"],
+            "speedup_feather": load_times["csv"]["median"] / load_times["feather"]["median"],
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", type=str, default="")
+    parser.add_argument(
+        "--tasks_dir",
+        type=str,
+        default=TASKS_DIR,
+        help="Directory with one subdirectory of input files per task.",
+    )
+    args = parser.parse_args()
+    if not data_util.has_pyarrow():
+        raise SystemExit("The conversion needs pyarrow: pip install pyarrow")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for task_name in sorted(os.listdir(args.tasks_dir)):
+            task_dir = os.path.join(args.tasks_dir, task_name)
+            if not os.path.isdir(task_dir):
+                continue
+            results[task_name] = benchmark_task(
+                task_dir, os.path.join(tmp_dir, task_name), args.repeats
+            )
+    bench_util.write_results("data_loading", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Benchmarks the import time of the agent and the construction of its graph.
+
+Usage:
+    python -m benchmarks.benchmark_import_time --repeats 5 --output import_time.json
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks import bench_util
+
+
+# Modules whose cumulative import time is reported separately.
+TRACKED_MODULES = (
+    "machine_learning_engineering.agent",
+    "google.adk",
+    "litellm",
+    "torch",
+)
+
+_IMPORT_SNIPPET = "import machine_learning_engineering.agent"
+
+_BUILD_SNIPPET = """
+import time
+import machine_learning_engineering.agent as agent_module
+start_time = time.perf_counter()
+agent_module.build_root_agent()
+print(time.perf_counter() - start_time)
+"""
+
+
+def parse_import_times(stderr: str) -> dict[str, float]:
+    """Parses `-X importtime` output into cumulative seconds per module."""
+    cumulative_times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        module_name = parts[2].strip()
+        cumulative_times[module_name] = int(parts[1].strip()) / 1e6
+    return cumulative_times
+
+
+def run_snippet(snippet: str, import_time: bool) -> subprocess.CompletedProcess:
+    """Runs a snippet in a fresh interpreter from the repository root."""
+    command = [sys.executable]
+    if import_time:
+        command += ["-X", "importtime"]
+    command += ["-c", snippet]
+    env = dict(os.environ)
+    env.setdefault("ROOT_AGENT_MODEL", "gemini-2.0-flash-001")
+    return subprocess.run(
+        command,
+        cwd=bench_util.REPO_ROOT,
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+
+
+def benchmark_import(repeats: int) -> dict:
+    """Measures the cold import time of the agent module."""
+    wall_times = []
+    module_times = {module_name: [] for module_name in TRACKED_MODULES}
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        run_snippet(_IMPORT_SNIPPET, import_time=False)
+        wall_times.append(time.perf_counter() - start_time)
+        cumulative_times = parse_import_times(
+            run_snippet(_IMPORT_SNIPPET, import_time=True).stderr
+        )
+        for module_name in TRACKED_MODULES:
+            module_times[module_name].append(cumulative_times.get(module_name, 0.0))
+    return {
+        "process_wall_time": bench_util.summarize(wall_times),
+        "module_import_time": {
+            module_name: bench_util.summarize(samples)
+            for module_name, samples in module_times.items()
+        },
+    }
+
+
+def benchmark_build(repeats: int) -> dict:
+    """Measures the time to build the agent graph after the import."""
+    samples = []
+    for _ in range(repeats):
+        result = run_snippet(_BUILD_SNIPPET, import_time=False)
+        samples.append(float(result.stdout.strip().splitlines()[-1]))
+    return {"build_root_agent": bench_util.summarize(samples)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", type=str, default="")
+    parser.add_argument(
+        "--skip_build",
+        action="store_true",
+        help="Only measure the import, not the construction of the graph.",
+    )
+    args = parser.parse_args()
+    results = benchmark_import(args.repeats)
+    if not args.skip_build:
+        results.update(benchmark_build(args.repeats))
+    bench_util.write_results("import_time", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
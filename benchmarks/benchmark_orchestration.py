@@ -0,0 +1,208 @@
+"""Benchmarks the orchestration of the pipeline offline, with a scripted model.
+
+Runs the whole pipeline agent on tiny synthetic regression and
+classification tasks, with the deterministic `scripted_llm` in place of the
+model, so that no API key or network is needed. The model answers at once,
+so the wall time of a run is its code executions plus the orchestration
+overhead: callbacks, state updates, instructions and workspace setup. Every
+scale setting `<num_solutions>x<num_model_candidates>` is measured on every
+task.
+
+Usage:
+    python -m benchmarks.benchmark_orchestration --repeats 3 --scales 1x1,2x2,4x2 --output orchestration.json
+"""
+
+from typing import Any
+import argparse
+import asyncio
+import dataclasses
+import json
+import os
+import tempfile
+import time
+
+from benchmarks import bench_util
+from benchmarks import scripted_llm
+
+
+APP_NAME = "orchestration-benchmark"
+USER_ID = "benchmark"
+TASK_MESSAGE = "Execute the task."
+NUM_FEATURES = 5
+TASK_DESCRIPTION = """# {title}
+
+Predict the column `target` of `test.csv` from the numeric features `x0` to `x{last_feature}`.
+`train.csv` has the features and the target, `test.csv` the features and an `id` column.
+The metric is {metric}. Write the predictions to `submission.csv` with the columns `id` and `target`.
+"""
+TASKS = {
+    "synthetic-regression": ("Tabular Regression", True, "the root mean squared error (lower is better)"),
+    "synthetic-classification": ("Tabular Classification", False, "the accuracy (higher is better)"),
+}
+
+
+def make_task(data_dir: str, task_name: str, num_rows: int, seed: int = 0) -> None:
+    """Writes a synthetic task with a linear target."""
+    import numpy as np
+    import pandas as pd
+    task_type, _, metric = TASKS[task_name]
+    rng = np.random.default_rng(seed)
+    task_dir = os.path.join(data_dir, task_name)
+    os.makedirs(task_dir, exist_ok=True)
+    X = rng.normal(size=(num_rows, NUM_FEATURES))
+    target = X @ rng.normal(size=NUM_FEATURES) + rng.normal(scale=0.1, size=num_rows)
+    if task_type == "Tabular Classification":
+        target = (target > 0).astype(int)
+    frame = pd.DataFrame(X, columns=[f"x{k}" for k in range(NUM_FEATURES)])
+    num_test = num_rows // 4
+    train = frame.iloc[num_test:].assign(target=target[num_test:])
+    test = frame.iloc[:num_test].assign(id=np.arange(num_test))
+    train.to_csv(os.path.join(task_dir, "train.csv"), index=False)
+    test.to_csv(os.path.join(task_dir, "test.csv"), index=False)
+    with open(os.path.join(task_dir, "task_description.txt"), "w", encoding="utf-8") as f:
+        f.write(TASK_DESCRIPTION.format(
+            title=task_name, last_feature=NUM_FEATURES - 1, metric=metric
+        ))
+
+
+def parse_scales(text: str) -> list[tuple[int, int]]:
+    """Parses `<num_solutions>x<num_model_candidates>` settings."""
+    scales = []
+    for scale in text.split(","):
+        num_solutions, _, num_model_candidates = scale.strip().partition("x")
+        scales.append((int(num_solutions), int(num_model_candidates)))
+    return scales
+
+
+class CodeTimer:
+    """An execution backend timing the code runs of another backend."""
+
+    def __init__(self, backend_name: str):
+        self.backend_name = backend_name
+        self.run_times: list[float] = []
+
+    def __call__(self, code_text, run_cwd, py_filepath, exec_timeout, state, env):
+        from machine_learning_engineering.shared_libraries import code_util
+        start_time = time.perf_counter()
+        try:
+            return code_util._EXECUTION_BACKENDS[self.backend_name](
+                code_text, run_cwd, py_filepath, exec_timeout, state, env
+            )
+        finally:
+            self.run_times.append(time.perf_counter() - start_time)
+
+
+async def run_pipeline(cfg: Any, code_timer: CodeTimer) -> dict[str, Any]:
+    """Runs the pipeline agent on a task and measures the run."""
+    from google.adk import runners
+    from google.adk.sessions import InMemorySessionService
+    from google.genai import types
+    from machine_learning_engineering import agent
+
+    code_timer.run_times.clear()
+    start_time = time.perf_counter()
+    pipeline_agent = agent.build_pipeline(cfg)
+    build_time = time.perf_counter() - start_time
+    session_service = InMemorySessionService()
+    runner = runners.Runner(agent=pipeline_agent, app_name=APP_NAME, session_service=session_service)
+    session = await session_service.create_session(app_name=APP_NAME, user_id=USER_ID)
+    content = types.Content(parts=[types.Part(text=TASK_MESSAGE)], role="user")
+    num_events = 0
+    async for _ in runner.run_async(user_id=USER_ID, session_id=session.id, new_message=content):
+        num_events += 1
+    wall_time = time.perf_counter() - start_time
+    session = await session_service.get_session(
+        app_name=APP_NAME, user_id=USER_ID, session_id=session.id
+    )
+    state = session.state
+    code_time = sum(code_timer.run_times)
+    submission_result = state.get("submission_code_exec_result", {})
+    return {
+        "wall_time": wall_time,
+        "build_time": build_time,
+        "code_time": code_time,
+        "overhead": wall_time - code_time,
+        "num_code_runs": len(code_timer.run_times),
+        "num_model_calls": state.get("model_usage", {}).get("total", {}).get("calls", 0),
+        "num_events": num_events,
+        "state_size": len(json.dumps(state, default=str)),
+        "score": submission_result.get("score"),
+    }
+
+
+def benchmark_scale(
+    data_dir: str,
+    workspace_dir: str,
+    task_name: str,
+    num_solutions: int,
+    num_model_candidates: int,
+    repeats: int,
+    overrides: dict[str, Any],
+) -> dict[str, Any]:
+    """Runs the pipeline repeatedly with a scale setting and summarizes the runs."""
+    from machine_learning_engineering.shared_libraries import code_util
+    from machine_learning_engineering.shared_libraries import config
+
+    backend_name = overrides.get("exec_backend", "local")
+    code_timer = CodeTimer(backend_name)
+    code_util.register_execution_backend(f"timed-{backend_name}", code_timer)
+    task_type, lower, _ = TASKS[task_name]
+    cfg = dataclasses.replace(
+        config.CONFIG,
+        data_dir=data_dir,
+        task_name=task_name,
+        task_type=task_type,
+        lower=lower,
+        workspace_dir=workspace_dir,
+        agent_model=scripted_llm.MODEL_NAME,
+        refinement_model="",
+        num_solutions=num_solutions,
+        num_model_candidates=num_model_candidates,
+        rate_limit_wait=0,
+        **{**overrides, "exec_backend": f"timed-{backend_name}"},
+    )
+    runs = [asyncio.run(run_pipeline(cfg, code_timer)) for _ in range(repeats)]
+    summary = {
+        name: bench_util.summarize([run[name] for run in runs])
+        for name in ("wall_time", "code_time", "overhead", "build_time")
+    }
+    for name in ("num_code_runs", "num_model_calls", "num_events", "state_size", "score"):
+        summary[name] = runs[-1][name]
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", type=str, default="")
+    parser.add_argument(
+        "--scales",
+        type=str,
+        default="1x1,2x2,4x2",
+        help="Comma-separated `<num_solutions>x<num_model_candidates>` settings.",
+    )
+    parser.add_argument("--tasks", type=str, default=",".join(TASKS))
+    parser.add_argument("--num_rows", type=int, default=2000)
+    parser.add_argument("--exec_backend", type=str, default="local")
+    args = parser.parse_args()
+    overrides = {"exec_backend": args.exec_backend}
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = os.path.join(tmp_dir, "tasks")
+        for task_name in args.tasks.split(","):
+            make_task(data_dir, task_name, args.num_rows)
+            for num_solutions, num_model_candidates in parse_scales(args.scales):
+                results[f"{task_name}/{num_solutions}x{num_model_candidates}"] = benchmark_scale(
+                    data_dir,
+                    os.path.join(tmp_dir, "workspace"),
+                    task_name,
+                    num_solutions,
+                    num_model_candidates,
+                    args.repeats,
+                    overrides,
+                )
+    bench_util.write_results("orchestration", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""A deterministic scripted model standing in for the LLM of the agents.
+
+Registered in the ADK model registry for the model names `scripted-*`, so
+that `agent_model="scripted-gemini-2"` runs the whole pipeline offline. The
+response is chosen from the name of the calling agent, which ADK passes in
+the labels of every request: model lists for the retrievers, small numpy
+solutions for the agents writing code, ablation code, plans whose code
+block is the `alpha = ...` line of the code, and short texts for the rest.
+
+The first solution of the second model candidate of every task always has a
+bug, so that every run also goes through the bug summary and debug agents.
+"""
+
+from typing import AsyncGenerator
+import json
+import re
+
+from google.adk.models import base_llm
+from google.adk.models import llm_request as llm_request_module
+from google.adk.models import llm_response as llm_response_module
+from google.adk.models import registry
+from google.genai import types
+
+
+# The `google_search` tool of the model retrievers only accepts Gemini 2 model names.
+MODEL_NAME = "scripted-gemini-2"
+AGENT_NAME_LABEL = "adk_agent_name"
+NUM_MODELS = 8
+ALPHA_PATTERN = re.compile(r"^alpha = ([0-9.e-]+)$", re.MULTILINE)
+
+SOLUTION_CODE = '''import os
+
+import numpy as np
+import pandas as pd
+
+train = pd.read_csv("./input/train.csv")
+test = pd.read_csv("./input/test.csv")
+features = [column for column in train.columns if column.startswith("x")]
+X = train[features].to_numpy(dtype=float)
+y = train["target"].to_numpy(dtype=float)
+is_classification = set(np.unique(y)) <= {{0.0, 1.0}}
+num_valid = len(X) // 5
+X_train, X_valid = X[num_valid:], X[:num_valid]
+y_train, y_valid = y[num_valid:], y[:num_valid]
+
+
+def add_bias(values):
+    return np.c_[values, np.ones(len(values))]
+
+
+alpha = {alpha}
+A = add_bias(X_train)
+weights = np.linalg.solve(A.T @ A + alpha * np.eye(A.shape[1]), A.T @ y_train)
+valid_pred = add_bias(X_valid) @ weights
+if is_classification:
+    score = float(np.mean((valid_pred > 0.5) == y_valid))
+else:
+    score = float(np.sqrt(np.mean((valid_pred - y_valid) ** 2)))
+{bug}print(f"Final Validation Performance: {{score}}")
+test_pred = add_bias(test[features].to_numpy(dtype=float)) @ weights
+if is_classification:
+    test_pred = (test_pred > 0.5).astype(int)
+os.makedirs("./final", exist_ok=True)
+pd.DataFrame({{"id": test["id"], "target": test_pred}}).to_csv("./final/submission.csv", index=False)
+'''
+
+ABLATION_CODE = '''import numpy as np
+import pandas as pd
+
+train = pd.read_csv("./input/train.csv")
+features = [column for column in train.columns if column.startswith("x")]
+y = train["target"].to_numpy(dtype=float)
+for dropped in [None] + features:
+    used = [column for column in features if column != dropped]
+    X = np.c_[train[used].to_numpy(dtype=float), np.ones(len(train))]
+    weights = np.linalg.lstsq(X, y, rcond=None)[0]
+    error = float(np.sqrt(np.mean((X @ weights - y) ** 2)))
+    print(f"Without {dropped}: training error {error:.4f}")
+'''
+
+
+def get_solution_code(alpha: float = 1.0, has_bug: bool = False) -> str:
+    """Gets the code of a solution fitting a ridge regression."""
+    bug = 'raise ValueError("Scripted bug.")\n' if has_bug else ""
+    return SOLUTION_CODE.format(alpha=alpha, bug=bug)
+
+
+def _as_code(code: str) -> str:
+    return f"```python\n{code}```"
+
+
+def get_request_text(llm_request: llm_request_module.LlmRequest) -> str:
+    """Gets the instruction and the contents of a request as text."""
+    texts = []
+    if llm_request.config and isinstance(llm_request.config.system_instruction, str):
+        texts.append(llm_request.config.system_instruction)
+    for content in llm_request.contents:
+        texts += [part.text for part in content.parts or [] if part.text]
+    return "\n".join(texts)
+
+
+def get_response_text(agent_name: str, request_text: str) -> str:
+    """Gets the scripted response to the request of an agent."""
+    alphas = ALPHA_PATTERN.findall(request_text)
+    alpha = float(alphas[-1]) if alphas else 1.0
+    if "bug_summary" in agent_name:
+        return "The code raises a ValueError before printing the validation performance."
+    if "check_leakage" in agent_name:
+        return json.dumps([{"leakage_status": "No Data Leakage", "code_block": ""}])
+    if "debug" in agent_name or "refine_leakage" in agent_name:
+        return _as_code(get_solution_code(alpha))
+    if agent_name.startswith("task_summarization"):
+        return "Predict `target` from the numeric features `x*`; the metric is in the description."
+    if agent_name.startswith("model_retriever"):
+        return json.dumps([
+            {"model_name": f"Ridge regression {k + 1}", "example_code": get_solution_code(10.0 ** -k)}
+            for k in range(NUM_MODELS)
+        ])
+    if agent_name.startswith("model_eval"):
+        # The second candidate of every solution needs debugging.
+        return _as_code(get_solution_code(alpha, has_bug=agent_name.endswith("_2")))
+    if agent_name.startswith("check_data_use"):
+        return "All the provided information is used."
+    if agent_name.startswith("ablation_summary"):
+        return "Removing any single feature barely changes the training error."
+    if agent_name.startswith("ablation"):
+        return _as_code(ABLATION_CODE)
+    if agent_name.startswith("init_plan"):
+        return json.dumps([{"plan": "Use a smaller ridge penalty.", "code_block": f"alpha = {alpha}"}])
+    if agent_name.startswith("plan_refine"):
+        return "Halve the ridge penalty again."
+    if agent_name.startswith("plan_implement"):
+        return _as_code(f"alpha = {alpha / 2}\n")
+    if agent_name.startswith(("init_ensemble_plan", "ensemble_plan_refine")):
+        return "Average the predictions of the solutions."
+    if agent_name.startswith(("merger", "ensemble_plan_implement", "submission")):
+        return _as_code(get_solution_code(alpha))
+    return "Done."
+
+
+class ScriptedLlm(base_llm.BaseLlm):
+    """A model answering every agent with its scripted response."""
+
+    model: str = MODEL_NAME
+
+    @classmethod
+    def supported_models(cls) -> list[str]:
+        return [r"scripted-.*"]
+
+    async def generate_content_async(
+        self,
+        llm_request: llm_request_module.LlmRequest,
+        stream: bool = False,
+    ) -> AsyncGenerator[llm_response_module.LlmResponse, None]:
+        labels = (llm_request.config.labels if llm_request.config else None) or {}
+        request_text = get_request_text(llm_request)
+        response_text = get_response_text(labels.get(AGENT_NAME_LABEL, ""), request_text)
+        yield llm_response_module.LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=response_text)]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                # About four characters per token.
+                prompt_token_count=len(request_text) // 4,
+                candidates_token_count=len(response_text) // 4,
+            ),
+        )
+
+
+registry.LLMRegistry.register(ScriptedLlm)
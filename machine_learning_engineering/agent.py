@@ -3,6 +3,10 @@
 import os
 import json
 import time
+import collections
+import dataclasses
+import functools
+import threading
 from typing import Optional
 from google.genai import types
 from google.adk.agents import callback_context as callback_context_module
@@ -13,9 +17,18 @@ from machine_learning_engineering.sub_agents.refinement import agent as refineme
 from machine_learning_engineering.sub_agents.ensemble import agent as ensemble_agent_module
 from machine_learning_engineering.sub_agents.submission import agent as submission_agent_module
 
+from machine_learning_engineering.shared_libraries import config
+from machine_learning_engineering.shared_libraries import tracing_util
+from machine_learning_engineering.shared_libraries import usage_util
 from machine_learning_engineering import prompt
 
 
+# The maximum number of pipeline agents kept by `build_pipeline`.
+_PIPELINE_CACHE_SIZE = 32
+_pipeline_cache: collections.OrderedDict[str, agents.SequentialAgent] = collections.OrderedDict()
+_pipeline_cache_lock = threading.Lock()
+
+
 def save_state(
     callback_context: callback_context_module.CallbackContext
 ) -> Optional[types.Content]:
@@ -32,34 +45,98 @@ def save_state_and_wait(
     callback_context: callback_context_module.CallbackContext
 ) -> Optional[types.Content]:
     """Saves state and then waits for a fixed duration to respect rate limits."""
-    # First, save the state
+    # First, summarize the model usage and save the state
+    usage_util.save_usage_summary(callback_context)
     save_state(callback_context)
 
     # Then, wait to manage request frequency
-    wait_duration = 8  # seconds
-    print(f"--- Waiting for {wait_duration} seconds to respect rate limits ---")
-    time.sleep(wait_duration)
+    wait_duration = callback_context.state.get("rate_limit_wait", 8)  # seconds
+    if wait_duration > 0:
+        print(f"--- Waiting for {wait_duration} seconds to respect rate limits ---")
+        time.sleep(wait_duration)
     return None
 
 
-mle_pipeline_agent = agents.SequentialAgent(
-    name="mle_pipeline_agent",
-    sub_agents=[
-        initialization_agent_module.initialization_agent,
-        refinement_agent_module.refinement_agent,
-        ensemble_agent_module.ensemble_agent,
-        submission_agent_module.submission_agent,
-    ],
-    description="Executes a sequence of sub-agents for solving the MLE task.",
-    after_agent_callback=save_state_and_wait,
-)
-
-# For ADK tools compatibility, the root agent must be named `root_agent`
-root_agent = agents.Agent(
-    model=os.getenv("ROOT_AGENT_MODEL"),
-    name="mle_frontdoor_agent",
-    instruction=prompt.FRONTDOOR_INSTRUCTION,
-    global_instruction=prompt.SYSTEM_INSTRUCTION,
-    sub_agents=[mle_pipeline_agent],
-    generate_content_config=types.GenerateContentConfig(temperature=0.01),
-)
+def build_pipeline_agent(
+    cfg: config.DefaultConfig,
+) -> agents.SequentialAgent:
+    """Builds the agent that executes the whole MLE pipeline."""
+    pipeline_agent = agents.SequentialAgent(
+        name="mle_pipeline_agent",
+        sub_agents=[
+            initialization_agent_module.build_initialization_agent(cfg),
+            refinement_agent_module.build_refinement_agent(cfg),
+            ensemble_agent_module.build_ensemble_agent(cfg),
+            submission_agent_module.build_submission_agent(cfg),
+        ],
+        description="Executes a sequence of sub-agents for solving the MLE task.",
+        after_agent_callback=save_state_and_wait,
+    )
+    usage_util.add_usage_callbacks(pipeline_agent)
+    if cfg.use_tracing:
+        # Before the first session, so that its outermost spans are recorded.
+        tracing_util.install(pipeline_agent)
+    return pipeline_agent
+
+
+def get_config_key(cfg: config.DefaultConfig) -> str:
+    """Gets a key that identifies a configuration."""
+    return json.dumps(dataclasses.asdict(cfg), sort_keys=True)
+
+
+def build_pipeline(
+    cfg: config.DefaultConfig,
+) -> agents.SequentialAgent:
+    """Builds the pipeline agent for a configuration, reusing cached graphs.
+
+    Every distinct configuration gets its own agent graph, built from a copy of
+    the configuration so that later changes to `cfg` cannot make the state
+    written by `prepare_task` diverge from the graph. The returned agent has no
+    parent and can be passed to a `Runner` directly, and it is safe to use the
+    same graph for several sessions at a time.
+    """
+    cfg = dataclasses.replace(cfg)
+    key = get_config_key(cfg)
+    with _pipeline_cache_lock:
+        pipeline_agent = _pipeline_cache.get(key)
+        if pipeline_agent is not None:
+            _pipeline_cache.move_to_end(key)
+            return pipeline_agent
+    pipeline_agent = build_pipeline_agent(cfg)
+    with _pipeline_cache_lock:
+        pipeline_agent = _pipeline_cache.setdefault(key, pipeline_agent)
+        _pipeline_cache.move_to_end(key)
+        while len(_pipeline_cache) > _PIPELINE_CACHE_SIZE:
+            _pipeline_cache.popitem(last=False)
+    return pipeline_agent
+
+
+def build_root_agent(
+    cfg: Optional[config.DefaultConfig] = None,
+) -> agents.Agent:
+    """Builds the root agent and its whole agent graph from a configuration."""
+    if cfg is None:
+        cfg = config.CONFIG
+    cfg = dataclasses.replace(cfg)
+    return agents.Agent(
+        model=cfg.agent_model,
+        name="mle_frontdoor_agent",
+        instruction=prompt.FRONTDOOR_INSTRUCTION,
+        global_instruction=prompt.SYSTEM_INSTRUCTION,
+        sub_agents=[build_pipeline_agent(cfg)],
+        generate_content_config=types.GenerateContentConfig(temperature=0.01),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_root_agent() -> agents.Agent:
+    """Gets the root agent built from the default configuration."""
+    return build_root_agent(config.CONFIG)
+
+
+def __getattr__(name: str):
+    # For ADK tools compatibility, the root agent must be named `root_agent`.
+    # It is only built on first access, so importing this module stays cheap.
+    if name == "root_agent":
+        return get_root_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,564 @@
+"""Runs Machine Learning Engineering Agent on many tasks concurrently.
+
+Every task runs the pipeline agent in a worker of a process pool. Workers are
+long-lived, so the imports of the controller (and the agent graphs built by
+`build_pipeline`) are reused from one task to the next.
+
+Usage:
+    python -m machine_learning_engineering.batch_runner \
+        --task_dirs ./machine_learning_engineering/tasks/california-housing-prices \
+        --cpu_budget 16 --cpus_per_task 4 \
+        --memory_budget_gb 64 --memory_per_task_gb 16 \
+        --summary_path ./batch_summary.jsonl \
+        --config outer_loop_round=2 --config exec_timeout=900
+
+With `--dashboard_port 8765`, the progress of the tasks is shown live on
+http://127.0.0.1:8765/.
+"""
+
+from typing import Any, Optional
+import argparse
+import asyncio
+import concurrent.futures
+import dataclasses
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+
+import dotenv
+
+
+APP_NAME = "machine-learning-engineering"
+USER_ID = "batch_runner"
+TASK_MESSAGE = "Execute the task."
+# Environment variables limiting the number of threads of numerical libraries.
+THREAD_LIMIT_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+
+def parse_config_overrides(overrides: list[str]) -> dict[str, Any]:
+    """Parses `key=value` overrides of the `DefaultConfig` fields."""
+    from machine_learning_engineering.shared_libraries import config
+
+    field_types = {
+        field.name: field.type for field in dataclasses.fields(config.DefaultConfig)
+    }
+    parsed = {}
+    for override in overrides:
+        key, sep, value = override.partition("=")
+        if not sep or key not in field_types:
+            raise ValueError(f"Invalid config override: {override}.")
+        field_type = field_types[key]
+        if field_type in (bool, "bool"):
+            parsed[key] = value.strip().lower() in ("1", "true", "yes")
+        elif field_type in (int, "int"):
+            parsed[key] = int(value)
+        elif field_type in (float, "float"):
+            parsed[key] = float(value)
+        else:
+            parsed[key] = value
+    return parsed
+
+
+def get_task_config(task_dir: str, overrides: dict[str, Any]):
+    """Gets the configuration for the task stored in the given directory."""
+    from machine_learning_engineering.shared_libraries import config
+
+    task_dir = os.path.abspath(task_dir.rstrip("/"))
+    return dataclasses.replace(
+        config.CONFIG,
+        data_dir=os.path.dirname(task_dir),
+        task_name=os.path.basename(task_dir),
+        **overrides,
+    )
+
+
+def init_worker(cpus_per_task: int, address_space_limit_bytes: int) -> None:
+    """Initializes a worker process of the pool.
+
+    `RLIMIT_AS` limits the virtual address space, not the resident memory, of
+    every process separately: the worker and each code it runs, which
+    inherits the limit, may reserve up to `address_space_limit_bytes`.
+    Libraries such as PyTorch, LightGBM or the BLAS reserve far more address
+    space than they use, so the limit must be well above the memory the codes
+    need. The memory budget of the batch is only enforced through the number
+    of workers.
+    """
+    from machine_learning_engineering.shared_libraries.runtime import mle_runtime
+
+    for env_var in THREAD_LIMIT_ENV_VARS:
+        os.environ[env_var] = str(cpus_per_task)
+    # Split between the codes of the task by `code_util.get_cpu_slots`.
+    os.environ[mle_runtime.CPU_SLOTS_ENV] = str(cpus_per_task)
+    if address_space_limit_bytes > 0:
+        try:
+            import resource
+            resource.setrlimit(
+                resource.RLIMIT_AS,
+                (address_space_limit_bytes, address_space_limit_bytes),
+            )
+        except (ImportError, ValueError, OSError):
+            pass
+    dotenv.load_dotenv()
+    # Warm up the imports once per worker rather than once per task.
+    from machine_learning_engineering import agent  # pylint: disable=unused-import
+
+
+def has_submission(state: dict[str, Any]) -> bool:
+    """Whether the submission code ran and wrote the submission file."""
+    from machine_learning_engineering.sub_agents.submission import agent as submission_agent
+
+    result_dict = state.get("submission_code_exec_result", {})
+    if not result_dict or result_dict.get("returncode", 1) != 0:
+        return False
+    return os.path.exists(submission_agent.get_submission_path(state))
+
+
+def get_final_score(state: dict[str, Any]) -> Optional[float]:
+    """Gets the validation score of the solution chosen for the submission, None if it has none.
+
+    The submission code itself may only load the saved models of the
+    solution, so it reports no score.
+    """
+    from machine_learning_engineering.shared_libraries import code_util
+    from machine_learning_engineering.sub_agents.submission import agent as submission_agent
+
+    _, exec_result = submission_agent.get_final_solution(state)
+    score = exec_result.get("score")
+    if score is None or score == code_util.get_failed_score(state.get("lower", True)):
+        return None
+    return score
+
+
+class ProgressLogHandler(logging.Handler):
+    """Forwards the warnings of the agent to the progress queue of the controller."""
+
+    def __init__(self, progress_queue: Any, task_name: str):
+        super().__init__(level=logging.WARNING)
+        self.progress_queue = progress_queue
+        self.task_name = task_name
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.progress_queue.put({
+                "event": "warning",
+                "task_name": self.task_name,
+                "logger": record.name,
+                "message": self.format(record),
+                "time": record.created,
+            })
+        except Exception:
+            self.handleError(record)
+
+
+async def _run_pipeline(
+    task_dir: str,
+    overrides: dict[str, Any],
+    attempt: int,
+    session_dir: str,
+    progress_queue: Any,
+    report_updates: bool = False,
+) -> dict[str, Any]:
+    """Runs the pipeline agent on a single task."""
+    from google.adk import runners
+    from google.genai import types
+    from machine_learning_engineering import agent
+    from machine_learning_engineering.shared_libraries import code_util
+    from machine_learning_engineering.shared_libraries import progress_util
+    from machine_learning_engineering.shared_libraries import sqlite_session_service
+
+    cfg = get_task_config(task_dir, overrides)
+    pipeline_agent = agent.build_pipeline(cfg)
+    session_service = sqlite_session_service.SqliteSessionService(
+        os.path.join(session_dir, f"{cfg.task_name}.db")
+    )
+    runner = runners.Runner(
+        agent=pipeline_agent,
+        app_name=APP_NAME,
+        session_service=session_service,
+    )
+    session = await session_service.create_session(
+        app_name=APP_NAME,
+        user_id=USER_ID,
+        session_id=f"{cfg.task_name}_attempt{attempt}_{int(time.time())}",
+    )
+    content = types.Content(parts=[types.Part(text=TASK_MESSAGE)], role="user")
+
+    def report_execution(event: str, info: dict[str, Any]) -> None:
+        progress_queue.put({
+            **info,
+            "event": f"execution_{event}",
+            "task_name": cfg.task_name,
+            "time": time.time(),
+        })
+
+    log_handler = ProgressLogHandler(progress_queue, cfg.task_name)
+    package_logger = logging.getLogger("machine_learning_engineering")
+    package_logger.addHandler(log_handler)
+    if report_updates:
+        code_util.register_execution_listener(report_execution)
+        progress_queue.put({
+            "event": "update",
+            "task_name": cfg.task_name,
+            "solution": progress_util.MAIN_BRANCH,
+            "agent": "",
+            "lower": cfg.lower,
+        })
+    current_author = ""
+    solution_agents = {}
+    try:
+        async for event in runner.run_async(
+            user_id=USER_ID,
+            session_id=session.id,
+            new_message=content,
+        ):
+            if event.author != current_author:
+                current_author = event.author
+                progress_queue.put({
+                    "event": "progress",
+                    "task_name": cfg.task_name,
+                    "attempt": attempt,
+                    "agent": current_author,
+                    "time": time.time(),
+                })
+            if not report_updates:
+                continue
+            update = progress_util.get_event_update(event)
+            # Only the changes are sent to the controller.
+            if len(update) > 2 or solution_agents.get(update["solution"]) != update["agent"]:
+                solution_agents[update["solution"]] = update["agent"]
+                progress_queue.put({**update, "event": "update", "task_name": cfg.task_name})
+    finally:
+        code_util.unregister_execution_listener(report_execution)
+        package_logger.removeHandler(log_handler)
+    session = await session_service.get_session(
+        app_name=APP_NAME,
+        user_id=USER_ID,
+        session_id=session.id,
+    )
+    succeeded = has_submission(session.state)
+    score = get_final_score(session.state)
+    session_service.close()
+    return {
+        "task_name": cfg.task_name,
+        "session_id": session.id,
+        "score": score,
+        "lower": cfg.lower,
+        "status": "succeeded" if succeeded else "failed",
+        "model_usage": session.state.get("model_usage", {}).get("total", {}),
+    }
+
+
+def run_task(
+    task_dir: str,
+    overrides: dict[str, Any],
+    attempt: int,
+    session_dir: str,
+    progress_queue: Any,
+    report_updates: bool = False,
+) -> dict[str, Any]:
+    """Runs a single task in a worker process and summarizes the result."""
+    start_time = time.time()
+    progress_queue.put({
+        "event": "started",
+        "task_dir": task_dir,
+        "attempt": attempt,
+        "pid": os.getpid(),
+        "time": start_time,
+    })
+    try:
+        result = asyncio.run(
+            _run_pipeline(
+                task_dir, overrides, attempt, session_dir, progress_queue, report_updates
+            )
+        )
+    except Exception:
+        result = {
+            "task_name": os.path.basename(task_dir.rstrip("/")),
+            "status": "failed",
+            "score": None,
+            "error": traceback.format_exc(),
+        }
+    result.update({
+        "event": "finished",
+        "task_dir": task_dir,
+        "attempt": attempt,
+        "elapsed": time.time() - start_time,
+        "time": time.time(),
+    })
+    return result
+
+
+def get_failed_result(task_dir: str, attempt: int) -> dict[str, Any]:
+    """Gets the result of an attempt whose worker failed, with the current exception."""
+    return {
+        "event": "finished",
+        "task_dir": task_dir,
+        "task_name": os.path.basename(task_dir.rstrip("/")),
+        "status": "failed",
+        "score": None,
+        "attempt": attempt,
+        "error": traceback.format_exc(),
+        "time": time.time(),
+    }
+
+
+class SummaryWriter:
+    """Appends JSON lines to the summary file from several threads."""
+
+    def __init__(self, summary_path: str):
+        self._lock = threading.Lock()
+        self._file = open(summary_path, "a", encoding="utf-8")
+
+    def write(self, record: dict[str, Any]) -> None:
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+        print(f"[batch_runner] {line[:300]}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def _drain_progress(
+    progress_queue: Any,
+    writer: SummaryWriter,
+    stop: threading.Event,
+    board: Any = None,
+    started: Optional[set[tuple[str, int]]] = None,
+) -> None:
+    """Forwards the progress reported by the workers to the summary file and the board.
+
+    The `(task_dir, attempt)` of every started attempt is added to `started`.
+    """
+    from machine_learning_engineering.shared_libraries import progress_util
+
+    while not stop.is_set() or not progress_queue.empty():
+        try:
+            record = progress_queue.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        if started is not None and record.get("event") == "started":
+            started.add((record["task_dir"], record["attempt"]))
+        if board is not None:
+            board.apply(record)
+        if record.get("event") not in progress_util.UPDATE_EVENTS:
+            writer.write(record)
+
+
+def get_num_workers(
+    num_tasks: int,
+    cpu_budget: int,
+    cpus_per_task: int,
+    memory_budget_gb: float,
+    memory_per_task_gb: float,
+) -> int:
+    """Gets the number of tasks that can run at once within the budgets."""
+    num_workers = min(num_tasks, max(1, cpu_budget // max(1, cpus_per_task)))
+    if memory_budget_gb > 0 and memory_per_task_gb > 0:
+        num_workers = min(num_workers, max(1, int(memory_budget_gb // memory_per_task_gb)))
+    return max(1, num_workers)
+
+
+def run_batch(
+    task_dirs: list[str],
+    overrides: dict[str, Any],
+    summary_path: str,
+    session_dir: str,
+    cpu_budget: int,
+    cpus_per_task: int,
+    memory_budget_gb: float,
+    memory_per_task_gb: float,
+    max_attempts: int,
+    dashboard_port: Optional[int] = None,
+    address_space_limit_gb: float = 0.0,
+) -> list[dict[str, Any]]:
+    """Runs all the tasks and retries the failed ones."""
+    from machine_learning_engineering.shared_libraries import progress_util
+
+    os.makedirs(session_dir, exist_ok=True)
+    num_workers = get_num_workers(
+        num_tasks=len(task_dirs),
+        cpu_budget=cpu_budget,
+        cpus_per_task=cpus_per_task,
+        memory_budget_gb=memory_budget_gb,
+        memory_per_task_gb=memory_per_task_gb,
+    )
+    mp_context = multiprocessing.get_context("spawn")
+    manager = mp_context.Manager()
+    progress_queue = manager.Queue()
+    writer = SummaryWriter(summary_path)
+    board = None
+    dashboard = None
+    if dashboard_port is not None:
+        board = progress_util.ProgressBoard(
+            [os.path.basename(task_dir.rstrip("/")) for task_dir in task_dirs],
+            queue_dir=overrides.get("exec_queue_dir", "") if overrides.get("exec_backend") == "queue" else "",
+        )
+        dashboard = progress_util.DashboardServer(board, port=dashboard_port)
+        dashboard.start()
+        print(f"[batch_runner] Dashboard: {dashboard.url}")
+    report_updates = board is not None
+    stop = threading.Event()
+    started = set()
+    drain_thread = threading.Thread(
+        target=_drain_progress,
+        args=(progress_queue, writer, stop, board, started),
+        daemon=True,
+    )
+    drain_thread.start()
+    writer.write({
+        "event": "batch_started",
+        "num_tasks": len(task_dirs),
+        "num_workers": num_workers,
+        "overrides": overrides,
+        "time": time.time(),
+    })
+    final_results = {}
+
+    def create_executor() -> concurrent.futures.ProcessPoolExecutor:
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=mp_context,
+            initializer=init_worker,
+            initargs=(cpus_per_task, int(address_space_limit_gb * 1024 ** 3)),
+        )
+
+    executor = create_executor()
+    attempts_to_run = [(task_dir, 1) for task_dir in task_dirs]
+    requeued_attempts = set()
+    futures = {}
+    try:
+        while attempts_to_run or futures:
+            while attempts_to_run:
+                task_dir, attempt = attempts_to_run[0]
+                try:
+                    future = executor.submit(
+                        run_task, task_dir, overrides, attempt, session_dir, progress_queue, report_updates
+                    )
+                except concurrent.futures.process.BrokenProcessPool:
+                    # The futures of the broken pool fail and are handled below.
+                    executor.shutdown(wait=False)
+                    executor = create_executor()
+                    continue
+                attempts_to_run.pop(0)
+                futures[future] = (task_dir, attempt, executor)
+            done, _ = concurrent.futures.wait(
+                futures, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                task_dir, attempt, future_executor = futures.pop(future)
+                try:
+                    result = future.result()
+                except concurrent.futures.process.BrokenProcessPool:
+                    # A worker process died, e.g. from running out of memory,
+                    # which fails all the futures of its pool.
+                    if future_executor is executor:
+                        executor.shutdown(wait=False)
+                        executor = create_executor()
+                    if (
+                        (task_dir, attempt) not in started
+                        and (task_dir, attempt) not in requeued_attempts
+                    ):
+                        # The attempt was still queued, it is run again once.
+                        requeued_attempts.add((task_dir, attempt))
+                        attempts_to_run.append((task_dir, attempt))
+                        continue
+                    result = get_failed_result(task_dir, attempt)
+                except Exception:
+                    result = get_failed_result(task_dir, attempt)
+                writer.write(result)
+                if board is not None:
+                    board.apply(result)
+                final_results[task_dir] = result
+                if result["status"] == "failed" and attempt < max_attempts:
+                    attempts_to_run.append((task_dir, attempt + 1))
+    finally:
+        executor.shutdown()
+    stop.set()
+    drain_thread.join()
+    results = [final_results[task_dir] for task_dir in task_dirs]
+    writer.write({
+        "event": "batch_finished",
+        "num_succeeded": sum(result["status"] == "succeeded" for result in results),
+        "num_failed": sum(result["status"] == "failed" for result in results),
+        "scores": {result["task_name"]: result.get("score") for result in results},
+        "time": time.time(),
+    })
+    writer.close()
+    manager.shutdown()
+    if dashboard is not None:
+        dashboard.stop()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Runs Machine Learning Engineering Agent on many tasks."
+    )
+    parser.add_argument("--task_dirs", nargs="+", required=True, help="Task directories.")
+    parser.add_argument("--summary_path", default="./batch_summary.jsonl")
+    parser.add_argument("--session_dir", default="./batch_sessions")
+    parser.add_argument("--cpu_budget", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--cpus_per_task", type=int, default=1)
+    parser.add_argument("--memory_budget_gb", type=float, default=0.0)
+    parser.add_argument(
+        "--memory_per_task_gb",
+        type=float,
+        default=0.0,
+        help="The memory a task needs, which bounds the workers within --memory_budget_gb.",
+    )
+    parser.add_argument(
+        "--address_space_limit_gb",
+        type=float,
+        default=0.0,
+        help=(
+            "Limits the virtual address space of every worker and code (RLIMIT_AS),"
+            " which is often far above their resident memory."
+        ),
+    )
+    parser.add_argument("--max_attempts", type=int, default=2)
+    parser.add_argument(
+        "--dashboard_port",
+        type=int,
+        default=None,
+        help="Serves the live progress of the tasks on this local port.",
+    )
+    parser.add_argument(
+        "--config",
+        action="append",
+        default=[],
+        help="Overrides a field of DefaultConfig, e.g. --config exec_timeout=900.",
+    )
+    args = parser.parse_args()
+    dotenv.load_dotenv()
+    results = run_batch(
+        task_dirs=args.task_dirs,
+        overrides=parse_config_overrides(args.config),
+        summary_path=args.summary_path,
+        session_dir=args.session_dir,
+        cpu_budget=args.cpu_budget,
+        cpus_per_task=args.cpus_per_task,
+        memory_budget_gb=args.memory_budget_gb,
+        memory_per_task_gb=args.memory_per_task_gb,
+        max_attempts=args.max_attempts,
+        dashboard_port=args.dashboard_port,
+        address_space_limit_gb=args.address_space_limit_gb,
+    )
+    for result in results:
+        print(f"{result['task_name']}: {result['status']} (score: {result.get('score')})")
+
+
+if __name__ == "__main__":
+    main()
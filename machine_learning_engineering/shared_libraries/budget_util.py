@@ -0,0 +1,101 @@
+"""Utility functions for the wall-clock time budget of a task.
+
+The budget of a task, `time_budget` seconds from `start_time`, is split into
+consecutive stages. `submission_time_reserve` seconds are always kept for the
+submission, and the rest is split between the initialization, the refinement
+and the ensemble according to `init_budget_ratio` and
+`refinement_budget_ratio`. The deadlines of the stages are cumulative, so the
+time left over by a stage is carried over to the next one.
+"""
+
+from typing import Any, Mapping, Optional
+import time
+
+from machine_learning_engineering.shared_libraries import config
+
+
+STAGES = ("initialization", "refinement", "ensemble", "submission")
+# The rough time of one LLM call, used to estimate the time of an iteration.
+LLM_CALL_TIME = 60.0
+
+
+def get_stage(agent_name: str) -> str:
+    """Gets the stage of the pipeline the agent belongs to."""
+    if agent_name.startswith(("model_eval", "merger", "check_data_use")):
+        return "initialization"
+    if agent_name.startswith(("ablation", "plan_implement", "init_plan", "plan_refine")):
+        return "refinement"
+    if agent_name.startswith(("ensemble", "init_ensemble")):
+        return "ensemble"
+    if agent_name.startswith("submission"):
+        return "submission"
+    raise ValueError(f"Unexpected agent name: {agent_name}.")
+
+
+def get_stage_deadline(state: Mapping[str, Any], stage: str) -> Optional[float]:
+    """Gets the time by which the stage must finish, None without a budget."""
+    time_budget = state.get("time_budget", 0)
+    start_time = state.get("start_time", 0.0)
+    if not time_budget or not start_time:
+        return None
+    if stage == "submission":
+        return start_time + time_budget
+    available_time = max(0.0, time_budget - state.get("submission_time_reserve", 900))
+    init_ratio = state.get("init_budget_ratio", 0.3)
+    refinement_ratio = state.get("refinement_budget_ratio", 0.45)
+    cumulative_ratios = {
+        "initialization": init_ratio,
+        "refinement": init_ratio + refinement_ratio,
+        "ensemble": 1.0,
+    }
+    return start_time + available_time * min(1.0, cumulative_ratios[stage])
+
+
+def get_remaining_time(state: Mapping[str, Any], stage: str) -> Optional[float]:
+    """Gets the seconds left for the stage, None without a budget."""
+    deadline = get_stage_deadline(state, stage)
+    if deadline is None:
+        return None
+    return deadline - time.time()
+
+
+def is_over_budget(
+    state: Mapping[str, Any],
+    stage: str,
+    required_time: float = 0.0,
+) -> bool:
+    """Checks if the stage has less than `required_time` seconds left."""
+    remaining_time = get_remaining_time(state, stage)
+    if remaining_time is None:
+        return False
+    if remaining_time < required_time:
+        print(f"--- Skipping a step of the {stage} stage to meet the time budget ---")
+        return True
+    return False
+
+
+def estimate_iteration_time(*exec_results: Mapping[str, Any]) -> float:
+    """Estimates the time of an iteration that writes and runs code once."""
+    execution_time = sum(
+        exec_result.get("execution_time", 0.0) for exec_result in exec_results if exec_result
+    )
+    return LLM_CALL_TIME + execution_time
+
+
+def get_exec_timeout(
+    state: Mapping[str, Any],
+    agent_name: str,
+    exec_timeout: Optional[int] = None,
+) -> int:
+    """Gets the timeout of a code execution, shrunk as the deadline approaches.
+
+    The timeout is never shrunk below `min_exec_timeout`, the floor of the
+    timeouts learned by `timeout_util`.
+    """
+    if exec_timeout is None:
+        exec_timeout = state.get("exec_timeout", config.CONFIG.exec_timeout)
+    remaining_time = get_remaining_time(state, get_stage(agent_name))
+    if remaining_time is None:
+        return exec_timeout
+    min_exec_timeout = state.get("min_exec_timeout", config.CONFIG.min_exec_timeout)
+    return int(max(min_exec_timeout, min(exec_timeout, remaining_time)))
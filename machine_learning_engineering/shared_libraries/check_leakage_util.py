@@ -182,10 +182,11 @@ def check_data_leakage(
 def get_data_leakage_checker_agent(
     prefix: str,
     suffix: str,
+    cfg: config.DefaultConfig,
 ) -> agents.SequentialAgent:
     """Gets the data leakage checker agent."""
     check_leakage_agent = agents.Agent(
-        model=config.CONFIG.agent_model,
+        model=cfg.agent_model,
         name=code_util.get_name_with_prefix_and_suffix(
             base_name="check_leakage_agent",
             prefix=prefix,
@@ -216,10 +217,10 @@ def get_data_leakage_checker_agent(
         sub_agents=[
             check_leakage_agent,
         ],
-        max_iterations=config.CONFIG.max_retry,
+        max_iterations=cfg.max_retry,
     )
     refine_leakage_agent = agents.Agent(
-        model=config.CONFIG.agent_model,
+        model=cfg.agent_model,
         name=code_util.get_name_with_prefix_and_suffix(
             base_name="refine_leakage_agent",
             prefix=prefix,
@@ -1,11 +1,60 @@
 """Code related utility functions."""
 
-from typing import Any
+from typing import Any, Callable, Mapping, Optional
+import ast
+import hashlib
+import logging
 import subprocess
 import os
+import signal
 import time
 
 from google.adk.agents import callback_context as callback_context_module
+from opentelemetry import trace
+
+from machine_learning_engineering.shared_libraries import budget_util
+from machine_learning_engineering.shared_libraries import kernel_util
+from machine_learning_engineering.shared_libraries import timeout_util
+from machine_learning_engineering.shared_libraries import work_queue
+from machine_learning_engineering.shared_libraries.runtime import mle_prefix_cache
+from machine_learning_engineering.shared_libraries.runtime import mle_profiler
+from machine_learning_engineering.shared_libraries.runtime import mle_runtime
+
+
+# The directory of `mle_runtime`, importable by every code the agent runs.
+RUNTIME_DIR = os.path.dirname(os.path.abspath(mle_runtime.__file__))
+
+tracer = trace.get_tracer(__name__)
+logger = logging.getLogger(__name__)
+
+
+ExecutionListener = Callable[[str, dict[str, Any]], None]
+
+_EXECUTION_LISTENERS: list[ExecutionListener] = []
+
+
+def register_execution_listener(listener: ExecutionListener) -> None:
+    """Registers a function called with the events of the code runs.
+
+    The events are `started`, `spawned` with the `pid` of a process running
+    the code on this host, and `finished`, each with the `py_filepath` of the
+    code as its absolute path.
+    """
+    _EXECUTION_LISTENERS.append(listener)
+
+
+def unregister_execution_listener(listener: ExecutionListener) -> None:
+    if listener in _EXECUTION_LISTENERS:
+        _EXECUTION_LISTENERS.remove(listener)
+
+
+def notify_execution_listeners(event: str, info: dict[str, Any]) -> None:
+    """Calls the execution listeners, which never fail the code run."""
+    for listener in list(_EXECUTION_LISTENERS):
+        try:
+            listener(event, info)
+        except Exception:
+            logger.warning("Execution listener failed on the %s event.", event, exc_info=True)
 
 
 class Result:
@@ -15,24 +64,142 @@ class Result:
         self.stderr = stderr
 
 
+def _kill_process_group(process: subprocess.Popen) -> None:
+    """Kills a process together with the processes it started."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (AttributeError, ProcessLookupError, PermissionError):
+        process.kill()
+
+
+def get_code_hash(code_text: str) -> str:
+    """Gets the hash identifying a code."""
+    return hashlib.sha256(code_text.encode("utf-8")).hexdigest()[:16]
+
+
+def get_prediction_dir(state: Mapping[str, Any]) -> str:
+    """Gets the directory of the prediction store of the task."""
+    workspace_dir = state.get("workspace_dir", "")
+    task_name = state.get("task_name", "")
+    return os.path.abspath(os.path.join(workspace_dir, task_name, "predictions"))
+
+
+def get_artifact_dir(state: Mapping[str, Any]) -> str:
+    """Gets the directory of the model store of the task."""
+    workspace_dir = state.get("workspace_dir", "")
+    task_name = state.get("task_name", "")
+    return os.path.abspath(os.path.join(workspace_dir, task_name, "artifacts"))
+
+
+def get_image_cache_dir(state: Mapping[str, Any]) -> str:
+    """Gets the directory of the images decoded by `mle_runtime.load_images`."""
+    workspace_dir = state.get("workspace_dir", "")
+    task_name = state.get("task_name", "")
+    return os.path.abspath(os.path.join(workspace_dir, task_name, "image_cache"))
+
+
+def get_cpu_slots(state: Mapping[str, Any]) -> int:
+    """Gets the number of CPUs a code may use.
+
+    Without `cpu_slots`, the CPUs of the agent are split between the solutions
+    refined in parallel.
+    """
+    cpu_slots = state.get("cpu_slots", 0)
+    if cpu_slots > 0:
+        return cpu_slots
+    return max(1, mle_runtime.get_cpu_slots() // max(1, state.get("num_solutions", 1)))
+
+
+def get_prefix_cache_dir(state: Mapping[str, Any]) -> str:
+    """Gets the directory of the snapshots of the code prefixes of the task."""
+    workspace_dir = state.get("workspace_dir", "")
+    task_name = state.get("task_name", "")
+    return os.path.abspath(os.path.join(workspace_dir, task_name, "prefix_cache"))
+
+
+def get_refinement_prefix_length(
+    code_text: str,
+    prev_code: str,
+    code_block: str,
+) -> int:
+    """Gets the length of the prefix of a refined code shared with its previous version.
+
+    The prefix ends at the start of the last top-level statement starting
+    before the refined block, so that it can run on its own. Returns 0 if the
+    code does not keep the prefix of the previous version.
+    """
+    if not code_block or code_block not in prev_code:
+        return 0
+    shared_prefix = prev_code[:prev_code.index(code_block)]
+    if not code_text.startswith(shared_prefix):
+        return 0
+    try:
+        body = ast.parse(code_text).body
+    except SyntaxError:
+        return 0
+    line_offsets = [0]
+    for line in code_text.splitlines(True):
+        line_offsets.append(line_offsets[-1] + len(line))
+    prefix_length = 0
+    for node in body:
+        first_line = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+        offset = line_offsets[first_line - 1]
+        if offset > len(shared_prefix):
+            break
+        prefix_length = offset
+    return prefix_length
+
+
+def get_runtime_env(env: Optional[Mapping[str, str]] = None) -> dict[str, str]:
+    """Gets the environment of a code, with `mle_runtime` importable."""
+    runtime_env = dict(os.environ)
+    python_path = runtime_env.get("PYTHONPATH", "")
+    runtime_env["PYTHONPATH"] = (
+        RUNTIME_DIR + os.pathsep + python_path if python_path else RUNTIME_DIR
+    )
+    if env:
+        runtime_env.update(env)
+    return runtime_env
+
+
 def run_python_code(
     code_text: str,
     run_cwd: str,
     py_filepath: str,
     exec_timeout: int,
+    env: Optional[Mapping[str, str]] = None,
 ) -> dict[str, Any]:
     start_time = time.time()
     output_filepath = os.path.join(run_cwd, py_filepath)
     with open(output_filepath, "w", encoding="utf-8") as f:
         f.write(code_text)
+    failure_kind = ""
     try:
-        result = subprocess.run(
+        # The code runs in its own session, so that on timeout the worker
+        # processes it started are killed with it.
+        process = subprocess.Popen(
             ["python", py_filepath],
             cwd=run_cwd,
-            capture_output=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
             text=True,
-            timeout=exec_timeout,
+            env=get_runtime_env(env),
+            start_new_session=True,
         )
+        notify_execution_listeners(
+            "spawned", {"py_filepath": os.path.abspath(output_filepath), "pid": process.pid}
+        )
+        try:
+            stdout, stderr = process.communicate(timeout=exec_timeout)
+            result = Result(returncode=process.returncode, stdout=stdout, stderr=stderr)
+        except subprocess.TimeoutExpired:
+            _kill_process_group(process)
+            stdout, stderr = process.communicate()
+            stderr = (stderr or "") + (
+                f"\nTimeoutError: The code did not finish within {exec_timeout} seconds."
+            )
+            result = Result(returncode=1, stdout=stdout or "", stderr=stderr)
+            failure_kind = "timeout"
     except Exception as e:
         result = Result(returncode=1, stdout="", stderr=str(e))
     end_time = time.time()
@@ -43,6 +210,132 @@ def run_python_code(
         "stderr": result.stderr,
         "execution_time": execution_time,
     }
+    if result.returncode != 0:
+        result_dict["failure_kind"] = failure_kind or "error"
+        result_dict["exec_timeout"] = exec_timeout
+    return result_dict
+
+
+def _run_python_code_locally(
+    code_text: str,
+    run_cwd: str,
+    py_filepath: str,
+    exec_timeout: int,
+    state: Mapping[str, Any],
+    env: Mapping[str, str],
+) -> dict[str, Any]:
+    """Runs the code on the controller host."""
+    return run_python_code(
+        code_text=code_text,
+        run_cwd=run_cwd,
+        py_filepath=py_filepath,
+        exec_timeout=exec_timeout,
+        env=env,
+    )
+
+
+ExecutionBackend = Callable[
+    [str, str, str, int, Mapping[str, Any], Mapping[str, str]], dict[str, Any]
+]
+
+_EXECUTION_BACKENDS: dict[str, ExecutionBackend] = {
+    "local": _run_python_code_locally,
+    "queue": work_queue.run_python_code_in_queue,
+    "kernel": kernel_util.run_python_code_in_kernel,
+}
+
+
+def register_execution_backend(name: str, backend: ExecutionBackend) -> None:
+    """Registers a backend selectable with the `exec_backend` config."""
+    _EXECUTION_BACKENDS[name] = backend
+
+
+def execute_code(
+    code_text: str,
+    run_cwd: str,
+    py_filepath: str,
+    exec_timeout: int,
+    state: Mapping[str, Any],
+    prefix_length: int = 0,
+) -> dict[str, Any]:
+    """Runs the code with the execution backend selected in the state.
+
+    With `use_prefix_cache`, a code whose first `prefix_length` characters
+    were already run resumes from the snapshot of their state. With
+    `use_profiling`, the hot spots of the code are added to the result as
+    `profile`. In both cases the code is still written to `py_filepath`, and
+    run by `<py_filepath>.launcher.py`. The metrics logged by the code with
+    `mle_runtime` are added as `metrics`.
+    """
+    backend_name = state.get("exec_backend", "local")
+    if backend_name not in _EXECUTION_BACKENDS:
+        raise ValueError(f"Unknown execution backend: {backend_name}.")
+    env = {
+        mle_runtime.SOLUTION_HASH_ENV: get_code_hash(code_text),
+        mle_runtime.PREDICTION_DIR_ENV: get_prediction_dir(state),
+        mle_runtime.ARTIFACT_DIR_ENV: get_artifact_dir(state),
+        mle_runtime.IMAGE_CACHE_DIR_ENV: get_image_cache_dir(state),
+        mle_runtime.DEADLINE_ENV: str(time.time() + exec_timeout),
+    }
+    # The workers of the `queue` backend know their own CPUs.
+    if backend_name != "queue" or state.get("cpu_slots", 0) > 0:
+        env[mle_runtime.CPU_SLOTS_ENV] = str(get_cpu_slots(state))
+    code_to_run = code_text
+    if not state.get("use_prefix_cache", False):
+        prefix_length = 0
+    if prefix_length > 0:
+        code_to_run = mle_prefix_cache.get_launcher_code(code_text, prefix_length, py_filepath)
+        env[mle_prefix_cache.CACHE_DIR_ENV] = get_prefix_cache_dir(state)
+    metrics_path = os.path.abspath(os.path.join(run_cwd, f"{py_filepath}.metrics.jsonl"))
+    if os.path.exists(metrics_path):
+        os.remove(metrics_path)
+    env[mle_runtime.METRICS_PATH_ENV] = metrics_path
+    profile_path = ""
+    if state.get("use_profiling", False):
+        profile_path = os.path.abspath(os.path.join(run_cwd, f"{py_filepath}.profile.json"))
+        if os.path.exists(profile_path):
+            os.remove(profile_path)
+        code_to_run = mle_profiler.get_launcher_code(code_text, prefix_length, py_filepath)
+        env[mle_profiler.PROFILE_PATH_ENV] = profile_path
+    abs_filepath = os.path.abspath(os.path.join(run_cwd, py_filepath))
+    run_filepath = py_filepath
+    if code_to_run != code_text:
+        # The backends write the script they run, which must not replace the
+        # code itself, e.g. `final_solution.py`.
+        os.makedirs(run_cwd, exist_ok=True)
+        with open(abs_filepath, "w", encoding="utf-8") as f:
+            f.write(code_text)
+        run_filepath = f"{py_filepath}.launcher.py"
+    notify_execution_listeners(
+        "started", {"py_filepath": abs_filepath, "exec_backend": backend_name}
+    )
+    with tracer.start_as_current_span("run_python_code") as span:
+        span.set_attribute("exec_backend", backend_name)
+        span.set_attribute("py_filepath", os.path.join(run_cwd, py_filepath))
+        span.set_attribute("code_hash", env[mle_runtime.SOLUTION_HASH_ENV])
+        span.set_attribute("exec_timeout", exec_timeout)
+        try:
+            result_dict = _EXECUTION_BACKENDS[backend_name](
+                code_to_run,
+                run_cwd,
+                run_filepath,
+                exec_timeout,
+                state,
+                env,
+            )
+        finally:
+            notify_execution_listeners("finished", {"py_filepath": abs_filepath})
+        span.set_attribute("returncode", result_dict["returncode"])
+        if result_dict.get("failure_kind"):
+            span.set_attribute("failure_kind", result_dict["failure_kind"])
+    result_dict["code_hash"] = env[mle_runtime.SOLUTION_HASH_ENV]
+    metrics = mle_runtime.load_metrics(metrics_path)
+    if metrics is not None:
+        result_dict["metrics"] = metrics
+    if profile_path:
+        profile = mle_profiler.load_profile(profile_path, state.get("profile_top_n", 10))
+        if profile is not None:
+            result_dict["profile"] = profile
     return result_dict
 
 
@@ -62,6 +355,42 @@ def extract_performance_from_text(text: str) -> float | None:
     return performance_value
 
 
+def get_score(result_dict: Mapping[str, Any]) -> float | None:
+    """Gets the validation score of a code run, from its metrics or else its output."""
+    score = result_dict.get("metrics", {}).get(mle_runtime.VALIDATION_SCORE_METRIC)
+    if score is not None:
+        return score
+    return extract_performance_from_text(result_dict.get("stdout", ""))
+
+
+def get_failed_score(lower: bool) -> float:
+    """Gets the score given to a code that failed or reported no score."""
+    return 1e9 if lower else 0
+
+
+def format_metrics(metrics: Mapping[str, Any]) -> str:
+    """Formats the metrics and stage times logged by a code, one per line."""
+    lines = []
+    for record in metrics.get("records", []):
+        fields = ", ".join(
+            f"{key}: {value}" for key, value in record.items()
+            if key not in ("name", "value", "time")
+        )
+        lines.append(f"{record['name']} = {record['value']}" + (f" ({fields})" if fields else ""))
+    if metrics.get("fold_scores"):
+        lines.append(f"fold scores = {metrics['fold_scores']}")
+    for stage, seconds in metrics.get("stage_times", {}).items():
+        lines.append(f"time of {stage} = {seconds:.1f}s")
+    if metrics.get("validation_score") is not None:
+        lines.append(f"{mle_runtime.SCORE_MARKER}: {metrics['validation_score']}")
+    return "\n".join(lines)
+
+
+def reports_score(code_text: str) -> bool:
+    """Whether a code reports its validation score."""
+    return mle_runtime.SCORE_MARKER in code_text or "log_validation_score" in code_text
+
+
 def get_name_with_prefix_and_suffix(
     base_name: str,
     prefix: str = "",
@@ -167,7 +496,7 @@ def get_run_code_condition(
     if agent_name.startswith("ensemble_plan_implement"):
         if "debug_agent" not in agent_name:
             return True
-        if "Final Validation Performance" in raw_code and "exit()" not in raw_code:
+        if reports_score(raw_code) and "exit()" not in raw_code:
             return True
     elif agent_name.startswith("ablation"):
         if "debug_agent" not in agent_name:
@@ -179,7 +508,7 @@ def get_run_code_condition(
             return True
         if "debug_agent" in agent_name and "exit()" not in raw_code:
             return True
-    elif "Final Validation Performance" in raw_code and "exit()" not in raw_code:
+    elif reports_score(raw_code) and "exit()" not in raw_code:
         return True
     return False
 
@@ -189,14 +518,19 @@ def evaluate_code(
 ) -> None:
     """Evaluates the given code."""
     lower = callback_context.state.get("lower", True)
-    exec_timeout = callback_context.state.get("exec_timeout", 1800)
     agent_name = callback_context.agent_name
+    exec_timeout = budget_util.get_exec_timeout(
+        callback_context.state,
+        agent_name,
+        timeout_util.get_adaptive_exec_timeout(callback_context.state, agent_name),
+    )
     suffix = get_updated_suffix(callback_context=callback_context)
     code_state_key = get_code_state_key(
         agent_name=agent_name,
         suffix=suffix,
     )
     raw_code = callback_context.state.get(code_state_key, "")
+    prefix_length = 0
     if agent_name.startswith("model_eval"):
         model_id = agent_name.split("_")[-1]
         task_id = agent_name.split("_")[-2]
@@ -217,6 +551,11 @@ def evaluate_code(
         step = callback_context.state.get(f"refine_step_{task_id}", 0)
         inner_iter = callback_context.state.get(f"inner_iter_{task_id}", 0)
         py_filepath = f"train{step}_improve{inner_iter}.py"
+        prefix_length = get_refinement_prefix_length(
+            raw_code,
+            callback_context.state.get(f"train_code_{step}_{task_id}", ""),
+            callback_context.state.get(f"refine_code_block_{step}_{task_id}", ""),
+        )
     elif agent_name.startswith("ensemble_plan_implement"):
         task_id = "ensemble"
         py_filepath = f"ensemble{suffix}.py"
@@ -232,27 +571,42 @@ def evaluate_code(
         workspace_dir = callback_context.state.get("workspace_dir", "")
         task_name = callback_context.state.get("task_name", "")
         run_cwd = os.path.join(workspace_dir, task_name, task_id)
-        result_dict = run_python_code(
+        result_dict = execute_code(
             code_text=raw_code,
             run_cwd=run_cwd,
             py_filepath=py_filepath,
             exec_timeout=exec_timeout,
+            state=callback_context.state,
+            prefix_length=prefix_length,
+        )
+        tune_result = mle_runtime.load_tune_result(
+            result_dict["code_hash"], get_artifact_dir(callback_context.state)
         )
+        if tune_result is not None:
+            result_dict["tune_result"] = {
+                key: tune_result[key]
+                for key in ("best_params", "best_score", "best_resource", "num_trials")
+            }
+        if result_dict.get("failure_kind") == "timeout":
+            result_dict["baseline_execution_time"] = timeout_util.get_baseline_execution_time(
+                callback_context.state, agent_name
+            )
         if agent_name.startswith("ablation"):
-            if result_dict["returncode"] == 0:
-                ablation_result = result_dict.get("stdout", "None")
-            else:
+            if result_dict["returncode"] != 0:
                 ablation_result = "None"
+            elif result_dict.get("metrics", {}).get("records"):
+                ablation_result = format_metrics(result_dict["metrics"])
+            else:
+                ablation_result = result_dict.get("stdout", "None")
             result_dict["ablation_result"] = ablation_result
         else:
             if result_dict.get("returncode", 1) == 0:
                 try:
-                    score = extract_performance_from_text(result_dict.get("stdout", ""))
-                    score = float(score)
+                    score = float(get_score(result_dict))
                 except:
-                    score = 1e9 if lower else 0
+                    score = get_failed_score(lower)
             else:
-                score = 1e9 if lower else 0
+                score = get_failed_score(lower)
             result_dict["score"] = score
     else:
         result_dict = {}
@@ -1,9 +1,9 @@
 """Common utility functions."""
 
 import random
-import torch
 import os
 import shutil
+import sys
 import numpy as np
 
 from google.adk.models import llm_response
@@ -23,9 +23,16 @@ def get_text_from_response(
 
 
 def set_random_seed(seed: int) -> None:
-    """Sets the random seed for reproducibility."""
+    """Sets the random seed for reproducibility.
+
+    PyTorch is seeded only when it has already been imported, so that seeding
+    never pays the cost of importing it.
+    """
     random.seed(seed)
     np.random.seed(seed)
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return
     torch.manual_seed(seed)
     torch.cuda.manual_seed(seed)
     torch.cuda.manual_seed_all(seed)
@@ -11,13 +11,21 @@ class DefaultConfig:
     task_name: str = "california-housing-prices"  # The name of the specific task to be loaded and processed.
     task_type: str = "Tabular Regression"  # The type of machine learning problem.
     lower: bool = True  # True if a lower value of the metric is better.
+    eval_metric: str = ""  # The metric of the task used by the numeric ensemble search: rmse, mse, mae, rmsle, r2, accuracy, logloss or auc. Empty skips the numeric ensemble search.
     workspace_dir: str = "./machine_learning_engineering/workspace/"  # Directory used for saving intermediate outputs, results, logs.
     agent_model: str = os.environ.get("ROOT_AGENT_MODEL", "gemini-2.0-flash-001")  # Name the LLM model to be used by the agent.
+    refinement_model: str = os.environ.get("REFINEMENT_AGENT_MODEL", "openrouter/horizon-beta")  # Name of the LLM model used for planning refinements. Empty to use `agent_model`.
     task_description: str = ""  # The detailed description of the task.
     task_summary: str = ""  # The concise summary of the task.
     start_time: float = 0.0  # Timestamp indicating the start time of the task. Typically represented in seconds since the epoch.
     seed: int = 42  # The random seed value used to ensure reproducibility of experiments.
     exec_timeout: int = 600  # The maximum time in seconds allowed to complete the task.
+    exec_timeout_multiplier: float = 3.0  # The timeout of a code is this multiple of the execution time of its previous versions. 0 always uses `exec_timeout`.
+    min_exec_timeout: int = 120  # The minimum timeout in seconds of a code, whether learned from its previous versions or shrunk by `time_budget`.
+    time_budget: int = 0  # The total wall-clock time in seconds allowed for the task. 0 disables the budget.
+    submission_time_reserve: int = 900  # Seconds of `time_budget` always kept for creating the submission.
+    init_budget_ratio: float = 0.3  # The share of the remaining budget given to the initialization.
+    refinement_budget_ratio: float = 0.45  # The share of the remaining budget given to the refinement. The ensemble gets the rest.
     num_solutions: int = 2  # The number of different solutions to generate or attempt for the given task.
     num_model_candidates: int = 2  # The number of different model architectures or hyperparameter sets to consider as candidates.
     max_retry: int = 10  # The maximum number of times to retry a failed operation.
@@ -27,8 +35,21 @@ class DefaultConfig:
     outer_loop_round: int = 1  # The number of iterations or rounds to be executed within the outer loop, which might encompass multiple inner loops.
     ensemble_loop_round: int = 1  # The number of rounds or iterations dedicated to ensembling, combining multiple models or solutions.
     num_top_plans: int = 2  # The number of highest-scoring plans or strategies to select or retain.
+    rate_limit_wait: int = 8  # Seconds waited at the end of the pipeline to respect the rate limits of the model. 0 does not wait.
     use_data_leakage_checker: bool = False  # Enable (`True`) or disable (`False`) a check for data leakage in the machine learning pipeline.
     use_data_usage_checker: bool = False  # Enable (`True`) or disable (`False`) a check for how data is being used, potentially for compliance or best practices.
+    exec_backend: str = "local"  # Where the generated code runs: `local` on the controller host, `kernel` in a long-lived kernel per workspace on the controller host, or `queue` on the worker daemons reading `exec_queue_dir`.
+    exec_queue_dir: str = ""  # The shared directory of the job queue used by the `queue` execution backend.
+    exec_lease_timeout: int = 60  # Seconds after which a job whose worker stopped renewing its lease is handed to another worker.
+    exec_queue_wait: int = 600  # Seconds a job of the `queue` backend may wait for a worker. A job without a result after its timeout, its lease timeout and this wait is removed and fails as timed out.
+    kernel_max_memory_gb: float = 4.0  # The `kernel` backend restarts a kernel whose resident memory grew beyond this size.
+    cpu_slots: int = 0  # The number of CPUs every code may use, e.g. for the folds of `mle_runtime.run_cv`. 0 splits the CPUs of the agent between the solutions.
+    use_prefix_cache: bool = False  # Resume the refined codes from a snapshot of the state after the code before the refined block, instead of running it again.
+    use_profiling: bool = False  # Run the codes under a sampling profiler and tell the ablation summary and plan refinement agents where the time of the solution is spent.
+    profile_top_n: int = 10  # The number of hottest functions and code lines kept in the profile of a code run.
+    use_data_profile: bool = True  # Profile the CSV inputs of the task once and give the profile to the agents writing code.
+    use_tracing: bool = False  # Write a timeline of the agent invocations, model calls and code runs of every session to `<workspace_dir>/<task_name>/traces/` in the Chrome trace format.
+    convert_inputs: bool = True  # Convert the CSV inputs of the task once to Parquet and memory-mappable Feather files with compact dtypes. Needs pyarrow.
 
 
 CONFIG = DefaultConfig()
@@ -0,0 +1,196 @@
+"""Profiles the tabular inputs of a task once, for the prompts of the agents.
+
+Without it, the agents learn the column names, dtypes, missing values and
+target of the data by writing code that fails and debugging it. The profile
+is computed with vectorized pandas operations after the task summarization,
+stored in the state as `data_profile`, and written to
+`<workspace_dir>/<task_name>/data_profile/<fingerprint>.md`, where the
+fingerprint covers the names, sizes and modification times of the input
+files, so that later runs on the same files reuse it.
+"""
+
+from typing import Any, Mapping, Optional
+import hashlib
+import json
+import os
+
+from machine_learning_engineering.shared_libraries import data_util
+
+
+PROFILE_DIR = "data_profile"
+# Changes the fingerprint when the format of the profile changes.
+PROFILE_VERSION = 1
+# Columns listed per file; the others are only counted.
+MAX_COLUMNS = 40
+# Length of the example values shown.
+MAX_VALUE_LENGTH = 30
+# Columns with at most this many distinct values get their value counts.
+MAX_CATEGORIES = 20
+NUM_TOP_VALUES = 3
+
+
+def get_input_files(task_dir: str) -> list[str]:
+    """Gets the CSV files of a task, without the answers."""
+    if not os.path.isdir(task_dir):
+        return []
+    return [
+        filename
+        for filename in sorted(os.listdir(task_dir))
+        if os.path.isfile(os.path.join(task_dir, filename))
+        and filename.endswith(data_util.CSV_EXTENSIONS)
+        and "answer" not in filename
+    ]
+
+
+def get_fingerprint(task_dir: str, filenames: list[str]) -> str:
+    """Gets the fingerprint of the input files from their names, sizes and times."""
+    entries = [PROFILE_VERSION]
+    for filename in filenames:
+        stat = os.stat(os.path.join(task_dir, filename))
+        entries.append([filename, stat.st_size, stat.st_mtime_ns])
+    return hashlib.sha256(json.dumps(entries).encode("utf-8")).hexdigest()[:16]
+
+
+def _format_value(value: Any) -> str:
+    text = repr(value.item() if hasattr(value, "item") else value)
+    if len(text) > MAX_VALUE_LENGTH:
+        text = text[:MAX_VALUE_LENGTH - 3] + "..."
+    return text
+
+
+def _format_number(value: float) -> str:
+    return f"{value:.4g}"
+
+
+def _describe_columns(df: Any) -> list[str]:
+    """Describes every column of a DataFrame in one line."""
+    import pandas as pd
+    missing_rates = df.isna().mean()
+    num_unique = df.nunique(dropna=True)
+    numeric = df.select_dtypes(include="number")
+    stats = numeric.agg(["min", "max", "mean"]) if len(numeric.columns) else None
+    lines = []
+    for column in list(df.columns)[:MAX_COLUMNS]:
+        parts = [
+            str(df[column].dtype),
+            f"{missing_rates[column]:.1%} missing",
+            f"{num_unique[column]} unique",
+        ]
+        if stats is not None and column in stats.columns and not pd.isna(stats[column]["min"]):
+            parts.append(
+                f"min {_format_number(stats[column]['min'])},"
+                f" max {_format_number(stats[column]['max'])},"
+                f" mean {_format_number(stats[column]['mean'])}"
+            )
+        else:
+            top_values = df[column].value_counts().head(NUM_TOP_VALUES)
+            if len(top_values):
+                parts.append("top values " + ", ".join(
+                    f"{_format_value(value)} ({count})" for value, count in top_values.items()
+                ))
+        lines.append(f"- `{column}`: " + ", ".join(parts))
+    if len(df.columns) > MAX_COLUMNS:
+        lines.append(f"- ... and {len(df.columns) - MAX_COLUMNS} more columns")
+    return lines
+
+
+def _describe_target(series: Any) -> str:
+    """Describes the distribution of a target column."""
+    import pandas as pd
+    values = series.dropna()
+    if pd.api.types.is_numeric_dtype(values) and values.nunique() > MAX_CATEGORIES:
+        quantiles = values.quantile([0.0, 0.25, 0.5, 0.75, 1.0])
+        return "quantiles (0, 25, 50, 75, 100%) " + ", ".join(
+            _format_number(value) for value in quantiles
+        ) + f", skew {_format_number(values.skew())}"
+    shares = values.value_counts(normalize=True).head(MAX_CATEGORIES)
+    return "classes " + ", ".join(
+        f"{_format_value(value)} {share:.1%}" for value, share in shares.items()
+    )
+
+
+def _is_id_column(df: Any, column: str) -> bool:
+    return str(column).lower().endswith("id") and df[column].is_unique
+
+
+def _find_file(frames: Mapping[str, Any], keyword: str) -> Optional[str]:
+    for filename in frames:
+        if keyword in filename.lower():
+            return filename
+    return None
+
+
+def compute_profile(task_dir: str, filenames: list[str]) -> str:
+    """Computes the profile of the input files of a task."""
+    import pandas as pd
+    frames = {}
+    lines = []
+    for filename in filenames:
+        try:
+            df = pd.read_csv(os.path.join(task_dir, filename), low_memory=False)
+        except Exception as e:
+            lines += [f"## `{filename}`", f"Could not be read with `pd.read_csv`: {e!r}", ""]
+            continue
+        frames[filename] = df
+        lines.append(f"## `{filename}`: {len(df)} rows, {len(df.columns)} columns")
+        lines += _describe_columns(df)
+        lines.append("")
+    train_file = _find_file(frames, "train")
+    test_file = _find_file(frames, "test")
+    if train_file and test_file:
+        train_df, test_df = frames[train_file], frames[test_file]
+        target_columns = [column for column in train_df.columns if column not in test_df.columns]
+        if target_columns:
+            lines.append(f"## Columns of `{train_file}` not in `{test_file}` (likely targets)")
+            for column in target_columns[:MAX_COLUMNS]:
+                lines.append(f"- `{column}`: {_describe_target(train_df[column])}")
+            lines.append("")
+        id_columns = [
+            column for column in train_df.columns
+            if column in test_df.columns
+            and _is_id_column(train_df, column)
+            and _is_id_column(test_df, column)
+        ]
+        if id_columns:
+            lines.append(f"## Id columns shared by `{train_file}` and `{test_file}`")
+            for column in id_columns:
+                overlap = int(test_df[column].isin(train_df[column]).sum())
+                lines.append(f"- `{column}`: {overlap} of {len(test_df)} test ids are also train ids")
+            lines.append("")
+    return "\n".join(lines).strip()
+
+
+def get_data_profile(state: Mapping[str, Any]) -> str:
+    """Gets the profile of the input files of the task, computed once per fingerprint."""
+    task_dir = os.path.join(state.get("data_dir", ""), state.get("task_name", ""))
+    filenames = get_input_files(task_dir)
+    if not filenames:
+        return ""
+    profile_dir = os.path.join(
+        state.get("workspace_dir", ""), state.get("task_name", ""), PROFILE_DIR
+    )
+    profile_path = os.path.join(profile_dir, f"{get_fingerprint(task_dir, filenames)}.md")
+    if os.path.exists(profile_path):
+        with open(profile_path, "r", encoding="utf-8") as f:
+            return f.read()
+    profile = compute_profile(task_dir, filenames)
+    os.makedirs(profile_dir, exist_ok=True)
+    tmp_path = f"{profile_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(profile)
+    os.replace(tmp_path, profile_path)
+    return profile
+
+
+def get_data_profile_instruction(state: Mapping[str, Any]) -> str:
+    """Gets the profile of the input files for the instructions of the agents."""
+    profile = state.get("data_profile", "")
+    if not profile:
+        return ""
+    return "\n".join([
+        "",
+        "# Data profile",
+        "The CSV files in `./input` were profiled as below. Use these exact column names and dtypes instead of exploring the data.",
+        profile,
+        "",
+    ])
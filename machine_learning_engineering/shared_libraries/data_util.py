@@ -0,0 +1,212 @@
+"""Converts the tabular inputs of a task once to fast columnar formats.
+
+Every generated code parses the raw CSV files of the task again, which
+dominates short runs on large datasets. When the task is prepared, every CSV
+file of the task is converted once into `<workspace_dir>/<task_name>/fast_input/`
+as Parquet and as uncompressed Arrow/Feather, which `pd.read_feather` reads
+memory-mapped. The columns get compact dtypes: smaller integer and float types
+where the values are kept exactly, and categoricals for repeated strings. The
+converted files are linked into the `input` directory of every workspace next
+to the CSV files, and the agents writing code are told about them.
+
+The conversion needs pyarrow, and is skipped when it is not installed.
+
+The directories of images of the task are listed as well, so that the agents
+are told to load them with `mle_runtime.load_images`, which decodes every
+image once for all the codes instead of once per run.
+"""
+
+from typing import Any, Mapping
+import importlib.util
+import json
+import os
+import shutil
+import time
+
+from machine_learning_engineering.shared_libraries.runtime import mle_runtime
+
+
+FAST_INPUT_DIR = "fast_input"
+MANIFEST = "manifest.json"
+CSV_EXTENSIONS = (".csv", ".csv.gz")
+# Object columns with at most this share of distinct values become categoricals.
+MAX_CATEGORY_RATIO = 0.5
+# Directories with fewer images, e.g. the assets of a saved web page, are not
+# inputs of the model.
+MIN_IMAGE_FILES = 100
+
+
+def has_pyarrow() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def get_fast_input_dir(state: Mapping[str, Any]) -> str:
+    """Gets the directory of the converted inputs of the task."""
+    workspace_dir = state.get("workspace_dir", "")
+    task_name = state.get("task_name", "")
+    return os.path.join(workspace_dir, task_name, FAST_INPUT_DIR)
+
+
+def _get_stem(filename: str) -> str:
+    for extension in CSV_EXTENSIONS:
+        if filename.endswith(extension):
+            return filename[:-len(extension)]
+    return filename
+
+
+def compact_dtypes(df: Any) -> Any:
+    """Downcasts the columns of a DataFrame to compact dtypes, keeping the values."""
+    import numpy as np
+    import pandas as pd
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_bool_dtype(series):
+            continue
+        if pd.api.types.is_integer_dtype(series):
+            df[column] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series):
+            downcast = series.astype(np.float32)
+            if np.array_equal(downcast.to_numpy(np.float64), series.to_numpy(), equal_nan=True):
+                df[column] = downcast
+        elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            num_unique = series.nunique(dropna=True)
+            if len(series) > 0 and num_unique <= MAX_CATEGORY_RATIO * len(series):
+                df[column] = series.astype("category")
+    return df
+
+
+def convert_csv(source_path: str, output_dir: str) -> dict[str, Any]:
+    """Converts a CSV file to Parquet and Feather with compact dtypes."""
+    import pandas as pd
+    stem = _get_stem(os.path.basename(source_path))
+    start_time = time.time()
+    df = pd.read_csv(source_path, low_memory=False)
+    memory_before = int(df.memory_usage(deep=True).sum())
+    df = compact_dtypes(df)
+    parquet_name, feather_name = f"{stem}.parquet", f"{stem}.feather"
+    for name, write in (
+        (parquet_name, lambda path: df.to_parquet(path, index=False)),
+        # Uncompressed, so that the file can be memory-mapped.
+        (feather_name, lambda path: df.to_feather(path, compression="uncompressed")),
+    ):
+        tmp_path = os.path.join(output_dir, f".{name}.{os.getpid()}.tmp")
+        write(tmp_path)
+        os.replace(tmp_path, os.path.join(output_dir, name))
+    return {
+        "source": os.path.basename(source_path),
+        "parquet": parquet_name,
+        "feather": feather_name,
+        "num_rows": len(df),
+        "num_columns": len(df.columns),
+        "num_categoricals": int(sum(isinstance(t, pd.CategoricalDtype) for t in df.dtypes)),
+        "memory_before": memory_before,
+        "memory_after": int(df.memory_usage(deep=True).sum()),
+        "source_size": os.path.getsize(source_path),
+        "source_mtime": os.path.getmtime(source_path),
+        "conversion_time": time.time() - start_time,
+    }
+
+
+def convert_inputs(task_dir: str, output_dir: str) -> list[dict[str, Any]]:
+    """Converts the CSV files of a task, skipping the ones converted before."""
+    if not has_pyarrow():
+        return []
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST)
+    previous = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            previous = {entry["source"]: entry for entry in json.load(f)}
+    converted = []
+    for filename in sorted(os.listdir(task_dir)):
+        source_path = os.path.join(task_dir, filename)
+        if (
+            not os.path.isfile(source_path)
+            or not filename.endswith(CSV_EXTENSIONS)
+            or "answer" in filename
+        ):
+            continue
+        entry = previous.get(filename)
+        if (
+            entry
+            and entry["source_size"] == os.path.getsize(source_path)
+            and entry["source_mtime"] == os.path.getmtime(source_path)
+            and os.path.exists(os.path.join(output_dir, entry["feather"]))
+            and os.path.exists(os.path.join(output_dir, entry["parquet"]))
+        ):
+            converted.append(entry)
+            continue
+        try:
+            converted.append(convert_csv(source_path, output_dir))
+        except Exception as e:
+            # The agents keep reading the CSV file.
+            print(f"--- Could not convert {filename}: {e!r} ---")
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(converted, f, indent=2)
+    return converted
+
+
+def find_image_dirs(task_dir: str) -> dict[str, int]:
+    """Finds the directories of a task holding images, with their number of images."""
+    image_dirs = {}
+    for root, _, filenames in os.walk(task_dir):
+        num_images = sum(filename.lower().endswith(mle_runtime.IMAGE_EXTENSIONS) for filename in filenames)
+        if num_images >= MIN_IMAGE_FILES:
+            image_dirs[os.path.relpath(root, task_dir)] = num_images
+    return image_dirs
+
+
+def prepare_fast_inputs(state: Any) -> None:
+    """Converts the inputs of the task once, with `convert_inputs` enabled."""
+    task_dir = os.path.join(state.get("data_dir", ""), state.get("task_name", ""))
+    state["image_dirs"] = find_image_dirs(task_dir)
+    if not state.get("convert_inputs", True):
+        state["fast_inputs"] = []
+        return
+    state["fast_inputs"] = convert_inputs(task_dir, get_fast_input_dir(state))
+
+
+def link_fast_inputs(state: Mapping[str, Any], input_dir: str) -> None:
+    """Puts the converted inputs into the `input` directory of a workspace."""
+    fast_input_dir = get_fast_input_dir(state)
+    for entry in state.get("fast_inputs", []):
+        for name in (entry["parquet"], entry["feather"]):
+            source_path = os.path.join(fast_input_dir, name)
+            target_path = os.path.join(input_dir, name)
+            if os.path.exists(target_path) or not os.path.exists(source_path):
+                continue
+            try:
+                os.link(source_path, target_path)
+            except OSError:
+                shutil.copy2(source_path, target_path)
+
+
+def get_fast_inputs_instruction(state: Mapping[str, Any]) -> str:
+    """Tells the agents writing code about the converted inputs and the images."""
+    fast_inputs = state.get("fast_inputs", [])
+    image_dirs = state.get("image_dirs", {})
+    if not fast_inputs and not image_dirs:
+        return ""
+    lines = ["", "# Fast input files"]
+    if fast_inputs:
+        lines.append(
+            "The CSV files were also converted to faster formats in the `./input` directory, with the same rows and columns but compact dtypes (smaller integer and float types where the values are unchanged, and pandas categoricals for repeated strings):"
+        )
+        for entry in fast_inputs:
+            lines.append(
+                f"- `{entry['source']}` ({entry['num_rows']} rows, {entry['num_columns']} columns):"
+                f" `./input/{entry['feather']}`, `./input/{entry['parquet']}`"
+            )
+        lines += [
+            "- Load them with `pd.read_feather(\"./input/<name>.feather\")` (memory-mapped Arrow, the fastest) or `pd.read_parquet` instead of `pd.read_csv`.",
+            "- Convert a categorical column with `.astype(str)` before assigning values that are not among its categories.",
+        ]
+    if image_dirs:
+        lines.append("The images of the task are in:")
+        for image_dir, num_images in sorted(image_dirs.items()):
+            lines.append(f"- `{os.path.normpath(os.path.join('./input', image_dir))}`: {num_images} images")
+        lines += [
+            "- Load the images with `images, paths = mle_runtime.load_images(image_paths, size=(height, width))` instead of opening the files, where `image_paths` is a directory (its images sorted by path) or a list of image paths, e.g. built from the ids of a CSV file. The images are decoded and resized once for all the codes of the task; `images` is a read-only memory-mapped uint8 array of shape (N, height, width, 3) in the order of `paths`, so convert and normalize it per batch, e.g. in the `__getitem__` of a PyTorch dataset, rather than as a whole.",
+        ]
+    lines.append("")
+    return "\n".join(lines)
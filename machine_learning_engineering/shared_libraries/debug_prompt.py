@@ -1,5 +1,7 @@
 """Defines the prompts for debugging."""
 
+from machine_learning_engineering.shared_libraries import runtime_prompt
+
 BUG_SUMMARY_INSTR = """# Error report
 {bug}
 
@@ -7,6 +9,9 @@ BUG_SUMMARY_INSTR = """# Error report
 - Remove all unnecessary parts of the above error report.
 - We are now running {filename}.py. Do not remove where the error occurred."""
 
+TIMEOUT_INSTR = """The code was stopped because it ran for more than {exec_timeout} seconds{baseline}.
+- The code got too slow. Make it faster, e.g. by reducing the number of iterations, estimators, epochs or folds, or by using more efficient operations, while keeping the approach of the code."""
+
 BUG_REFINE_INSTR = """# Task description
 {task_description}
 
@@ -26,4 +31,4 @@ BUG_REFINE_INSTR = """# Task description
 - Remember to print a line in the code with 'Final Validation Performance: {{final_validation_score}}' so we can parse performance.
 - The code should be a single-file python program that is self-contained and can be executed as-is.
 - Your response should only contain a single code block.
-- Do not use exit() function in the refined Python code."""
+- Do not use exit() function in the refined Python code.""" + runtime_prompt.KEEP_RUNTIME_INSTR
@@ -14,6 +14,7 @@ from machine_learning_engineering.shared_libraries import debug_prompt
 from machine_learning_engineering.shared_libraries import code_util
 from machine_learning_engineering.shared_libraries import common_util
 from machine_learning_engineering.shared_libraries import check_leakage_util
+from machine_learning_engineering.shared_libraries import budget_util
 from machine_learning_engineering.shared_libraries import config
 
 
@@ -36,6 +37,20 @@ def check_rollback(
     return None
 
 
+def is_debug_over_budget(
+    callback_context: callback_context_module.CallbackContext,
+) -> bool:
+    """Checks if debugging must stop to meet the time budget.
+
+    Only the refinement and the ensemble can give up on a failing code, since
+    the other stages must produce a working solution.
+    """
+    stage = budget_util.get_stage(callback_context.agent_name)
+    if stage not in ("refinement", "ensemble"):
+        return False
+    return budget_util.is_over_budget(callback_context.state, stage)
+
+
 def get_bug_summary(
     callback_context: callback_context_module.CallbackContext,
     llm_response: llm_response_module.LlmResponse,
@@ -75,6 +90,8 @@ def skip_bug_summary(
         )
         callback_context.state[key_name] = ""
         return llm_response_module.LlmResponse()
+    if is_debug_over_budget(callback_context):
+        return llm_response_module.LlmResponse()
     return None
 
 
@@ -92,6 +109,8 @@ def check_bug_existence(
     result_dict = callback_context.state.get(code_execution_result_state_key, {})
     if result_dict and result_dict.get("returncode", 1) == 0:
         return llm_response_module.LlmResponse()
+    if is_debug_over_budget(callback_context):
+        return llm_response_module.LlmResponse()
     return None
 
 
@@ -155,6 +174,23 @@ def get_debug_agent_instruction(
         suffix=suffix,
     )
     code = context.state.get(code_state_key, "")
+    code_execution_result_state_key = code_util.get_code_execution_result_state_key(
+        agent_name=agent_name,
+        suffix=suffix,
+    )
+    result_dict = context.state.get(code_execution_result_state_key, {})
+    if result_dict.get("failure_kind") == "timeout":
+        baseline_execution_time = result_dict.get("baseline_execution_time")
+        if baseline_execution_time:
+            baseline = (
+                f", while its previous version ran in {baseline_execution_time:.0f} seconds"
+            )
+        else:
+            baseline = ""
+        bug += "\n" + debug_prompt.TIMEOUT_INSTR.format(
+            exec_timeout=result_dict.get("exec_timeout"),
+            baseline=baseline,
+        )
     return debug_prompt.BUG_REFINE_INSTR.format(
         task_description=task_description,
         code=code,
@@ -204,10 +240,11 @@ def get_code_from_response(
 def get_debug_inner_loop_agent(
     prefix: str,
     suffix: str,
+    cfg: config.DefaultConfig,
 ) -> agents.LoopAgent:
     """Gets the debug_inner_loop_agent."""
     bug_summary_agent = agents.Agent(
-        model=config.CONFIG.agent_model,
+        model=cfg.agent_model,
         name=code_util.get_name_with_prefix_and_suffix(
             base_name="bug_summary_agent",
             prefix=prefix,
@@ -229,7 +266,7 @@ def get_debug_inner_loop_agent(
         include_contents="none",
     )
     debug_agent = agents.Agent(
-        model=config.CONFIG.agent_model,
+        model=cfg.agent_model,
         name=code_util.get_name_with_prefix_and_suffix(
             base_name="debug_agent",
             prefix=prefix,
@@ -256,7 +293,7 @@ def get_debug_inner_loop_agent(
         ),
         description="Debug the given code until it succeeds.",
         sub_agents=[debug_agent],
-        max_iterations=config.CONFIG.max_debug_round,
+        max_iterations=cfg.max_debug_round,
     )
     debug_inner_loop_agent = agents.LoopAgent(
         name=code_util.get_name_with_prefix_and_suffix(
@@ -269,7 +306,7 @@ def get_debug_inner_loop_agent(
             bug_summary_agent,
             debug_loop_agent,
         ],
-        max_iterations=config.CONFIG.max_debug_round,
+        max_iterations=cfg.max_debug_round,
     )
     return debug_inner_loop_agent
 
@@ -280,14 +317,15 @@ def get_run_and_debug_agent(
     agent_description: str,
     instruction_func: agents.llm_agent.InstructionProvider,
     before_model_callback: Optional[agents.llm_agent.BeforeModelCallback],
+    cfg: config.DefaultConfig,
 ) -> agents.LoopAgent:
     """Gets the run and debug agent."""
     if prefix.startswith("ensemble_plan_implement"):
         use_data_leakage_checker = False
     else:
-        use_data_leakage_checker = config.CONFIG.use_data_leakage_checker
+        use_data_leakage_checker = cfg.use_data_leakage_checker
     run_agent = agents.Agent(
-        model=config.CONFIG.agent_model,
+        model=cfg.agent_model,
         name=code_util.get_name_with_prefix_and_suffix(
             base_name="agent",
             prefix=prefix,
@@ -310,6 +348,7 @@ def get_run_and_debug_agent(
         data_leakage_checker_agent = check_leakage_util.get_data_leakage_checker_agent(
             prefix=prefix,
             suffix=suffix,
+            cfg=cfg,
         )
         run_sequential_sub_agents.append(data_leakage_checker_agent)
         additional_agent_description = " and check if there are data leakage issues"
@@ -334,11 +373,12 @@ def get_run_and_debug_agent(
             f"{agent_description} until it succeeds."
         ),
         sub_agents=[run_sequential_agent],
-        max_iterations=config.CONFIG.max_retry,
+        max_iterations=cfg.max_retry,
     )
     debug_inner_loop_agent = get_debug_inner_loop_agent(
         prefix=prefix,
         suffix=suffix,
+        cfg=cfg,
     )
     run_and_debug_sequential_agent = agents.SequentialAgent(
         name=code_util.get_name_with_prefix_and_suffix(
@@ -361,6 +401,6 @@ def get_run_and_debug_agent(
         ),
         description=f"{agent_description} and debug the code until it succeeds.",
         sub_agents=[run_and_debug_sequential_agent],
-        max_iterations=config.CONFIG.max_rollback_round,
+        max_iterations=cfg.max_rollback_round,
     )
     return run_and_debug_loop_agent
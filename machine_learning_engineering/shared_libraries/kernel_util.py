@@ -0,0 +1,196 @@
+"""Execution backend keeping a long-lived kernel per workspace.
+
+The codes of one solution lineage (ablation, plan implementation, debugging)
+run in the same workspace directory. The `kernel` backend keeps one kernel
+process per workspace (`runtime/mle_kernel.py`) which forks a fresh child for
+every code, so that the codes skip the interpreter start and the imports
+already done by the previous codes of the lineage. A kernel that crashed,
+stopped answering, or grew beyond `kernel_max_memory_gb` is restarted for the
+next code.
+"""
+
+from typing import Any, Mapping, Optional
+import atexit
+import json
+import os
+import select
+import signal
+import subprocess
+import threading
+import time
+
+from machine_learning_engineering.shared_libraries.runtime import mle_kernel
+
+
+KERNEL_PATH = os.path.abspath(mle_kernel.__file__)
+# Seconds to wait for the kernel on top of the timeout of the code.
+RESPONSE_GRACE_TIME = 30
+
+
+class Kernel:
+    """A kernel process running the codes of one workspace."""
+
+    def __init__(self, run_cwd: str, max_memory_bytes: int):
+        self.run_cwd = run_cwd
+        self.max_memory_bytes = max_memory_bytes
+        self.process: Optional[subprocess.Popen] = None
+        self.buffer = b""
+        self.num_restarts = 0
+        self.lock = threading.Lock()
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self) -> None:
+        """Starts the kernel process, restarting it if it was started before."""
+        # Imported here since `code_util` registers this backend.
+        from machine_learning_engineering.shared_libraries import code_util
+        if self.process is not None:
+            self.stop()
+            self.num_restarts += 1
+        self.process = subprocess.Popen(
+            ["python", KERNEL_PATH],
+            cwd=self.run_cwd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env=code_util.get_runtime_env(),
+            start_new_session=True,
+        )
+        self.buffer = b""
+
+    def stop(self) -> None:
+        """Stops the kernel process."""
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+    def _read_response(self, deadline: float) -> Optional[dict[str, Any]]:
+        """Reads the next response of the kernel, None if it stopped or hung."""
+        # Reads the pipe without buffering, so that `select` sees all the
+        # responses not read yet.
+        fd = self.process.stdout.fileno()
+        while b"\n" not in self.buffer:
+            timeout = max(0.0, deadline - time.time())
+            ready, _, _ = select.select([fd], [], [], timeout)
+            if not ready:
+                return None
+            data = os.read(fd, 1 << 16)
+            if not data:
+                return None
+            self.buffer += data
+        line, self.buffer = self.buffer.split(b"\n", 1)
+        return json.loads(line)
+
+    def run(
+        self,
+        code_text: str,
+        py_filepath: str,
+        exec_timeout: int,
+        env: Mapping[str, str],
+    ) -> dict[str, Any]:
+        """Runs a code in the kernel, with the result of `code_util.run_python_code`."""
+        # Imported here since `code_util` registers this backend.
+        from machine_learning_engineering.shared_libraries import code_util
+        with self.lock:
+            start_time = time.time()
+            if not self.is_alive():
+                self.start()
+            deadline = start_time + exec_timeout + RESPONSE_GRACE_TIME
+            response = None
+            child_pid = None
+            try:
+                self.process.stdin.write((json.dumps({
+                    "code": code_text,
+                    "py_filepath": py_filepath,
+                    "exec_timeout": exec_timeout,
+                    "env": dict(env),
+                }) + "\n").encode("utf-8"))
+                self.process.stdin.flush()
+                started = self._read_response(deadline)
+                if started is not None:
+                    child_pid = started["pid"]
+                    code_util.notify_execution_listeners("spawned", {
+                        "py_filepath": os.path.join(self.run_cwd, py_filepath),
+                        "pid": child_pid,
+                    })
+                    response = self._read_response(deadline)
+            except (OSError, ValueError):
+                response = None
+            if response is None:
+                # The kernel crashed or hung: the code is stopped and the
+                # kernel restarted for the next code.
+                if child_pid is not None:
+                    try:
+                        os.killpg(child_pid, signal.SIGKILL)
+                    except (ProcessLookupError, PermissionError):
+                        pass
+                self.stop()
+                response = {
+                    "returncode": 1,
+                    "stdout": "",
+                    "stderr": "RuntimeError: The kernel running the code stopped unexpectedly.",
+                    "timed_out": False,
+                }
+            elif response["rss"] > self.max_memory_bytes:
+                self.stop()
+        result_dict = {
+            "returncode": response["returncode"],
+            "stdout": response["stdout"],
+            "stderr": response["stderr"],
+            "execution_time": time.time() - start_time,
+        }
+        if response["timed_out"]:
+            result_dict["returncode"] = 1
+            result_dict["stderr"] += (
+                f"\nTimeoutError: The code did not finish within {exec_timeout} seconds."
+            )
+        if result_dict["returncode"] != 0:
+            result_dict["failure_kind"] = "timeout" if response["timed_out"] else "error"
+            result_dict["exec_timeout"] = exec_timeout
+        return result_dict
+
+
+_KERNELS: dict[str, Kernel] = {}
+_KERNELS_LOCK = threading.Lock()
+
+
+def get_kernel(run_cwd: str, max_memory_bytes: int) -> Kernel:
+    """Gets the kernel of a workspace, created on first use."""
+    run_cwd = os.path.abspath(run_cwd)
+    with _KERNELS_LOCK:
+        if run_cwd not in _KERNELS:
+            _KERNELS[run_cwd] = Kernel(run_cwd, max_memory_bytes)
+        return _KERNELS[run_cwd]
+
+
+def shutdown_kernels() -> None:
+    """Stops all the kernels."""
+    with _KERNELS_LOCK:
+        for kernel in _KERNELS.values():
+            kernel.stop()
+        _KERNELS.clear()
+
+
+atexit.register(shutdown_kernels)
+
+
+def run_python_code_in_kernel(
+    code_text: str,
+    run_cwd: str,
+    py_filepath: str,
+    exec_timeout: int,
+    state: Mapping[str, Any],
+    env: Mapping[str, str],
+) -> dict[str, Any]:
+    """Runs the code in the kernel of its workspace."""
+    max_memory_bytes = int(state.get("kernel_max_memory_gb", 4.0) * 1024 ** 3)
+    kernel = get_kernel(run_cwd, max_memory_bytes)
+    return kernel.run(code_text, py_filepath, exec_timeout, env)
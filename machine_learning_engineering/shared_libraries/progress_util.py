@@ -0,0 +1,311 @@
+"""Live progress of the tasks of a batch, served as a local dashboard.
+
+The workers of `batch_runner` turn every event of a session into a small
+update with `get_event_update`: the solution branch and agent of the event,
+and only the state keys of its delta that the dashboard shows (the refine
+step and inner iteration of every solution, the scores of the code runs and
+the model usage of the agents). They also forward the `started`, `spawned`
+and `finished` events of the code runs from `code_util`. The controller
+folds the updates into a `ProgressBoard`, which never reads the state of a
+session, and `DashboardServer` renders the board when the page asks for it:
+the in-flight code runs with their elapsed time and resident memory, and the
+number of tasks and queued jobs waiting.
+"""
+
+from typing import Any, Optional
+import http.server
+import json
+import os
+import re
+import threading
+import time
+
+from machine_learning_engineering.shared_libraries import usage_util
+
+
+MAIN_BRANCH = "main"
+# The events of the workers only shown on the dashboard.
+UPDATE_EVENTS = ("update", "execution_started", "execution_spawned", "execution_finished")
+_STEP_KEY_PATTERN = re.compile(r"^(refine_step|inner_iter)_(\w+)$")
+# The scores of the failed codes.
+_FAILED_SCORES = (1e9, 0)
+
+DASHBOARD_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>MLE-STAR progress</title>
+<style>
+body { font-family: sans-serif; margin: 1em; }
+table { border-collapse: collapse; margin-bottom: 1em; }
+td, th { border: 1px solid #ccc; padding: 2px 8px; text-align: left; font-size: 13px; }
+th { background: #eee; }
+</style>
+</head>
+<body>
+<h2>MLE-STAR progress</h2>
+<div id="summary"></div>
+<h3>Tasks</h3>
+<table id="tasks"></table>
+<h3>Running codes</h3>
+<table id="executions"></table>
+<script>
+function row(cells, tag) {
+  return "<tr>" + cells.map(c => `<${tag}>${c === null || c === undefined ? "" : c}</${tag}>`).join("") + "</tr>";
+}
+function fmt(x, digits) { return typeof x === "number" ? x.toFixed(digits) : x; }
+async function refresh() {
+  const board = await (await fetch("progress.json")).json();
+  document.getElementById("summary").textContent =
+    `Tasks waiting: ${board.num_waiting_tasks}, jobs queued: ${board.num_queued_jobs}, ` +
+    `tokens: ${board.tokens}, cost: $${fmt(board.cost, 3)}`;
+  let tasks = row(["task", "status", "attempt", "elapsed (s)", "best score", "solution", "agent", "refine step", "inner iter", "tokens", "cost ($)"], "th");
+  for (const task of board.tasks) {
+    const solutions = task.solutions.length ? task.solutions : [{}];
+    for (const s of solutions) {
+      tasks += row([task.task_name, task.status, task.attempt, fmt(task.elapsed, 0), fmt(task.best_score, 5),
+                    s.solution, s.agent, s.refine_step, s.inner_iter, task.tokens, fmt(task.cost, 3)], "td");
+    }
+  }
+  document.getElementById("tasks").innerHTML = tasks;
+  let executions = row(["task", "code", "backend", "pid", "elapsed (s)", "RSS (MB)"], "th");
+  for (const e of board.executions) {
+    executions += row([e.task_name, e.py_filepath, e.exec_backend, e.pid, fmt(e.elapsed, 0),
+                       e.rss === null ? null : fmt(e.rss / 1048576, 0)], "td");
+  }
+  document.getElementById("executions").innerHTML = executions;
+}
+refresh();
+setInterval(refresh, 2000);
+</script>
+</body>
+</html>
+"""
+
+
+def get_solution_id(branch: Optional[str]) -> str:
+    """Gets the solution of a branch from the index of its parallel sub-agent."""
+    if not branch:
+        return MAIN_BRANCH
+    suffix = branch.split(".")[1 if "." in branch else 0].rsplit("_", 1)[-1]
+    return suffix if suffix.isdigit() else MAIN_BRANCH
+
+
+def get_state_updates(state_delta: dict[str, Any]) -> dict[str, Any]:
+    """Gets the values shown on the dashboard from the delta of an event."""
+    updates = {}
+    for key, value in state_delta.items():
+        match = _STEP_KEY_PATTERN.match(key)
+        if match and isinstance(value, int):
+            updates.setdefault(match.group(1), {})[match.group(2)] = value
+        elif "exec_result" in key and isinstance(value, dict):
+            score = value.get("score")
+            if value.get("returncode") == 0 and score is not None and score not in _FAILED_SCORES:
+                updates.setdefault("scores", []).append(score)
+        elif key.startswith(usage_util.USAGE_KEY_PREFIX) and isinstance(value, dict):
+            if "calls" not in value:
+                continue
+            agent_name = key[len(usage_util.USAGE_KEY_PREFIX):]
+            updates.setdefault("usage", {})[agent_name] = {
+                "tokens": value.get("input_tokens", 0)
+                + value.get("output_tokens", 0)
+                + value.get("thoughts_tokens", 0),
+                "cost": usage_util.get_cost(value) or 0.0,
+            }
+    return updates
+
+
+def get_event_update(event: Any) -> dict[str, Any]:
+    """Gets the update of the dashboard from an event of a session."""
+    state_delta = event.actions.state_delta if event.actions else {}
+    return {
+        "solution": get_solution_id(event.branch),
+        "agent": event.author,
+        **get_state_updates(state_delta or {}),
+    }
+
+
+def get_rss(pid: int) -> Optional[int]:
+    """Gets the resident memory in bytes of a process, None if unknown."""
+    try:
+        with open(f"/proc/{pid}/statm", encoding="utf-8") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ProgressBoard:
+    """The progress of the tasks of a batch, folded from the worker events."""
+
+    def __init__(self, task_names: list[str], queue_dir: str = ""):
+        self.queue_dir = queue_dir
+        self.tasks = {
+            task_name: {
+                "task_name": task_name,
+                "status": "waiting",
+                "attempt": 0,
+                "start_time": None,
+                "end_time": None,
+                "lower": True,
+                "best_score": None,
+                "solutions": {},
+                "usage": {},
+            }
+            for task_name in task_names
+        }
+        self.executions = {}
+        self._lock = threading.Lock()
+
+    def apply(self, record: dict[str, Any]) -> None:
+        """Folds an event of the workers or a task result into the board."""
+        task_name = record.get("task_name") or os.path.basename(
+            record.get("task_dir", "").rstrip("/")
+        )
+        event = record.get("event")
+        with self._lock:
+            task = self.tasks.get(task_name)
+            if task is None:
+                return
+            if event == "started":
+                task.update({
+                    "status": "running",
+                    "attempt": record["attempt"],
+                    "start_time": record["time"],
+                    "end_time": None,
+                    "best_score": None,
+                    "solutions": {},
+                })
+            elif event == "finished":
+                task["status"] = record.get("status", "finished")
+                task["end_time"] = record["time"]
+                if record.get("score") is not None:
+                    task["best_score"] = record["score"]
+                self.executions = {
+                    key: execution for key, execution in self.executions.items()
+                    if execution["task_name"] != task_name
+                }
+            elif event == "update":
+                self._apply_update(task, record)
+            elif event == "execution_started":
+                self.executions[record["py_filepath"]] = {
+                    "task_name": task_name,
+                    "py_filepath": record["py_filepath"],
+                    "exec_backend": record.get("exec_backend", ""),
+                    "pid": None,
+                    "start_time": record["time"],
+                }
+            elif event == "execution_spawned":
+                if record["py_filepath"] in self.executions:
+                    self.executions[record["py_filepath"]]["pid"] = record["pid"]
+            elif event == "execution_finished":
+                self.executions.pop(record["py_filepath"], None)
+
+    def _apply_update(self, task: dict[str, Any], record: dict[str, Any]) -> None:
+        if "lower" in record:
+            task["lower"] = record["lower"]
+        solution = task["solutions"].setdefault(
+            record["solution"], {"solution": record["solution"], "agent": ""}
+        )
+        solution["agent"] = record["agent"]
+        for name in ("refine_step", "inner_iter"):
+            for solution_id, value in record.get(name, {}).items():
+                task["solutions"].setdefault(
+                    solution_id, {"solution": solution_id, "agent": ""}
+                )[name] = value
+        scores = record.get("scores", [])
+        if task["best_score"] is not None:
+            scores = scores + [task["best_score"]]
+        if scores:
+            task["best_score"] = min(scores) if task["lower"] else max(scores)
+        task["usage"].update(record.get("usage", {}))
+
+    def get_num_queued_jobs(self) -> int:
+        """Gets the number of jobs waiting in the queue of the `queue` backend."""
+        if not self.queue_dir:
+            return 0
+        try:
+            return len(os.listdir(os.path.join(self.queue_dir, "pending")))
+        except OSError:
+            return 0
+
+    def snapshot(self) -> dict[str, Any]:
+        """Gets the board as shown on the dashboard."""
+        now = time.time()
+        with self._lock:
+            tasks = []
+            for task in self.tasks.values():
+                start_time = task["start_time"]
+                tasks.append({
+                    "task_name": task["task_name"],
+                    "status": task["status"],
+                    "attempt": task["attempt"],
+                    "elapsed": None if start_time is None else (task["end_time"] or now) - start_time,
+                    "best_score": task["best_score"],
+                    "solutions": sorted(
+                        task["solutions"].values(),
+                        key=lambda solution: (solution["solution"] != MAIN_BRANCH, solution["solution"]),
+                    ),
+                    "tokens": sum(usage["tokens"] for usage in task["usage"].values()),
+                    "cost": sum(usage["cost"] for usage in task["usage"].values()),
+                })
+            executions = [
+                {
+                    **execution,
+                    "elapsed": now - execution["start_time"],
+                    "rss": None if execution["pid"] is None else get_rss(execution["pid"]),
+                }
+                for execution in self.executions.values()
+            ]
+        return {
+            "time": now,
+            "tasks": tasks,
+            "executions": sorted(executions, key=lambda execution: -execution["elapsed"]),
+            "num_waiting_tasks": sum(task["status"] == "waiting" for task in tasks),
+            "num_queued_jobs": self.get_num_queued_jobs(),
+            "tokens": sum(task["tokens"] for task in tasks),
+            "cost": sum(task["cost"] for task in tasks),
+        }
+
+
+class DashboardServer:
+    """Serves the board on a local HTTP port from a background thread."""
+
+    def __init__(self, board: ProgressBoard, port: int = 8765, host: str = "127.0.0.1"):
+        self.board = board
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+
+            def do_GET(handler):
+                if handler.path.startswith("/progress.json"):
+                    body = json.dumps(board.snapshot(), default=str).encode("utf-8")
+                    content_type = "application/json"
+                elif handler.path in ("/", "/index.html"):
+                    body = DASHBOARD_HTML.encode("utf-8")
+                    content_type = "text/html; charset=utf-8"
+                else:
+                    handler.send_error(404)
+                    return
+                handler.send_response(200)
+                handler.send_header("Content-Type", content_type)
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
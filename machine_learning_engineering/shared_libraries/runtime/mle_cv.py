@@ -0,0 +1,169 @@
+"""Trains the folds of a cross-validation in forked processes, importable as `import mle_cv`.
+
+The code is given its share of CPUs in `MLE_CPU_SLOTS`, which `run_cv` splits
+between the folds it trains at once.
+"""
+
+from typing import Any, Callable, Optional
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+if __package__:
+    from . import mle_metrics
+    from . import mle_predictions
+    from . import mle_scoring
+else:
+    # Imported by the generated code, with the runtime directory on its path.
+    import mle_metrics
+    import mle_predictions
+    import mle_scoring
+
+
+CPU_SLOTS_ENV = "MLE_CPU_SLOTS"
+# Limit the threads of the numeric libraries loaded after they are set.
+THREAD_LIMIT_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+
+def get_cpu_slots() -> int:
+    """Gets the number of CPUs the code may use, e.g. for `n_jobs`."""
+    value = os.environ.get(CPU_SLOTS_ENV, "")
+    if value.isdigit() and int(value) > 0:
+        return int(value)
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _limit_threads(num_threads: int) -> None:
+    """Limits the threads of a worker, so that the folds do not oversubscribe the CPUs."""
+    os.environ[CPU_SLOTS_ENV] = str(num_threads)
+    for env_var in THREAD_LIMIT_ENV_VARS:
+        os.environ[env_var] = str(num_threads)
+    try:
+        import threadpoolctl
+        threadpoolctl.threadpool_limits(num_threads)
+    except ImportError:
+        pass
+
+
+# The arguments of the running `run_cv`, inherited by the forked workers
+# instead of being pickled to them.
+_cv_task = None
+
+
+def _take(data: Any, index: np.ndarray) -> Any:
+    if hasattr(data, "iloc"):
+        return data.iloc[index]
+    return data[index]
+
+
+def _run_fold(fold: int) -> tuple[np.ndarray, Optional[np.ndarray], float]:
+    """Trains the model of one fold and predicts its validation samples."""
+    train_fold, X, y, X_test, splits, kwargs = _cv_task
+    train_index, valid_index = splits[fold]
+    args = [_take(X, train_index), _take(y, train_index), _take(X, valid_index), _take(y, valid_index)]
+    if X_test is not None:
+        args.append(X_test)
+    start_time = time.time()
+    output = train_fold(*args, **kwargs)
+    fold_time = time.time() - start_time
+    if X_test is None:
+        return mle_predictions._to_numeric_array(output, "validation predictions"), None, fold_time
+    valid_predictions, test_predictions = output
+    return (
+        mle_predictions._to_numeric_array(valid_predictions, "validation predictions"),
+        mle_predictions._to_numeric_array(test_predictions, "test predictions"),
+        fold_time,
+    )
+
+
+def run_cv(
+    train_fold: Callable[..., Any],
+    X: Any,
+    y: Any,
+    splits: Any,
+    X_test: Any = None,
+    metric: Optional[str] = None,
+    n_jobs: Optional[int] = None,
+    **kwargs: Any,
+) -> dict[str, Any]:
+    """Runs the folds of a cross-validation in parallel processes.
+
+    Every fold calls `train_fold(X_train, y_train, X_valid, y_valid, **kwargs)`,
+    which trains a model and returns its validation predictions; with `X_test`,
+    `train_fold(X_train, y_train, X_valid, y_valid, X_test, **kwargs)` returns
+    `(valid_predictions, test_predictions)`. The folds run in processes forked
+    after the data is loaded, so they share the pages of `X`, `y` and `X_test`
+    with the code instead of copying them, and the CPU slots of the code are
+    split between them.
+
+    Args:
+        train_fold: Trains the model of one fold.
+        X: The training features, a DataFrame or an array.
+        y: The training targets, a Series or an array.
+        splits: The `(train_index, valid_index)` positional indices of every
+            fold, e.g. `list(KFold(5).split(X))`.
+        X_test: The test features, if any.
+        metric: Scores the folds with `mle_scoring.score_predictions`, if given.
+        n_jobs: The number of folds trained at once, by default the CPU slots.
+        **kwargs: Passed to `train_fold`.
+
+    Returns:
+        A dict with the out-of-fold predictions `oof`, the test predictions
+        averaged over the folds `test`, and the `fold_scores`, overall
+        out-of-fold `score` and `fold_times` in seconds.
+    """
+    global _cv_task
+    splits = [(np.asarray(train_index), np.asarray(valid_index)) for train_index, valid_index in splits]
+    cpu_slots = get_cpu_slots()
+    n_jobs = max(1, min(n_jobs or cpu_slots, len(splits)))
+    _cv_task = (train_fold, X, y, X_test, splits, kwargs)
+    try:
+        if n_jobs > 1 and "fork" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("fork")
+            with context.Pool(
+                n_jobs, initializer=_limit_threads, initargs=(max(1, cpu_slots // n_jobs),)
+            ) as pool:
+                results = pool.map(_run_fold, range(len(splits)), chunksize=1)
+        else:
+            results = [_run_fold(fold) for fold in range(len(splits))]
+    finally:
+        _cv_task = None
+    y_true = y.to_numpy() if hasattr(y, "to_numpy") else np.asarray(y)
+    oof = np.zeros((len(y_true),) + results[0][0].shape[1:], dtype=np.float64)
+    covered = np.zeros(len(y_true), dtype=bool)
+    fold_scores = []
+    for (_, valid_index), (valid_predictions, _, _) in zip(splits, results):
+        oof[valid_index] = valid_predictions
+        covered[valid_index] = True
+        if metric:
+            fold_scores.append(mle_scoring.score_predictions(metric, y_true[valid_index], valid_predictions))
+    test_predictions = None
+    if X_test is not None:
+        test_predictions = np.mean([result[1] for result in results], axis=0)
+    score = mle_scoring.score_predictions(metric, y_true[covered], oof[covered]) if metric else None
+    for fold, (_, _, fold_time) in enumerate(results):
+        mle_metrics.log_metric(
+            "fold_score",
+            fold_scores[fold] if fold_scores else None,
+            fold=fold,
+            seconds=fold_time,
+        )
+    if score is not None:
+        mle_metrics.log_metric("cv_score", score)
+    return {
+        "oof": oof,
+        "test": test_predictions,
+        "fold_scores": fold_scores,
+        "score": score,
+        "fold_times": [result[2] for result in results],
+    }
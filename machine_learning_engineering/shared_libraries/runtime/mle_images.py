@@ -0,0 +1,145 @@
+"""Image cache shared by the codes of a task, importable as `import mle_images`.
+
+The images are decoded and resized once into `<MLE_IMAGE_CACHE_DIR>`, and the
+next codes map the decoded array instead of decoding the files again.
+"""
+
+from typing import Any, Optional
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+
+import numpy as np
+
+if __package__:
+    from . import mle_cv
+else:
+    # Imported by the generated code, with the runtime directory on its path.
+    import mle_cv
+
+
+IMAGE_CACHE_DIR_ENV = "MLE_IMAGE_CACHE_DIR"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tif", ".tiff", ".webp")
+
+
+def list_images(directory: str) -> list[str]:
+    """Lists the image files under a directory, recursively and sorted."""
+    paths = []
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(root, filename))
+    return sorted(paths)
+
+
+def get_image_cache_dir() -> str:
+    """Gets the directory of the decoded images, shared by the codes of the task."""
+    return os.environ.get(IMAGE_CACHE_DIR_ENV, "") or os.path.abspath("image_cache")
+
+
+# The arguments of the running `_build_image_cache`, inherited by the forked
+# workers instead of being pickled to them.
+_image_task = None
+
+
+def _decode_images(bounds: tuple[int, int]) -> None:
+    """Decodes and resizes a range of images into the cache being built."""
+    from PIL import Image
+    paths, size, mode, images_path = _image_task
+    images = np.load(images_path, mmap_mode="r+")
+    for i in range(*bounds):
+        with Image.open(paths[i]) as image:
+            resized = image.convert(mode).resize((size[1], size[0]), Image.BILINEAR)
+            images[i] = np.asarray(resized)
+    images.flush()
+
+
+def _build_image_cache(
+    paths: list[str],
+    size: tuple[int, int],
+    mode: str,
+    cache_dir: str,
+    n_jobs: Optional[int],
+) -> None:
+    """Decodes the images into `<cache_dir>/images.npy`, in parallel processes."""
+    global _image_task
+    from PIL import Image
+    tmp_dir = f"{cache_dir}.{os.getpid()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    images_path = os.path.join(tmp_dir, "images.npy")
+    channels = np.asarray(Image.new(mode, (1, 1))).shape[2:]
+    np.lib.format.open_memmap(
+        images_path, mode="w+", dtype=np.uint8, shape=(len(paths), *size, *channels)
+    ).flush()
+    n_jobs = max(1, min(n_jobs or mle_cv.get_cpu_slots(), len(paths)))
+    bounds = np.linspace(0, len(paths), min(len(paths), 4 * n_jobs) + 1).astype(int)
+    chunks = [(int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:])]
+    _image_task = (paths, size, mode, images_path)
+    try:
+        if n_jobs > 1 and "fork" in multiprocessing.get_all_start_methods():
+            with multiprocessing.get_context("fork").Pool(n_jobs) as pool:
+                pool.map(_decode_images, chunks, chunksize=1)
+        else:
+            for chunk in chunks:
+                _decode_images(chunk)
+    finally:
+        _image_task = None
+    with open(os.path.join(tmp_dir, "index.json"), "w", encoding="utf-8") as f:
+        json.dump({"paths": paths, "size": list(size), "mode": mode}, f)
+    try:
+        os.rename(tmp_dir, cache_dir)
+    except OSError:
+        # Another code built the same cache meanwhile.
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def load_images(
+    paths: Any,
+    size: Any,
+    mode: str = "RGB",
+    n_jobs: Optional[int] = None,
+) -> tuple[np.ndarray, list[str]]:
+    """Loads images decoded and resized once for all the codes of the task.
+
+    The first code asking for a list of images at a size and mode decodes them
+    with PIL into a uint8 array in the image cache; the next codes map the
+    array from the cache without decoding the files again.
+
+    Args:
+        paths: A directory, whose images are loaded sorted by path, or a list
+            of image paths, e.g. built from the ids of a CSV file.
+        size: The `(height, width)` of the resized images, or an int for
+            square images.
+        mode: The PIL mode of the images, e.g. `RGB` or `L` for grayscale.
+        n_jobs: The number of processes decoding the images the first time,
+            by default the CPU slots of the code.
+
+    Returns:
+        A read-only uint8 array of shape `(N, height, width, channels)`, or
+        `(N, height, width)` for single-channel modes, memory-mapped from the
+        cache, and the path of the image of every row.
+    """
+    if isinstance(paths, (str, os.PathLike)):
+        paths = list_images(os.fspath(paths))
+    else:
+        paths = [os.fspath(path) for path in paths]
+    if not paths:
+        raise ValueError("No images to load.")
+    size = (size, size) if isinstance(size, int) else tuple(int(side) for side in size)
+    # The files are identified by their paths relative to the code and their
+    # sizes, so the copies of `input` in the workspaces share the cache.
+    key = json.dumps([
+        list(size),
+        mode,
+        [[os.path.normpath(path), os.path.getsize(path)] for path in paths],
+    ])
+    cache_dir = os.path.join(
+        get_image_cache_dir(), hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    )
+    images_path = os.path.join(cache_dir, "images.npy")
+    if not os.path.exists(images_path):
+        os.makedirs(os.path.dirname(cache_dir), exist_ok=True)
+        _build_image_cache(paths, size, mode, cache_dir, n_jobs)
+    return np.load(images_path, mmap_mode="r"), paths
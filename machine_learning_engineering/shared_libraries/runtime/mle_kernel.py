@@ -0,0 +1,209 @@
+"""Long-lived kernel running the codes of one workspace in forked processes.
+
+The kernel reads one JSON request per line on stdin, runs the code of the
+request as if it were `python <py_filepath>` and writes one JSON response per
+line on stdout. Every code runs in a child forked from the kernel, in a fresh
+`__main__` namespace: the modules imported by the previous codes stay loaded
+in the kernel, so the child does not pay the interpreter start and the
+imports again, while a crash or a memory leak of the code never reaches the
+kernel.
+
+Request: `{"code": str, "py_filepath": str, "exec_timeout": float, "env": dict}`.
+Responses: `{"pid": int}` once the child running the code started, then
+`{"returncode": int, "stdout": str, "stderr": str, "timed_out": bool,
+"rss": int}`, where `rss` is the resident memory of the kernel in bytes.
+
+The kernel stops when its stdin is closed, e.g. when the agent exits.
+"""
+
+from typing import Any
+import ast
+import builtins
+import importlib
+import json
+import os
+import signal
+import sys
+import tempfile
+import time
+import traceback
+import types
+
+
+POLL_INTERVAL = 0.01
+# Libraries starting threads on import, which must not be loaded before a fork.
+FORK_UNSAFE_MODULES = ("tensorflow", "keras", "jax")
+# The copy of stdout the responses are written to.
+_responses = None
+
+
+def get_rss() -> int:
+    """Gets the resident memory of the current process in bytes."""
+    try:
+        with open("/proc/self/statm", "r", encoding="utf-8") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def warm_imports(code: str) -> None:
+    """Imports the top-level imports of a code in the kernel, for the next codes."""
+    try:
+        body = ast.parse(code).body
+    except SyntaxError:
+        return
+    for node in body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            if name.split(".")[0] in FORK_UNSAFE_MODULES:
+                continue
+            try:
+                importlib.import_module(name)
+            except BaseException:
+                # The code itself reports its failed imports.
+                pass
+
+
+def _exit_code(e: SystemExit) -> int:
+    if e.code is None:
+        return 0
+    if isinstance(e.code, int):
+        return e.code
+    print(e.code, file=sys.stderr)
+    return 1
+
+
+def _run_child(code: str, py_filepath: str, env: dict[str, str], output_dir: str) -> None:
+    """Runs the code in the forked child, which never returns."""
+    returncode = 1
+    try:
+        os.setsid()
+        if _responses is not None:
+            _responses.close()
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.close(devnull)
+        sys.stdin = open(0, "r", encoding="utf-8", closefd=False)
+        for fd, name in ((1, "stdout"), (2, "stderr")):
+            output_fd = os.open(os.path.join(output_dir, name), os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+            os.dup2(output_fd, fd)
+            os.close(output_fd)
+        sys.stdout = open(1, "w", encoding="utf-8", closefd=False)
+        sys.stderr = open(2, "w", encoding="utf-8", closefd=False)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        os.environ.update(env)
+        sys.argv = [py_filepath]
+        # Like `python py_filepath`, which shows the absolute path of the code.
+        filename = os.path.abspath(py_filepath)
+        sys.path[0] = os.path.dirname(filename)
+        main_module = types.ModuleType("__main__")
+        main_module.__file__ = filename
+        main_module.__builtins__ = builtins
+        sys.modules["__main__"] = main_module
+        try:
+            exec(compile(code, filename, "exec"), main_module.__dict__)
+            returncode = 0
+        except SystemExit as e:
+            returncode = _exit_code(e)
+        except BaseException as e:
+            # Hides the frame of the kernel, like a traceback of `python py_filepath`.
+            traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+            returncode = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(returncode)
+
+
+def _respond(response: dict[str, Any]) -> None:
+    _responses.write(json.dumps(response) + "\n")
+    _responses.flush()
+
+
+def run_code(request: dict[str, Any]) -> dict[str, Any]:
+    """Runs the code of a request in a forked child."""
+    code = request["code"]
+    py_filepath = request["py_filepath"]
+    exec_timeout = request["exec_timeout"]
+    with open(py_filepath, "w", encoding="utf-8") as f:
+        f.write(code)
+    with tempfile.TemporaryDirectory() as output_dir:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            _run_child(code, py_filepath, request.get("env", {}), output_dir)
+        _respond({"pid": pid})
+        deadline = time.time() + exec_timeout
+        timed_out = False
+        while True:
+            finished_pid, status = os.waitpid(pid, os.WNOHANG)
+            if finished_pid:
+                break
+            if time.time() > deadline:
+                # The child leads its own process group, with the processes it started.
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                _, status = os.waitpid(pid, 0)
+                timed_out = True
+                break
+            time.sleep(POLL_INTERVAL)
+        outputs = {}
+        for name in ("stdout", "stderr"):
+            path = os.path.join(output_dir, name)
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8", errors="replace") as f:
+                    outputs[name] = f.read()
+            else:
+                outputs[name] = ""
+    if os.WIFEXITED(status):
+        returncode = os.WEXITSTATUS(status)
+    else:
+        returncode = -os.WTERMSIG(status)
+    warm_imports(code)
+    return {
+        "returncode": returncode,
+        "stdout": outputs["stdout"],
+        "stderr": outputs["stderr"],
+        "timed_out": timed_out,
+        "rss": get_rss(),
+    }
+
+
+def main() -> None:
+    global _responses
+    # The responses get their own copy of stdout; what the kernel itself
+    # prints, e.g. while importing, is discarded.
+    _responses = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        try:
+            response = run_code(request)
+        except Exception as e:
+            response = {
+                "returncode": 1,
+                "stdout": "",
+                "stderr": f"The kernel failed to run the code: {e!r}",
+                "timed_out": False,
+                "rss": get_rss(),
+            }
+        _respond(response)
+
+
+if __name__ == "__main__":
+    main()
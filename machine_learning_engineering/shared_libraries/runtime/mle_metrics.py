@@ -0,0 +1,113 @@
+"""Metrics channel of the codes, importable as `import mle_metrics`.
+
+The codes append their score, metrics and stage timings as JSON lines to
+`<MLE_METRICS_PATH>`, which the agent reads instead of parsing the output.
+"""
+
+from typing import Any, Iterator, Optional
+import contextlib
+import json
+import os
+import time
+
+import numpy as np
+
+
+METRICS_PATH_ENV = "MLE_METRICS_PATH"
+VALIDATION_SCORE_METRIC = "validation_score"
+SCORE_MARKER = "Final Validation Performance"
+# The number of metric records kept in the result of a code run.
+MAX_METRIC_RECORDS = 100
+
+
+def _to_json_value(value: Any) -> Any:
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return value
+
+
+def log_metric(name: str, value: Any, **fields: Any) -> None:
+    """Appends a metric of the code, e.g. the score of an ablation, to its metrics file.
+
+    Args:
+        name: The name of the metric, e.g. `ablation_score`.
+        value: A number, or any JSON value.
+        **fields: What the metric is about, e.g. `fold=2` or `variant="no
+            feature engineering"`.
+    """
+    path = os.environ.get(METRICS_PATH_ENV, "")
+    if not path:
+        return
+    record = {"name": name, "value": _to_json_value(value), "time": time.time()}
+    record.update({key: _to_json_value(field) for key, field in fields.items()})
+    line = json.dumps(record, default=str) + "\n"
+    # One write per line in append mode, so the lines of forked folds do not mix.
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+def log_validation_score(score: float) -> None:
+    """Reports the final validation score of the code, also printed as text."""
+    log_metric(VALIDATION_SCORE_METRIC, float(score))
+    print(f"{SCORE_MARKER}: {score}")
+
+
+@contextlib.contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Logs the wall time of a stage of the code, e.g. `with mle_runtime.timed("training"):`."""
+    start_time = time.time()
+    try:
+        yield
+    finally:
+        log_metric("stage_time", time.time() - start_time, stage=stage)
+
+
+def load_metrics(path: str) -> Optional[dict[str, Any]]:
+    """Loads the metrics file of a code run, None without one.
+
+    Returns:
+        A dict with the last `validation_score`, the last value of every
+        other metric in `metrics`, the `fold_scores` and `fold_times` logged
+        by `run_cv`, the `stage_times` in seconds, and the first
+        `MAX_METRIC_RECORDS` records of the other metrics in `records`.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # A line cut by the end of the code.
+                continue
+    summary = {
+        "validation_score": None,
+        "metrics": {},
+        "fold_scores": [],
+        "fold_times": [],
+        "stage_times": {},
+        "records": [],
+    }
+    folds = {}
+    for record in records:
+        name = record.get("name")
+        if name == VALIDATION_SCORE_METRIC:
+            summary["validation_score"] = record["value"]
+        elif name == "fold_score":
+            folds[record.get("fold")] = record
+        elif name == "stage_time":
+            stage = record.get("stage", "")
+            summary["stage_times"][stage] = summary["stage_times"].get(stage, 0.0) + record["value"]
+        else:
+            summary["metrics"][name] = record["value"]
+            if len(summary["records"]) < MAX_METRIC_RECORDS:
+                summary["records"].append(record)
+    # The folds are in the order of their first records.
+    for record in folds.values():
+        if record["value"] is not None:
+            summary["fold_scores"].append(record["value"])
+        summary["fold_times"].append(record.get("seconds"))
+    return summary
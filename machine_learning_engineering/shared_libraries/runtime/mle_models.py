@@ -0,0 +1,143 @@
+"""Model store of the solutions, importable as `import mle_models`.
+
+Every solution saves its fitted models in `<MLE_ARTIFACT_DIR>/<solution hash>/`
+with a manifest of their formats, so that the submission only runs inference.
+"""
+
+from typing import Any, Optional
+import json
+import os
+import pickle
+import sys
+import time
+
+if __package__:
+    from . import mle_predictions
+else:
+    # Imported by the generated code, with the runtime directory on its path.
+    import mle_predictions
+
+
+ARTIFACT_DIR_ENV = "MLE_ARTIFACT_DIR"
+MODEL_MANIFEST = "models.json"
+
+
+def get_artifact_dir(
+    solution_hash: Optional[str] = None,
+    artifact_dir: Optional[str] = None,
+) -> str:
+    """Gets the directory of the saved models of a solution."""
+    if artifact_dir is None:
+        artifact_dir = os.environ.get(ARTIFACT_DIR_ENV, "")
+    if solution_hash is None:
+        solution_hash = mle_predictions.get_solution_hash()
+    if not artifact_dir or not solution_hash:
+        return ""
+    return os.path.join(artifact_dir, solution_hash)
+
+
+def _is_torch_object(model: Any) -> bool:
+    """Checks if a model is a PyTorch module, tensor or state dict."""
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return False
+    if isinstance(model, dict) and model:
+        return all(isinstance(v, torch.Tensor) for v in model.values())
+    return isinstance(model, (torch.nn.Module, torch.Tensor))
+
+
+def _check_model_name(name: str) -> None:
+    if not name or os.sep in name or name.startswith("."):
+        raise ValueError(f"The model name must be a plain file name, got {name!r}.")
+
+
+def _load_manifest(output_dir: str) -> dict[str, Any]:
+    path = os.path.join(output_dir, MODEL_MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_model(model: Any, name: str = "model") -> str:
+    """Saves a fitted model or pipeline of the running solution.
+
+    PyTorch modules, tensors and state dicts are saved with `torch.save`, the
+    other models with joblib, or pickle if joblib is not installed.
+
+    Args:
+        model: The fitted model.
+        name: A distinct name for every model of the solution, e.g. `model`
+            or `model_fold0`.
+
+    Returns:
+        The path of the saved model, empty if the code is not run by the
+        agent.
+    """
+    _check_model_name(name)
+    output_dir = get_artifact_dir()
+    if not output_dir:
+        return ""
+    os.makedirs(output_dir, exist_ok=True)
+    if _is_torch_object(model):
+        model_format, filename = "torch", f"{name}.pt"
+    else:
+        try:
+            import joblib
+            model_format, filename = "joblib", f"{name}.joblib"
+        except ImportError:
+            model_format, filename = "pickle", f"{name}.pkl"
+    path = os.path.join(output_dir, filename)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if model_format == "torch":
+        sys.modules["torch"].save(model, tmp_path)
+    elif model_format == "joblib":
+        joblib.dump(model, tmp_path)
+    else:
+        with open(tmp_path, "wb") as f:
+            pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    manifest = _load_manifest(output_dir)
+    manifest[name] = {"file": filename, "format": model_format, "saved_at": time.time()}
+    tmp_path = os.path.join(output_dir, f"{MODEL_MANIFEST}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(output_dir, MODEL_MANIFEST))
+    return path
+
+
+def list_models(
+    solution_hash: Optional[str] = None,
+    artifact_dir: Optional[str] = None,
+) -> list[str]:
+    """Lists the names of the saved models of a solution."""
+    output_dir = get_artifact_dir(solution_hash, artifact_dir)
+    if not output_dir:
+        return []
+    return sorted(_load_manifest(output_dir))
+
+
+def load_model(
+    name: str = "model",
+    solution_hash: Optional[str] = None,
+    artifact_dir: Optional[str] = None,
+) -> Any:
+    """Loads a saved model of a solution, by default of the running one.
+
+    The classes of the model, e.g. custom transformers or PyTorch modules,
+    must be defined or imported by the loading code.
+    """
+    _check_model_name(name)
+    output_dir = get_artifact_dir(solution_hash, artifact_dir)
+    entry = _load_manifest(output_dir).get(name) if output_dir else None
+    if entry is None:
+        raise FileNotFoundError(f"No saved model named {name!r} for solution {solution_hash}.")
+    path = os.path.join(output_dir, entry["file"])
+    if entry["format"] == "torch":
+        import torch
+        return torch.load(path, weights_only=False)
+    if entry["format"] == "joblib":
+        import joblib
+        return joblib.load(path)
+    with open(path, "rb") as f:
+        return pickle.load(f)
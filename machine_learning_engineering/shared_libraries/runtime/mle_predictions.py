@@ -0,0 +1,214 @@
+"""Prediction store of the solutions, importable as `import mle_predictions`.
+
+Every solution saves its validation and test predictions as NumPy files in
+`<MLE_PREDICTION_DIR>/<solution hash>/`, where `MLE_SOLUTION_HASH` is the hash
+of the running code, so that an ensemble can combine the predictions of the
+solutions without training them again.
+"""
+
+from typing import Any, Optional
+import json
+import os
+import time
+
+import numpy as np
+
+
+SOLUTION_HASH_ENV = "MLE_SOLUTION_HASH"
+PREDICTION_DIR_ENV = "MLE_PREDICTION_DIR"
+SPLITS = ("val", "test")
+
+
+def get_solution_hash() -> str:
+    """Gets the hash of the code being run, empty outside of the agent."""
+    return os.environ.get(SOLUTION_HASH_ENV, "")
+
+
+def get_prediction_dir(
+    solution_hash: Optional[str] = None,
+    prediction_dir: Optional[str] = None,
+) -> str:
+    """Gets the directory of the stored predictions of a solution."""
+    if prediction_dir is None:
+        prediction_dir = os.environ.get(PREDICTION_DIR_ENV, "")
+    if solution_hash is None:
+        solution_hash = get_solution_hash()
+    if not prediction_dir or not solution_hash:
+        return ""
+    return os.path.join(prediction_dir, solution_hash)
+
+
+def _save_array(path: str, array: np.ndarray) -> None:
+    """Saves an array so that readers never see a partially written file."""
+    tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+
+def _to_numeric_array(values: Any, name: str) -> np.ndarray:
+    """Converts predictions or targets to a numeric array."""
+    if hasattr(values, "to_numpy"):
+        values = values.to_numpy()
+    array = np.asarray(values)
+    if array.dtype == object or not (
+        np.issubdtype(array.dtype, np.number) or np.issubdtype(array.dtype, np.bool_)
+    ):
+        raise ValueError(
+            f"The {name} must be numeric, e.g. class probabilities or encoded labels."
+        )
+    return array
+
+
+def _to_index_array(index: Any) -> np.ndarray:
+    """Converts the row identifiers to an array without Python objects."""
+    if hasattr(index, "to_numpy"):
+        index = index.to_numpy()
+    array = np.asarray(index)
+    if array.dtype == object:
+        array = array.astype(str)
+    return array
+
+
+def save_predictions(
+    split: str,
+    predictions: Any,
+    index: Any = None,
+    target: Any = None,
+) -> str:
+    """Saves the predictions of the running solution on `val` or `test`.
+
+    Args:
+        split: `val` for the hold-out validation samples, `test` for the test
+            samples.
+        predictions: Predicted values for regression, or class probabilities
+            for classification, one row per sample.
+        index: The identifiers of the samples, e.g. the index of the
+            validation rows in the training data. Used to align the
+            predictions of solutions with different validation splits.
+        target: The true target values of the validation samples.
+
+    Returns:
+        The directory of the stored predictions, empty if the code is not run
+        by the agent.
+    """
+    if split not in SPLITS:
+        raise ValueError(f"split must be one of {SPLITS}, got {split}.")
+    output_dir = get_prediction_dir()
+    if not output_dir:
+        return ""
+    os.makedirs(output_dir, exist_ok=True)
+    predictions = _to_numeric_array(predictions, "predictions")
+    _save_array(os.path.join(output_dir, f"{split}.npy"), predictions)
+    metadata = {"shape": list(predictions.shape), "saved_at": time.time()}
+    if index is not None:
+        index = _to_index_array(index)
+        if len(index) != len(predictions):
+            raise ValueError("index and predictions must have the same length.")
+        _save_array(os.path.join(output_dir, f"{split}_index.npy"), index)
+    if target is not None:
+        target = _to_numeric_array(target, "target")
+        if len(target) != len(predictions):
+            raise ValueError("target and predictions must have the same length.")
+        _save_array(os.path.join(output_dir, f"{split}_target.npy"), target)
+    with open(os.path.join(output_dir, f"{split}_meta.json"), "w", encoding="utf-8") as f:
+        json.dump(metadata, f)
+    return output_dir
+
+
+def has_predictions(
+    solution_hash: str,
+    split: str = "val",
+    prediction_dir: Optional[str] = None,
+) -> bool:
+    """Checks if the predictions of a solution are stored."""
+    output_dir = get_prediction_dir(solution_hash, prediction_dir)
+    return bool(output_dir) and os.path.exists(os.path.join(output_dir, f"{split}.npy"))
+
+
+def _load_optional(path: str, mmap: bool) -> Optional[np.ndarray]:
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode="r" if mmap else None)
+
+
+def load_predictions(
+    solution_hash: str,
+    split: str = "val",
+    mmap: bool = True,
+    prediction_dir: Optional[str] = None,
+) -> np.ndarray:
+    """Loads the stored predictions of a solution, memory-mapped by default."""
+    output_dir = get_prediction_dir(solution_hash, prediction_dir)
+    return np.load(os.path.join(output_dir, f"{split}.npy"), mmap_mode="r" if mmap else None)
+
+
+def load_index(
+    solution_hash: str,
+    split: str = "val",
+    prediction_dir: Optional[str] = None,
+) -> Optional[np.ndarray]:
+    """Loads the sample identifiers of the stored predictions, if saved."""
+    output_dir = get_prediction_dir(solution_hash, prediction_dir)
+    return _load_optional(os.path.join(output_dir, f"{split}_index.npy"), mmap=False)
+
+
+def load_target(
+    solution_hash: str,
+    split: str = "val",
+    mmap: bool = True,
+    prediction_dir: Optional[str] = None,
+) -> Optional[np.ndarray]:
+    """Loads the true target values stored with the predictions, if saved."""
+    output_dir = get_prediction_dir(solution_hash, prediction_dir)
+    return _load_optional(os.path.join(output_dir, f"{split}_target.npy"), mmap=mmap)
+
+
+def list_solutions(prediction_dir: Optional[str] = None) -> list[str]:
+    """Lists the hashes of the solutions with stored predictions."""
+    if prediction_dir is None:
+        prediction_dir = os.environ.get(PREDICTION_DIR_ENV, "")
+    if not prediction_dir or not os.path.isdir(prediction_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(prediction_dir)
+        if has_predictions(name, "val", prediction_dir)
+    )
+
+
+def load_aligned_predictions(
+    solution_hashes: list[str],
+    split: str = "val",
+    prediction_dir: Optional[str] = None,
+) -> tuple[Optional[np.ndarray], list[np.ndarray], Optional[np.ndarray]]:
+    """Loads the predictions of several solutions on their common samples.
+
+    Returns:
+        The identifiers of the common samples (None if no solution saved an
+        index), the predictions of every solution on them, and their target
+        values (None if no solution saved them).
+    """
+    predictions = [
+        np.asarray(load_predictions(h, split, mmap=True, prediction_dir=prediction_dir))
+        for h in solution_hashes
+    ]
+    indices = [load_index(h, split, prediction_dir) for h in solution_hashes]
+    targets = [load_target(h, split, mmap=False, prediction_dir=prediction_dir) for h in solution_hashes]
+    if all(index is None for index in indices):
+        if len({len(p) for p in predictions}) > 1:
+            raise ValueError("The predictions have different lengths and no index.")
+        target = next((t for t in targets if t is not None), None)
+        return None, predictions, target
+    if any(index is None for index in indices):
+        raise ValueError("Either all or none of the solutions must save an index.")
+    common_index = indices[0]
+    for index in indices[1:]:
+        common_index = common_index[np.isin(common_index, index)]
+    aligned_predictions = []
+    target = None
+    for prediction, index, curr_target in zip(predictions, indices, targets):
+        positions = {key: i for i, key in enumerate(index.tolist())}
+        order = np.array([positions[key] for key in common_index.tolist()], dtype=np.int64)
+        aligned_predictions.append(prediction[order])
+        if target is None and curr_target is not None:
+            target = np.asarray(curr_target)[order]
+    return common_index, aligned_predictions, target
@@ -0,0 +1,239 @@
+"""Runs a code resuming from a snapshot of the state after its prefix.
+
+The refinement only rewrites one block of a solution, so the code before the
+block (typically the data loading and the feature engineering) is the same
+for all the variants of the block. The agent runs such a code through `run`,
+which executes the prefix once, pickles the resulting global variables
+together with the states of the random generators into
+`<MLE_PREFIX_CACHE_DIR>/<prefix key>.pkl`, and resumes the later variants
+from that snapshot so that only the changed suffix runs.
+
+Modules are imported again, and the imports, functions and classes of the
+prefix are defined again before the variables are unpickled. Variables that
+cannot be pickled, e.g. closed files, are left out of the snapshot, and a
+code using one of them after the prefix runs in full, so a resumed code
+always sees the same state as a full run.
+"""
+
+from typing import Any, Optional
+import ast
+import hashlib
+import importlib
+import linecache
+import os
+import pickle
+import random
+import sys
+import types
+
+
+CACHE_DIR_ENV = "MLE_PREFIX_CACHE_DIR"
+MAX_SNAPSHOT_BYTES = 4 * 1024 ** 3
+_DEFINITION_NODES = (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+class SnapshotTooLargeError(Exception):
+    """Raised when a snapshot is larger than `MAX_SNAPSHOT_BYTES`."""
+
+
+class _NullWriter:
+    """Discards what is written, to check if an object can be pickled."""
+
+    def write(self, data: bytes) -> int:
+        return len(data)
+
+
+class _Tee:
+    """Copies what is written to a stream."""
+
+    def __init__(self, stream: Any):
+        self.stream = stream
+        self.parts = []
+
+    def write(self, text: str) -> int:
+        self.parts.append(text)
+        return self.stream.write(text)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.stream, name)
+
+
+def get_prefix_key(prefix: str) -> str:
+    """Gets the key of the snapshot of a prefix run in the current directory."""
+    key = "\n".join([sys.version, os.getcwd(), prefix])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def _get_rng_state() -> dict[str, Any]:
+    """Gets the states of the global random generators."""
+    state = {"random": random.getstate()}
+    if "numpy" in sys.modules:
+        state["numpy"] = sys.modules["numpy"].random.get_state()
+    if "torch" in sys.modules:
+        state["torch"] = sys.modules["torch"].get_rng_state()
+    return state
+
+
+def _set_rng_state(state: dict[str, Any]) -> None:
+    random.setstate(state["random"])
+    if "numpy" in state:
+        importlib.import_module("numpy").random.set_state(state["numpy"])
+    if "torch" in state:
+        importlib.import_module("torch").set_rng_state(state["torch"])
+
+
+def _register_source(filename: str, source: str) -> None:
+    """Shows the lines of the code in the tracebacks."""
+    # An entry without mtime is never invalidated by `linecache.checkcache`.
+    linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+
+
+def _write_snapshot(path: str, header: dict[str, Any], variables: dict[str, Any]) -> None:
+    """Writes a snapshot so that readers never see a partially written file."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+            # One pickle keeps the objects shared between variables shared.
+            pickle.dump(variables, f, protocol=pickle.HIGHEST_PROTOCOL)
+        if os.path.getsize(tmp_path) > MAX_SNAPSHOT_BYTES:
+            raise SnapshotTooLargeError(path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _save_snapshot(
+    path: str,
+    namespace: dict[str, Any],
+    base_names: set[str],
+    stdout_text: str,
+) -> bool:
+    """Saves the state after the prefix, without the variables that cannot be pickled."""
+    variables, modules = {}, {}
+    for name, value in namespace.items():
+        if name in base_names or name.startswith("__"):
+            continue
+        if isinstance(value, types.ModuleType):
+            modules[name] = value.__name__
+        else:
+            variables[name] = value
+    header = {
+        "modules": modules,
+        "dropped": [],
+        "rng": _get_rng_state(),
+        "stdout": stdout_text,
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        _write_snapshot(path, header, variables)
+        return True
+    except SnapshotTooLargeError:
+        return False
+    except Exception:
+        pass
+    for name, value in list(variables.items()):
+        try:
+            pickle.dump(value, _NullWriter(), protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            header["dropped"].append(name)
+            del variables[name]
+    try:
+        _write_snapshot(path, header, variables)
+        return True
+    except Exception:
+        return False
+
+
+def _get_used_names(*nodes: ast.AST) -> set[str]:
+    return {
+        node.id for root in nodes for node in ast.walk(root) if isinstance(node, ast.Name)
+    }
+
+
+def _restore_snapshot(
+    path: str,
+    namespace: dict[str, Any],
+    prefix: str,
+    suffix: str,
+    filename: str,
+) -> bool:
+    """Restores the state after the prefix from its snapshot, if any."""
+    if not os.path.exists(path):
+        return False
+    try:
+        with open(path, "rb") as f:
+            header = pickle.load(f)
+            definitions = ast.Module(
+                body=[
+                    node for node in ast.parse(prefix).body
+                    if isinstance(node, _DEFINITION_NODES)
+                ],
+                type_ignores=[],
+            )
+            if set(header["dropped"]) & _get_used_names(definitions, ast.parse(suffix)):
+                return False
+            exec(compile(definitions, filename, "exec"), namespace)
+            for name, module_name in header["modules"].items():
+                namespace[name] = importlib.import_module(module_name)
+            namespace.update(pickle.load(f))
+        _set_rng_state(header["rng"])
+    except Exception:
+        # The prefix runs again and overwrites what was restored.
+        return False
+    sys.stdout.write(header["stdout"])
+    return True
+
+
+def run(
+    namespace: dict[str, Any],
+    source: str,
+    prefix_length: int,
+    cache_dir: Optional[str] = None,
+) -> None:
+    """Runs a code in `namespace`, resuming after `source[:prefix_length]` if cached.
+
+    Args:
+        namespace: The globals of the `__main__` module running the code.
+        source: The code.
+        prefix_length: The length of the prefix, ending at the start of a
+            top-level statement.
+        cache_dir: The directory of the snapshots, `MLE_PREFIX_CACHE_DIR` by
+            default.
+    """
+    filename = namespace.get("__file__", "<code>")
+    _register_source(filename, source)
+    if cache_dir is None:
+        cache_dir = os.environ.get(CACHE_DIR_ENV, "")
+    if namespace.get("__name__") != "__main__" or prefix_length <= 0 or not cache_dir:
+        # E.g. a process started by `multiprocessing` importing the main module.
+        exec(compile(source, filename, "exec"), namespace)
+        return
+    prefix = source[:prefix_length]
+    # The padding keeps the line numbers of the suffix in the tracebacks.
+    suffix = "\n" * prefix.count("\n") + source[prefix_length:]
+    suffix_code = compile(suffix, filename, "exec")
+    path = os.path.join(cache_dir, f"{get_prefix_key(prefix)}.pkl")
+    base_names = set(namespace)
+    if not _restore_snapshot(path, namespace, prefix, suffix, filename):
+        tee = _Tee(sys.stdout)
+        sys.stdout = tee
+        try:
+            exec(compile(prefix, filename, "exec"), namespace)
+        finally:
+            sys.stdout = tee.stream
+        _save_snapshot(path, namespace, base_names, "".join(tee.parts))
+    exec(suffix_code, namespace)
+
+
+def get_launcher_code(source: str, prefix_length: int, filename: str = "") -> str:
+    """Gets a script running the code through `run`.
+
+    With a `filename`, relative to the directory the script runs in, the code
+    is run as that file, e.g. in its tracebacks, rather than as the script.
+    """
+    launcher = "import mle_prefix_cache\n"
+    if filename:
+        launcher += f"import os\n__file__ = os.path.abspath({filename!r})\n"
+    return launcher + f"mle_prefix_cache.run(globals(), {source!r}, {prefix_length})\n"
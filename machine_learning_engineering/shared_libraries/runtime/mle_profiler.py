@@ -0,0 +1,191 @@
+"""Runs a code under a sampling profiler and writes where its time is spent.
+
+A thread samples the stack of the thread running the code every
+`SAMPLE_INTERVAL` seconds. Every sample counts for the functions on the
+stack (their total time), for the innermost function (its own time), and
+for the innermost line of the code itself, so that the time of a library
+call is charged to the line of the code calling it. The times are the shares
+of the samples in the wall time of the run. Worker processes started by the
+code are not sampled, and a call holding the GIL delays the samples taken
+during it.
+
+The profile is written as JSON to `<MLE_PROFILE_PATH>` when the code ends,
+also when it fails. With a prefix length, the code runs through
+`mle_prefix_cache.run`.
+"""
+
+from typing import Any, Optional
+import collections
+import json
+import linecache
+import os
+import sys
+import threading
+import time
+
+
+PROFILE_PATH_ENV = "MLE_PROFILE_PATH"
+SAMPLE_INTERVAL = 0.01
+# The number of functions and lines kept in the profile file.
+MAX_ENTRIES = 50
+
+
+class _Sampler:
+    """Samples the stack of a thread from a background thread."""
+
+    def __init__(
+        self,
+        root_frame: Any,
+        filename: str,
+        interval: float,
+        launcher_files: tuple[str, ...],
+    ):
+        self.thread_id = threading.get_ident()
+        self.root_frame = root_frame
+        self.filename = filename
+        self.interval = interval
+        self.launcher_files = launcher_files
+        self.num_samples = 0
+        self.total_counts = collections.Counter()
+        self.self_counts = collections.Counter()
+        self.line_counts = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self.start_time = time.perf_counter()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.wall_time = time.perf_counter() - self.start_time
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self._add_sample(frame)
+
+    def _add_sample(self, frame: Any) -> None:
+        self.num_samples += 1
+        functions = set()
+        code_line = None
+        innermost = True
+        # The frames outside the run, e.g. of the kernel, are not part of the code.
+        while frame is not None and frame is not self.root_frame:
+            code = frame.f_code
+            function = (code.co_filename, code.co_firstlineno, code.co_name)
+            if innermost:
+                self.self_counts[function] += 1
+                innermost = False
+            # The module of the code and the launcher run during the whole run,
+            # and the time of the imports is shown on the lines importing.
+            if (
+                code.co_filename not in self.launcher_files
+                and code.co_name != "<module>"
+                and not code.co_filename.startswith("<frozen")
+            ):
+                functions.add(function)
+            if code_line is None and code.co_filename == self.filename:
+                code_line = frame.f_lineno
+            frame = frame.f_back
+        self.total_counts.update(functions)
+        if code_line is not None:
+            self.line_counts[code_line] += 1
+
+    def get_profile(self) -> dict[str, Any]:
+        """Gets the hot functions and lines, with their estimated times."""
+        seconds_per_sample = self.wall_time / max(1, self.num_samples)
+        functions = []
+        for (filename, line, name), count in self.total_counts.most_common(MAX_ENTRIES):
+            functions.append({
+                "function": name,
+                "file": os.path.basename(filename),
+                "line": line,
+                "total_time": count * seconds_per_sample,
+                "self_time": self.self_counts[(filename, line, name)] * seconds_per_sample,
+            })
+        lines = []
+        for line, count in self.line_counts.most_common(MAX_ENTRIES):
+            lines.append({
+                "line": line,
+                "code": linecache.getline(self.filename, line).strip(),
+                "time": count * seconds_per_sample,
+            })
+        return {
+            "wall_time": self.wall_time,
+            "num_samples": self.num_samples,
+            "functions": functions,
+            "lines": lines,
+        }
+
+
+def _write_profile(path: str, profile: dict[str, Any]) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(profile, f)
+    os.replace(tmp_path, path)
+
+
+def run(
+    namespace: dict[str, Any],
+    source: str,
+    prefix_length: int = 0,
+    profile_path: Optional[str] = None,
+) -> None:
+    """Runs a code in `namespace` and writes its profile to `profile_path`.
+
+    Args:
+        namespace: The globals of the `__main__` module running the code.
+        source: The code.
+        prefix_length: The length of the prefix resumed by `mle_prefix_cache`.
+        profile_path: The profile file, `MLE_PROFILE_PATH` by default.
+    """
+    # Only importable where the code runs, with the runtime on its path.
+    import mle_prefix_cache
+
+    if profile_path is None:
+        profile_path = os.environ.get(PROFILE_PATH_ENV, "")
+    if namespace.get("__name__") != "__main__" or not profile_path:
+        mle_prefix_cache.run(namespace, source, prefix_length)
+        return
+    sampler = _Sampler(
+        sys._getframe(),
+        namespace.get("__file__", "<code>"),
+        SAMPLE_INTERVAL,
+        (__file__, mle_prefix_cache.__file__),
+    )
+    sampler.start()
+    try:
+        mle_prefix_cache.run(namespace, source, prefix_length)
+    finally:
+        sampler.stop()
+        try:
+            _write_profile(profile_path, sampler.get_profile())
+        except OSError:
+            pass
+
+
+def load_profile(path: str, top_n: int) -> Optional[dict[str, Any]]:
+    """Loads a profile, keeping its `top_n` hottest functions and lines."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            profile = json.load(f)
+    except (OSError, ValueError):
+        return None
+    profile["functions"] = profile["functions"][:top_n]
+    profile["lines"] = profile["lines"][:top_n]
+    return profile
+
+
+def get_launcher_code(source: str, prefix_length: int = 0, filename: str = "") -> str:
+    """Gets a script running the code through `run`.
+
+    With a `filename`, relative to the directory the script runs in, the code
+    is run and profiled as that file rather than as the script.
+    """
+    launcher = "import mle_profiler\n"
+    if filename:
+        launcher += f"import os\n__file__ = os.path.abspath({filename!r})\n"
+    return launcher + f"mle_profiler.run(globals(), {source!r}, {prefix_length})\n"
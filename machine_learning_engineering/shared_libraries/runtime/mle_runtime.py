@@ -0,0 +1,49 @@
+"""Runtime helpers importable by the generated code as `import mle_runtime`.
+
+The agent puts this directory on the `PYTHONPATH` of every code it runs, and
+tells the code who it is through environment variables:
+
+- `MLE_SOLUTION_HASH`: the hash of the code being run.
+- `MLE_PREDICTION_DIR`: the directory of the prediction store of the task.
+- `MLE_ARTIFACT_DIR`: the directory of the model store of the task.
+- `MLE_CPU_SLOTS`: the number of CPUs the code may use.
+- `MLE_IMAGE_CACHE_DIR`: the directory of the decoded images of the task.
+- `MLE_DEADLINE`: the time (seconds since the epoch) the code is stopped at.
+- `MLE_METRICS_PATH`: the JSON lines file of the metrics of the code.
+
+The prediction store keeps the validation and test predictions of every
+solution as NumPy files in `<MLE_PREDICTION_DIR>/<solution hash>/`, so that an
+ensemble can combine the predictions of the solutions without training them
+again. The model store keeps their fitted models in
+`<MLE_ARTIFACT_DIR>/<solution hash>/`, so that the submission only runs
+inference. `run_cv` trains the folds of a cross-validation in parallel
+processes, `load_images` decodes the images of the task once for all the
+codes, and `tune` searches hyperparameters within a time budget.
+`log_validation_score`, `log_metric` and `timed` write the score, metrics and
+stage timings of the code to its metrics file, which the agent reads instead
+of parsing the output.
+
+The helpers live in `mle_predictions`, `mle_scoring`, `mle_models`, `mle_cv`,
+`mle_images`, `mle_tune` and `mle_metrics`; this module re-exports them so
+that the codes only import one module. They only depend on NumPy, so they
+stay cheap to import.
+"""
+
+# The public names of the runtime modules, e.g. `mle_runtime.save_predictions`.
+if __package__:
+    from .mle_cv import *
+    from .mle_images import *
+    from .mle_metrics import *
+    from .mle_models import *
+    from .mle_predictions import *
+    from .mle_scoring import *
+    from .mle_tune import *
+else:
+    # Imported by the generated code, with the runtime directory on its path.
+    from mle_cv import *
+    from mle_images import *
+    from mle_metrics import *
+    from mle_models import *
+    from mle_predictions import *
+    from mle_scoring import *
+    from mle_tune import *
@@ -0,0 +1,121 @@
+"""Scores and combines predictions with NumPy, importable as `import mle_scoring`."""
+
+from typing import Any, Optional
+
+import numpy as np
+
+
+# Whether a lower value is better, for the metrics of `score_predictions`.
+METRIC_LOWER_IS_BETTER = {
+    "rmse": True,
+    "mse": True,
+    "mae": True,
+    "rmsle": True,
+    "logloss": True,
+    "r2": False,
+    "accuracy": False,
+    "auc": False,
+}
+_EPS = 1e-15
+
+
+def _rank(values: np.ndarray) -> np.ndarray:
+    """Ranks values along the first axis, scaled to [0, 1]."""
+    ranks = np.argsort(np.argsort(values, axis=0, kind="stable"), axis=0, kind="stable")
+    return ranks / max(1, len(values) - 1)
+
+
+def _to_labels(y_true: np.ndarray, y_pred: np.ndarray) -> np.ndarray:
+    """Converts scores or probabilities to predicted labels."""
+    if y_pred.ndim == 2:
+        return np.argmax(y_pred, axis=1)
+    if np.all((y_pred >= 0) & (y_pred <= 1)) and set(np.unique(y_true).tolist()) <= {0, 1}:
+        return (y_pred >= 0.5).astype(y_true.dtype)
+    return np.round(y_pred).astype(y_true.dtype)
+
+
+def _auc(y_true: np.ndarray, y_score: np.ndarray) -> float:
+    """Computes the ROC AUC of binary labels with the rank statistic."""
+    order = np.argsort(y_score, kind="stable")
+    sorted_score = y_score[order]
+    ranks = np.empty(len(y_score), dtype=np.float64)
+    # Ties share their average rank.
+    _, first, counts = np.unique(sorted_score, return_index=True, return_counts=True)
+    average_ranks = first + (counts + 1) / 2.0
+    ranks[order] = np.repeat(average_ranks, counts)
+    positive = y_true == 1
+    num_positive = positive.sum()
+    num_negative = len(y_true) - num_positive
+    if num_positive == 0 or num_negative == 0:
+        return 0.5
+    return float(
+        (ranks[positive].sum() - num_positive * (num_positive + 1) / 2.0)
+        / (num_positive * num_negative)
+    )
+
+
+def score_predictions(metric: str, y_true: Any, y_pred: Any) -> float:
+    """Scores predictions with one of the metrics of `METRIC_LOWER_IS_BETTER`."""
+    y_true = np.asarray(y_true)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    if metric == "mse":
+        return float(np.mean((y_true - y_pred) ** 2))
+    if metric == "rmse":
+        return float(np.sqrt(np.mean((y_true - y_pred) ** 2)))
+    if metric == "mae":
+        return float(np.mean(np.abs(y_true - y_pred)))
+    if metric == "rmsle":
+        return float(np.sqrt(np.mean(
+            (np.log1p(np.clip(y_pred, 0, None)) - np.log1p(np.clip(y_true, 0, None))) ** 2
+        )))
+    if metric == "r2":
+        total = np.sum((y_true - np.mean(y_true)) ** 2)
+        return float(1.0 - np.sum((y_true - y_pred) ** 2) / max(total, _EPS))
+    if metric == "accuracy":
+        return float(np.mean(_to_labels(y_true, y_pred) == y_true))
+    if metric == "logloss":
+        if y_pred.ndim == 2:
+            probs = np.clip(y_pred, _EPS, 1.0)
+            probs = probs / probs.sum(axis=1, keepdims=True)
+            return float(-np.mean(np.log(probs[np.arange(len(y_true)), y_true.astype(int)])))
+        probs = np.clip(y_pred, _EPS, 1 - _EPS)
+        return float(-np.mean(y_true * np.log(probs) + (1 - y_true) * np.log(1 - probs)))
+    if metric == "auc":
+        if y_pred.ndim == 2:
+            y_pred = y_pred[:, -1]
+        return _auc(y_true, y_pred)
+    raise ValueError(f"Unknown metric: {metric}.")
+
+
+def combine_predictions(
+    predictions: list[Any],
+    method: str,
+    weights: Optional[list[float]] = None,
+    power: float = 1.0,
+    intercept: float = 0.0,
+) -> np.ndarray:
+    """Combines the predictions of several solutions.
+
+    Args:
+        predictions: One array of predictions per solution.
+        method: `weighted` for a weighted average, `power` for a weighted
+            power mean of probabilities, `rank` for a weighted average of the
+            ranks, or `linear` for a linear model with an intercept.
+        weights: The weight of every solution, equal weights by default.
+        power: The exponent of the `power` method.
+        intercept: The intercept of the `linear` method.
+    """
+    stacked = np.stack([np.asarray(p, dtype=np.float64) for p in predictions])
+    if weights is None:
+        weights = np.full(len(predictions), 1.0 / len(predictions))
+    weights = np.asarray(weights, dtype=np.float64)
+    if method == "weighted":
+        return np.tensordot(weights, stacked, axes=1)
+    if method == "power":
+        powered = np.tensordot(weights, np.clip(stacked, 0, None) ** power, axes=1)
+        return powered ** (1.0 / power)
+    if method == "rank":
+        return np.tensordot(weights, _rank(stacked.swapaxes(0, 1)).swapaxes(0, 1), axes=1)
+    if method == "linear":
+        return intercept + np.tensordot(weights, stacked, axes=1)
+    raise ValueError(f"Unknown method: {method}.")
@@ -0,0 +1,377 @@
+"""Hyperparameter search within the time left to the code, importable as `import mle_tune`.
+
+The code is stopped at `MLE_DEADLINE` (seconds since the epoch). The result of
+the search is saved with the models of the solution, for the agents refining it.
+"""
+
+from typing import Any, Callable, Optional
+import json
+import math
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+if __package__:
+    from . import mle_cv
+    from . import mle_models
+else:
+    # Imported by the generated code, with the runtime directory on its path.
+    import mle_cv
+    import mle_models
+
+
+DEADLINE_ENV = "MLE_DEADLINE"
+TUNE_RESULT = "tune.json"
+
+
+def get_time_left() -> Optional[float]:
+    """Gets the seconds left before the code is stopped, None if unknown."""
+    try:
+        return float(os.environ[DEADLINE_ENV]) - time.time()
+    except (KeyError, ValueError):
+        return None
+
+
+def uniform(low: float, high: float) -> dict[str, Any]:
+    """A float hyperparameter sampled uniformly in `[low, high]`."""
+    return {"type": "uniform", "low": low, "high": high}
+
+
+def loguniform(low: float, high: float) -> dict[str, Any]:
+    """A positive float hyperparameter sampled uniformly in log scale."""
+    return {"type": "loguniform", "low": low, "high": high}
+
+
+def randint(low: int, high: int) -> dict[str, Any]:
+    """An integer hyperparameter in `[low, high]`, both included."""
+    return {"type": "int", "low": low, "high": high}
+
+
+def choice(options: list[Any]) -> dict[str, Any]:
+    """A hyperparameter taking one of the options."""
+    return {"type": "choice", "options": list(options)}
+
+
+def _is_searched(spec: Any) -> bool:
+    return isinstance(spec, dict) and spec.get("type") in ("uniform", "loguniform", "int", "choice")
+
+
+def _to_params(space: dict[str, Any], point: dict[str, float]) -> dict[str, Any]:
+    """Maps a point of the unit cube, one coordinate per hyperparameter, to parameters."""
+    params = {}
+    for name, spec in space.items():
+        if not _is_searched(spec):
+            params[name] = spec
+            continue
+        u = point[name]
+        if spec["type"] == "choice":
+            params[name] = spec["options"][int(u)]
+        elif spec["type"] == "uniform":
+            params[name] = float(spec["low"] + u * (spec["high"] - spec["low"]))
+        elif spec["type"] == "loguniform":
+            low, high = math.log(spec["low"]), math.log(spec["high"])
+            params[name] = float(math.exp(low + u * (high - low)))
+        else:
+            value = spec["low"] - 0.5 + u * (spec["high"] - spec["low"] + 1)
+            params[name] = int(min(spec["high"], max(spec["low"], round(value))))
+    return params
+
+
+def _sample_random(space: dict[str, Any], rng: np.random.Generator) -> dict[str, float]:
+    point = {}
+    for name, spec in space.items():
+        if _is_searched(spec):
+            if spec["type"] == "choice":
+                point[name] = int(rng.integers(len(spec["options"])))
+            else:
+                point[name] = float(rng.random())
+    return point
+
+
+def _get_bandwidths(centers: np.ndarray) -> np.ndarray:
+    """Gets the bandwidth of every kernel, the larger distance to its neighbors in the unit interval."""
+    order = np.argsort(centers)
+    padded = np.concatenate([[0.0], centers[order], [1.0]])
+    gaps = np.diff(padded)
+    bandwidths = np.empty(len(centers))
+    bandwidths[order] = np.maximum(gaps[:-1], gaps[1:])
+    return np.clip(bandwidths, 1.0 / min(100, len(centers) + 1), 1.0)
+
+
+def _parzen_density(x: np.ndarray, centers: np.ndarray, bandwidths: np.ndarray) -> np.ndarray:
+    """Gets the density of Gaussian kernels mixed with a uniform prior on the unit interval."""
+    kernels = np.exp(-0.5 * ((x[:, None] - centers[None, :]) / bandwidths[None, :]) ** 2)
+    kernels /= bandwidths[None, :] * math.sqrt(2 * math.pi)
+    return (kernels.sum(axis=1) + 1.0) / (len(centers) + 1)
+
+
+def _sample_tpe(
+    space: dict[str, Any],
+    good: list[dict[str, float]],
+    bad: list[dict[str, float]],
+    rng: np.random.Generator,
+    num_candidates: int = 24,
+) -> dict[str, float]:
+    """Samples the candidate most likely under the good points relative to the bad ones.
+
+    Every hyperparameter is modeled independently, with a Parzen estimator of
+    Gaussian kernels (frequencies for choices) smoothed by a uniform prior.
+    """
+    candidates = [{} for _ in range(num_candidates)]
+    log_ratios = np.zeros(num_candidates)
+    for name, spec in space.items():
+        if not _is_searched(spec):
+            continue
+        good_values = np.array([point[name] for point in good], dtype=np.float64)
+        bad_values = np.array([point[name] for point in bad], dtype=np.float64)
+        if spec["type"] == "choice":
+            num_options = len(spec["options"])
+            good_probs = (np.bincount(good_values.astype(int), minlength=num_options) + 1.0) / (len(good) + num_options)
+            bad_probs = (np.bincount(bad_values.astype(int), minlength=num_options) + 1.0) / (len(bad) + num_options)
+            values = rng.choice(num_options, size=num_candidates, p=good_probs)
+            log_ratios += np.log(good_probs[values]) - np.log(bad_probs[values])
+            for candidate, value in zip(candidates, values):
+                candidate[name] = int(value)
+            continue
+
+        good_bandwidths = _get_bandwidths(good_values)
+        centers = rng.integers(len(good_values), size=num_candidates)
+        values = np.clip(
+            good_values[centers] + rng.normal(0.0, 1.0, num_candidates) * good_bandwidths[centers],
+            0.0,
+            1.0,
+        )
+        log_ratios += (
+            np.log(_parzen_density(values, good_values, good_bandwidths))
+            - np.log(_parzen_density(values, bad_values, _get_bandwidths(bad_values)))
+        )
+        for candidate, value in zip(candidates, values):
+            candidate[name] = float(value)
+    return candidates[int(np.argmax(log_ratios))]
+
+
+# The objective of the running `tune`, inherited by the forked workers
+# instead of being pickled to them.
+_tune_objective = None
+
+
+def _evaluate_trial(params: dict[str, Any], resource: Optional[float]) -> tuple[float, float]:
+    start_time = time.time()
+    if resource is None:
+        score = _tune_objective(params)
+    else:
+        score = _tune_objective(params, resource)
+    return float(score), time.time() - start_time
+
+
+def tune(
+    objective: Callable[..., float],
+    space: dict[str, Any],
+    lower: bool = True,
+    budget: Optional[float] = None,
+    max_trials: Optional[int] = None,
+    max_resource: Optional[float] = None,
+    min_resource: Optional[float] = None,
+    eta: int = 3,
+    num_startup_trials: int = 8,
+    n_jobs: Optional[int] = None,
+    seed: int = 42,
+) -> dict[str, Any]:
+    """Searches hyperparameters with TPE and ASHA early stopping, within a time budget.
+
+    The first configurations are sampled at random, the next ones with a
+    tree-structured Parzen estimator fitted on the scores so far. With
+    `max_resource`, every configuration is first evaluated with
+    `min_resource` (e.g. boosting rounds or epochs), and only the best
+    `1 / eta` of every rung is evaluated again with `eta` times the resource,
+    up to `max_resource`. The trials run in `n_jobs` forked processes sharing
+    the CPU slots of the code. The result is printed and saved with the
+    models of the solution, for the agents refining it.
+
+    Args:
+        objective: Called as `objective(params)`, or
+            `objective(params, resource)` with `max_resource`, and returns
+            the validation score of the parameters.
+        space: Maps the hyperparameters to `uniform`, `loguniform`,
+            `randint` or `choice`; other values are passed unchanged.
+        lower: Whether a lower score is better.
+        budget: The seconds the search may take, by default half of the time
+            left to the code, or 5 minutes.
+        max_trials: The maximum number of configurations to try.
+        max_resource: The resource of the last rung, None to evaluate every
+            configuration once.
+        min_resource: The resource of the first rung, by default
+            `max_resource / eta ** 2`.
+        eta: The reduction factor between the rungs.
+        num_startup_trials: The configurations sampled at random first.
+        n_jobs: The trials run at once, by default the CPU slots of the code.
+        seed: The seed of the sampler.
+
+    Returns:
+        A dict with the `best_params`, their `best_score` and
+        `best_resource`, the `num_trials` configurations tried, and every
+        evaluation in `trials`.
+    """
+    global _tune_objective
+    start_time = time.time()
+    if budget is None:
+        time_left = get_time_left()
+        budget = 0.5 * time_left if time_left is not None else 300.0
+    if max_resource is None:
+        resources = [None]
+    else:
+        if min_resource is None:
+            min_resource = max_resource / eta ** 2
+        resources = [max_resource]
+        while resources[0] / eta >= min_resource * (1 - 1e-9):
+            resources.insert(0, resources[0] / eta)
+        if isinstance(max_resource, int):
+            resources = [max(1, int(round(resource))) for resource in resources]
+    sign = 1.0 if lower else -1.0
+    rng = np.random.default_rng(seed)
+    cpu_slots = mle_cv.get_cpu_slots()
+    n_jobs = max(1, n_jobs or cpu_slots)
+    configs = []  # The points of the configurations, in the unit cube.
+    scores = []  # The score of every configuration at every rung.
+    promoted = set()  # (config, rung) already run at the next rung.
+    trials = []
+    running = {}
+    errors = []
+
+    def next_job() -> Optional[tuple[int, int]]:
+        for rung in range(len(resources) - 2, -1, -1):
+            finished = [
+                (sign * rung_scores[rung], config) for config, rung_scores in enumerate(scores)
+                if rung in rung_scores
+            ]
+            finished.sort()
+            for _, config in finished[:len(finished) // eta]:
+                if (config, rung) not in promoted:
+                    promoted.add((config, rung))
+                    return config, rung + 1
+        if max_trials is not None and len(configs) >= max_trials:
+            return None
+        completed = [
+            (sign * rung_scores[0], config) for config, rung_scores in enumerate(scores)
+            if 0 in rung_scores
+        ]
+        if len(completed) < num_startup_trials:
+            point = _sample_random(space, rng)
+        else:
+            completed.sort()
+            num_good = max(1, int(math.ceil(0.25 * len(completed))))
+            point = _sample_tpe(
+                space,
+                [configs[config] for _, config in completed[:num_good]],
+                [configs[config] for _, config in completed[num_good:]],
+                rng,
+            )
+        configs.append(point)
+        scores.append({})
+        return len(configs) - 1, 0
+
+    def record(config: int, rung: int, output: Any) -> None:
+        params = _to_params(space, configs[config])
+        trial = {"params": params, "resource": resources[rung]}
+        if isinstance(output, BaseException):
+            errors.append(output)
+            trial.update(score=None, time=None, error=repr(output))
+        else:
+            score, trial_time = output
+            if math.isfinite(score):
+                scores[config][rung] = score
+            trial.update(score=score, time=trial_time)
+        trials.append(trial)
+
+    _tune_objective = objective
+    pool = None
+    try:
+        if "fork" in multiprocessing.get_all_start_methods():
+            pool = multiprocessing.get_context("fork").Pool(
+                n_jobs, initializer=mle_cv._limit_threads, initargs=(max(1, cpu_slots // n_jobs),)
+            )
+        while True:
+            out_of_time = time.time() - start_time >= budget
+            while not out_of_time and len(running) < (n_jobs if pool else 1):
+                job = next_job()
+                if job is None:
+                    break
+                config, rung = job
+                params = _to_params(space, configs[config])
+                if pool is None:
+                    try:
+                        output = _evaluate_trial(params, resources[rung])
+                    except Exception as e:
+                        output = e
+                    record(config, rung, output)
+                    out_of_time = time.time() - start_time >= budget
+                else:
+                    running[job] = pool.apply_async(_evaluate_trial, (params, resources[rung]))
+            if not running:
+                break
+            # Past the budget, the running trials are only awaited while no
+            # trial has a score.
+            if out_of_time and any(scores):
+                break
+            time.sleep(0.01)
+            for job, async_result in list(running.items()):
+                if async_result.ready():
+                    del running[job]
+                    try:
+                        output = async_result.get()
+                    except Exception as e:
+                        output = e
+                    record(*job, output)
+    finally:
+        _tune_objective = None
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    best = None
+    for rung in range(len(resources) - 1, -1, -1):
+        finished = [(sign * rung_scores[rung], config) for config, rung_scores in enumerate(scores) if rung in rung_scores]
+        if finished:
+            best = (rung, min(finished)[1])
+            break
+    if best is None:
+        if errors:
+            raise RuntimeError("Every trial of the hyperparameter search failed.") from errors[0]
+        raise RuntimeError("The hyperparameter search ran no trial within its budget.")
+    rung, config = best
+    result = {
+        "best_params": _to_params(space, configs[config]),
+        "best_score": scores[config][rung],
+        "best_resource": resources[rung],
+        "lower": lower,
+        "num_trials": len(configs),
+        "num_evaluations": len(trials),
+        "elapsed": time.time() - start_time,
+        "trials": trials,
+    }
+    print(f"Best hyperparameters: {json.dumps(result['best_params'], default=str)}")
+    print(f"Best hyperparameter search score: {result['best_score']}"
+          f" ({result['num_trials']} configurations, {result['num_evaluations']} evaluations)")
+    output_dir = mle_models.get_artifact_dir()
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, TUNE_RESULT)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, default=str)
+        os.replace(tmp_path, path)
+    return result
+
+
+def load_tune_result(
+    solution_hash: Optional[str] = None,
+    artifact_dir: Optional[str] = None,
+) -> Optional[dict[str, Any]]:
+    """Loads the result of the hyperparameter search of a solution, None without one."""
+    output_dir = mle_models.get_artifact_dir(solution_hash, artifact_dir)
+    path = os.path.join(output_dir, TUNE_RESULT) if output_dir else ""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
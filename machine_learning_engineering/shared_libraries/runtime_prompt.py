@@ -0,0 +1,30 @@
+"""Defines the prompts describing the `mle_runtime` helpers to the agents.
+
+The prompts are appended to the instructions of the agents writing code, which
+are formatted afterwards, so literal braces are doubled.
+"""
+
+SAVE_PREDICTIONS_INSTR = """
+- The `mle_runtime` module is always importable; do not implement or install it.
+- Right after computing the validation performance, save the validation predictions with `mle_runtime.save_predictions("val", val_predictions, index=val_index, target=y_val)`, where `val_predictions` are the predicted values (regression) or class probabilities (classification) as a numeric array, `val_index` identifies the validation rows in the training data (e.g. the DataFrame index) and `y_val` are their numeric target values.
+- If test data is provided, also predict the test samples with the trained model and save them with `mle_runtime.save_predictions("test", test_predictions)`, in the order of the test file. Never use the test data for training."""
+
+SAVE_MODELS_INSTR = """
+- After training, save every fitted model or pipeline used for the predictions with `mle_runtime.save_model(model, name)`, using a distinct short `name` per model (e.g. `"model"` or `"model_fold0"`), so that the test predictions can be made later without training again."""
+
+RUN_CV_INSTR = """
+- If the code uses K-fold cross-validation, train the folds in parallel with `cv = mle_runtime.run_cv(train_fold, X, y, splits, X_test=X_test, metric=metric)` instead of a loop over the folds, where `train_fold(X_train, y_train, X_valid, y_valid, X_test)` is a function defined at the top level that trains the model of one fold and returns `(valid_predictions, test_predictions)`, `splits` is the list of `(train_index, valid_index)` positional indices (e.g. `list(KFold(n_splits=5, shuffle=True, random_state=42).split(X))`) and `metric` is one of `rmse`, `mse`, `mae`, `rmsle`, `r2`, `accuracy`, `logloss` or `auc`, or None. It returns a dict with the out-of-fold predictions `cv["oof"]`, the test predictions averaged over the folds `cv["test"]`, the `cv["fold_scores"]` and the overall `cv["score"]`.
+- Inside `train_fold`, set the number of threads of the model (e.g. `n_jobs`, `num_threads` or `thread_count`) to `mle_runtime.get_cpu_slots()`."""
+
+TUNE_INSTR = """
+- To tune hyperparameters, do not write a hand-picked grid. Define `objective(params, resource)`, a function at the top level that trains the model with `params` for `resource` boosting rounds or epochs and returns its validation score, and call `result = mle_runtime.tune(objective, space, lower=lower, max_resource=max_rounds)`, where `space` maps every hyperparameter to `mle_runtime.uniform(low, high)`, `mle_runtime.loguniform(low, high)`, `mle_runtime.randint(low, high)` or `mle_runtime.choice(options)`, and `lower` is whether a lower score is better. It runs a TPE search with early stopping of the poor configurations in parallel processes within half of the time left to the code (or `budget` seconds). Then train the final model with `result["best_params"]` and `result["best_resource"]`."""
+
+LOG_METRICS_INSTR = """
+- Report the final validation performance with `mle_runtime.log_validation_score(score)`, which also prints the 'Final Validation Performance' line.
+- Wrap the main stages of the code (e.g. data loading, feature engineering and training) in `with mle_runtime.timed("<stage>"):` to log their time."""
+
+ABLATION_METRICS_INSTR = """
+- For each ablation, also log its performance with `mle_runtime.log_metric("ablation_score", score, variant="<short description of the modification>")`."""
+
+KEEP_RUNTIME_INSTR = """
+- Keep the calls to `mle_runtime` in the code."""
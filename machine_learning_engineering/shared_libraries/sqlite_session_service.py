@@ -0,0 +1,622 @@
+"""SQLite-backed session service for long multi-task runs."""
+
+from typing import Any, Optional
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from google.adk.events import event as event_module
+from google.adk.sessions import base_session_service
+from google.adk.sessions import session as session_module
+from google.adk.sessions import state as state_module
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    create_time REAL NOT NULL,
+    update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, session_id)
+);
+CREATE TABLE IF NOT EXISTS session_states (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id, session_id, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS user_states (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS app_states (
+    app_name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (app_name, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_by_session
+    ON events (app_name, user_id, session_id, seq);
+"""
+
+# Upper bound used to turn a key prefix into an index range scan.
+_PREFIX_UPPER_BOUND = "\U0010ffff"
+# The state values kept in memory by a session by default.
+DEFAULT_MAX_CACHED_VALUES = 128
+
+
+def _json_default(value: Any) -> Any:
+    """Converts NumPy scalars and arrays into JSON-serializable values."""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable.")
+
+
+def _encode(value: Any) -> str:
+    """Encodes a state value."""
+    return json.dumps(value, default=_json_default)
+
+
+def _split_scope(key: str) -> tuple[str, str]:
+    """Splits a state key into its storage scope and the key within it."""
+    if key.startswith(state_module.State.APP_PREFIX):
+        return "app", key[len(state_module.State.APP_PREFIX):]
+    if key.startswith(state_module.State.USER_PREFIX):
+        return "user", key[len(state_module.State.USER_PREFIX):]
+    if key.startswith(state_module.State.TEMP_PREFIX):
+        return "temp", key
+    return "session", key
+
+
+class LazySessionState(dict):
+    """A session state dict that loads values from SQLite on first access.
+
+    Values read or written are kept in the dict itself, up to
+    `max_cached_values` of them. Beyond that, the least recently used value
+    is evicted, and written back first if it was mutated in place. The other
+    values mutated in place, e.g. a list appended to, are written back by
+    `SqliteSessionService.append_event`. Everything else stays on disk until
+    it is asked for.
+    """
+
+    def __init__(
+        self,
+        service: "SqliteSessionService",
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        max_cached_values: int = DEFAULT_MAX_CACHED_VALUES,
+    ):
+        super().__init__()
+        self._service = service
+        self._app_name = app_name
+        self._user_id = user_id
+        self._session_id = session_id
+        self._max_cached_values = max_cached_values
+        self._missing: set[str] = set()
+        self._all_keys: Optional[set[str]] = None
+        # The cached keys from the least to the most recently used, with the
+        # hash of their stored value, None for the values written in memory.
+        self._stored_hashes: collections.OrderedDict[str, Optional[int]] = (
+            collections.OrderedDict()
+        )
+
+    def _cache(self, key: str, value: Any, stored_hash: Optional[int]) -> None:
+        """Caches a value, evicting the least recently used ones."""
+        dict.__setitem__(self, key, value)
+        self._stored_hashes[key] = stored_hash
+        self._stored_hashes.move_to_end(key)
+        evictable_keys = [
+            cached_key for cached_key in self._stored_hashes
+            if cached_key != key and _split_scope(cached_key)[0] != "temp"
+        ]
+        for evicted_key in evictable_keys[:len(self._stored_hashes) - self._max_cached_values]:
+            self._evict(evicted_key)
+
+    def _evict(self, key: str) -> None:
+        """Drops a value from memory, writing it back if it changed."""
+        value = dict.pop(self, key)
+        stored_hash = self._stored_hashes.pop(key)
+        encoded = _encode(value)
+        if hash(encoded) != stored_hash:
+            self._service.write_state_value(
+                app_name=self._app_name,
+                user_id=self._user_id,
+                session_id=self._session_id,
+                key=key,
+                encoded=encoded,
+            )
+
+    def pop_changed_values(self) -> dict[str, str]:
+        """Gets the encoded cached values changed since they were stored, and marks them stored."""
+        changed = {}
+        for key, stored_hash in self._stored_hashes.items():
+            if _split_scope(key)[0] == "temp":
+                continue
+            encoded = _encode(dict.__getitem__(self, key))
+            if hash(encoded) != stored_hash:
+                changed[key] = encoded
+                self._stored_hashes[key] = hash(encoded)
+        return changed
+
+    def _load(self, key: str) -> bool:
+        """Loads a single key into the cache, returning whether it exists."""
+        if dict.__contains__(self, key):
+            self._stored_hashes.move_to_end(key)
+            return True
+        if key in self._missing or (self._all_keys is not None and key not in self._all_keys):
+            return False
+        encoded = self._service.read_state_value(
+            app_name=self._app_name,
+            user_id=self._user_id,
+            session_id=self._session_id,
+            key=key,
+        )
+        if encoded is None:
+            self._missing.add(key)
+            return False
+        self._cache(key, json.loads(encoded), hash(encoded))
+        return True
+
+    def _keys(self) -> list[str]:
+        """Returns every key of the state, cached or not."""
+        if self._all_keys is None:
+            self._all_keys = set(
+                self._service.list_state_keys(
+                    app_name=self._app_name,
+                    user_id=self._user_id,
+                    session_id=self._session_id,
+                )
+            )
+        self._all_keys.update(dict.keys(self))
+        return sorted(self._all_keys)
+
+    def __getitem__(self, key: str) -> Any:
+        if not self._load(key):
+            raise KeyError(key)
+        return dict.__getitem__(self, key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._cache(key, value, None)
+        self._missing.discard(key)
+        if self._all_keys is not None:
+            self._all_keys.add(key)
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self._load(key)
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self) -> int:
+        return len(self._keys())
+
+    def __repr__(self) -> str:
+        return f"LazySessionState(session_id={self._session_id!r}, cached={dict.__len__(self)})"
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self:
+            return self[key]
+        return default
+
+    def keys(self) -> list[str]:
+        return self._keys()
+
+    def values(self) -> list[Any]:
+        return [self[key] for key in self._keys()]
+
+    def items(self) -> list[tuple[str, Any]]:
+        return [(key, self[key]) for key in self._keys()]
+
+    def update(self, *args, **kwargs) -> None:
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def copy(self) -> dict[str, Any]:
+        return dict(self.items())
+
+    def with_prefix(self, prefix: str) -> dict[str, Any]:
+        """Returns all the state entries whose key starts with the prefix."""
+        values = self._service.get_state_with_prefix(
+            app_name=self._app_name,
+            user_id=self._user_id,
+            session_id=self._session_id,
+            prefix=prefix,
+        )
+        # The values are returned but not cached, a prefix may match many.
+        for key in dict.keys(self):
+            if key.startswith(prefix):
+                values[key] = dict.__getitem__(self, key)
+        return dict(sorted(values.items()))
+
+
+class SqliteSessionService(base_session_service.BaseSessionService):
+    """A session service that persists sessions into a local SQLite file.
+
+    State keys are stored one row per key, so a single entry (or every entry
+    sharing a prefix, e.g. `train_code_exec_result_`) can be looked up without
+    loading the whole state. The state delta of each event is written in a
+    single transaction together with the event itself. The stored events do
+    not repeat their state delta, so loading the events of a session does not
+    load its state.
+    """
+
+    def __init__(self, db_path: str, max_cached_values: int = DEFAULT_MAX_CACHED_VALUES):
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        self.db_path = db_path
+        self.max_cached_values = max_cached_values
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+        self._connection.commit()
+
+    def close(self) -> None:
+        """Closes the underlying database connection."""
+        with self._lock:
+            self._connection.close()
+
+    def _write_state(
+        self,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        state: dict[str, Any],
+    ) -> None:
+        """Writes state entries; must be called inside a transaction."""
+        self._write_encoded_state(
+            app_name,
+            user_id,
+            session_id,
+            {
+                key: _encode(value)
+                for key, value in state.items()
+                if _split_scope(key)[0] != "temp"
+            },
+        )
+
+    def _write_encoded_state(
+        self,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        encoded_state: dict[str, str],
+    ) -> None:
+        """Writes encoded state entries; must be called inside a transaction."""
+        session_rows, user_rows, app_rows = [], [], []
+        for key, encoded in encoded_state.items():
+            scope, scoped_key = _split_scope(key)
+            if scope == "temp":
+                continue
+            if scope == "app":
+                app_rows.append((app_name, scoped_key, encoded))
+            elif scope == "user":
+                user_rows.append((app_name, user_id, scoped_key, encoded))
+            else:
+                session_rows.append((app_name, user_id, session_id, scoped_key, encoded))
+        if session_rows:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO session_states VALUES (?, ?, ?, ?, ?)",
+                session_rows,
+            )
+        if user_rows:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO user_states VALUES (?, ?, ?, ?)",
+                user_rows,
+            )
+        if app_rows:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO app_states VALUES (?, ?, ?)",
+                app_rows,
+            )
+
+    def _session_exists(self, app_name: str, user_id: str, session_id: str) -> bool:
+        """Checks whether the session exists."""
+        row = self._connection.execute(
+            "SELECT 1 FROM sessions WHERE app_name = ? AND user_id = ? AND session_id = ?",
+            (app_name, user_id, session_id),
+        ).fetchone()
+        return row is not None
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> session_module.Session:
+        session_id = (
+            session_id.strip()
+            if session_id and session_id.strip()
+            else str(uuid.uuid4())
+        )
+        now = time.time()
+        with self._lock, self._connection:
+            if self._session_exists(app_name, user_id, session_id):
+                raise ValueError(f"Session {session_id} already exists.")
+            self._connection.execute(
+                "INSERT INTO sessions VALUES (?, ?, ?, ?, ?)",
+                (app_name, user_id, session_id, now, now),
+            )
+            self._write_state(app_name, user_id, session_id, state or {})
+        session = session_module.Session(
+            app_name=app_name,
+            user_id=user_id,
+            id=session_id,
+            last_update_time=now,
+        )
+        session.state = LazySessionState(
+            self, app_name, user_id, session_id, self.max_cached_values
+        )
+        return session
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[base_session_service.GetSessionConfig] = None,
+    ) -> Optional[session_module.Session]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT update_time FROM sessions"
+                " WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                (app_name, user_id, session_id),
+            ).fetchone()
+            if row is None:
+                return None
+            query = (
+                "SELECT data FROM events"
+                " WHERE app_name = ? AND user_id = ? AND session_id = ?"
+            )
+            params: list[Any] = [app_name, user_id, session_id]
+            if config and config.after_timestamp:
+                query += " AND timestamp >= ?"
+                params.append(config.after_timestamp)
+            query += " ORDER BY seq DESC"
+            if config and config.num_recent_events:
+                query += " LIMIT ?"
+                params.append(config.num_recent_events)
+            event_rows = self._connection.execute(query, params).fetchall()
+        events = [
+            event_module.Event.model_validate_json(data)
+            for (data,) in reversed(event_rows)
+        ]
+        session = session_module.Session(
+            app_name=app_name,
+            user_id=user_id,
+            id=session_id,
+            events=events,
+            last_update_time=row[0],
+        )
+        session.state = LazySessionState(
+            self, app_name, user_id, session_id, self.max_cached_values
+        )
+        return session
+
+    async def list_sessions(
+        self, *, app_name: str, user_id: str
+    ) -> base_session_service.ListSessionsResponse:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT session_id, update_time FROM sessions"
+                " WHERE app_name = ? AND user_id = ? ORDER BY create_time",
+                (app_name, user_id),
+            ).fetchall()
+        sessions = [
+            session_module.Session(
+                app_name=app_name,
+                user_id=user_id,
+                id=session_id,
+                last_update_time=update_time,
+            )
+            for session_id, update_time in rows
+        ]
+        return base_session_service.ListSessionsResponse(sessions=sessions)
+
+    async def delete_session(
+        self, *, app_name: str, user_id: str, session_id: str
+    ) -> None:
+        key = (app_name, user_id, session_id)
+        where = "WHERE app_name = ? AND user_id = ? AND session_id = ?"
+        with self._lock, self._connection:
+            self._connection.execute(f"DELETE FROM events {where}", key)
+            self._connection.execute(f"DELETE FROM session_states {where}", key)
+            self._connection.execute(f"DELETE FROM sessions {where}", key)
+
+    async def append_event(
+        self,
+        session: session_module.Session,
+        event: event_module.Event,
+    ) -> event_module.Event:
+        if event.partial:
+            return event
+        await super().append_event(session=session, event=event)
+        session.last_update_time = event.timestamp
+        state_delta = {}
+        if event.actions and event.actions.state_delta:
+            state_delta = event.actions.state_delta
+        # The values of the delta, and the cached values mutated in place
+        # without a delta, e.g. `state["ensemble_plans"].append(plan)`.
+        changed_values = {}
+        if isinstance(session.state, LazySessionState):
+            changed_values = session.state.pop_changed_values()
+        with self._lock, self._connection:
+            self._write_state(session.app_name, session.user_id, session.id, {
+                key: value for key, value in state_delta.items() if key not in changed_values
+            })
+            self._write_encoded_state(
+                session.app_name, session.user_id, session.id, changed_values
+            )
+            self._connection.execute(
+                "INSERT INTO events (app_name, user_id, session_id, timestamp, data)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (
+                    session.app_name,
+                    session.user_id,
+                    session.id,
+                    event.timestamp,
+                    # The state delta is already in the state tables.
+                    event.model_dump_json(
+                        exclude_none=True, exclude={"actions": {"state_delta"}}
+                    ),
+                ),
+            )
+            self._connection.execute(
+                "UPDATE sessions SET update_time = ?"
+                " WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                (event.timestamp, session.app_name, session.user_id, session.id),
+            )
+        return event
+
+    def read_state_value(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        key: str,
+    ) -> Optional[str]:
+        """Reads a single encoded state value, None if it was not found."""
+        scope, scoped_key = _split_scope(key)
+        if scope == "temp":
+            return None
+        if scope == "app":
+            query = "SELECT value FROM app_states WHERE app_name = ? AND key = ?"
+            params = (app_name, scoped_key)
+        elif scope == "user":
+            query = "SELECT value FROM user_states WHERE app_name = ? AND user_id = ? AND key = ?"
+            params = (app_name, user_id, scoped_key)
+        else:
+            query = (
+                "SELECT value FROM session_states"
+                " WHERE app_name = ? AND user_id = ? AND session_id = ? AND key = ?"
+            )
+            params = (app_name, user_id, session_id, scoped_key)
+        with self._lock:
+            row = self._connection.execute(query, params).fetchone()
+        return None if row is None else row[0]
+
+    def write_state_value(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        key: str,
+        encoded: str,
+    ) -> None:
+        """Writes a single encoded state value."""
+        scope, scoped_key = _split_scope(key)
+        if scope == "temp":
+            return
+        if scope == "app":
+            query = "INSERT OR REPLACE INTO app_states VALUES (?, ?, ?)"
+            params = (app_name, scoped_key, encoded)
+        elif scope == "user":
+            query = "INSERT OR REPLACE INTO user_states VALUES (?, ?, ?, ?)"
+            params = (app_name, user_id, scoped_key, encoded)
+        else:
+            query = "INSERT OR REPLACE INTO session_states VALUES (?, ?, ?, ?, ?)"
+            params = (app_name, user_id, session_id, scoped_key, encoded)
+        with self._lock, self._connection:
+            self._connection.execute(query, params)
+
+    def list_state_keys(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+    ) -> list[str]:
+        """Lists the state keys of a session, including app and user keys."""
+        with self._lock:
+            session_keys = self._connection.execute(
+                "SELECT key FROM session_states"
+                " WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                (app_name, user_id, session_id),
+            ).fetchall()
+            user_keys = self._connection.execute(
+                "SELECT key FROM user_states WHERE app_name = ? AND user_id = ?",
+                (app_name, user_id),
+            ).fetchall()
+            app_keys = self._connection.execute(
+                "SELECT key FROM app_states WHERE app_name = ?",
+                (app_name,),
+            ).fetchall()
+        keys = [key for (key,) in session_keys]
+        keys.extend(state_module.State.USER_PREFIX + key for (key,) in user_keys)
+        keys.extend(state_module.State.APP_PREFIX + key for (key,) in app_keys)
+        return keys
+
+    def get_state_with_prefix(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        prefix: str,
+    ) -> dict[str, Any]:
+        """Gets all the state entries whose key starts with the prefix.
+
+        The lookup is a range scan on the primary key index, e.g. every
+        `train_code_exec_result_` entry of a session without touching the rest.
+        """
+        scope, scoped_prefix = _split_scope(prefix)
+        if scope == "temp":
+            return {}
+        bounds = (scoped_prefix, scoped_prefix + _PREFIX_UPPER_BOUND)
+        if scope == "app":
+            query = (
+                "SELECT key, value FROM app_states"
+                " WHERE app_name = ? AND key >= ? AND key < ?"
+            )
+            params = (app_name, *bounds)
+            key_prefix = state_module.State.APP_PREFIX
+        elif scope == "user":
+            query = (
+                "SELECT key, value FROM user_states"
+                " WHERE app_name = ? AND user_id = ? AND key >= ? AND key < ?"
+            )
+            params = (app_name, user_id, *bounds)
+            key_prefix = state_module.State.USER_PREFIX
+        else:
+            query = (
+                "SELECT key, value FROM session_states"
+                " WHERE app_name = ? AND user_id = ? AND session_id = ?"
+                " AND key >= ? AND key < ?"
+            )
+            params = (app_name, user_id, session_id, *bounds)
+            key_prefix = ""
+        with self._lock:
+            rows = self._connection.execute(query, params).fetchall()
+        return {key_prefix + key: json.loads(value) for key, value in rows}
@@ -0,0 +1,105 @@
+"""Utility functions for the timeouts of the code executions.
+
+The timeout of a code is learned from its lineage: the previous versions of the
+same solution that already ran. It is `exec_timeout_multiplier` times their
+execution time, clamped between `min_exec_timeout` and `exec_timeout`. Codes
+without a lineage, such as the first evaluation of a model, get `exec_timeout`.
+"""
+
+from typing import Any, Mapping, Optional
+
+from machine_learning_engineering.shared_libraries import config
+
+
+# An ablation study runs the solution once and 1-2 variations of it.
+ABLATION_NUM_RUNS = 3
+
+
+def _get_execution_time(exec_result: Any) -> Optional[float]:
+    """Gets the execution time of a successful execution."""
+    if not isinstance(exec_result, Mapping) or exec_result.get("returncode", 1) != 0:
+        return None
+    return exec_result.get("execution_time")
+
+
+def _sum_execution_times(exec_results: list[Any]) -> Optional[float]:
+    """Sums the known execution times, None if none of them is known."""
+    execution_times = [
+        execution_time
+        for execution_time in map(_get_execution_time, exec_results)
+        if execution_time is not None
+    ]
+    if not execution_times:
+        return None
+    return sum(execution_times)
+
+
+def get_final_exec_results(state: Mapping[str, Any]) -> list[Any]:
+    """Gets the execution results of the refined solutions."""
+    num_solutions = state.get("num_solutions", config.CONFIG.num_solutions)
+    outer_loop_round = state.get("outer_loop_round", config.CONFIG.outer_loop_round)
+    return [
+        state.get(f"train_code_exec_result_{outer_loop_round}_{task_id}", {})
+        for task_id in range(1, num_solutions + 1)
+    ]
+
+
+def get_baseline_execution_time(
+    state: Mapping[str, Any],
+    agent_name: str,
+) -> Optional[float]:
+    """Gets the execution time expected for the code of the agent."""
+    if agent_name.startswith("model_eval"):
+        return None
+    elif agent_name.startswith("merger"):
+        reference_idx = int(agent_name.split("_")[-1])
+        task_id = agent_name.split("_")[-2]
+        best_idx = state.get(f"best_idx_{task_id}", 0)
+        exec_results = [state.get(f"merger_code_exec_result_{task_id}_{best_idx}", {})]
+        performance_results = state.get(f"performance_results_{task_id}", [])
+        if reference_idx < len(performance_results):
+            exec_results.append(performance_results[reference_idx][2])
+        return _sum_execution_times(exec_results)
+    elif agent_name.startswith("check_data_use"):
+        task_id = agent_name.split("_")[-1]
+        return _sum_execution_times([state.get(f"train_code_exec_result_0_{task_id}", {})])
+    elif agent_name.startswith("ablation"):
+        task_id = agent_name.split("_")[-1]
+        step = state.get(f"refine_step_{task_id}", 0)
+        execution_time = _sum_execution_times(
+            [state.get(f"train_code_exec_result_{step}_{task_id}", {})]
+        )
+        if execution_time is None:
+            return None
+        return execution_time * ABLATION_NUM_RUNS
+    elif agent_name.startswith("plan_implement"):
+        task_id = agent_name.split("_")[-1]
+        step = state.get(f"refine_step_{task_id}", 0)
+        return _sum_execution_times([state.get(f"train_code_exec_result_{step}_{task_id}", {})])
+    elif agent_name.startswith("ensemble_plan_implement"):
+        return _sum_execution_times(get_final_exec_results(state))
+    elif agent_name.startswith("submission"):
+        ensemble_loop_round = state.get("ensemble_loop_round", config.CONFIG.ensemble_loop_round)
+        execution_times = [
+            _get_execution_time(exec_result)
+            for exec_result in get_final_exec_results(state) + [
+                state.get(f"ensemble_code_exec_result_{ensemble_iter}", {})
+                for ensemble_iter in [*range(ensemble_loop_round + 1), "numeric"]
+            ]
+        ]
+        execution_times = [t for t in execution_times if t is not None]
+        return max(execution_times) if execution_times else None
+    raise ValueError(f"Unexpected agent name: {agent_name}.")
+
+
+def get_adaptive_exec_timeout(state: Mapping[str, Any], agent_name: str) -> int:
+    """Gets the timeout of a code from the execution time of its lineage."""
+    exec_timeout = state.get("exec_timeout", config.CONFIG.exec_timeout)
+    multiplier = state.get("exec_timeout_multiplier", config.CONFIG.exec_timeout_multiplier)
+    if multiplier <= 0:
+        return exec_timeout
+    baseline = get_baseline_execution_time(state, agent_name)
+    if baseline is None:
+        return exec_timeout
+    min_exec_timeout = state.get("min_exec_timeout", config.CONFIG.min_exec_timeout)
+    return int(min(exec_timeout, max(min_exec_timeout, baseline * multiplier)))
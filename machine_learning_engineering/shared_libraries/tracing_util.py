@@ -0,0 +1,303 @@
+"""Hierarchical tracing of the agent tree into local Chrome trace files.
+
+ADK already opens an OpenTelemetry span around every agent invocation
+(`agent_run [plan_implement_agent_2]`), every model call (`call_llm`, with
+the request and the response) and every tool call, and `code_util` opens one
+around every code it runs (`run_python_code`). With `use_tracing`, a span
+processor is added to the tracer provider, and the ended spans of a session
+are appended to `<workspace_dir>/<task_name>/traces/<time>_<trace id>.json`
+in the Chrome trace event format, which `chrome://tracing` and
+https://ui.perfetto.dev show as a timeline. No collector is needed.
+
+The spans nest by time on one lane (a `tid` of the trace) per branch: a span
+runs on the lane of its parent, unless a sibling still running is already
+there, as for the sub-agents of a `ParallelAgent`, in which case it gets a
+free lane. The model calls get their prompt and response token counts, the
+agents their kind (`sequential`, `loop`, `parallel` or `llm`), and every
+event the ids of its span and of the parent span, from which
+`trace_report` rebuilds the dependency graph of the run.
+"""
+
+from typing import Any, Mapping, Optional
+import collections
+import json
+import os
+import threading
+import time
+
+from opentelemetry import context as context_module
+from opentelemetry import trace
+from opentelemetry.sdk import trace as sdk_trace
+
+
+TRACE_DIR = "traces"
+# Attributes longer than this, e.g. the whole requests and responses of the
+# model calls, are left out of the trace.
+MAX_ATTRIBUTE_LENGTH = 200
+AGENT_SPAN_PREFIX = "agent_run ["
+LLM_RESPONSE_ATTRIBUTE = "gcp.vertex.agent.llm_response"
+# Attributes always left out of the trace; the token counts are taken from the response.
+OMITTED_ATTRIBUTES = ("gcp.vertex.agent.llm_request", LLM_RESPONSE_ATTRIBUTE)
+# Token counts of the usage metadata of the model responses, by argument name.
+TOKEN_COUNT_FIELDS = {
+    "prompt_tokens": "prompt_token_count",
+    "response_tokens": "candidates_token_count",
+    "thoughts_tokens": "thoughts_token_count",
+    "cached_tokens": "cached_content_token_count",
+}
+
+_processor = None
+_processor_lock = threading.Lock()
+
+
+def get_span_category(name: str) -> str:
+    """Gets the category of a span from its name."""
+    if name.startswith(AGENT_SPAN_PREFIX):
+        return "agent"
+    if name == "call_llm":
+        return "llm"
+    if name.startswith("execute_tool"):
+        return "tool"
+    if name == "run_python_code":
+        return "code"
+    return "adk"
+
+
+def get_event_name(span_name: str) -> str:
+    """Gets the name of the event of a span, the agent name for the agent spans."""
+    if span_name.startswith(AGENT_SPAN_PREFIX) and span_name.endswith("]"):
+        return span_name[len(AGENT_SPAN_PREFIX):-1]
+    return span_name
+
+
+def get_agent_kind(agent: Any) -> str:
+    """Gets the kind of an agent from its class, e.g. `parallel` for a `ParallelAgent`."""
+    class_name = type(agent).__name__
+    if class_name.endswith("Agent") and class_name != "Agent":
+        return class_name[:-len("Agent")].lower()
+    return "llm"
+
+
+def get_token_counts(attributes: Mapping[str, Any]) -> dict[str, int]:
+    """Gets the token counts of a model call from the attributes of its span."""
+    try:
+        usage = json.loads(attributes.get(LLM_RESPONSE_ATTRIBUTE, "{}")).get("usage_metadata") or {}
+    except (TypeError, ValueError):
+        usage = {}
+    token_counts = {
+        name: usage[field]
+        for name, field in TOKEN_COUNT_FIELDS.items()
+        if isinstance(usage.get(field), int)
+    }
+    if "prompt_tokens" not in token_counts and "gen_ai.usage.input_tokens" in attributes:
+        token_counts["prompt_tokens"] = attributes["gen_ai.usage.input_tokens"]
+    return token_counts
+
+
+def load_trace(trace_path: str) -> list[dict[str, Any]]:
+    """Loads the events of a trace file, which may still be written to."""
+    with open(trace_path, "r", encoding="utf-8") as f:
+        text = f.read().strip()
+    if not text.endswith("]"):
+        text = text.rstrip(",") + "]"
+    return json.loads(text)
+
+
+class _TraceState:
+    """The lanes and the pending events of one trace."""
+
+    def __init__(self):
+        self.path = ""
+        self.pending = []
+        # The number of open spans on every lane.
+        self.open_spans = collections.Counter()
+        self.num_lanes = 0
+
+
+class ChromeTraceProcessor(sdk_trace.SpanProcessor):
+    """Appends the ended spans to the Chrome trace file of their session.
+
+    The events of a trace are kept in memory until `start_trace` gives the
+    trace its file, and dropped if it never does.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._traces: dict[int, _TraceState] = {}
+        # The name and lane of the open spans, and the lanes of their open
+        # children, by span id.
+        self._spans: dict[int, tuple[str, int]] = {}
+        self._children_lanes: dict[int, collections.Counter] = collections.defaultdict(
+            collections.Counter
+        )
+        # The kind of every agent of the registered agent graphs, by name.
+        self._agent_kinds: dict[str, str] = {}
+
+    def register_agents(self, root_agent: Any) -> None:
+        """Records the kinds of the agents of a graph, e.g. `parallel` or `loop`."""
+        agents_to_visit = [root_agent]
+        with self._lock:
+            while agents_to_visit:
+                agent = agents_to_visit.pop()
+                self._agent_kinds[agent.name] = get_agent_kind(agent)
+                agents_to_visit.extend(agent.sub_agents)
+
+    def _get_free_lane(self, trace_state: _TraceState, name: str) -> int:
+        for lane in range(trace_state.num_lanes):
+            if not trace_state.open_spans[lane]:
+                return lane
+        lane = trace_state.num_lanes
+        trace_state.num_lanes += 1
+        self._add_event(trace_state, {
+            "name": "thread_name",
+            "ph": "M",
+            "pid": os.getpid(),
+            "tid": lane,
+            "args": {"name": get_event_name(name)},
+        })
+        return lane
+
+    def on_start(
+        self,
+        span: sdk_trace.Span,
+        parent_context: Optional[context_module.Context] = None,
+    ) -> None:
+        trace_id = span.context.trace_id
+        with self._lock:
+            trace_state = self._traces.setdefault(trace_id, _TraceState())
+            parent = self._spans.get(span.parent.span_id) if span.parent else None
+            siblings = self._children_lanes[span.parent.span_id] if parent else None
+            if parent and not siblings[parent[1]]:
+                lane = parent[1]
+            else:
+                lane = self._get_free_lane(trace_state, span.name)
+            if parent:
+                siblings[lane] += 1
+            trace_state.open_spans[lane] += 1
+            self._spans[span.context.span_id] = (span.name, lane)
+
+    def on_end(self, span: sdk_trace.ReadableSpan) -> None:
+        trace_id = span.context.trace_id
+        with self._lock:
+            trace_state = self._traces.get(trace_id)
+            entry = self._spans.pop(span.context.span_id, None)
+            if trace_state is None or entry is None:
+                return
+            self._children_lanes.pop(span.context.span_id, None)
+            _, lane = entry
+            trace_state.open_spans[lane] -= 1
+            parent = self._spans.get(span.parent.span_id) if span.parent else None
+            if parent:
+                self._children_lanes[span.parent.span_id][lane] -= 1
+            attributes = dict(span.attributes or {})
+            args = {
+                key: value
+                for key, value in attributes.items()
+                if key not in OMITTED_ATTRIBUTES
+                and not (isinstance(value, str) and len(value) > MAX_ATTRIBUTE_LENGTH)
+            }
+            category = get_span_category(span.name)
+            if category == "llm":
+                args.update(get_token_counts(attributes))
+                if parent and get_span_category(parent[0]) == "agent":
+                    args["agent"] = get_event_name(parent[0])
+            elif category == "agent":
+                kind = self._agent_kinds.get(get_event_name(span.name))
+                if kind:
+                    args["kind"] = kind
+            args["span_id"] = f"{span.context.span_id:016x}"
+            if span.parent is not None:
+                args["parent_id"] = f"{span.parent.span_id:016x}"
+            if span.status.status_code == trace.StatusCode.ERROR:
+                args["error"] = span.status.description or "error"
+            self._add_event(trace_state, {
+                "name": get_event_name(span.name),
+                "cat": category,
+                "ph": "X",
+                "ts": span.start_time / 1000,
+                "dur": max(0, span.end_time - span.start_time) / 1000,
+                "pid": os.getpid(),
+                "tid": lane,
+                "args": args,
+            })
+            if span.parent is None:
+                # The root span of the session ended.
+                del self._traces[trace_id]
+
+    def _add_event(self, trace_state: _TraceState, event: dict[str, Any]) -> None:
+        if not trace_state.path:
+            trace_state.pending.append(event)
+            return
+        self._write_events(trace_state.path, [event])
+
+    @staticmethod
+    def _write_events(path: str, events: list[dict[str, Any]]) -> None:
+        # The closing bracket is optional in the Chrome trace format, so
+        # the file stays readable while it is written.
+        with open(path, "a", encoding="utf-8") as f:
+            if f.tell() == 0:
+                f.write("[\n")
+            f.write("".join(json.dumps(event) + ",\n" for event in events))
+
+    def set_trace_path(self, trace_id: int, path: str) -> None:
+        """Sets the file of a trace and writes its pending events."""
+        with self._lock:
+            trace_state = self._traces.get(trace_id)
+            if trace_state is None or trace_state.path:
+                return
+            trace_state.path = path
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._write_events(path, [{
+                "name": "process_name",
+                "ph": "M",
+                "pid": os.getpid(),
+                "args": {"name": os.path.splitext(os.path.basename(path))[0]},
+            }] + trace_state.pending)
+            trace_state.pending = []
+
+    def shutdown(self) -> None:
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+def install(root_agent: Any = None) -> ChromeTraceProcessor:
+    """Adds the trace processor to the tracer provider, once per process.
+
+    The kinds of the agents of `root_agent` and its sub-agents are recorded.
+    """
+    global _processor
+    with _processor_lock:
+        if _processor is None:
+            provider = trace.get_tracer_provider()
+            if not isinstance(provider, sdk_trace.TracerProvider):
+                provider = sdk_trace.TracerProvider()
+                trace.set_tracer_provider(provider)
+            _processor = ChromeTraceProcessor()
+            provider.add_span_processor(_processor)
+    if root_agent is not None:
+        _processor.register_agents(root_agent)
+    return _processor
+
+
+def get_trace_dir(state: Mapping[str, Any]) -> str:
+    """Gets the directory of the trace files of the task."""
+    workspace_dir = state.get("workspace_dir", "")
+    task_name = state.get("task_name", "")
+    return os.path.abspath(os.path.join(workspace_dir, task_name, TRACE_DIR))
+
+
+def start_trace(state: Any) -> None:
+    """Writes the trace of the current session to a file, with `use_tracing`."""
+    if not state.get("use_tracing", False) or _processor is None:
+        return
+    span_context = trace.get_current_span().get_span_context()
+    if not span_context.is_valid:
+        return
+    trace_id = f"{span_context.trace_id:032x}"
+    trace_path = os.path.join(
+        get_trace_dir(state), f"{time.strftime('%Y%m%d_%H%M%S')}_{trace_id[:8]}.json"
+    )
+    _processor.set_trace_path(span_context.trace_id, trace_path)
+    state["trace_path"] = trace_path
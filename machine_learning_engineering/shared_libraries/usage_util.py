@@ -0,0 +1,237 @@
+"""Accounting of the tokens, latency and cost of the model calls.
+
+Every LLM agent of the pipeline gets `start_model_call` as its last
+before-model callback, which only runs when the model is actually called,
+and `record_model_call` as its first after-model callback. The usage of every
+agent is kept in the state under `model_usage_<agent name>`, so that the
+branches of a parallel agent never write the same key, and at the end of
+`mle_pipeline_agent` it is aggregated by agent role into `model_usage`.
+
+The calls with the `google_search` tool are counted as grounded calls; the
+search itself runs on the side of the model and is billed with its call.
+"""
+
+from typing import Any, Optional
+import threading
+import time
+
+from google.adk.agents import callback_context as callback_context_module
+from google.adk.models import llm_request as llm_request_module
+from google.adk.models import llm_response as llm_response_module
+
+
+USAGE_KEY_PREFIX = "model_usage_"
+# Prices in USD per million input, output and cached input tokens. The
+# output price applies to the thinking tokens as well.
+MODEL_PRICES = {
+    "gemini-2.0-flash": (0.10, 0.40, 0.025),
+    "gemini-2.0-flash-lite": (0.075, 0.30, 0.01875),
+    "gemini-2.5-flash": (0.30, 2.50, 0.075),
+    "gemini-2.5-pro": (1.25, 10.00, 0.31),
+}
+# The roles of the agents, found in this order in their names.
+ROLE_INFIXES = ("bug_summary", "debug", "check_leakage", "refine_leakage")
+ROLE_PREFIXES = {
+    "task_summarization": "task_summarization",
+    "model_retriever": "model_retriever",
+    "model_eval": "model_eval",
+    "merger": "merger",
+    "check_data_use": "check_data_use",
+    "ablation": "ablation",
+    "init_plan": "plan_refine",
+    "plan_refine": "plan_refine",
+    "plan_implement": "plan_implement",
+    "init_ensemble_plan": "ensemble",
+    "ensemble": "ensemble",
+    "submission": "submission",
+}
+USAGE_FIELDS = (
+    "calls",
+    "retries",
+    "errors",
+    "grounded_calls",
+    "input_tokens",
+    "output_tokens",
+    "cached_tokens",
+    "thoughts_tokens",
+    "latency",
+)
+
+# The start times of the running model calls, by invocation and agent.
+_start_times: dict[tuple[str, str], float] = {}
+_start_times_lock = threading.Lock()
+
+
+def register_model_price(
+    model_prefix: str,
+    input_price: float,
+    output_price: float,
+    cached_price: Optional[float] = None,
+) -> None:
+    """Registers the prices in USD per million tokens of the models with a prefix."""
+    MODEL_PRICES[model_prefix] = (
+        input_price,
+        output_price,
+        input_price if cached_price is None else cached_price,
+    )
+
+
+def get_model_price(model: str) -> Optional[tuple[float, float, float]]:
+    """Gets the prices of a model from its longest registered prefix."""
+    model = model.split("/")[-1]
+    prefixes = [prefix for prefix in MODEL_PRICES if model.startswith(prefix)]
+    if not prefixes:
+        return None
+    return MODEL_PRICES[max(prefixes, key=len)]
+
+
+def get_role(agent_name: str) -> str:
+    """Gets the role of an agent from its name."""
+    for infix in ROLE_INFIXES:
+        if infix in agent_name:
+            return "leakage" if infix.endswith("leakage") else infix
+    for prefix, role in ROLE_PREFIXES.items():
+        if agent_name.startswith(prefix):
+            return role
+    return "other"
+
+
+def get_cost(usage: dict[str, Any]) -> Optional[float]:
+    """Gets the cost in USD of the usage of a model, None for unknown prices."""
+    prices = get_model_price(usage.get("model", ""))
+    if prices is None:
+        return None
+    input_price, output_price, cached_price = prices
+    cached_tokens = usage.get("cached_tokens", 0)
+    return (
+        (usage.get("input_tokens", 0) - cached_tokens) * input_price
+        + cached_tokens * cached_price
+        + (usage.get("output_tokens", 0) + usage.get("thoughts_tokens", 0)) * output_price
+    ) / 1e6
+
+
+def _get_call_key(callback_context: callback_context_module.CallbackContext) -> tuple[str, str]:
+    return callback_context.invocation_id, callback_context.agent_name
+
+
+def start_model_call(
+    callback_context: callback_context_module.CallbackContext,
+    llm_request: llm_request_module.LlmRequest,
+) -> Optional[llm_response_module.LlmResponse]:
+    """Records the start of a model call."""
+    with _start_times_lock:
+        _start_times[_get_call_key(callback_context)] = time.time()
+    key = USAGE_KEY_PREFIX + callback_context.agent_name
+    usage = dict(callback_context.state.get(key, {}))
+    usage["model"] = llm_request.model or usage.get("model", "")
+    callback_context.state[key] = usage
+    return None
+
+
+def record_model_call(
+    callback_context: callback_context_module.CallbackContext,
+    llm_response: llm_response_module.LlmResponse,
+) -> Optional[llm_response_module.LlmResponse]:
+    """Adds the tokens and the latency of a model call to the usage of its agent."""
+    with _start_times_lock:
+        start_time = _start_times.pop(_get_call_key(callback_context), None)
+    key = USAGE_KEY_PREFIX + callback_context.agent_name
+    usage = {field: 0 for field in USAGE_FIELDS}
+    usage.update(callback_context.state.get(key, {}))
+    if usage["calls"]:
+        # Another call of the same agent, e.g. by a retry or debug loop.
+        usage["retries"] += 1
+    usage["calls"] += 1
+    if llm_response.error_code:
+        usage["errors"] += 1
+    if llm_response.grounding_metadata:
+        usage["grounded_calls"] += 1
+    metadata = llm_response.usage_metadata
+    if metadata is not None:
+        usage["input_tokens"] += metadata.prompt_token_count or 0
+        usage["output_tokens"] += metadata.candidates_token_count or 0
+        usage["cached_tokens"] += metadata.cached_content_token_count or 0
+        usage["thoughts_tokens"] += metadata.thoughts_token_count or 0
+    if start_time is not None:
+        usage["latency"] += time.time() - start_time
+    callback_context.state[key] = usage
+    return None
+
+
+def _as_list(callback: Any) -> list[Any]:
+    if callback is None:
+        return []
+    return list(callback) if isinstance(callback, list) else [callback]
+
+
+def add_usage_callbacks(root_agent: Any) -> None:
+    """Adds the usage callbacks to every LLM agent of a graph."""
+    agents_to_visit = [root_agent]
+    while agents_to_visit:
+        agent = agents_to_visit.pop()
+        agents_to_visit.extend(agent.sub_agents)
+        if not hasattr(agent, "before_model_callback"):
+            continue
+        before_callbacks = _as_list(agent.before_model_callback)
+        after_callbacks = _as_list(agent.after_model_callback)
+        if start_model_call in before_callbacks:
+            continue
+        # A callback returning a response stops the ones after it: the start
+        # is only recorded for the calls no callback skipped, and the usage
+        # before any callback replaces the response.
+        agent.before_model_callback = before_callbacks + [start_model_call]
+        agent.after_model_callback = [record_model_call] + after_callbacks
+
+
+def summarize_usage(state: Any) -> dict[str, Any]:
+    """Aggregates the usage of the agents by role and in total."""
+    by_role = {}
+    total = {field: 0 for field in USAGE_FIELDS}
+    total["cost"] = 0.0
+    unpriced_models = set()
+    for key in list(state.to_dict() if hasattr(state, "to_dict") else state):
+        if not key.startswith(USAGE_KEY_PREFIX):
+            continue
+        usage = state.get(key, {})
+        if not usage.get("calls"):
+            continue
+        role = get_role(key[len(USAGE_KEY_PREFIX):])
+        role_usage = by_role.setdefault(role, {**{field: 0 for field in USAGE_FIELDS}, "cost": 0.0})
+        for field in USAGE_FIELDS:
+            role_usage[field] += usage.get(field, 0)
+            total[field] += usage.get(field, 0)
+        cost = get_cost(usage)
+        if cost is None:
+            unpriced_models.add(usage.get("model", ""))
+            continue
+        role_usage["cost"] += cost
+        total["cost"] += cost
+    return {
+        "by_role": dict(sorted(by_role.items(), key=lambda item: -item[1]["input_tokens"])),
+        "total": total,
+        "unpriced_models": sorted(unpriced_models),
+    }
+
+
+def format_usage(summary: dict[str, Any]) -> str:
+    """Formats the usage summary as a table."""
+    lines = [
+        f"{'role':<20}{'calls':>7}{'retries':>9}{'input':>12}{'cached':>12}{'output':>10}{'latency':>10}{'cost':>10}"
+    ]
+    for role, usage in list(summary["by_role"].items()) + [("total", summary["total"])]:
+        lines.append(
+            f"{role:<20}{usage['calls']:>7}{usage['retries']:>9}{usage['input_tokens']:>12}"
+            f"{usage['cached_tokens']:>12}{usage['output_tokens'] + usage['thoughts_tokens']:>10}"
+            f"{usage['latency']:>9.0f}s{usage['cost']:>9.3f}$"
+        )
+    if summary["unpriced_models"]:
+        lines.append("No prices for: " + ", ".join(summary["unpriced_models"]))
+    return "\n".join(lines)
+
+
+def save_usage_summary(callback_context: callback_context_module.CallbackContext) -> None:
+    """Stores the usage summary in the state as `model_usage` and prints it."""
+    summary = summarize_usage(callback_context.state)
+    callback_context.state["model_usage"] = summary
+    print("--- Model usage ---")
+    print(format_usage(summary))
@@ -0,0 +1,371 @@
+"""Job queue on a shared directory for running generated code on worker nodes.
+
+The controller puts jobs into `pending/`. Every worker daemon claims the oldest
+pending job by renaming it into `claimed/`, which is atomic on a POSIX
+filesystem, so exactly one worker wins each job and idle workers keep pulling
+from the shared backlog. While a job runs, the worker touches its lease; a
+lease that is not touched for `lease_timeout` seconds is moved back into
+`pending/` so that another worker picks it up, and the worker that lost it
+kills the code and drops its result. Results are written into `results/`,
+also the error of a job that failed in the worker. A job without a result by
+its deadline, e.g. because no worker is running, is removed from the queue and
+reported as timed out.
+
+The workspace of the task must be on storage shared by the controller and the
+workers, mounted at the same path.
+
+Usage:
+    python -m machine_learning_engineering.shared_libraries.work_queue \
+        --queue_dir /shared/mle_queue
+"""
+
+from typing import Any, Mapping, Optional
+import argparse
+import json
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+import uuid
+
+
+PENDING_DIR = "pending"
+CLAIMED_DIR = "claimed"
+RESULTS_DIR = "results"
+TMP_DIR = "tmp"
+
+
+class FileWorkQueue:
+    """Job queue stored in a directory."""
+
+    def __init__(self, queue_dir: str):
+        self.queue_dir = queue_dir
+        for sub_dir in (PENDING_DIR, CLAIMED_DIR, RESULTS_DIR, TMP_DIR):
+            os.makedirs(os.path.join(queue_dir, sub_dir), exist_ok=True)
+
+    def _path(self, sub_dir: str, filename: str) -> str:
+        return os.path.join(self.queue_dir, sub_dir, filename)
+
+    def _write_atomically(self, sub_dir: str, filename: str, content: dict[str, Any]) -> None:
+        """Writes a file that becomes visible only once it is complete."""
+        tmp_path = self._path(TMP_DIR, f"{uuid.uuid4().hex}_{filename}")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(content, f)
+        os.replace(tmp_path, self._path(sub_dir, filename))
+
+    def submit(self, job: dict[str, Any]) -> str:
+        """Enqueues a job and returns its id."""
+        job_id = f"{time.time_ns():020d}_{uuid.uuid4().hex[:8]}"
+        self._write_atomically(PENDING_DIR, f"{job_id}.json", job)
+        return job_id
+
+    def claim(self, worker_id: str) -> Optional[tuple[str, dict[str, Any]]]:
+        """Claims the oldest pending job."""
+        for filename in sorted(os.listdir(os.path.join(self.queue_dir, PENDING_DIR))):
+            if not filename.endswith(".json"):
+                continue
+            job_id = filename[:-len(".json")]
+            lease_path = self._path(CLAIMED_DIR, f"{job_id}.{worker_id}.json")
+            pending_path = self._path(PENDING_DIR, filename)
+            try:
+                # Touches the job first, so the new lease is not seen as stale.
+                os.utime(pending_path)
+                os.rename(pending_path, lease_path)
+            except FileNotFoundError:
+                # Another worker claimed the job first.
+                continue
+            with open(lease_path, "r", encoding="utf-8") as f:
+                return job_id, json.load(f)
+        return None
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """Renews the lease of a job, returns False if the lease was lost."""
+        try:
+            os.utime(self._path(CLAIMED_DIR, f"{job_id}.{worker_id}.json"))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def complete(self, job_id: str, worker_id: str, result_dict: dict[str, Any]) -> None:
+        """Writes the result of a job and releases its lease."""
+        if self.get_status(job_id) == "unknown":
+            # The job was cancelled while it ran.
+            return
+        self._write_atomically(RESULTS_DIR, f"{job_id}.json", result_dict)
+        try:
+            os.remove(self._path(CLAIMED_DIR, f"{job_id}.{worker_id}.json"))
+        except FileNotFoundError:
+            pass
+
+    def cancel(self, job_id: str) -> None:
+        """Removes a job from the queue, whether it is pending, claimed or done."""
+        paths = [
+            self._path(PENDING_DIR, f"{job_id}.json"),
+            self._path(RESULTS_DIR, f"{job_id}.json"),
+        ]
+        paths.extend(
+            self._path(CLAIMED_DIR, filename)
+            for filename in os.listdir(os.path.join(self.queue_dir, CLAIMED_DIR))
+            if filename.startswith(f"{job_id}.")
+        )
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def requeue_stale(self, lease_timeout: float) -> list[str]:
+        """Moves the jobs whose lease expired back into the pending jobs."""
+        requeued = []
+        now = time.time()
+        for filename in os.listdir(os.path.join(self.queue_dir, CLAIMED_DIR)):
+            lease_path = self._path(CLAIMED_DIR, filename)
+            try:
+                if now - os.path.getmtime(lease_path) < lease_timeout:
+                    continue
+                job_id = filename.split(".")[0]
+                os.rename(lease_path, self._path(PENDING_DIR, f"{job_id}.json"))
+            except FileNotFoundError:
+                continue
+            requeued.append(job_id)
+        return requeued
+
+    def get_status(self, job_id: str) -> str:
+        """Gets whether the job is `pending`, `claimed`, `done` or `unknown`."""
+        if os.path.exists(self._path(RESULTS_DIR, f"{job_id}.json")):
+            return "done"
+        if os.path.exists(self._path(PENDING_DIR, f"{job_id}.json")):
+            return "pending"
+        for filename in os.listdir(os.path.join(self.queue_dir, CLAIMED_DIR)):
+            if filename.startswith(f"{job_id}."):
+                return "claimed"
+        return "unknown"
+
+    def pop_result(self, job_id: str) -> Optional[dict[str, Any]]:
+        """Reads and removes the result of a job if it is available."""
+        result_path = self._path(RESULTS_DIR, f"{job_id}.json")
+        try:
+            with open(result_path, "r", encoding="utf-8") as f:
+                result_dict = json.load(f)
+        except FileNotFoundError:
+            return None
+        os.remove(result_path)
+        return result_dict
+
+    def wait_result(
+        self,
+        job_id: str,
+        lease_timeout: float,
+        poll_interval: float = 0.5,
+        deadline: Optional[float] = None,
+    ) -> Optional[dict[str, Any]]:
+        """Waits for the result of a job, requeueing the stale leases meanwhile.
+
+        Returns None, after removing the job, if there is no result by the
+        `deadline` timestamp.
+        """
+        num_missing = 0
+        while True:
+            result_dict = self.pop_result(job_id)
+            if result_dict is not None:
+                return result_dict
+            if deadline is not None and time.time() > deadline:
+                self.cancel(job_id)
+                return None
+            self.requeue_stale(lease_timeout)
+            # The job may move between the directories while they are listed.
+            if self.get_status(job_id) == "unknown":
+                num_missing += 1
+                if num_missing > 3:
+                    raise RuntimeError(f"Job {job_id} disappeared from the queue.")
+            else:
+                num_missing = 0
+            time.sleep(poll_interval)
+
+
+def run_python_code_in_queue(
+    code_text: str,
+    run_cwd: str,
+    py_filepath: str,
+    exec_timeout: int,
+    state: Mapping[str, Any],
+    env: Mapping[str, str],
+) -> dict[str, Any]:
+    """Runs the code on a worker node through the queue in `exec_queue_dir`."""
+    queue_dir = state.get("exec_queue_dir", "")
+    if not queue_dir:
+        raise ValueError("exec_queue_dir must be set to use the queue backend.")
+    lease_timeout = state.get("exec_lease_timeout", 60)
+    queue_wait = state.get("exec_queue_wait", 600)
+    work_queue = FileWorkQueue(queue_dir)
+    start_time = time.time()
+    job_id = work_queue.submit({
+        "code_text": code_text,
+        "run_cwd": os.path.abspath(run_cwd),
+        "py_filepath": py_filepath,
+        "exec_timeout": exec_timeout,
+        "env": dict(env),
+    })
+    result_dict = work_queue.wait_result(
+        job_id,
+        lease_timeout=lease_timeout,
+        deadline=start_time + exec_timeout + lease_timeout + queue_wait,
+    )
+    if result_dict is None:
+        return {
+            "returncode": 1,
+            "stdout": "",
+            "stderr": (
+                f"TimeoutError: The code did not finish within {exec_timeout} seconds"
+                f" after waiting up to {queue_wait} seconds for a worker of the queue."
+            ),
+            "execution_time": time.time() - start_time,
+            "failure_kind": "timeout",
+            "exec_timeout": exec_timeout,
+        }
+    return result_dict
+
+
+def _kill_process_groups(pids: list[int]) -> None:
+    """Kills the processes running a code together with the processes they started."""
+    for pid in pids:
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+def _keep_lease(
+    work_queue: FileWorkQueue,
+    job_id: str,
+    worker_id: str,
+    heartbeat_interval: float,
+    done: threading.Event,
+    lease_lost: threading.Event,
+    pids: list[int],
+) -> None:
+    """Renews the lease of a job until it is done.
+
+    When the lease was lost, e.g. handed to another worker after a pause of
+    this one, the processes running the job are killed so that the two
+    workers do not write into the same workspace.
+    """
+    while not done.wait(heartbeat_interval):
+        if not work_queue.heartbeat(job_id, worker_id):
+            lease_lost.set()
+            _kill_process_groups(list(pids))
+            return
+
+
+def _run_job(job: dict[str, Any]) -> dict[str, Any]:
+    """Runs the code of a job, with the failure as its result if it cannot run."""
+    from machine_learning_engineering.shared_libraries import code_util
+
+    start_time = time.time()
+    try:
+        os.makedirs(job["run_cwd"], exist_ok=True)
+        return code_util.run_python_code(
+            code_text=job["code_text"],
+            run_cwd=job["run_cwd"],
+            py_filepath=job["py_filepath"],
+            exec_timeout=job["exec_timeout"],
+            env=job.get("env"),
+        )
+    except Exception:
+        return {
+            "returncode": 1,
+            "stdout": "",
+            "stderr": traceback.format_exc(),
+            "execution_time": time.time() - start_time,
+            "failure_kind": "error",
+            "exec_timeout": job.get("exec_timeout"),
+        }
+
+
+def serve(
+    queue_dir: str,
+    worker_id: str,
+    poll_interval: float = 0.5,
+    heartbeat_interval: float = 10.0,
+    max_idle_time: Optional[float] = None,
+) -> int:
+    """Runs jobs from the queue, returns the number of jobs run."""
+    from machine_learning_engineering.shared_libraries import code_util
+
+    # Dots separate the job id from the worker id in the lease filenames.
+    worker_id = worker_id.replace(".", "-")
+    work_queue = FileWorkQueue(queue_dir)
+    num_jobs = 0
+    idle_since = time.time()
+    while True:
+        claimed = work_queue.claim(worker_id)
+        if claimed is None:
+            if max_idle_time is not None and time.time() - idle_since > max_idle_time:
+                return num_jobs
+            time.sleep(poll_interval)
+            continue
+        job_id, job = claimed
+        done = threading.Event()
+        lease_lost = threading.Event()
+        pids = []
+
+        def record_pid(event: str, info: dict[str, Any]) -> None:
+            if event != "spawned":
+                return
+            pids.append(info["pid"])
+            # The lease may have been lost before the process started.
+            if lease_lost.is_set():
+                _kill_process_groups([info["pid"]])
+
+        lease_thread = threading.Thread(
+            target=_keep_lease,
+            args=(work_queue, job_id, worker_id, heartbeat_interval, done, lease_lost, pids),
+            daemon=True,
+        )
+        code_util.register_execution_listener(record_pid)
+        lease_thread.start()
+        try:
+            result_dict = _run_job(job)
+        finally:
+            code_util.unregister_execution_listener(record_pid)
+            done.set()
+            lease_thread.join()
+        num_jobs += 1
+        idle_since = time.time()
+        if lease_lost.is_set():
+            # The job belongs to another worker now, which reports its result.
+            print(f"Worker {worker_id} lost the lease of job {job_id}.")
+            continue
+        result_dict["worker_id"] = worker_id
+        work_queue.complete(job_id, worker_id, result_dict)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Runs the generated code enqueued by the agent."
+    )
+    parser.add_argument("--queue_dir", required=True)
+    parser.add_argument("--worker_id", default=f"{socket.gethostname()}-{os.getpid()}")
+    parser.add_argument("--poll_interval", type=float, default=0.5)
+    parser.add_argument("--heartbeat_interval", type=float, default=10.0)
+    parser.add_argument(
+        "--max_idle_time",
+        type=float,
+        default=None,
+        help="Exits after being idle for this many seconds.",
+    )
+    args = parser.parse_args()
+    num_jobs = serve(
+        queue_dir=args.queue_dir,
+        worker_id=args.worker_id,
+        poll_interval=args.poll_interval,
+        heartbeat_interval=args.heartbeat_interval,
+        max_idle_time=args.max_idle_time,
+    )
+    print(f"Worker {args.worker_id} ran {num_jobs} jobs.")
+
+
+if __name__ == "__main__":
+    main()
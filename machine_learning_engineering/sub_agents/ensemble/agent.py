@@ -1,6 +1,7 @@
 """Ensemble agent for Machine Learning Engineering."""
 
-from typing import Optional
+from typing import Any, Mapping, Optional
+import dataclasses
 import os
 import shutil
 import numpy as np
@@ -11,10 +12,15 @@ from google.adk.models import llm_response as llm_response_module
 from google.adk.models import llm_request as llm_request_module
 from google.genai import types
 
+from machine_learning_engineering.sub_agents.ensemble import ensemble_search
 from machine_learning_engineering.sub_agents.ensemble import prompt
 from machine_learning_engineering.shared_libraries import debug_util
 from machine_learning_engineering.shared_libraries import common_util
+from machine_learning_engineering.shared_libraries import budget_util
+from machine_learning_engineering.shared_libraries import code_util
 from machine_learning_engineering.shared_libraries import config
+from machine_learning_engineering.shared_libraries import data_util
+from machine_learning_engineering.shared_libraries.runtime import mle_runtime
 
 
 def update_ensemble_loop_states(
@@ -33,6 +39,39 @@ def init_ensemble_loop_states(
     return None
 
 
+def is_ensemble_over_budget(
+    callback_context: callback_context_module.CallbackContext,
+) -> bool:
+    """Checks if there is no time left for another ensemble attempt."""
+    num_solutions = callback_context.state.get("num_solutions", 2)
+    outer_loop_round = callback_context.state.get("outer_loop_round", 2)
+    if get_solution_hashes(callback_context.state):
+        # The stored predictions are ensembled without training again.
+        exec_results = []
+    else:
+        exec_results = [
+            callback_context.state.get(
+                f"train_code_exec_result_{outer_loop_round}_{task_id}", {}
+            )
+            for task_id in range(1, num_solutions + 1)
+        ]
+    return budget_util.is_over_budget(
+        callback_context.state,
+        "ensemble",
+        budget_util.estimate_iteration_time(*exec_results),
+    )
+
+
+def check_ensemble_plan_finish(
+    callback_context: callback_context_module.CallbackContext,
+    llm_request: llm_request_module.LlmRequest,
+) -> Optional[llm_response_module.LlmResponse]:
+    """Skips planning the ensemble without time left."""
+    if is_ensemble_over_budget(callback_context):
+        return llm_response_module.LlmResponse()
+    return None
+
+
 def get_init_ensemble_plan(
     callback_context: callback_context_module.CallbackContext,
     llm_response: llm_response_module.LlmResponse,
@@ -57,6 +96,8 @@ def check_ensemble_plan_implement_finish(
     ] = True
     if result_dict:
         return llm_response_module.LlmResponse()
+    if is_ensemble_over_budget(callback_context):
+        return llm_response_module.LlmResponse()
     callback_context.state[
         f"ensemble_plan_implement_skip_data_leakage_check_{ensemble_iter}"
     ] = False
@@ -73,6 +114,109 @@ def get_refined_ensemble_plan(
     return None
 
 
+def get_solution_hashes(
+    state: Mapping[str, Any],
+) -> list[str]:
+    """Gets the hashes of the solutions to ensemble, empty if any has no predictions."""
+    num_solutions = state.get("num_solutions", 2)
+    outer_loop_round = state.get("outer_loop_round", 2)
+    prediction_dir = code_util.get_prediction_dir(state)
+    solution_hashes = []
+    for task_id in range(1, num_solutions + 1):
+        code = state.get(f"train_code_{outer_loop_round}_{task_id}", "")
+        exec_result = state.get(f"train_code_exec_result_{outer_loop_round}_{task_id}", {})
+        solution_hash = exec_result.get("code_hash") or code_util.get_code_hash(code)
+        if not code or not mle_runtime.has_predictions(solution_hash, "val", prediction_dir):
+            return []
+        solution_hashes.append(solution_hash)
+    return solution_hashes
+
+
+def get_stored_predictions_description(
+    state: Mapping[str, Any],
+) -> str:
+    """Describes the stored predictions of the solutions to ensemble."""
+    solution_hashes = get_solution_hashes(state)
+    if not solution_hashes:
+        return ""
+    prediction_dir = code_util.get_prediction_dir(state)
+    solutions = []
+    for task_id, solution_hash in enumerate(solution_hashes, start=1):
+        shape = mle_runtime.load_predictions(solution_hash, "val", prediction_dir=prediction_dir).shape
+        if mle_runtime.has_predictions(solution_hash, "test", prediction_dir):
+            stored = "validation and test predictions"
+        else:
+            stored = "validation predictions only"
+        solutions.append(
+            f"- Python Solution {task_id}: hash `{solution_hash}`, {stored}, validation shape {shape}"
+        )
+    return prompt.STORED_PREDICTIONS_INSTR.format(
+        solutions="\n".join(solutions),
+        solution_hashes=solution_hashes,
+    )
+
+
+def run_numeric_ensemble(
+    callback_context: callback_context_module.CallbackContext
+) -> Optional[types.Content]:
+    """Searches ensembles of the stored predictions without LLM calls."""
+    state = callback_context.state
+    solution_hashes = get_solution_hashes(state)
+    if not solution_hashes:
+        return None
+    metric = ensemble_search.get_metric_name(state)
+    if metric is None:
+        # A score with another metric would compete with the scores of the agents.
+        print("--- Skipping the numeric ensemble: `eval_metric` is not set ---")
+        return None
+    if mle_runtime.METRIC_LOWER_IS_BETTER[metric] != state.get("lower", True):
+        print(f"--- Skipping the numeric ensemble: {metric} does not match `lower` ---")
+        return None
+    prediction_dir = code_util.get_prediction_dir(state)
+    if not all(
+        mle_runtime.has_predictions(solution_hash, "test", prediction_dir)
+        for solution_hash in solution_hashes
+    ):
+        # The ensemble could not write the test predictions of the submission.
+        print("--- Skipping the numeric ensemble: a solution stored no test predictions ---")
+        return None
+    try:
+        _, val_predictions, y_val = mle_runtime.load_aligned_predictions(
+            solution_hashes, "val", prediction_dir=prediction_dir
+        )
+        if y_val is None or len(y_val) == 0:
+            return None
+        candidates = ensemble_search.search_ensembles(val_predictions, y_val, metric)
+    except ValueError as e:
+        # The stored predictions do not match or do not suit the metric, e.g.
+        # mismatched ids or shapes.
+        print(f"--- Skipping the numeric ensemble: {e} ---")
+        return None
+    if not candidates:
+        return None
+    state["ensemble_numeric_candidates"] = [
+        dataclasses.asdict(candidate) for candidate in candidates[:5]
+    ]
+    code = ensemble_search.get_ensemble_code(candidates[0], solution_hashes, metric)
+    workspace_dir = state.get("workspace_dir", "")
+    task_name = state.get("task_name", "")
+    result_dict = code_util.execute_code(
+        code_text=code,
+        run_cwd=os.path.join(workspace_dir, task_name, "ensemble"),
+        py_filepath="ensemble_numeric.py",
+        exec_timeout=budget_util.get_exec_timeout(state, callback_context.agent_name),
+        state=state,
+    )
+    score = None
+    if result_dict.get("returncode", 1) == 0:
+        score = code_util.get_score(result_dict)
+    if score is not None:
+        result_dict["score"] = float(score)
+    state["ensemble_code_numeric"] = code
+    state["ensemble_code_exec_result_numeric"] = result_dict
+    return None
+
+
 def get_init_ensemble_plan_agent_instruction(
     context: callback_context_module.ReadonlyContext,
 ) -> str:
@@ -89,6 +233,7 @@ def get_init_ensemble_plan_agent_instruction(
     instruction = prompt.INIT_ENSEMBLE_PLAN_INSTR.format(
         num_solutions=num_solutions,
         python_solutions="\n".join(python_solutions),
+        stored_predictions=get_stored_predictions_description(context.state),
     )
     return instruction
 
@@ -103,11 +248,27 @@ def get_ensemble_plan_refinement_instruction(
     lower = context.state.get("lower", True)
     prev_plans = context.state.get("ensemble_plans", [])
     prev_scores = []
+    scored_plans = []
     for k in range(len(prev_plans)):
         exec_result = context.state.get(
             f"ensemble_code_exec_result_{k}", {}
         )
+        if "score" not in exec_result:
+            # The plan was not implemented.
+            continue
         prev_scores.append(exec_result["score"])
+        scored_plans.append(prev_plans[k])
+    prev_plans = scored_plans
+    numeric_result = context.state.get("ensemble_code_exec_result_numeric", {})
+    numeric_candidates = context.state.get("ensemble_numeric_candidates", [])
+    if "score" in numeric_result and numeric_candidates:
+        # The best ensemble of the numeric search is a plan to improve on too.
+        best = numeric_candidates[0]
+        prev_plans.append(
+            f"Combine the stored predictions with `{best['method']}` weights {best['weights']}"
+            f" found by the numeric search {best['search']}."
+        )
+        prev_scores.append(numeric_result["score"])
     sorted_idx = np.argsort(prev_scores)[::-1]
     if lower:
         sorted_idx = sorted_idx[-num_top_plans:]
@@ -129,6 +290,7 @@ def get_ensemble_plan_refinement_instruction(
     return prompt.ENSEMBLE_PLAN_REFINE_INSTR.format(
         num_solutions=num_solutions,
         python_solutions="\n".join(python_solutions),
+        stored_predictions=get_stored_predictions_description(context.state),
         prev_plans_and_scores=prev_plans_and_scores,
         criteria=criteria,
     )
@@ -148,11 +310,13 @@ def get_ensemble_plan_implement_agent_instruction(
         formatted_str = f"# Python Solution {task_id}\n```python\n{code}\n```\n"
         python_solutions.append(formatted_str)
     prev_plans = context.state.get(f"ensemble_plans", [""])
-    return prompt.ENSEMBLE_PLAN_IMPLEMENT_INSTR.format(
+    instruction = prompt.ENSEMBLE_PLAN_IMPLEMENT_INSTR.format(
         num_solutions=num_solutions,
         python_solutions="\n".join(python_solutions),
+        stored_predictions=get_stored_predictions_description(context.state),
         plan=prev_plans[-1],
     )
+    return instruction + data_util.get_fast_inputs_instruction(context.state)
 
 
 def create_workspace(
@@ -183,70 +347,89 @@ def create_workspace(
                     os.path.join(data_dir, task_name, file),
                     os.path.join(workspace_dir, task_name, "ensemble", "input"),
                 )
+    data_util.link_fast_inputs(
+        callback_context.state, os.path.join(workspace_dir, task_name, "ensemble", "input")
+    )
     return None
 
 
-init_ensemble_plan_agent = agents.Agent(
-    model=config.CONFIG.agent_model,
-    name="init_ensemble_plan_agent",
-    description="Generate an initial plan to ensemble solutions.",
-    instruction=get_init_ensemble_plan_agent_instruction,
-    before_agent_callback=init_ensemble_loop_states,
-    after_model_callback=get_init_ensemble_plan,
-    generate_content_config=types.GenerateContentConfig(
-        temperature=1.0,
-    ),
-    include_contents="none",
-)
-init_ensemble_plan_implement_agent = debug_util.get_run_and_debug_agent(
-    prefix="ensemble_plan_implement_initial",
-    suffix="",
-    agent_description="Implement the initial plan to ensemble solutions.",
-    instruction_func=get_ensemble_plan_implement_agent_instruction,
-    before_model_callback=check_ensemble_plan_implement_finish,
-)
-ensemble_plan_refine_agent = agents.Agent(
-    model=config.CONFIG.agent_model,
-    name="ensemble_plan_refine_agent",
-    description="Refine the ensemble plan.",
-    instruction=get_ensemble_plan_refinement_instruction,
-    after_model_callback=get_refined_ensemble_plan,
-    generate_content_config=types.GenerateContentConfig(
-        temperature=1.0,
-    ),
-    include_contents="none",
-)
-ensemble_plan_implement_agent = debug_util.get_run_and_debug_agent(
-    prefix="ensemble_plan_implement",
-    suffix="",
-    agent_description="Implement the plan to ensemble solutions.",
-    instruction_func=get_ensemble_plan_implement_agent_instruction,
-    before_model_callback=check_ensemble_plan_implement_finish,
-)
-ensemble_plan_refine_and_implement_agent = agents.SequentialAgent(
-    name="ensemble_plan_refine_and_implement_agent",
-    description="Refine the ensemble plan and then implement it.",
-    sub_agents=[
-        ensemble_plan_refine_agent,
-        ensemble_plan_implement_agent,
-    ],
-    after_agent_callback=update_ensemble_loop_states,
-)
-ensemble_plan_refine_and_implement_loop_agent = agents.LoopAgent(
-    name="ensemble_plan_refine_and_implement_loop_agent",
-    description="Iteratively refine the ensemble plan and implement it.",
-    sub_agents=[ensemble_plan_refine_and_implement_agent],
-    before_agent_callback=update_ensemble_loop_states,
-    max_iterations=config.CONFIG.ensemble_loop_round,
-)
-ensemble_agent = agents.SequentialAgent(
-    name="ensemble_agent",
-    description="Ensemble multiple solutions.",
-    sub_agents=[
-        init_ensemble_plan_agent,
-        init_ensemble_plan_implement_agent,
-        ensemble_plan_refine_and_implement_loop_agent,
-    ],
-    before_agent_callback=create_workspace,
-    after_agent_callback=None,
-)
+def build_ensemble_agent(
+    cfg: config.DefaultConfig,
+) -> agents.SequentialAgent:
+    """Builds the ensemble agent for the given configuration."""
+    numeric_ensemble_agent = agents.SequentialAgent(
+        name="ensemble_numeric_agent",
+        description="Search ensemble weights of the stored predictions without LLM calls.",
+        sub_agents=[],
+        before_agent_callback=run_numeric_ensemble,
+    )
+    init_ensemble_plan_agent = agents.Agent(
+        model=cfg.agent_model,
+        name="init_ensemble_plan_agent",
+        description="Generate an initial plan to ensemble solutions.",
+        instruction=get_init_ensemble_plan_agent_instruction,
+        before_agent_callback=init_ensemble_loop_states,
+        before_model_callback=check_ensemble_plan_finish,
+        after_model_callback=get_init_ensemble_plan,
+        generate_content_config=types.GenerateContentConfig(
+            temperature=1.0,
+        ),
+        include_contents="none",
+    )
+    init_ensemble_plan_implement_agent = debug_util.get_run_and_debug_agent(
+        prefix="ensemble_plan_implement_initial",
+        suffix="",
+        agent_description="Implement the initial plan to ensemble solutions.",
+        instruction_func=get_ensemble_plan_implement_agent_instruction,
+        before_model_callback=check_ensemble_plan_implement_finish,
+        cfg=cfg,
+    )
+    ensemble_plan_refine_agent = agents.Agent(
+        model=cfg.agent_model,
+        name="ensemble_plan_refine_agent",
+        description="Refine the ensemble plan.",
+        instruction=get_ensemble_plan_refinement_instruction,
+        before_model_callback=check_ensemble_plan_finish,
+        after_model_callback=get_refined_ensemble_plan,
+        generate_content_config=types.GenerateContentConfig(
+            temperature=1.0,
+        ),
+        include_contents="none",
+    )
+    ensemble_plan_implement_agent = debug_util.get_run_and_debug_agent(
+        prefix="ensemble_plan_implement",
+        suffix="",
+        agent_description="Implement the plan to ensemble solutions.",
+        instruction_func=get_ensemble_plan_implement_agent_instruction,
+        before_model_callback=check_ensemble_plan_implement_finish,
+        cfg=cfg,
+    )
+    ensemble_plan_refine_and_implement_agent = agents.SequentialAgent(
+        name="ensemble_plan_refine_and_implement_agent",
+        description="Refine the ensemble plan and then implement it.",
+        sub_agents=[
+            ensemble_plan_refine_agent,
+            ensemble_plan_implement_agent,
+        ],
+        after_agent_callback=update_ensemble_loop_states,
+    )
+    ensemble_plan_refine_and_implement_loop_agent = agents.LoopAgent(
+        name="ensemble_plan_refine_and_implement_loop_agent",
+        description="Iteratively refine the ensemble plan and implement it.",
+        sub_agents=[ensemble_plan_refine_and_implement_agent],
+        before_agent_callback=update_ensemble_loop_states,
+        max_iterations=cfg.ensemble_loop_round,
+    )
+    ensemble_agent = agents.SequentialAgent(
+        name="ensemble_agent",
+        description="Ensemble multiple solutions.",
+        sub_agents=[
+            numeric_ensemble_agent,
+            init_ensemble_plan_agent,
+            init_ensemble_plan_implement_agent,
+            ensemble_plan_refine_and_implement_loop_agent,
+        ],
+        before_agent_callback=create_workspace,
+        after_agent_callback=None,
+    )
+    return ensemble_agent
@@ -0,0 +1,376 @@
+"""Numeric search for ensembles of the stored predictions, without LLM calls.
+
+Every search scores its candidates with the task metric, given by
+`eval_metric`, on the stored validation predictions. The searches fitting
+weights on them (coordinate descent, hill climbing and ridge stacking) are
+scored out of fold, so that their scores are comparable with the validation
+scores of the other candidates and of the agents. The candidates of a step
+are built at once with NumPy, and scored at once for the regression metrics
+or one by one for the others. The best ensemble is turned into a short script
+applying it with `mle_runtime`, so that it is run, scored and submitted like
+the ensembles written by the agents.
+"""
+
+from typing import Any, Callable, Mapping, Optional
+import dataclasses
+
+import numpy as np
+
+from machine_learning_engineering.shared_libraries.runtime import mle_runtime
+
+
+RANKING_METRICS = ("auc",)
+REGRESSION_METRICS = ("rmse", "mse", "mae", "rmsle", "r2")
+POWERS = (0.5, 2.0, 3.0)
+RIDGE_ALPHAS = (1e-3, 1e-2, 1e-1, 1.0, 10.0, 100.0)
+# The folds scoring the weights fitted on the validation predictions.
+NUM_FOLDS = 5
+_EPS = 1e-15
+
+
+@dataclasses.dataclass
+class EnsembleCandidate:
+    """An ensemble of the solutions found by the search."""
+    method: str  # The method of `mle_runtime.combine_predictions`.
+    weights: list[float]  # The weight of every solution.
+    score: float  # The validation score with the task metric.
+    power: float = 1.0
+    intercept: float = 0.0
+    search: str = ""  # The search that found the ensemble.
+
+
+def get_metric_name(state: Mapping[str, Any]) -> Optional[str]:
+    """Gets the metric of the task from `eval_metric`, None if it is not set.
+
+    The metric is never guessed: the scores of the numeric ensembles are
+    compared with the scores the codes compute with the metric of the task.
+    """
+    metric = state.get("eval_metric", "")
+    if not metric:
+        return None
+    if metric not in mle_runtime.METRIC_LOWER_IS_BETTER:
+        raise ValueError(
+            f"eval_metric must be one of {sorted(mle_runtime.METRIC_LOWER_IS_BETTER)}, got {metric}."
+        )
+    return metric
+
+
+def _is_better(score: float, best_score: float, lower: bool) -> bool:
+    return score < best_score if lower else score > best_score
+
+
+def _score_rows(
+    metric: str,
+    y_true: np.ndarray,
+    candidates: np.ndarray,
+) -> np.ndarray:
+    """Scores every candidate prediction along the first axis.
+
+    The regression metrics are computed for all the candidates in one NumPy
+    expression, and the other metrics one candidate at a time.
+    """
+    if metric in REGRESSION_METRICS:
+        candidates = np.asarray(candidates, dtype=np.float64)
+        y_true = np.asarray(y_true, dtype=np.float64)
+        axes = tuple(range(1, candidates.ndim))
+        if metric == "rmsle":
+            errors = np.log1p(np.clip(candidates, 0, None)) - np.log1p(np.clip(y_true, 0, None))
+        else:
+            errors = candidates - y_true
+        if metric == "mae":
+            return np.mean(np.abs(errors), axis=axes)
+        squared_errors = errors ** 2
+        if metric == "r2":
+            total = np.sum((y_true - np.mean(y_true)) ** 2)
+            return 1.0 - np.sum(squared_errors, axis=axes) / max(total, _EPS)
+        mse = np.mean(squared_errors, axis=axes)
+        return mse if metric == "mse" else np.sqrt(mse)
+    return np.array([
+        mle_runtime.score_predictions(metric, y_true, candidate) for candidate in candidates
+    ])
+
+
+def _best_index(scores: np.ndarray, lower: bool) -> int:
+    scores = np.where(np.isfinite(scores), scores, np.inf if lower else -np.inf)
+    return int(np.argmin(scores) if lower else np.argmax(scores))
+
+
+def _get_folds(num_samples: int, num_folds: int, seed: int) -> Optional[np.ndarray]:
+    """Assigns every sample to a fold at random, None with too few samples."""
+    num_folds = min(num_folds, num_samples // 2)
+    if num_folds < 2:
+        return None
+    return np.random.default_rng(seed).permutation(num_samples) % num_folds
+
+
+def cross_validate(
+    search: Callable[..., EnsembleCandidate],
+    predictions: np.ndarray,
+    y_true: np.ndarray,
+    metric: str,
+    lower: bool,
+    num_folds: int = NUM_FOLDS,
+    seed: int = 42,
+) -> Optional[EnsembleCandidate]:
+    """Runs a weight search on all the samples and scores it out of fold.
+
+    The weights found on the other folds are applied to every fold, and the
+    out-of-fold predictions give the score of the candidate.
+    """
+    folds = _get_folds(len(y_true), num_folds, seed)
+    if folds is None:
+        return None
+    out_of_fold = np.zeros_like(predictions[0])
+    for fold in range(folds.max() + 1):
+        train, valid = folds != fold, folds == fold
+        weights = search(predictions[:, train], y_true[train], metric, lower).weights
+        out_of_fold[valid] = np.tensordot(weights, predictions[:, valid], axes=1)
+    candidate = search(predictions, y_true, metric, lower)
+    candidate.score = mle_runtime.score_predictions(metric, y_true, out_of_fold)
+    return candidate
+
+
+def coordinate_descent(
+    predictions: np.ndarray,
+    y_true: np.ndarray,
+    metric: str,
+    lower: bool,
+    num_rounds: int = 10,
+    grid_size: int = 21,
+) -> EnsembleCandidate:
+    """Searches non-negative weights summing to one, one weight at a time.
+
+    For every weight, all the values of a grid are scored at once; the other
+    weights are rescaled so that the weights still sum to one.
+    """
+    num_solutions = len(predictions)
+    weights = np.full(num_solutions, 1.0 / num_solutions)
+    best_score = mle_runtime.score_predictions(
+        metric, y_true, np.tensordot(weights, predictions, axes=1)
+    )
+    grid = np.linspace(0.0, 1.0, grid_size)
+    for _ in range(num_rounds):
+        improved = False
+        for i in range(num_solutions):
+            rest_weight = weights.sum() - weights[i]
+            if rest_weight <= 0:
+                continue
+            rest = np.tensordot(np.delete(weights, i), np.delete(predictions, i, axis=0), axes=1)
+            # Candidate g gives weight g to solution i and 1 - g to the others.
+            candidates = (
+                (1.0 - grid).reshape((-1,) + (1,) * rest.ndim) * (rest / rest_weight)
+                + grid.reshape((-1,) + (1,) * rest.ndim) * predictions[i]
+            )
+            scores = _score_rows(metric, y_true, candidates)
+            k = _best_index(scores, lower)
+            if _is_better(scores[k], best_score, lower):
+                weights = np.delete(weights, i) / rest_weight * (1.0 - grid[k])
+                weights = np.insert(weights, i, grid[k])
+                best_score = scores[k]
+                improved = True
+        if not improved:
+            break
+    return EnsembleCandidate(
+        method="weighted",
+        weights=weights.tolist(),
+        score=float(best_score),
+        search="coordinate_descent",
+    )
+
+
+def hill_climb(
+    predictions: np.ndarray,
+    y_true: np.ndarray,
+    metric: str,
+    lower: bool,
+    max_steps: int = 100,
+) -> EnsembleCandidate:
+    """Greedily adds solutions to the ensemble, with replacement.
+
+    Every step scores the ensembles extended with each solution at once, and
+    stops when no extension improves the score.
+    """
+    num_solutions = len(predictions)
+    counts = np.zeros(num_solutions)
+    total = np.zeros_like(predictions[0])
+    best_score = None
+    for step in range(max_steps):
+        candidates = (total + predictions) / (step + 1)
+        scores = _score_rows(metric, y_true, candidates)
+        k = _best_index(scores, lower)
+        if best_score is not None and not _is_better(scores[k], best_score, lower):
+            break
+        counts[k] += 1
+        total = total + predictions[k]
+        best_score = scores[k]
+    return EnsembleCandidate(
+        method="weighted",
+        weights=(counts / counts.sum()).tolist(),
+        score=float(best_score),
+        search="hill_climb",
+    )
+
+
+def power_average(
+    predictions: np.ndarray,
+    y_true: np.ndarray,
+    metric: str,
+    lower: bool,
+    powers: tuple[float, ...] = POWERS,
+) -> list[EnsembleCandidate]:
+    """Scores the equal-weight power means of the probabilities."""
+    weights = np.full(len(predictions), 1.0 / len(predictions))
+    candidates = []
+    for power in powers:
+        combined = mle_runtime.combine_predictions(list(predictions), "power", weights, power=power)
+        candidates.append(EnsembleCandidate(
+            method="power",
+            weights=weights.tolist(),
+            score=mle_runtime.score_predictions(metric, y_true, combined),
+            power=power,
+            search="power_average",
+        ))
+    return candidates
+
+
+def rank_average(
+    predictions: np.ndarray,
+    y_true: np.ndarray,
+    metric: str,
+    lower: bool,
+) -> EnsembleCandidate:
+    """Scores the equal-weight average of the ranks of the predictions."""
+    weights = np.full(len(predictions), 1.0 / len(predictions))
+    combined = mle_runtime.combine_predictions(list(predictions), "rank", weights)
+    return EnsembleCandidate(
+        method="rank",
+        weights=weights.tolist(),
+        score=mle_runtime.score_predictions(metric, y_true, combined),
+        search="rank_average",
+    )
+
+
+def _fit_ridge(
+    features: np.ndarray,
+    y_true: np.ndarray,
+    alphas: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Fits a ridge regression with an intercept for every alpha at once.
+
+    Returns:
+        The coefficients with shape (num_alphas, num_features), and the
+        intercepts with shape (num_alphas,).
+    """
+    x_mean = features.mean(axis=0)
+    y_mean = y_true.mean()
+    centered = features - x_mean
+    u, s, vt = np.linalg.svd(centered, full_matrices=False)
+    shrinkage = s / (s ** 2 + alphas[:, None])
+    coefs = (shrinkage * (u.T @ (y_true - y_mean))) @ vt
+    return coefs, y_mean - coefs @ x_mean
+
+
+def ridge_stack(
+    predictions: np.ndarray,
+    y_true: np.ndarray,
+    metric: str,
+    lower: bool,
+    alphas: tuple[float, ...] = RIDGE_ALPHAS,
+    num_folds: int = NUM_FOLDS,
+    seed: int = 42,
+) -> Optional[EnsembleCandidate]:
+    """Stacks the predictions with a ridge regression chosen by cross-validation.
+
+    Every alpha is scored on the out-of-fold predictions, so the score is
+    comparable with the ones of the other searches.
+    """
+    features = predictions.T.astype(np.float64)
+    y_true = np.asarray(y_true, dtype=np.float64)
+    num_samples = len(y_true)
+    folds = _get_folds(num_samples, num_folds, seed)
+    if folds is None:
+        return None
+    num_folds = folds.max() + 1
+    alphas = np.asarray(alphas, dtype=np.float64)
+    out_of_fold = np.zeros((len(alphas), num_samples))
+    for fold in range(num_folds):
+        train, valid = folds != fold, folds == fold
+        coefs, intercepts = _fit_ridge(features[train], y_true[train], alphas)
+        out_of_fold[:, valid] = (features[valid] @ coefs.T + intercepts).T
+    scores = _score_rows(metric, y_true, out_of_fold)
+    k = _best_index(scores, lower)
+    coefs, intercepts = _fit_ridge(features, y_true, alphas[k:k + 1])
+    return EnsembleCandidate(
+        method="linear",
+        weights=coefs[0].tolist(),
+        score=float(scores[k]),
+        intercept=float(intercepts[0]),
+        search=f"ridge_stack(alpha={alphas[k]:g})",
+    )
+
+
+def search_ensembles(
+    predictions: list[Any],
+    y_true: Any,
+    metric: str,
+) -> list[EnsembleCandidate]:
+    """Runs all the searches that suit the metric, best ensemble first."""
+    lower = mle_runtime.METRIC_LOWER_IS_BETTER[metric]
+    predictions = np.stack([np.asarray(p, dtype=np.float64) for p in predictions])
+    y_true = np.asarray(y_true)
+    num_solutions = len(predictions)
+    candidates = []
+    for i in range(num_solutions):
+        weights = np.eye(num_solutions)[i]
+        candidates.append(EnsembleCandidate(
+            method="weighted",
+            weights=weights.tolist(),
+            score=mle_runtime.score_predictions(metric, y_true, predictions[i]),
+            search=f"single_solution_{i + 1}",
+        ))
+    for search in (coordinate_descent, hill_climb):
+        candidate = cross_validate(search, predictions, y_true, metric, lower)
+        if candidate is not None:
+            candidates.append(candidate)
+    if np.all((predictions >= 0) & (predictions <= 1)):
+        candidates.extend(power_average(predictions, y_true, metric, lower))
+    if metric in RANKING_METRICS and predictions.ndim == 2:
+        candidates.append(rank_average(predictions, y_true, metric, lower))
+    if metric in REGRESSION_METRICS + RANKING_METRICS and predictions.ndim == 2:
+        candidate = ridge_stack(predictions, y_true, metric, lower)
+        if candidate is not None:
+            candidates.append(candidate)
+    candidates = [c for c in candidates if np.isfinite(c.score)]
+    return sorted(candidates, key=lambda c: c.score, reverse=not lower)
+
+
+def get_ensemble_code(
+    candidate: EnsembleCandidate,
+    solution_hashes: list[str],
+    metric: str,
+) -> str:
+    """Gets a script applying the ensemble to the stored predictions."""
+    return f'''"""Ensemble found by the numeric search: {candidate.search}."""
+
+import mle_runtime
+
+solution_hashes = {solution_hashes!r}
+method = {candidate.method!r}
+weights = {candidate.weights!r}
+power = {candidate.power!r}
+intercept = {candidate.intercept!r}
+
+val_index, val_predictions, y_val = mle_runtime.load_aligned_predictions(solution_hashes, "val")
+val_ensemble = mle_runtime.combine_predictions(
+    val_predictions, method, weights, power=power, intercept=intercept
+)
+score = mle_runtime.score_predictions({metric!r}, y_val, val_ensemble)
+mle_runtime.save_predictions("val", val_ensemble, index=val_index, target=y_val)
+if all(mle_runtime.has_predictions(h, "test") for h in solution_hashes):
+    test_predictions = [mle_runtime.load_predictions(h, "test") for h in solution_hashes]
+    test_ensemble = mle_runtime.combine_predictions(
+        test_predictions, method, weights, power=power, intercept=intercept
+    )
+    mle_runtime.save_predictions("test", test_ensemble)
+mle_runtime.log_validation_score(score)
+'''
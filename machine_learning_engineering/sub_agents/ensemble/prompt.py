@@ -1,5 +1,23 @@
 """Defines the prompts for the ensemble agent."""
 
+from machine_learning_engineering.shared_libraries import runtime_prompt
+
+
+STORED_PREDICTIONS_INSTR = """
+# Stored predictions
+The validation and test predictions of the solutions are already stored, so the ensemble does not need to train the solutions again.
+{solutions}
+
+The predictions can be loaded in the code with:
+```python
+import mle_runtime
+solution_hashes = {solution_hashes}
+val_index, val_predictions, y_val = mle_runtime.load_aligned_predictions(solution_hashes, "val")
+test_predictions = [mle_runtime.load_predictions(h, "test") for h in solution_hashes]
+```
+`val_predictions` and `test_predictions` are lists with one array per solution, `val_index` identifies the validation rows shared by all the solutions, and `y_val` holds their target values.
+"""
+
 
 INIT_ENSEMBLE_PLAN_INSTR = """# Introduction
 - You are a Kaggle grandmaster attending a competition.
@@ -7,7 +25,7 @@ INIT_ENSEMBLE_PLAN_INSTR = """# Introduction
 - Your task is to propose a plan to ensemble the {num_solutions} solutions to achieve the best performance.
 
 {python_solutions}
-
+{stored_predictions}
 # Your task
 - Suggest a plan to ensemble the {num_solutions} solutions. You should concentrate how to merge, not the other parts like hyperparameters.
 - The suggested plan should be easy to novel, effective, and easy to implement.
@@ -24,12 +42,13 @@ ENSEMBLE_PLAN_IMPLEMENT_INSTR = """# Introduction
 - We will now provide the Python Solutions and the ensemble plan.
 
 {python_solutions}
-
+{stored_predictions}
 # Ensemble Plan
 {plan}
 
 # Your task
 - Implement the ensemble plan with the provided solutions.
+- If stored predictions are provided above, ensemble them instead of training the solutions again, and also compute the ensembled test predictions.
 - Unless mentioned in the ensemble plan, do not modify the origianl Python Solutions too much.
 - All the provided data is already prepared and available in the `./input` directory. There is no need to unzip any files.
 - The code should implement the proposed solution and print the value of the evaluation metric computed on a hold-out validation set.
@@ -41,7 +60,7 @@ ENSEMBLE_PLAN_IMPLEMENT_INSTR = """# Introduction
 - Do not subsample or introduce dummy variables. You have to provide full new Python Solution using the {num_solutions} provided solutions.
 - Print out or return a final performance metric in your answer in a clear format with the exact words: 'Final Validation Performance: {{final_validation_score}}'.
 - The code should be a single-file Python program that is self-contained and can be executed as-is.
-- Do not modify the original codes too much and implement the plan since new errors can occur."""
+- Do not modify the original codes too much and implement the plan since new errors can occur.""" + runtime_prompt.SAVE_MODELS_INSTR
 
 ENSEMBLE_PLAN_REFINE_INSTR = """# Introduction
 - You are a Kaggle grandmaster attending a competition.
@@ -49,7 +68,7 @@ ENSEMBLE_PLAN_REFINE_INSTR = """# Introduction
 - We will provide the Python Solutions and the ensemble plans you have tried.
 
 {python_solutions}
-
+{stored_predictions}
 # Ensemble plans you have tried
 
 {prev_plans_and_scores}
@@ -2,6 +2,7 @@
 
 from typing import Optional
 import dataclasses
+import functools
 import os
 import shutil
 import time
@@ -17,7 +18,11 @@ from google.adk.tools.google_search_tool import google_search
 from machine_learning_engineering.sub_agents.initialization import prompt
 from machine_learning_engineering.shared_libraries import debug_util
 from machine_learning_engineering.shared_libraries import common_util
+from machine_learning_engineering.shared_libraries import budget_util
 from machine_learning_engineering.shared_libraries import config
+from machine_learning_engineering.shared_libraries import data_profile
+from machine_learning_engineering.shared_libraries import data_util
+from machine_learning_engineering.shared_libraries import tracing_util
 
 
 def get_model_candidates(
@@ -95,6 +100,13 @@ def check_model_eval_finish(
     result_dict = callback_context.state.get(f"init_code_exec_result_{task_id}_{model_id}", {})
     if result_dict:
         return llm_response_module.LlmResponse()
+    # At least one candidate is always evaluated to have a solution to refine.
+    has_solution = any(
+        callback_context.state.get(f"init_code_exec_result_{task_id}_{k+1}", {}).get("returncode", 1) == 0
+        for k in range(callback_context.state.get("num_model_candidates", 2))
+    )
+    if has_solution and budget_util.is_over_budget(callback_context.state, "initialization"):
+        return llm_response_module.LlmResponse()
     callback_context.state[f"model_eval_skip_data_leakage_check_{task_id}_{model_id}"] = False
     return None
 
@@ -110,6 +122,13 @@ def check_merger_finish(
     callback_context.state[f"merger_skip_data_leakage_check_{task_id}_{reference_idx}"] = True
     if result_dict:
         return llm_response_module.LlmResponse()
+    base_exec_result = callback_context.state.get(f"merger_code_exec_result_{task_id}_0", {})
+    if budget_util.is_over_budget(
+        callback_context.state,
+        "initialization",
+        budget_util.estimate_iteration_time(base_exec_result),
+    ):
+        return llm_response_module.LlmResponse()
     callback_context.state[f"merger_skip_data_leakage_check_{task_id}_{reference_idx}"] = False
     return None
 
@@ -206,6 +225,9 @@ def update_merger_states(
     result_dict = callback_context.state.get(
         f"merger_code_exec_result_{task_id}_{reference_idx}", {}
     )
+    if not result_dict:
+        # The merge was skipped or failed, so the base solution is kept.
+        return None
     score = result_dict["score"]
     if lower:
         if score <= best_score:
@@ -224,14 +246,18 @@ def update_merger_states(
 
 
 import re
-import base64
 import mimetypes
 
 def prepare_task(
-    callback_context: callback_context_module.CallbackContext
+    callback_context: callback_context_module.CallbackContext,
+    cfg: config.DefaultConfig,
 ) -> Optional[types.Content]:
-    """Prepares things for the task, including multimodal content."""
-    config_dict = dataclasses.asdict(config.CONFIG)
+    """Prepares things for the task, including multimodal content.
+
+    The state is initialized from the configuration the agent graph was built
+    from, so that the state always matches the graph that is running.
+    """
+    config_dict = dataclasses.asdict(cfg)
     for key in config_dict:
         callback_context.state[key] = config_dict[key]
     callback_context.state["start_time"] = time.time()
@@ -246,7 +272,7 @@ def prepare_task(
         task_description_text = f.read()
 
     # Find all image placeholders
-    image_placeholders = re.findall(r"[ИЗОБРАЖЕНИЕ: См. файл '(.*?)' в папке (.*?)]", task_description_text)
+    image_placeholders = re.findall(r"\[ИЗОБРАЖЕНИЕ: См\. файл '(.*?)' в папке (.*?)\]", task_description_text)
 
     task_images = []
     for img_filename, img_folder in image_placeholders:
@@ -254,24 +280,44 @@ def prepare_task(
         if os.path.exists(img_path):
             mime_type, _ = mimetypes.guess_type(img_path)
             if mime_type and mime_type.startswith("image/"):
-                with open(img_path, "rb") as image_file:
-                    encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
+                # The images are read when the prompts are built, rather than
+                # kept in the state.
                 task_images.append({
                     "placeholder": f"[ИЗОБРАЖЕНИЕ: См. файл '{img_filename}' в папке {img_folder}]",
                     "mime_type": mime_type,
-                    "base64": encoded_string
+                    "path": os.path.abspath(img_path),
                 })
 
-    # Store the text and the list of processed images in the state
+    # Store the text and the list of images in the state
     callback_context.state["task_description_text"] = task_description_text
     callback_context.state["task_images"] = task_images
     # For legacy agents that only use text
     callback_context.state["task_description"] = task_description_text
 
+    data_util.prepare_fast_inputs(callback_context.state)
+    tracing_util.start_trace(callback_context.state)
     return None
 
 
 
+def profile_data(
+    callback_context: callback_context_module.CallbackContext
+) -> Optional[types.Content]:
+    """Profiles the input files of the task, reusing the profile of earlier runs."""
+    if not callback_context.state.get("use_data_profile", True):
+        callback_context.state["data_profile"] = ""
+        return None
+    try:
+        callback_context.state["data_profile"] = data_profile.get_data_profile(
+            callback_context.state
+        )
+    except Exception as e:
+        # The agents explore the data themselves.
+        print(f"--- Could not profile the data: {e!r} ---")
+        callback_context.state["data_profile"] = ""
+    return None
+
+
 def create_workspace(
     callback_context: callback_context_module.CallbackContext
 ) -> Optional[types.Content]:
@@ -301,6 +347,9 @@ def create_workspace(
                     os.path.join(data_dir, task_name, file),
                     os.path.join(workspace_dir, task_name, task_id, "input"),
                 )
+    data_util.link_fast_inputs(
+        callback_context.state, os.path.join(workspace_dir, task_name, task_id, "input")
+    )
     return None
 
 
@@ -315,10 +364,15 @@ def get_model_eval_agent_instruction(
         f"init_{task_id}_model_{model_id}",
         {},
     ).get("model_description", "")
-    return prompt.MODEL_EVAL_INSTR.format(
+    instruction = prompt.MODEL_EVAL_INSTR.format(
         task_description=task_description,
         model_description=model_description,
     )
+    return (
+        instruction
+        + data_util.get_fast_inputs_instruction(context.state)
+        + data_profile.get_data_profile_instruction(context.state)
+    )
 
 
 def get_model_retriever_agent_instruction(
@@ -347,10 +401,15 @@ def get_merger_agent_instruction(
         ).replace("```", "")
     else:
         reference_solution = ""
-    return prompt.CODE_INTEGRATION_INSTR.format(
+    instruction = prompt.CODE_INTEGRATION_INSTR.format(
         base_code=base_solution,
         reference_code=reference_solution,
     )
+    return (
+        instruction
+        + data_util.get_fast_inputs_instruction(context.state)
+        + data_profile.get_data_profile_instruction(context.state)
+    )
 
 
 def get_check_data_use_instruction(
@@ -366,108 +425,122 @@ def get_check_data_use_instruction(
     )
 
 
-task_summarization_agent = agents.Agent(
-    model=config.CONFIG.agent_model,
-    name="task_summarization_agent",
-    description="Summarize the task description.",
-    instruction=prompt.SUMMARIZATION_AGENT_INSTR,
-    after_model_callback=get_task_summary,
-    generate_content_config=types.GenerateContentConfig(
-        temperature=0.0,
-    ),
-    include_contents="none",
-)
-init_parallel_sub_agents = []
-for k in range(config.CONFIG.num_solutions):
-    model_retriever_agent = agents.Agent(
-        model=config.CONFIG.agent_model,
-        name=f"model_retriever_agent_{k+1}",
-        description="Retrieve effective models for solving a given task.",
-        instruction=get_model_retriever_agent_instruction,
-        tools=[google_search],
-        before_model_callback=check_model_finish,
-        after_model_callback=get_model_candidates,
+def build_initialization_agent(
+    cfg: config.DefaultConfig,
+) -> agents.SequentialAgent:
+    """Builds the initialization agent for the given configuration."""
+    task_summarization_agent = agents.Agent(
+        model=cfg.agent_model,
+        name="task_summarization_agent",
+        description="Summarize the task description.",
+        instruction=prompt.SUMMARIZATION_AGENT_INSTR,
+        after_model_callback=get_task_summary,
         generate_content_config=types.GenerateContentConfig(
-            temperature=1.0,
+            temperature=0.0,
         ),
         include_contents="none",
     )
-    model_retriever_loop_agent = agents.LoopAgent(
-        name=f"model_retriever_loop_agent_{k+1}",
-        description="Retrieve effective models until it succeeds.",
-        sub_agents=[model_retriever_agent],
-        max_iterations=config.CONFIG.max_retry,
+    data_profile_agent = agents.SequentialAgent(
+        name="data_profile_agent",
+        description="Profile the input files of the task.",
+        before_agent_callback=profile_data,
     )
-    init_solution_gen_sub_agents = [
-        model_retriever_loop_agent,
-    ]
-    for l in range(config.CONFIG.num_model_candidates):
-        model_eval_and_debug_loop_agent = debug_util.get_run_and_debug_agent(
-            prefix="model_eval",
-            suffix=f"{k+1}_{l+1}",
-            agent_description="Generate a code using the given model",
-            instruction_func=get_model_eval_agent_instruction,
-            before_model_callback=check_model_eval_finish,
+    init_parallel_sub_agents = []
+    for k in range(cfg.num_solutions):
+        model_retriever_agent = agents.Agent(
+            model=cfg.agent_model,
+            name=f"model_retriever_agent_{k+1}",
+            description="Retrieve effective models for solving a given task.",
+            instruction=get_model_retriever_agent_instruction,
+            tools=[google_search],
+            before_model_callback=check_model_finish,
+            after_model_callback=get_model_candidates,
+            generate_content_config=types.GenerateContentConfig(
+                temperature=1.0,
+            ),
+            include_contents="none",
         )
-        init_solution_gen_sub_agents.append(model_eval_and_debug_loop_agent)
-    rank_agent = agents.SequentialAgent(
-        name=f"rank_agent_{k+1}",
-        description="Rank the solutions based on the scores.",
-        before_agent_callback=rank_candidate_solutions,
-    )
-    init_solution_gen_sub_agents.append(rank_agent)
-    for l in range(1, config.CONFIG.num_model_candidates):
-        merge_and_debug_loop_agent = debug_util.get_run_and_debug_agent(
-            prefix="merger",
-            suffix=f"{k+1}_{l}",
-            agent_description="Integrate two solutions into a single solution",
-            instruction_func=get_merger_agent_instruction,
-            before_model_callback=check_merger_finish,
+        model_retriever_loop_agent = agents.LoopAgent(
+            name=f"model_retriever_loop_agent_{k+1}",
+            description="Retrieve effective models until it succeeds.",
+            sub_agents=[model_retriever_agent],
+            max_iterations=cfg.max_retry,
         )
-        merger_states_update_agent = agents.SequentialAgent(
-            name=f"merger_states_update_agent_{k+1}_{l}",
-            description="Updates the states after merging.",
-            before_agent_callback=update_merger_states,
+        init_solution_gen_sub_agents = [
+            model_retriever_loop_agent,
+        ]
+        for l in range(cfg.num_model_candidates):
+            model_eval_and_debug_loop_agent = debug_util.get_run_and_debug_agent(
+                prefix="model_eval",
+                suffix=f"{k+1}_{l+1}",
+                agent_description="Generate a code using the given model",
+                instruction_func=get_model_eval_agent_instruction,
+                before_model_callback=check_model_eval_finish,
+                cfg=cfg,
+            )
+            init_solution_gen_sub_agents.append(model_eval_and_debug_loop_agent)
+        rank_agent = agents.SequentialAgent(
+            name=f"rank_agent_{k+1}",
+            description="Rank the solutions based on the scores.",
+            before_agent_callback=rank_candidate_solutions,
         )
-        init_solution_gen_sub_agents.extend(
-            [
-                merge_and_debug_loop_agent,
-                merger_states_update_agent,
-            ]
+        init_solution_gen_sub_agents.append(rank_agent)
+        for l in range(1, cfg.num_model_candidates):
+            merge_and_debug_loop_agent = debug_util.get_run_and_debug_agent(
+                prefix="merger",
+                suffix=f"{k+1}_{l}",
+                agent_description="Integrate two solutions into a single solution",
+                instruction_func=get_merger_agent_instruction,
+                before_model_callback=check_merger_finish,
+                cfg=cfg,
+            )
+            merger_states_update_agent = agents.SequentialAgent(
+                name=f"merger_states_update_agent_{k+1}_{l}",
+                description="Updates the states after merging.",
+                before_agent_callback=update_merger_states,
+            )
+            init_solution_gen_sub_agents.extend(
+                [
+                    merge_and_debug_loop_agent,
+                    merger_states_update_agent,
+                ]
+            )
+        selection_agent = agents.SequentialAgent(
+            name=f"selection_agent_{k+1}",
+            description="Select the best solution.",
+            before_agent_callback=select_best_solution,
         )
-    selection_agent = agents.SequentialAgent(
-        name=f"selection_agent_{k+1}",
-        description="Select the best solution.",
-        before_agent_callback=select_best_solution,
-    )
-    init_solution_gen_sub_agents.append(selection_agent)
-    if config.CONFIG.use_data_usage_checker:
-        check_data_use_and_debug_loop_agent = debug_util.get_run_and_debug_agent(
-            prefix="check_data_use",
-            suffix=f"{k+1}",
-            agent_description="Check if all the provided information is used",
-            instruction_func=get_check_data_use_instruction,
-            before_model_callback=skip_data_use_check,
+        init_solution_gen_sub_agents.append(selection_agent)
+        if cfg.use_data_usage_checker:
+            check_data_use_and_debug_loop_agent = debug_util.get_run_and_debug_agent(
+                prefix="check_data_use",
+                suffix=f"{k+1}",
+                agent_description="Check if all the provided information is used",
+                instruction_func=get_check_data_use_instruction,
+                before_model_callback=skip_data_use_check,
+                cfg=cfg,
+            )
+            init_solution_gen_sub_agents.append(check_data_use_and_debug_loop_agent)
+        init_solution_gen_agent = agents.SequentialAgent(
+            name=f"init_solution_gen_agent_{k+1}",
+            description="Generate an initial solutions for the given task.",
+            sub_agents=init_solution_gen_sub_agents,
+            before_agent_callback=create_workspace,
         )
-        init_solution_gen_sub_agents.append(check_data_use_and_debug_loop_agent)
-    init_solution_gen_agent = agents.SequentialAgent(
-        name=f"init_solution_gen_agent_{k+1}",
-        description="Generate an initial solutions for the given task.",
-        sub_agents=init_solution_gen_sub_agents,
-        before_agent_callback=create_workspace,
+        init_parallel_sub_agents.append(init_solution_gen_agent)
+    init_parallel_agent = agents.ParallelAgent(
+        name="init_parallel_agent",
+        description="Generate multiple initial solutions for the given task in parallel.",
+        sub_agents=init_parallel_sub_agents,
+    )
+    initialization_agent = agents.SequentialAgent(
+        name="initialization_agent",
+        description="Initialize the states and generate initial solutions.",
+        sub_agents=[
+            task_summarization_agent,
+            data_profile_agent,
+            init_parallel_agent,
+        ],
+        before_agent_callback=functools.partial(prepare_task, cfg=cfg),
     )
-    init_parallel_sub_agents.append(init_solution_gen_agent)
-init_parallel_agent = agents.ParallelAgent(
-    name="init_parallel_agent",
-    description="Generate multiple initial solutions for the given task in parallel.",
-    sub_agents=init_parallel_sub_agents,
-)
-initialization_agent = agents.SequentialAgent(
-    name="initialization_agent",
-    description="Initialize the states and generate initial solutions.",
-    sub_agents=[
-        task_summarization_agent,
-        init_parallel_agent,
-    ],
-    before_agent_callback=prepare_task,
-)
+    return initialization_agent
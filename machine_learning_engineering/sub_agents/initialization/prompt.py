@@ -1,5 +1,7 @@
 """Defines the prompts for the initialization agent."""
 
+from machine_learning_engineering.shared_libraries import runtime_prompt
+
 SUMMARIZATION_AGENT_INSTR = """# Task description
 {task_description}
 
@@ -54,8 +56,7 @@ MODEL_EVAL_INSTR = """# Introduction
 - The code should be a single-file Python program that is self-contained and can be executed as-is.
 - Your response should only contain a single code block.
 - Do not use exit() function in the Python code.
-- Do not use try: and except: or if else to ignore unintended behavior.
-"""
+- Do not use try: and except: or if else to ignore unintended behavior.""" + runtime_prompt.SAVE_PREDICTIONS_INSTR + runtime_prompt.SAVE_MODELS_INSTR + runtime_prompt.RUN_CV_INSTR + runtime_prompt.LOG_METRICS_INSTR
 
 BUG_SUMMARY_INSTR = """# Error report
 {bug}
@@ -116,7 +117,7 @@ CODE_INTEGRATION_INSTR = """# Introduction
 - The code should be a single-file Python program that is self-contained and can be executed as-is.
 - Your response should only contain a single code block.
 - Do not use exit() function in the Python code.
-- Do not use try: and except: or if else to ignore unintended behavior."""
+- Do not use try: and except: or if else to ignore unintended behavior.""" + runtime_prompt.SAVE_PREDICTIONS_INSTR + runtime_prompt.SAVE_MODELS_INSTR + runtime_prompt.RUN_CV_INSTR + runtime_prompt.LOG_METRICS_INSTR
 
 CHECK_DATA_USE_INSTR = """I have provided Python code for a machine learning task (attached below):
 # Solution Code
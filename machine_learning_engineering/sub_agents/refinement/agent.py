@@ -2,63 +2,101 @@
 
 import os
 import json
-from typing import Optional
+from typing import Any, Mapping, Optional, Union
 import functools
 
 from google.adk.agents import callback_context as callback_context_module
 from google.adk.models import llm_response as llm_response_module
 from google.adk.models import llm_request as llm_request_module
 from google.adk import agents
-from google.adk.models.lite_llm import LiteLlm    
 from google.genai import types
 
 from machine_learning_engineering.sub_agents.refinement import prompt
 from machine_learning_engineering.shared_libraries import debug_util
 from machine_learning_engineering.shared_libraries import check_leakage_util
 from machine_learning_engineering.shared_libraries import common_util
+from machine_learning_engineering.shared_libraries import budget_util
 from machine_learning_engineering.shared_libraries import config
-import base64
-import re
+from machine_learning_engineering.shared_libraries import data_profile
 
 # --- Helper for Multimodal Prompts ---
-def build_multimodal_prompt(base_instruction: str, context: callback_context_module.ReadonlyContext) -> list:
-    """Builds a multimodal prompt including text and images from the state."""
-    task_description_text = context.state.get("task_description_text", "")
-    task_images = context.state.get("task_images", [])
-
-    # Start with the base instruction for the current agent
-    prompt_parts = [base_instruction]
-
-    # Split the main description by image placeholders and interleave images
-    remaining_text = task_description_text
-    for img_data in task_images:
-        # Use regex to handle potential variations in placeholder format
-        placeholder_regex = re.escape(img_data["placeholder"])
-        parts = re.split(placeholder_regex, remaining_text, 1)
-        if len(parts) == 2:
-            prompt_parts.append(parts[0]) # Text before the image
-            prompt_parts.append(types.Part.from_data(
-                mime_type=img_data["mime_type"],
-                data=base64.b64decode(img_data["base64"])
-            ))
-            remaining_text = parts[1]
-    
-    prompt_parts.append(remaining_text) # Append any remaining text
+@functools.lru_cache(maxsize=None)
+def _read_image(path: str) -> bytes:
+    """Reads an image of the task description once per process."""
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def add_task_description(
+    callback_context: callback_context_module.CallbackContext,
+    llm_request: llm_request_module.LlmRequest,
+) -> None:
+    """Adds the task description to the request, with its images in place of their placeholders."""
+    remaining_text = callback_context.state.get("task_description_text", "")
+    parts = []
+    for img_data in callback_context.state.get("task_images", []):
+        before, placeholder, after = remaining_text.partition(img_data["placeholder"])
+        if not placeholder:
+            continue
+        if before:
+            parts.append(types.Part(text=before))
+        parts.append(types.Part.from_bytes(
+            data=_read_image(img_data["path"]),
+            mime_type=img_data["mime_type"],
+        ))
+        remaining_text = after
+    if remaining_text:
+        parts.append(types.Part(text=remaining_text))
+    if parts:
+        llm_request.contents.append(types.Content(role="user", parts=parts))
 
-    return prompt_parts
 
 # --- Model Setup for Horizon-Beta ---
-# Set up the advanced model using LiteLlm with OpenRouter
+# The advanced model is set up with LiteLlm and OpenRouter on first use, so
+# that importing this module neither imports litellm nor talks to the network.
 # This model will be used for the most critical reasoning tasks.
-try:
-    horizon_model = LiteLlm(
-        model="openrouter/horizon-beta",
-        api_key=os.environ.get("OPENROUTER_API_KEY")
+@functools.lru_cache(maxsize=None)
+def _init_lite_llm_model(
+    model_name: str,
+    fallback_model: str,
+) -> Union[str, "lite_llm.LiteLlm"]:
+    """Initializes a LiteLlm model, falling back to the default model."""
+    try:
+        from google.adk.models import lite_llm
+        model = lite_llm.LiteLlm(
+            model=model_name,
+            api_key=os.environ.get("OPENROUTER_API_KEY")
+        )
+        print(f"Successfully initialized {model_name} model for refinement agent.")
+    except Exception as e:
+        print(f"Failed to initialize {model_name} model: {e}. Falling back to default.")
+        model = fallback_model
+    return model
+
+
+def get_refinement_model(
+    cfg: config.DefaultConfig,
+) -> Union[str, "lite_llm.LiteLlm"]:
+    """Gets the model used by the planning agents of the refinement step."""
+    if not cfg.refinement_model:
+        return cfg.agent_model
+    if cfg.refinement_model.startswith("openrouter/"):
+        return _init_lite_llm_model(cfg.refinement_model, cfg.agent_model)
+    return cfg.refinement_model
+
+
+def is_refinement_over_budget(
+    callback_context: callback_context_module.CallbackContext,
+    task_id: str,
+) -> bool:
+    """Checks if there is no time left for another refinement attempt."""
+    step = callback_context.state.get(f"refine_step_{task_id}", 0)
+    exec_result = callback_context.state.get(f"train_code_exec_result_{step}_{task_id}", {})
+    return budget_util.is_over_budget(
+        callback_context.state,
+        "refinement",
+        budget_util.estimate_iteration_time(exec_result),
     )
-    print("Successfully initialized Horizon-Beta model for refinement agent.")
-except Exception as e:
-    print(f"Failed to initialize Horizon-Beta model: {e}. Falling back to default.")
-    horizon_model = config.CONFIG.agent_model
 
 
 def update_inner_loop_states(
@@ -82,16 +120,22 @@ def update_outer_loop_states(
     inner_loop_round = callback_context.state.get("inner_loop_round", 2)
     run_cwd = os.path.join(workspace_dir, task_name, task_id)
     prev_solution = callback_context.state.get(
-        f"train_code_{{step}}_{task_id}", ""
+        f"train_code_{step}_{task_id}", ""
     )
     prev_exec_result = callback_context.state.get(
-        f"train_code_exec_result_{{step}}_{task_id}", {{}}
+        f"train_code_exec_result_{step}_{task_id}", {}
     )
     improvements = []
-    for inner_iter in range(inner_loop_round):
+    # The initial plan is implemented at inner iteration 0, and the refined
+    # plans at inner iterations 1 to `inner_loop_round`.
+    for inner_iter in range(inner_loop_round + 1):
         exec_result = callback_context.state.get(
-            f"train_code_improve_exec_result_{{inner_iter}}_{step}_{task_id}", {{}}
+            f"train_code_improve_exec_result_{inner_iter}_{step}_{task_id}", {}
         )
+        if "score" not in exec_result or "score" not in prev_exec_result:
+            # The attempt was skipped or failed.
+            improvements.append(-float("inf"))
+            continue
         if lower:
             improvement = prev_exec_result["score"] - exec_result["score"]
         else:
@@ -99,36 +143,36 @@ def update_outer_loop_states(
         improvements.append(improvement)
     best_improvement = max(improvements)
     best_idx = improvements.index(best_improvement)
-    output_filepath = os.path.join(run_cwd, f"train{{step+1}}.py")
+    output_filepath = os.path.join(run_cwd, f"train{step+1}.py")
     if best_improvement <= 0.0:
         callback_context.state[
-            f"train_code_{{step+1}}_{task_id}"
+            f"train_code_{step+1}_{task_id}"
         ] = prev_solution
         callback_context.state[
-            f"train_code_exec_result_{{step+1}}_{task_id}"
+            f"train_code_exec_result_{step+1}_{task_id}"
         ] = prev_exec_result
         with open(output_filepath, "w", encoding="utf-8") as f:
             f.write(prev_solution)
     else:
         best_solution = callback_context.state.get(
-            f"train_code_improve_{{best_idx}}_{step}_{task_id}", ""
+            f"train_code_improve_{best_idx}_{step}_{task_id}", ""
         )
         best_exec_result = callback_context.state.get(
-            f"train_code_improve_exec_result_{{best_idx}}_{step}_{task_id}", {{}}
+            f"train_code_improve_exec_result_{best_idx}_{step}_{task_id}", {}
         )
         callback_context.state[
-            f"train_code_{{step+1}}_{task_id}"
+            f"train_code_{step+1}_{task_id}"
         ] = best_solution
         callback_context.state[
-            f"train_code_exec_result_{{step+1}}_{task_id}"
+            f"train_code_exec_result_{step+1}_{task_id}"
         ] = best_exec_result
         with open(output_filepath, "w", encoding="utf-8") as f:
             f.write(best_solution)
     ablation_results = callback_context.state.get(
-        f"ablation_summary_{{step}}_{task_id}", ""
+        f"ablation_summary_{step}_{task_id}", ""
     )
     code_block = callback_context.state.get(
-        f"refine_code_block_{{step}}_{task_id}", ""
+        f"refine_code_block_{step}_{task_id}", ""
     )
     callback_context.state[f"prev_ablations_{task_id}"].append(ablation_results)
     callback_context.state[f"prev_code_blocks_{task_id}"].append(code_block)
@@ -162,10 +206,10 @@ def get_ablation_agent_instruction(
     task_id = context.agent_name.split("_")[-1]
     prev_ablations = context.state.get(f"prev_ablations_{task_id}", [])
     step = context.state.get(f"refine_step_{task_id}", 0)
-    code = context.state.get(f"train_code_{{step}}_{task_id}", "")
+    code = context.state.get(f"train_code_{step}_{task_id}", "")
     prev_ablations_str = ""
     for i, ablation_result in enumerate(prev_ablations):
-        prev_ablations_str += f"## Previous ablation study result {{i+1}}\n"
+        prev_ablations_str += f"## Previous ablation study result {i+1}\n"
         prev_ablations_str += f"{ablation_result}\n\n"
     if prev_ablations_str:
         instruction = prompt.ABLATION_SEQ_INSTR.format(
@@ -185,18 +229,21 @@ def get_ablation_summary_agent_instruction(
     """Gets the ablation summary agent instruction."""
     task_id = context.agent_name.split("_")[-1]
     step = context.state.get(f"refine_step_{task_id}", 0)
-    code = context.state.get(f"ablation_code_{{step}}_{task_id}", "")
-    result_dict = context.state.get(f"ablation_code_exec_result_{{step}}_{task_id}", {{}})
-    return prompt.SUMMARIZE_ABLATION_INSTR.format(
+    code = context.state.get(f"ablation_code_{step}_{task_id}", "")
+    result_dict = context.state.get(f"ablation_code_exec_result_{step}_{task_id}", {})
+    instruction = prompt.SUMMARIZE_ABLATION_INSTR.format(
         code=code,
-        result=result_dict["ablation_result"],
+        result=result_dict.get("ablation_result", ""),
+    )
+    return instruction + get_profile_description(
+        context.state, task_id, step, prompt.PROFILE_SUMMARY_TASK
     )
 
 
 def get_init_plan_agent_instruction(
     context: callback_context_module.ReadonlyContext,
-) -> list:
-    """Gets the initial plan agent instruction, now in multimodal format."""
+) -> str:
+    """Gets the initial plan agent instruction."""
     task_id = context.agent_name.split("_")[-1]
     step = context.state.get(f"refine_step_{task_id}", 0)
     code = context.state.get(f"train_code_{step}_{task_id}", "")
@@ -213,23 +260,25 @@ def get_init_plan_agent_instruction(
             ablation_results=ablation_results,
             prev_code_blocks=prev_code_blocks,
         )
-    return build_multimodal_prompt(instruction_text, context)
+    return instruction_text
 
 def get_plan_refinement_instruction(
     context: callback_context_module.ReadonlyContext,
-) -> list:
-    """Gets plan refinement instruction, now in multimodal format."""
+) -> str:
+    """Gets plan refinement instruction."""
     lower = context.state.get("lower", True)
     task_id = context.agent_name.split("_")[-1]
     step = context.state.get(f"refine_step_{task_id}", 0)
-    code_block = context.state.get(f"refine_code_block_{{step}}_{task_id}", "")
-    prev_plans = context.state.get(f"refine_plans_{{step}}_{task_id}", [])
-    prev_exec_result = context.state.get(f"train_code_exec_result_{{step}}_{task_id}", {{}})
+    code_block = context.state.get(f"refine_code_block_{step}_{task_id}", "")
+    prev_plans = context.state.get(f"refine_plans_{step}_{task_id}", [])
+    prev_exec_result = context.state.get(f"train_code_exec_result_{step}_{task_id}", {})
     score_plan_time_list = []
     for inner_iter, curr_plan in enumerate(prev_plans):
         exec_result = context.state.get(
-            f"train_code_improve_exec_result_{{inner_iter}}_{step}_{task_id}", {{}}
+            f"train_code_improve_exec_result_{inner_iter}_{step}_{task_id}", {}
         )
+        if "score" not in exec_result or "score" not in prev_exec_result:
+            continue
         if lower:
             improvement = prev_exec_result["score"] - exec_result["score"]
         else:
@@ -248,7 +297,74 @@ def get_plan_refinement_instruction(
         code_block=code_block,
         prev_plan_summary=prev_plan_summary,
     )
-    return build_multimodal_prompt(instruction_text, context)
+    return (
+        instruction_text
+        + get_tune_results_description(context.state, task_id, step)
+        + get_profile_description(context.state, task_id, step, prompt.PROFILE_PLAN_TASK)
+    )
+
+def get_tune_results_description(
+    state: Mapping[str, Any],
+    task_id: str,
+    step: int,
+) -> str:
+    """Describes the hyperparameter searches run by the implemented plans of a step."""
+    plans = state.get(f"refine_plans_{step}_{task_id}", [])
+    lines = []
+    for inner_iter, plan in enumerate(plans):
+        exec_result = state.get(
+            f"train_code_improve_exec_result_{inner_iter}_{step}_{task_id}", {}
+        )
+        tune_result = exec_result.get("tune_result")
+        if not tune_result:
+            continue
+        lines.append(f"## Plan: {plan}")
+        lines.append(f"## Best hyperparameters: {json.dumps(tune_result['best_params'], default=str)}")
+        if tune_result.get("best_resource") is not None:
+            lines.append(f"## Best resource (rounds or epochs): {tune_result['best_resource']}")
+        lines.append(
+            f"## Search score: {tune_result['best_score']:.5f}"
+            f" ({tune_result['num_trials']} configurations tried)"
+        )
+        lines.append("")
+    if not lines:
+        return ""
+    return "\n".join([
+        "",
+        "# Hyperparameter search results",
+        "The hyperparameter searches run by the implementations of the previous plans found the following. When the plan keeps the searched model, write these values into the code block as fixed hyperparameters instead of searching again.",
+        "",
+        *lines,
+    ])
+
+
+def get_profile_description(
+    state: Mapping[str, Any],
+    task_id: str,
+    step: int,
+    task: str,
+) -> str:
+    """Describes where the time of the solution refined in a step is spent."""
+    exec_result = state.get(f"train_code_exec_result_{step}_{task_id}", {})
+    profile = exec_result.get("profile")
+    if not profile or not profile["lines"]:
+        return ""
+    wall_time = max(profile["wall_time"], 1e-9)
+    hot_lines = [
+        f"- line {entry['line']} ({entry['time']:.1f}s, {entry['time'] / wall_time:.0%}): `{entry['code']}`"
+        for entry in profile["lines"]
+    ]
+    hot_functions = [
+        f"- {entry['function']} ({entry['file']}:{entry['line']}): {entry['total_time']:.1f}s, {entry['self_time']:.1f}s in itself"
+        for entry in profile["functions"]
+    ]
+    return prompt.PROFILE_INSTR.format(
+        wall_time=profile["wall_time"],
+        hot_lines="\n".join(hot_lines),
+        hot_functions="\n".join(hot_functions),
+        task=task,
+    )
+
 
 def get_plan_implement_agent_instruction(
     context: callback_context_module.ReadonlyContext,
@@ -256,12 +372,17 @@ def get_plan_implement_agent_instruction(
     """Gets the plan implement agent instruction."""
     task_id = context.agent_name.split("_")[-1]
     step = context.state.get(f"refine_step_{task_id}", 0)
-    code_block = context.state.get(f"refine_code_block_{{step}}_{task_id}", "")
-    plan = context.state.get(f"refine_plans_{{step}}_{task_id}", [""])[-1]
-    return prompt.IMPLEMENT_PLAN_INSTR.format(
+    code_block = context.state.get(f"refine_code_block_{step}_{task_id}", "")
+    plan = context.state.get(f"refine_plans_{step}_{task_id}", [""])[-1]
+    instruction = prompt.IMPLEMENT_PLAN_INSTR.format(
         code_block=code_block,
         plan=plan,
     )
+    return (
+        instruction
+        + get_tune_results_description(context.state, task_id, step)
+        + data_profile.get_data_profile_instruction(context.state)
+    )
 
 def check_ablation_finish(
     callback_context: callback_context_module.CallbackContext,
@@ -271,13 +392,28 @@ def check_ablation_finish(
     task_id = callback_context.agent_name.split("_")[-1]
     callback_context.state[f"ablation_skip_data_leakage_check_{task_id}"] = True
     step = callback_context.state.get(f"refine_step_{task_id}", 0)
-    result_dict = callback_context.state.get(f"ablation_code_exec_result_{{step}}_{task_id}", {{}})
+    result_dict = callback_context.state.get(f"ablation_code_exec_result_{step}_{task_id}", {})
     if result_dict.get("returncode", 1) == 0:
         return llm_response_module.LlmResponse()
+    if is_refinement_over_budget(callback_context, task_id):
+        return llm_response_module.LlmResponse()
     callback_context.state[f"ablation_skip_data_leakage_check_{task_id}"] = False
     return None
 
 
+def check_ablation_summary_finish(
+    callback_context: callback_context_module.CallbackContext,
+    llm_request: llm_request_module.LlmRequest,
+) -> Optional[llm_response_module.LlmResponse]:
+    """Skips the ablation summary if the ablation study did not succeed."""
+    task_id = callback_context.agent_name.split("_")[-1]
+    step = callback_context.state.get(f"refine_step_{task_id}", 0)
+    result_dict = callback_context.state.get(f"ablation_code_exec_result_{step}_{task_id}", {})
+    if result_dict.get("returncode", 1) != 0:
+        return llm_response_module.LlmResponse()
+    return None
+
+
 def check_init_plan_finish(
     callback_context: callback_context_module.CallbackContext,
     llm_request: llm_request_module.LlmRequest,
@@ -285,11 +421,30 @@ def check_init_plan_finish(
     """Checks if the initial plan is finished."""
     task_id = callback_context.agent_name.split("_")[-1]
     step = callback_context.state.get(f"refine_step_{task_id}", 0)
-    code = callback_context.state.get(f"train_code_{{step}}_{task_id}", "")
-    code_block = callback_context.state.get(f"refine_code_block_{{step}}_{task_id}", "")
+    code = callback_context.state.get(f"train_code_{step}_{task_id}", "")
+    code_block = callback_context.state.get(f"refine_code_block_{step}_{task_id}", "")
     status = code and code_block and (code_block in code)
     if status:
         return llm_response_module.LlmResponse()
+    if is_refinement_over_budget(callback_context, task_id):
+        return llm_response_module.LlmResponse()
+    add_task_description(callback_context, llm_request)
+    return None
+
+
+def check_plan_refine_finish(
+    callback_context: callback_context_module.CallbackContext,
+    llm_request: llm_request_module.LlmRequest,
+) -> Optional[llm_response_module.LlmResponse]:
+    """Skips the plan refinement without a code block or time left."""
+    task_id = callback_context.agent_name.split("_")[-1]
+    step = callback_context.state.get(f"refine_step_{task_id}", 0)
+    code_block = callback_context.state.get(f"refine_code_block_{step}_{task_id}", "")
+    if not code_block:
+        return llm_response_module.LlmResponse()
+    if is_refinement_over_budget(callback_context, task_id):
+        return llm_response_module.LlmResponse()
+    add_task_description(callback_context, llm_request)
     return None
 
 def check_plan_implement_finish(
@@ -300,13 +455,16 @@ def check_plan_implement_finish(
     task_id = callback_context.agent_name.split("_")[-1]
     step = callback_context.state.get(f"refine_step_{task_id}", 0)
     inner_iter = callback_context.state.get(f"inner_iter_{task_id}", 0)
-    suffix = f"{inner_iter}_{{step}}_{task_id}"
+    suffix = f"{inner_iter}_{step}_{task_id}"
     result_dict = callback_context.state.get(
-        f"train_code_improve_exec_result_{{suffix}}", {{}}
+        f"train_code_improve_exec_result_{suffix}", {}
     )
     callback_context.state[f"plan_implement_skip_data_leakage_check_{suffix}"] = True
     if result_dict:
         return llm_response_module.LlmResponse()
+    code_block = callback_context.state.get(f"refine_code_block_{step}_{task_id}", "")
+    if not code_block or is_refinement_over_budget(callback_context, task_id):
+        return llm_response_module.LlmResponse()
     callback_context.state[f"plan_implement_skip_data_leakage_check_{suffix}"] = False
     return None
 
@@ -318,7 +476,7 @@ def get_ablation_summary(
     response_text = common_util.get_text_from_response(llm_response)
     task_id = callback_context.agent_name.split("_")[-1]
     step = callback_context.state.get(f"refine_step_{task_id}", 0)
-    callback_context.state[f"ablation_summary_{{step}}_{task_id}"] = response_text
+    callback_context.state[f"ablation_summary_{step}_{task_id}"] = response_text
     return None
 
 def get_plan_and_code_block(
@@ -338,8 +496,8 @@ def get_plan_and_code_block(
     except Exception:
         plan = ""
         code_block = ""
-    callback_context.state[f"refine_plans_{{step}}_{task_id}"] = [plan]
-    callback_context.state[f"refine_code_block_{{step}}_{task_id}"] = code_block
+    callback_context.state[f"refine_plans_{step}_{task_id}"] = [plan]
+    callback_context.state[f"refine_code_block_{step}_{task_id}"] = code_block
     return None
 
 def get_refined_plan(
@@ -350,152 +508,164 @@ def get_refined_plan(
     response_text = common_util.get_text_from_response(llm_response)
     task_id = callback_context.agent_name.split("_")[-1]
     step = callback_context.state.get(f"refine_step_{task_id}", 0)
-    callback_context.state[f"refine_plans_{{step}}_{task_id}"].append(response_text)
+    callback_context.state[f"refine_plans_{step}_{task_id}"].append(response_text)
     return None
 
 
-use_data_leakage_checker = config.CONFIG.use_data_leakage_checker
-refinement_parallel_sub_agents = []
-for k in range(config.CONFIG.num_solutions):
-    ablation_agent = agents.Agent(
-        model=config.CONFIG.agent_model,
-        name=f"ablation_agent_{k+1}",
-        description="Perform ablation studies to improve the solution.",
-        instruction=get_ablation_agent_instruction,
-        before_model_callback=check_ablation_finish,
-        after_model_callback=functools.partial(
-            debug_util.get_code_from_response,
-            do_eval=not use_data_leakage_checker,
-        ),
-        generate_content_config=types.GenerateContentConfig(
-            temperature=1.0,
-        ),
-        include_contents="none",
-    )
-    ablation_sequential_sub_agents = [ablation_agent]
-    if use_data_leakage_checker:
-        data_leakage_checker_agent = check_leakage_util.get_data_leakage_checker_agent(
+def build_refinement_agent(
+    cfg: config.DefaultConfig,
+) -> agents.ParallelAgent:
+    """Builds the refinement agent for the given configuration."""
+    use_data_leakage_checker = cfg.use_data_leakage_checker
+    horizon_model = get_refinement_model(cfg)
+    refinement_parallel_sub_agents = []
+    for k in range(cfg.num_solutions):
+        ablation_agent = agents.Agent(
+            model=cfg.agent_model,
+            name=f"ablation_agent_{k+1}",
+            description="Perform ablation studies to improve the solution.",
+            instruction=get_ablation_agent_instruction,
+            before_model_callback=check_ablation_finish,
+            after_model_callback=functools.partial(
+                debug_util.get_code_from_response,
+                do_eval=not use_data_leakage_checker,
+            ),
+            generate_content_config=types.GenerateContentConfig(
+                temperature=1.0,
+            ),
+            include_contents="none",
+        )
+        ablation_sequential_sub_agents = [ablation_agent]
+        if use_data_leakage_checker:
+            data_leakage_checker_agent = check_leakage_util.get_data_leakage_checker_agent(
+                prefix="ablation",
+                suffix=f"{k+1}",
+                cfg=cfg,
+            )
+            ablation_sequential_sub_agents.append(data_leakage_checker_agent)
+            additional_agent_description = " and check if there are data leakage issues"
+        else:
+            additional_agent_description = ""
+        ablation_sequential_agent = agents.SequentialAgent(
+            name=f"ablation_sequential_agent_{k+1}",
+            description=f"Perform ablation studies{additional_agent_description}.",
+            sub_agents=ablation_sequential_sub_agents,
+        )
+        debug_inner_loop_agent = debug_util.get_debug_inner_loop_agent(
             prefix="ablation",
             suffix=f"{k+1}",
+            cfg=cfg,
         )
-        ablation_sequential_sub_agents.append(data_leakage_checker_agent)
-        additional_agent_description = " and check if there are data leakage issues"
-    else:
-        additional_agent_description = ""
-    ablation_sequential_agent = agents.SequentialAgent(
-        name=f"ablation_sequential_agent_{k+1}",
-        description=f"Perform ablation studies{additional_agent_description}.",
-        sub_agents=ablation_sequential_sub_agents,
-    )
-    debug_inner_loop_agent = debug_util.get_debug_inner_loop_agent(
-        prefix="ablation",
-        suffix=f"{k+1}",
-    )
-    ablation_and_debug_loop_agent = agents.LoopAgent(
-        name=f"ablation_and_debug_loop_agent_{k+1}",
-        description="Perform ablation studies and debug the code until it succeeds.",
-        sub_agents=[
-            ablation_sequential_agent,
-            debug_inner_loop_agent,
-        ],
-        max_iterations=config.CONFIG.max_rollback_round,
-    )
-    ablation_summary_agent = agents.Agent(
-        model=config.CONFIG.agent_model,
-        name=f"ablation_summary_agent_{k+1}",
-        description="Summarize the ablation study results.",
-        instruction=get_ablation_summary_agent_instruction,
-        after_model_callback=get_ablation_summary,
-        generate_content_config=types.GenerateContentConfig(
-            temperature=0.0,
-        ),
-        include_contents="none",
-    )
-    init_plan_agent = agents.Agent(
-        model=horizon_model,
-        name=f"init_plan_agent_{k+1}",
-        description="Generate an initial plan and a code block.",
-        instruction=get_init_plan_agent_instruction,
-        before_model_callback=check_init_plan_finish,
-        after_model_callback=get_plan_and_code_block,
-        generate_content_config=types.GenerateContentConfig(
-            temperature=1.0,
-        ),
-        include_contents="none",
-    )
-    init_plan_loop_agent = agents.LoopAgent(
-        name=f"init_plan_loop_agent_{k+1}",
-        description=(
-            "Generate an initial plan and a code block until the code block is valid."
-        ),
-        sub_agents=[init_plan_agent],
-        before_agent_callback=init_inner_loop_states,
-        max_iterations=config.CONFIG.max_retry,
-    )
-    init_plan_implement_agent = debug_util.get_run_and_debug_agent(
-        prefix="plan_implement_initial",
-        suffix=f"{k+1}",
-        agent_description="Implement the initial plan to generate a solution.",
-        instruction_func=get_plan_implement_agent_instruction,
-        before_model_callback=check_plan_implement_finish,
-    )
-    plan_refine_agent = agents.Agent(
-        model=horizon_model,
-        name=f"plan_refine_agent_{k+1}",
-        description="Refine the plan.",
-        instruction=get_plan_refinement_instruction,
-        after_model_callback=get_refined_plan,
-        generate_content_config=types.GenerateContentConfig(
-            temperature=1.0,
-        ),
-        include_contents="none",
-    )
-    plan_implement_agent = debug_util.get_run_and_debug_agent(
-        prefix="plan_implement",
-        suffix=f"{k+1}",
-        agent_description="Implement the plan to generate a solution.",
-        instruction_func=get_plan_implement_agent_instruction,
-        before_model_callback=check_plan_implement_finish,
-    )
-    plan_refine_and_implement_agent = agents.SequentialAgent(
-        name=f"plan_refine_and_implement_agent_{k+1}",
-        description="Refine the plan and then implement it.",
-        sub_agents=[
-            plan_refine_agent,
-            plan_implement_agent,
-        ],
-        after_agent_callback=update_inner_loop_states,
-    )
-    refine_inner_loop_agent = agents.LoopAgent(
-        name=f"refine_inner_loop_agent_{k+1}",
-        description="Refine the given solution.",
-        sub_agents=[plan_refine_and_implement_agent],
-        before_agent_callback=update_inner_loop_states,
-        max_iterations=config.CONFIG.inner_loop_round,
-    )
-    ablation_and_refine_agent = agents.SequentialAgent(
-        name=f"ablation_and_refine_agent_{k+1}",
-        description="Perform ablation study and refine the code.",
-        sub_agents=[
-            ablation_and_debug_loop_agent,
-            ablation_summary_agent,
-            init_plan_loop_agent,
-            init_plan_implement_agent,
-            refine_inner_loop_agent,
-        ],
-        after_agent_callback=update_outer_loop_states,
-    )
-    ablation_and_refine_loop_agent = agents.LoopAgent(
-        name=f"ablation_and_refine_loop_agent_{k+1}",
-        description="Perform ablation study and refine the code for multiple rounds.",
-        sub_agents=[ablation_and_refine_agent],
-        before_agent_callback=init_outer_loop_states,
-        max_iterations=config.CONFIG.outer_loop_round,
+        ablation_and_debug_loop_agent = agents.LoopAgent(
+            name=f"ablation_and_debug_loop_agent_{k+1}",
+            description="Perform ablation studies and debug the code until it succeeds.",
+            sub_agents=[
+                ablation_sequential_agent,
+                debug_inner_loop_agent,
+            ],
+            max_iterations=cfg.max_rollback_round,
+        )
+        ablation_summary_agent = agents.Agent(
+            model=cfg.agent_model,
+            name=f"ablation_summary_agent_{k+1}",
+            description="Summarize the ablation study results.",
+            instruction=get_ablation_summary_agent_instruction,
+            before_model_callback=check_ablation_summary_finish,
+            after_model_callback=get_ablation_summary,
+            generate_content_config=types.GenerateContentConfig(
+                temperature=0.0,
+            ),
+            include_contents="none",
+        )
+        init_plan_agent = agents.Agent(
+            model=horizon_model,
+            name=f"init_plan_agent_{k+1}",
+            description="Generate an initial plan and a code block.",
+            instruction=get_init_plan_agent_instruction,
+            before_model_callback=check_init_plan_finish,
+            after_model_callback=get_plan_and_code_block,
+            generate_content_config=types.GenerateContentConfig(
+                temperature=1.0,
+            ),
+            include_contents="none",
+        )
+        init_plan_loop_agent = agents.LoopAgent(
+            name=f"init_plan_loop_agent_{k+1}",
+            description=(
+                "Generate an initial plan and a code block until the code block is valid."
+            ),
+            sub_agents=[init_plan_agent],
+            before_agent_callback=init_inner_loop_states,
+            max_iterations=cfg.max_retry,
+        )
+        init_plan_implement_agent = debug_util.get_run_and_debug_agent(
+            prefix="plan_implement_initial",
+            suffix=f"{k+1}",
+            agent_description="Implement the initial plan to generate a solution.",
+            instruction_func=get_plan_implement_agent_instruction,
+            before_model_callback=check_plan_implement_finish,
+            cfg=cfg,
+        )
+        plan_refine_agent = agents.Agent(
+            model=horizon_model,
+            name=f"plan_refine_agent_{k+1}",
+            description="Refine the plan.",
+            instruction=get_plan_refinement_instruction,
+            before_model_callback=check_plan_refine_finish,
+            after_model_callback=get_refined_plan,
+            generate_content_config=types.GenerateContentConfig(
+                temperature=1.0,
+            ),
+            include_contents="none",
+        )
+        plan_implement_agent = debug_util.get_run_and_debug_agent(
+            prefix="plan_implement",
+            suffix=f"{k+1}",
+            agent_description="Implement the plan to generate a solution.",
+            instruction_func=get_plan_implement_agent_instruction,
+            before_model_callback=check_plan_implement_finish,
+            cfg=cfg,
+        )
+        plan_refine_and_implement_agent = agents.SequentialAgent(
+            name=f"plan_refine_and_implement_agent_{k+1}",
+            description="Refine the plan and then implement it.",
+            sub_agents=[
+                plan_refine_agent,
+                plan_implement_agent,
+            ],
+            after_agent_callback=update_inner_loop_states,
+        )
+        refine_inner_loop_agent = agents.LoopAgent(
+            name=f"refine_inner_loop_agent_{k+1}",
+            description="Refine the given solution.",
+            sub_agents=[plan_refine_and_implement_agent],
+            before_agent_callback=update_inner_loop_states,
+            max_iterations=cfg.inner_loop_round,
+        )
+        ablation_and_refine_agent = agents.SequentialAgent(
+            name=f"ablation_and_refine_agent_{k+1}",
+            description="Perform ablation study and refine the code.",
+            sub_agents=[
+                ablation_and_debug_loop_agent,
+                ablation_summary_agent,
+                init_plan_loop_agent,
+                init_plan_implement_agent,
+                refine_inner_loop_agent,
+            ],
+            after_agent_callback=update_outer_loop_states,
+        )
+        ablation_and_refine_loop_agent = agents.LoopAgent(
+            name=f"ablation_and_refine_loop_agent_{k+1}",
+            description="Perform ablation study and refine the code for multiple rounds.",
+            sub_agents=[ablation_and_refine_agent],
+            before_agent_callback=init_outer_loop_states,
+            max_iterations=cfg.outer_loop_round,
+        )
+        refinement_parallel_sub_agents.append(ablation_and_refine_loop_agent)
+    refinement_agent = agents.ParallelAgent(
+        name="refinement_agent",
+        description="Refine each solution by performing ablation studies.",
+        sub_agents=refinement_parallel_sub_agents,
+        before_agent_callback=None,
     )
-    refinement_parallel_sub_agents.append(ablation_and_refine_loop_agent)
-refinement_agent = agents.ParallelAgent(
-    name="refinement_agent",
-    description="Refine each solution by performing ablation studies.",
-    sub_agents=refinement_parallel_sub_agents,
-    before_agent_callback=None,
-)
+    return refinement_agent
@@ -1,5 +1,7 @@
 """Defines the prompts for the refinement agent."""
 
+from machine_learning_engineering.shared_libraries import runtime_prompt
+
 ABLATION_INSTR = """# Introduction
 - You are a Kaggle grandmaster attending a competition.
 - In order to win this competition, you need to perform an ablation study on the current Python solution to know which parts of the code contribute the most to the overall performance.
@@ -18,8 +20,7 @@ ABLATION_INSTR = """# Introduction
 - There should be no additional headings or text in your response.
 - The Python code for the ablation study should not load test data. It should only focus on training and evaluating the model on the validation set.
 - The code should include a printing statement that shows the performance of each ablation.
-- The code should consequently print out which part of the code contributes the most to the overall performance.
-"""
+- The code should consequently print out which part of the code contributes the most to the overall performance.""" + runtime_prompt.ABLATION_METRICS_INSTR
 
 ABLATION_SEQ_INSTR = """# Introduction
 - You are a Kaggle grandmaster attending a competition.
@@ -44,8 +45,7 @@ ABLATION_SEQ_INSTR = """# Introduction
 - There should be no additional headings or text in your response.
 - The Python code for the ablation study should not load test data. It should only focus on training and evaluating the model on the validation set.
 - The code should include a printing statement that shows the performance of each ablation.
-- The code should consequently print out what part of the code contributes the most to the overall performance.
-"""
+- The code should consequently print out what part of the code contributes the most to the overall performance.""" + runtime_prompt.ABLATION_METRICS_INSTR
 
 SUMMARIZE_ABLATION_INSTR = """# Your code for ablation study was:
 ```python
@@ -59,6 +59,22 @@ SUMMARIZE_ABLATION_INSTR = """# Your code for ablation study was:
 - Summarize the result of ablation study based on the code and printed output.
 """
 
+PROFILE_INSTR = """
+# Where the time of the current solution is spent
+The current Python solution ran for {wall_time:.1f} seconds under a sampling profiler.
+The lines of the solution taking the most time, including the library calls they make:
+{hot_lines}
+
+The functions taking the most time, including the functions they call:
+{hot_functions}
+
+- {task}
+"""
+
+PROFILE_SUMMARY_TASK = "Also summarize in one or two sentences where the time of the solution is spent, so that its slow parts can be made cheaper."
+
+PROFILE_PLAN_TASK = "If the code block is among the slow parts, prefer plans that also make it cheaper (e.g., early stopping, fewer redundant passes over the data, vectorized code) without lowering the score."
+
 EXTRACT_BLOCK_AND_PLAN_INSTR = """# Introduction
 - You are a Kaggle grandmaster attending a competition.
 - In order to win this competition, you need to extract a code block from the current Python solution and improve the extracted block for better performance.
@@ -139,6 +155,7 @@ PLAN_REFINEMENT_INSTR = """# Introduction
 - Suggest a better plan to improve the above code block.
 - The suggested plan must be novel and effective.
 - Please avoid plans which can make the solution's running time too long (e.g., searching hyperparameters in a very large search space).
+- To tune hyperparameters, plan a budgeted search with `mle_runtime.tune` rather than a hand-picked grid.
 - The suggested plan should be differ from the previous plans you have tried and should receive a higher score.
 
 # Response format
@@ -166,5 +183,4 @@ IMPLEMENT_PLAN_INSTR = """# Introduction
 
 # Response format
 - Your response should be a single markdown code block (wrapped in ```) which is the improved code block.
-- There should be no additional headings or text in your response.
-"""
+- There should be no additional headings or text in your response.""" + runtime_prompt.KEEP_RUNTIME_INSTR + runtime_prompt.RUN_CV_INSTR + runtime_prompt.TUNE_INSTR + runtime_prompt.LOG_METRICS_INSTR
@@ -1,13 +1,19 @@
 """Submission agent for Machine Learning Engineering."""
 
-from typing import Optional
+from typing import Any, Mapping, Optional
+import os
 
+from google.adk import agents
 from google.adk.agents import callback_context as callback_context_module
 from google.adk.models import llm_response as llm_response_module
 from google.adk.models import llm_request as llm_request_module
 
 from machine_learning_engineering.sub_agents.submission import prompt
 from machine_learning_engineering.shared_libraries import debug_util
+from machine_learning_engineering.shared_libraries import code_util
+from machine_learning_engineering.shared_libraries import config
+from machine_learning_engineering.shared_libraries import data_util
+from machine_learning_engineering.shared_libraries.runtime import mle_runtime
 
 
 def check_submission_finish(
@@ -29,49 +35,108 @@ def check_submission_finish(
     return None
 
 
-def get_submission_and_debug_agent_instruction(
-    context: callback_context_module.ReadonlyContext,
+def get_saved_artifacts_description(
+    state: Mapping[str, Any],
+    exec_result: Mapping[str, Any],
 ) -> str:
-    """Gets the submission agent instruction."""
-    num_solutions = context.state.get("num_solutions", 2)
-    outer_loop_round = context.state.get("outer_loop_round", 2)
-    ensemble_loop_round = context.state.get("ensemble_loop_round", 2)
-    task_description = context.state.get("task_description", "")
-    lower = context.state.get("lower", True)
+    """Describes the models and test predictions saved by the final solution.
+
+    The submission code only loads them, so it reports the validation score
+    of the solution instead of validating again.
+    """
+    solution_hash = exec_result.get("code_hash", "")
+    if not solution_hash:
+        return ""
+    artifacts = [
+        f'- Model `{name}`: `mle_runtime.load_model("{name}", solution_hash="{solution_hash}")`'
+        for name in mle_runtime.list_models(solution_hash, code_util.get_artifact_dir(state))
+    ]
+    if mle_runtime.has_predictions(solution_hash, "test", code_util.get_prediction_dir(state)):
+        artifacts.append(
+            f'- Test predictions: `mle_runtime.load_predictions("{solution_hash}", "test")`'
+        )
+    if not artifacts:
+        return ""
+    return prompt.SAVED_ARTIFACTS_INSTR.format(
+        solution_hash=solution_hash,
+        artifacts="\n".join(artifacts),
+        score=exec_result.get("score"),
+    )
+
+
+def get_submission_path(state: Mapping[str, Any]) -> str:
+    """Gets the path of the submission file written by the final solution."""
+    workspace_dir = state.get("workspace_dir", "")
+    task_name = state.get("task_name", "")
+    return os.path.join(workspace_dir, task_name, "ensemble", "final", "submission.csv")
+
+
+def get_final_solution(state: Mapping[str, Any]) -> tuple[str, dict[str, Any]]:
+    """Gets the best refined or ensembled solution and its execution result."""
+    num_solutions = state.get("num_solutions", 2)
+    outer_loop_round = state.get("outer_loop_round", 2)
+    ensemble_loop_round = state.get("ensemble_loop_round", 2)
+    lower = state.get("lower", True)
     final_solution = ""
+    final_exec_result = {}
     best_score = None
     for task_id in range(1, num_solutions + 1):
-        curr_code = context.state.get(
+        curr_code = state.get(
             f"train_code_{outer_loop_round}_{task_id}", ""
         )
-        curr_exec_result = context.state.get(
-            f"train_code_exec_result_{outer_loop_round}_{task_id}", ""
+        curr_exec_result = state.get(
+            f"train_code_exec_result_{outer_loop_round}_{task_id}", {}
         )
+        if "score" not in curr_exec_result:
+            continue
         curr_score = curr_exec_result["score"]
         if (best_score is None) or (lower and curr_score < best_score) or (not lower and curr_score > best_score):
             final_solution = curr_code
+            final_exec_result = curr_exec_result
             best_score = curr_score
-    for ensemble_iter in range(ensemble_loop_round + 1):
-        curr_code = context.state.get(
-            f"ensemble_code_{ensemble_iter}", {}
+    # `numeric` is the ensemble found by the numeric search.
+    for ensemble_iter in [*range(ensemble_loop_round + 1), "numeric"]:
+        curr_code = state.get(
+            f"ensemble_code_{ensemble_iter}", ""
         )
-        curr_exec_result = context.state.get(
+        curr_exec_result = state.get(
             f"ensemble_code_exec_result_{ensemble_iter}", {}
         )
+        if "score" not in curr_exec_result:
+            # The ensemble was skipped or failed.
+            continue
         curr_score = curr_exec_result["score"]
         if (best_score is None) or (lower and curr_score < best_score) or (not lower and curr_score > best_score):
             final_solution = curr_code
+            final_exec_result = curr_exec_result
             best_score = curr_score
-    return prompt.ADD_TEST_FINAL_INSTR.format(
+    return final_solution, final_exec_result
+
+
+def get_submission_and_debug_agent_instruction(
+    context: callback_context_module.ReadonlyContext,
+) -> str:
+    """Gets the submission agent instruction."""
+    task_description = context.state.get("task_description", "")
+    final_solution, final_exec_result = get_final_solution(context.state)
+    instruction = prompt.ADD_TEST_FINAL_INSTR.format(
         task_description=task_description,
         code=final_solution,
+        artifacts=get_saved_artifacts_description(context.state, final_exec_result),
     )
+    return instruction + data_util.get_fast_inputs_instruction(context.state)
 
 
-submission_agent = debug_util.get_run_and_debug_agent(
-    prefix="submission",
-    suffix="",
-    agent_description="Add codes for creating a submission file.",
-    instruction_func=get_submission_and_debug_agent_instruction,
-    before_model_callback=check_submission_finish,
-)
+def build_submission_agent(
+    cfg: config.DefaultConfig,
+) -> agents.LoopAgent:
+    """Builds the submission agent for the given configuration."""
+    submission_agent = debug_util.get_run_and_debug_agent(
+        prefix="submission",
+        suffix="",
+        agent_description="Add codes for creating a submission file.",
+        instruction_func=get_submission_and_debug_agent_instruction,
+        before_model_callback=check_submission_finish,
+        cfg=cfg,
+    )
+    return submission_agent
@@ -1,6 +1,23 @@
 """Defines the prompts for the submission agent."""
 
 
+SAVED_ARTIFACTS_INSTR = """
+# Saved artifacts
+The Python solution was already run and saved the following artifacts under the solution hash `{solution_hash}`:
+{artifacts}
+
+Create the submission from these artifacts instead of training again, so that the code only loads them and predicts the test samples:
+```python
+import mle_runtime
+model = mle_runtime.load_model("model", solution_hash="{solution_hash}")
+test_predictions = mle_runtime.load_predictions("{solution_hash}", "test")
+mle_runtime.log_validation_score({score})
+```
+- Keep the data loading, the preprocessing and the definitions of the custom classes used by the models, and remove the training and the validation.
+- Report the validation score of the saved solution with `mle_runtime.log_validation_score({score})` instead of computing it again.
+- Stored test predictions are in the order of the test file, and can be written to the submission directly.
+"""
+
 ADD_TEST_FINAL_INSTR = """# Introduction
 - You are a Kaggle grandmaster attending a competition.
 - In order to win this competition, you need to come up with an excellent solution in Python.
@@ -14,14 +31,15 @@ ADD_TEST_FINAL_INSTR = """# Introduction
 ```python
 {code}
 ```
-
+{artifacts}
 # Your task
 - Load the test samples and create a submission file.
 - All the provided data is already prepared and available in the `./input` directory. There is no need to unzip any files.
 - Test data is available in the `./input` directory.
 - Save the test predictions in a `submission.csv` file. Put the `submission.csv` into `./final` directory.
 - You should not drop any test samples. Predict the target value for all test samples.
-- This is a very easy task because the only thing to do is to load test samples and then replace the validation samples with the test samples. Then you can even use the full training set!
+- This is a very easy task because the only thing to do is to load test samples and then replace the validation samples with the test samples. Unless saved artifacts are provided above, you can even use the full training set!
+- If the solution ensembles predictions stored with `mle_runtime`, create the submission from the ensembled stored test predictions instead of training again.
 
 # Required
 - Do not modify the given Python solution code too much. Try to integarte test submission with minimal changes.
@@ -0,0 +1,464 @@
+"""Reports the critical path and the idle time of a traced pipeline run.
+
+Reads a trace written with `use_tracing` (see `shared_libraries/tracing_util.py`)
+and rebuilds the dependency graph of the run from the nesting of its spans:
+the children of a sequential, loop or LLM agent run one after the other, and
+those of a parallel agent, such as `init_parallel_agent` and
+`refinement_agent`, at the same time. The tasks of the graph are the model
+calls, the code runs and the overhead between them (callbacks and waits).
+
+The report has:
+- the duration of every stage of the pipeline;
+- the critical path: the chain of tasks bounding the makespan even with
+  unlimited model calls and CPUs, grouped by agent;
+- the busy and idle time of every branch of the parallel agents, and their
+  parallel efficiency;
+- the makespan simulated with at most `llm_slots` concurrent model calls and
+  `code_slots` concurrent code runs, for every combination given.
+
+The agent runs the generated code synchronously on its event loop, so no two
+codes of a process ever run at the same time, which the simulation with one
+code slot reproduces. For the same reason, the time when code of another
+branch was running is left out of the overhead of a branch. The model calls
+are taken as measured, and may include such blocked time.
+
+Usage:
+    python -m machine_learning_engineering.trace_report \
+        ./machine_learning_engineering/workspace/california-housing-prices/traces/<trace>.json \
+        --llm_slots 1,2,4,8,0 --code_slots 1,2,4,8,0 --output report.json
+"""
+
+from typing import Any, Optional
+import argparse
+import bisect
+import collections
+import dataclasses
+import heapq
+import json
+import math
+
+from machine_learning_engineering.shared_libraries import tracing_util
+
+
+# Overhead shorter than this many seconds is left out of the graph.
+MIN_OVERHEAD = 1e-3
+# Slots given as 0 are unlimited.
+DEFAULT_SLOTS = "1,2,4,8,0"
+# The number of agents of the critical path shown in the text report.
+NUM_CRITICAL_AGENTS = 15
+RESOURCES = ("llm", "code", "overhead")
+
+
+@dataclasses.dataclass
+class Span:
+    """A span of the trace, in seconds."""
+    span_id: str
+    parent_id: str
+    name: str
+    category: str
+    kind: str
+    start: float
+    end: float
+    children: list["Span"] = dataclasses.field(default_factory=list)
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+@dataclasses.dataclass
+class Task:
+    """A model call, code run or overhead in the dependency graph of a run."""
+    task_id: int
+    agent: str
+    resource: str
+    duration: float
+    predecessors: list[int]
+
+
+def load_spans(trace_path: str) -> Span:
+    """Loads the spans of a trace as a tree and returns its root."""
+    spans = {}
+    for event in tracing_util.load_trace(trace_path):
+        args = event.get("args", {})
+        if event.get("ph") != "X" or "span_id" not in args:
+            continue
+        spans[args["span_id"]] = Span(
+            span_id=args["span_id"],
+            parent_id=args.get("parent_id", ""),
+            name=event["name"],
+            category=event.get("cat", ""),
+            kind=args.get("kind", ""),
+            start=event["ts"] / 1e6,
+            end=(event["ts"] + event["dur"]) / 1e6,
+        )
+    if not spans:
+        raise ValueError(f"No spans with ids in {trace_path}.")
+    roots = []
+    for span in spans.values():
+        parent = spans.get(span.parent_id)
+        (parent.children if parent else roots).append(span)
+    for span in spans.values():
+        span.children.sort(key=lambda child: child.start)
+    if len(roots) == 1:
+        return roots[0]
+    roots.sort(key=lambda root: root.start)
+    return Span(
+        span_id="",
+        parent_id="",
+        name="trace",
+        category="adk",
+        kind="sequential",
+        start=roots[0].start,
+        end=max(root.end for root in roots),
+        children=roots,
+    )
+
+
+def iter_spans(root: Span):
+    spans_to_visit = [root]
+    while spans_to_visit:
+        span = spans_to_visit.pop()
+        yield span
+        spans_to_visit.extend(reversed(span.children))
+
+
+def merge_intervals(intervals: list[tuple[float, float]]) -> list[tuple[float, float]]:
+    """Merges overlapping intervals into sorted disjoint ones."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def get_overlap(merged: list[tuple[float, float]], start: float, end: float) -> float:
+    """Gets the length of the overlap of an interval with merged intervals."""
+    overlap = 0.0
+    index = max(0, bisect.bisect_right(merged, (start, math.inf)) - 1)
+    for interval_start, interval_end in merged[index:]:
+        if interval_start >= end:
+            break
+        overlap += max(0.0, min(end, interval_end) - max(start, interval_start))
+    return overlap
+
+
+def get_busy_time(span: Span) -> float:
+    """Gets the time a span waited for a model or ran code."""
+    intervals = [
+        (descendant.start, descendant.end)
+        for descendant in iter_spans(span)
+        if descendant.category in ("llm", "code")
+    ]
+    return sum(end - start for start, end in merge_intervals(intervals))
+
+
+def is_parallel(span: Span) -> bool:
+    """Checks if the children of a span run at the same time."""
+    if span.kind == "parallel":
+        return True
+    return any(
+        child.start < previous.end - MIN_OVERHEAD
+        for previous, child in zip(span.children, span.children[1:])
+    )
+
+
+class GraphBuilder:
+    """Builds the dependency graph of the tasks of a run from its spans."""
+
+    def __init__(self, root: Span):
+        self.tasks: list[Task] = []
+        self.code_intervals = merge_intervals([
+            (span.start, span.end) for span in iter_spans(root) if span.category == "code"
+        ])
+
+    def _add_task(
+        self, agent: str, resource: str, start: float, end: float, predecessors: list[int]
+    ) -> list[int]:
+        duration = end - start
+        if resource == "overhead":
+            duration -= get_overlap(self.code_intervals, start, end)
+            if duration < MIN_OVERHEAD:
+                return predecessors
+        elif duration <= 0:
+            return predecessors
+        task = Task(len(self.tasks), agent, resource, duration, list(predecessors))
+        self.tasks.append(task)
+        return [task.task_id]
+
+    def _get_resource(self, span: Span, is_first: bool) -> str:
+        if span.category == "code":
+            return "code"
+        # The rest of a model call are its callbacks, e.g. the code run after it.
+        if span.category == "llm" and is_first:
+            return "llm"
+        return "overhead"
+
+    def build(self, span: Span, agent: str = "", predecessors: Optional[list[int]] = None) -> list[int]:
+        """Adds the tasks of a span after its predecessors and returns its last tasks."""
+        if span.category == "agent":
+            agent = span.name
+        predecessors = predecessors or []
+        if not span.children:
+            return self._add_task(agent, self._get_resource(span, True), span.start, span.end, predecessors)
+        if is_parallel(span):
+            predecessors = self._add_task(
+                agent, self._get_resource(span, True), span.start, span.children[0].start, predecessors
+            )
+            last_tasks = []
+            for child in span.children:
+                last_tasks += self.build(child, agent, predecessors)
+            end = max(child.end for child in span.children)
+            return self._add_task(agent, "overhead", end, span.end, last_tasks)
+        cursor = span.start
+        for index, child in enumerate(span.children):
+            predecessors = self._add_task(
+                agent, self._get_resource(span, index == 0), cursor, child.start, predecessors
+            )
+            predecessors = self.build(child, agent, predecessors)
+            cursor = max(cursor, child.end)
+        return self._add_task(agent, "overhead", cursor, span.end, predecessors)
+
+
+def build_graph(root: Span) -> list[Task]:
+    """Builds the dependency graph of the tasks of a run, in topological order."""
+    builder = GraphBuilder(root)
+    builder.build(root)
+    return builder.tasks
+
+
+def get_critical_path(tasks: list[Task]) -> list[Task]:
+    """Gets the longest chain of dependent tasks."""
+    if not tasks:
+        return []
+    finish_times = []
+    previous_tasks = []
+    for task in tasks:
+        previous = max(task.predecessors, key=lambda task_id: finish_times[task_id], default=None)
+        start_time = finish_times[previous] if previous is not None else 0.0
+        finish_times.append(start_time + task.duration)
+        previous_tasks.append(previous)
+    task_id = max(range(len(tasks)), key=lambda i: finish_times[i])
+    path = []
+    while task_id is not None:
+        path.append(tasks[task_id])
+        task_id = previous_tasks[task_id]
+    return path[::-1]
+
+
+def simulate(tasks: list[Task], llm_slots: int = 0, code_slots: int = 0) -> float:
+    """Simulates the makespan of a run with limited model calls and code runs.
+
+    The tasks start as soon as their predecessors finished and a slot of
+    their resource is free, first come first served. 0 slots are unlimited.
+    """
+    free_slots = {
+        "llm": llm_slots or math.inf,
+        "code": code_slots or math.inf,
+        "overhead": math.inf,
+    }
+    successors = collections.defaultdict(list)
+    num_predecessors = []
+    for task in tasks:
+        num_predecessors.append(len(set(task.predecessors)))
+        for task_id in set(task.predecessors):
+            successors[task_id].append(task.task_id)
+    # Ready tasks by resource, in the order they became ready.
+    waiting = {resource: [] for resource in RESOURCES}
+    for task in tasks:
+        if not num_predecessors[task.task_id]:
+            heapq.heappush(waiting[task.resource], (0.0, task.task_id))
+    running = []
+    time = 0.0
+    while True:
+        for resource, queue in waiting.items():
+            while queue and free_slots[resource] > 0:
+                _, task_id = heapq.heappop(queue)
+                free_slots[resource] -= 1
+                heapq.heappush(running, (time + tasks[task_id].duration, task_id))
+        if not running:
+            return time
+        time, task_id = heapq.heappop(running)
+        free_slots[tasks[task_id].resource] += 1
+        for successor in successors[task_id]:
+            num_predecessors[successor] -= 1
+            if not num_predecessors[successor]:
+                heapq.heappush(waiting[tasks[successor].resource], (time, successor))
+
+
+def get_stages(root: Span) -> list[dict[str, Any]]:
+    """Gets the duration of the sub-agents of the outermost agent."""
+    pipeline = next((span for span in iter_spans(root) if span.category == "agent"), None)
+    if pipeline is None:
+        return []
+    return [
+        {"name": child.name, "duration": child.duration}
+        for child in pipeline.children
+        if child.category == "agent"
+    ]
+
+
+def get_parallel_agents(root: Span) -> list[dict[str, Any]]:
+    """Gets the busy and idle time of the branches of every parallel agent."""
+    parallel_agents = []
+    for span in iter_spans(root):
+        if span.category != "agent" or not span.children or not is_parallel(span):
+            continue
+        branches = []
+        for child in span.children:
+            busy_time = get_busy_time(child)
+            branches.append({
+                "name": child.name,
+                "duration": child.duration,
+                "busy_time": busy_time,
+                # Waiting for callbacks, rate limits or the code of other branches.
+                "idle_within": max(0.0, child.duration - busy_time),
+                # Waiting for the slowest branch to finish.
+                "idle_after": max(0.0, span.end - child.end),
+            })
+        total_busy_time = sum(branch["busy_time"] for branch in branches)
+        parallel_agents.append({
+            "name": span.name,
+            "duration": span.duration,
+            "branches": branches,
+            "speedup": total_busy_time / span.duration if span.duration > 0 else 0.0,
+            "efficiency": (
+                total_busy_time / (len(branches) * span.duration) if span.duration > 0 else 0.0
+            ),
+        })
+    return parallel_agents
+
+
+def summarize_path(path: list[Task]) -> dict[str, Any]:
+    """Groups the tasks of the critical path by agent, in order."""
+    by_resource = collections.Counter()
+    agents = []
+    for task in path:
+        by_resource[task.resource] += task.duration
+        if not agents or agents[-1]["agent"] != task.agent:
+            agents.append({"agent": task.agent, **{resource: 0.0 for resource in RESOURCES}})
+        agents[-1][task.resource] += task.duration
+    return {
+        "length": sum(task.duration for task in path),
+        "by_resource": {resource: by_resource[resource] for resource in RESOURCES},
+        "agents": agents,
+    }
+
+
+def parse_slots(text: str) -> list[int]:
+    return [int(value) for value in text.split(",") if value.strip()]
+
+
+def analyze(
+    root: Span,
+    llm_slots: Optional[list[int]] = None,
+    code_slots: Optional[list[int]] = None,
+) -> dict[str, Any]:
+    """Analyzes the critical path, the idle time and the makespans of a run."""
+    llm_slots = llm_slots if llm_slots is not None else parse_slots(DEFAULT_SLOTS)
+    code_slots = code_slots if code_slots is not None else parse_slots(DEFAULT_SLOTS)
+    tasks = build_graph(root)
+    work = collections.Counter()
+    for task in tasks:
+        work[task.resource] += task.duration
+    return {
+        "makespan": root.duration,
+        "work": {resource: work[resource] for resource in RESOURCES},
+        "stages": get_stages(root),
+        "critical_path": summarize_path(get_critical_path(tasks)),
+        "parallel_agents": get_parallel_agents(root),
+        "simulated_makespans": [
+            {
+                "llm_slots": num_llm_slots,
+                "code_slots": num_code_slots,
+                "makespan": simulate(tasks, num_llm_slots, num_code_slots),
+            }
+            for num_llm_slots in llm_slots
+            for num_code_slots in code_slots
+        ],
+    }
+
+
+def _format_slots(slots: int) -> str:
+    return str(slots) if slots else "inf"
+
+
+def format_report(report: dict[str, Any]) -> str:
+    """Formats a report as text."""
+    work = report["work"]
+    lines = [
+        f"Makespan: {report['makespan']:.1f}s",
+        f"Work: {work['llm']:.1f}s model calls, {work['code']:.1f}s code runs, {work['overhead']:.1f}s overhead",
+        "",
+        "Stages:",
+    ]
+    lines += [f"  {stage['name']}: {stage['duration']:.1f}s" for stage in report["stages"]]
+    critical_path = report["critical_path"]
+    by_resource = critical_path["by_resource"]
+    lines += [
+        "",
+        f"Critical path: {critical_path['length']:.1f}s"
+        f" ({by_resource['llm']:.1f}s model calls, {by_resource['code']:.1f}s code runs,"
+        f" {by_resource['overhead']:.1f}s overhead)",
+    ]
+    agents = sorted(
+        critical_path["agents"], key=lambda entry: -sum(entry[resource] for resource in RESOURCES)
+    )[:NUM_CRITICAL_AGENTS]
+    for entry in agents:
+        lines.append(
+            f"  {entry['agent']}: {entry['llm']:.1f}s model, {entry['code']:.1f}s code,"
+            f" {entry['overhead']:.1f}s overhead"
+        )
+    for parallel_agent in report["parallel_agents"]:
+        lines += [
+            "",
+            f"{parallel_agent['name']}: {parallel_agent['duration']:.1f}s,"
+            f" speedup {parallel_agent['speedup']:.2f},"
+            f" efficiency {parallel_agent['efficiency']:.0%}",
+        ]
+        for branch in parallel_agent["branches"]:
+            lines.append(
+                f"  {branch['name']}: busy {branch['busy_time']:.1f}s,"
+                f" idle {branch['idle_within']:.1f}s within, {branch['idle_after']:.1f}s after"
+            )
+    lines += ["", "Simulated makespan (model call slots x code slots):"]
+    for entry in report["simulated_makespans"]:
+        lines.append(
+            f"  {_format_slots(entry['llm_slots']):>4} x {_format_slots(entry['code_slots']):>4}:"
+            f" {entry['makespan']:.1f}s"
+        )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("trace_path", type=str, help="Trace file written with `use_tracing`.")
+    parser.add_argument(
+        "--llm_slots",
+        type=str,
+        default=DEFAULT_SLOTS,
+        help="Comma-separated numbers of concurrent model calls to simulate, 0 for unlimited.",
+    )
+    parser.add_argument(
+        "--code_slots",
+        type=str,
+        default=DEFAULT_SLOTS,
+        help="Comma-separated numbers of concurrent code runs to simulate, 0 for unlimited.",
+    )
+    parser.add_argument("--output", type=str, default="", help="Path of the report as JSON.")
+    args = parser.parse_args()
+    report = analyze(
+        load_spans(args.trace_path),
+        llm_slots=parse_slots(args.llm_slots),
+        code_slots=parse_slots(args.code_slots),
+    )
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
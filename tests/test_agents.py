@@ -1,6 +1,7 @@
 """Test cases for the Machine Learning Engineering agent and its sub-agents."""
 
 
+import dataclasses
 import dotenv
 import os
 import sys
@@ -16,7 +17,9 @@ from google.adk.runners import Runner
 from google.adk.runners import InMemoryRunner
 from google.adk.sessions import InMemorySessionService
 
+from machine_learning_engineering import agent as agent_module
 from machine_learning_engineering.agent import root_agent
+from machine_learning_engineering.shared_libraries import config
 
 session_service = InMemorySessionService()
 artifact_service = InMemoryArtifactService()
@@ -57,5 +60,23 @@ async def test_happy_path():
     # The correct answer should mention 'machine learning'.
     assert "machine learning" in response.lower()
 
+
+def test_build_pipeline_per_config():
+    """Builds independent agent graphs for different scaling parameters."""
+    small_config = dataclasses.replace(
+        config.CONFIG, num_solutions=1, num_model_candidates=1, refinement_model=""
+    )
+    large_config = dataclasses.replace(
+        config.CONFIG, num_solutions=3, num_model_candidates=2, refinement_model=""
+    )
+    small_pipeline = agent_module.build_pipeline(small_config)
+    large_pipeline = agent_module.build_pipeline(large_config)
+    assert agent_module.build_pipeline(dataclasses.replace(small_config)) is small_pipeline
+    assert large_pipeline is not small_pipeline
+    assert small_pipeline.find_agent("init_solution_gen_agent_2") is None
+    assert large_pipeline.find_agent("init_solution_gen_agent_3") is not None
+    assert large_pipeline.find_agent("merger_agent_3_1") is not None
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,104 @@
+"""Test cases for the batch runner."""
+
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from machine_learning_engineering import batch_runner
+
+
+def _stub_run_task(task_dir, overrides, attempt, session_dir, progress_queue, report_updates=False):
+    """Fails the first attempt of `flaky` and kills the worker of the first attempt of `crash`."""
+    task_name = os.path.basename(task_dir)
+    progress_queue.put({"event": "started", "task_dir": task_dir, "attempt": attempt, "time": time.time()})
+    if task_name == "crash" and attempt == 1:
+        os._exit(1)
+    status = "failed" if task_name == "flaky" and attempt == 1 else "succeeded"
+    return {
+        "event": "finished",
+        "task_dir": task_dir,
+        "task_name": task_name,
+        "attempt": attempt,
+        "status": status,
+        "score": 0.5 if status == "succeeded" else None,
+        "time": time.time(),
+    }
+
+
+def test_get_num_workers():
+    """Bounds the workers by the tasks, the CPUs and the memory."""
+    assert batch_runner.get_num_workers(10, 16, 4, 0.0, 0.0) == 4
+    assert batch_runner.get_num_workers(2, 16, 4, 0.0, 0.0) == 2
+    assert batch_runner.get_num_workers(10, 16, 4, 32.0, 16.0) == 2
+    assert batch_runner.get_num_workers(10, 2, 4, 8.0, 16.0) == 1
+
+
+def test_has_submission(tmp_path):
+    """Only succeeds when the submission code ran and wrote the submission file."""
+    state = {
+        "workspace_dir": str(tmp_path),
+        "task_name": "task",
+        "submission_code_exec_result": {"returncode": 0, "score": 1e9},
+    }
+    assert not batch_runner.has_submission(state)
+    os.makedirs(tmp_path / "task" / "ensemble" / "final")
+    (tmp_path / "task" / "ensemble" / "final" / "submission.csv").write_text("id,target\n")
+    # The submission code only loaded the saved models and reported no score.
+    assert batch_runner.has_submission(state)
+    state["submission_code_exec_result"] = {"returncode": 1}
+    assert not batch_runner.has_submission(state)
+    assert not batch_runner.has_submission({})
+
+
+def test_get_final_score():
+    """Gets the score of the solution chosen for the submission."""
+    def get_state(scores, lower=True):
+        state = {"lower": lower, "num_solutions": 2, "outer_loop_round": 1, "ensemble_loop_round": 0}
+        for task_id, score in enumerate(scores, start=1):
+            state[f"train_code_exec_result_1_{task_id}"] = {"returncode": 0, "score": score}
+        return state
+
+    assert batch_runner.get_final_score(get_state([0.5, 0.3])) == 0.3
+    assert batch_runner.get_final_score(get_state([0.5, 0.3], lower=False)) == 0.5
+    state = get_state([0.5, 0.3])
+    state["ensemble_code_exec_result_numeric"] = {"returncode": 0, "score": 0.2}
+    assert batch_runner.get_final_score(state) == 0.2
+    assert batch_runner.get_final_score(get_state([1e9, 1e9])) is None
+    assert batch_runner.get_final_score(get_state([0, 0], lower=False)) is None
+    assert batch_runner.get_final_score({}) is None
+
+
+def test_run_batch_retries_failed_tasks(tmp_path, monkeypatch):
+    """Retries the failed tasks, also after their worker died, and writes the summary."""
+    monkeypatch.setattr(batch_runner, "run_task", _stub_run_task)
+    task_dirs = [str(tmp_path / task_name) for task_name in ("ok", "flaky", "crash")]
+    summary_path = str(tmp_path / "summary.jsonl")
+    results = batch_runner.run_batch(
+        task_dirs=task_dirs,
+        overrides={},
+        summary_path=summary_path,
+        session_dir=str(tmp_path / "sessions"),
+        cpu_budget=2,
+        cpus_per_task=1,
+        memory_budget_gb=0.0,
+        memory_per_task_gb=0.0,
+        max_attempts=2,
+    )
+    assert [result["status"] for result in results] == ["succeeded"] * 3
+    assert [result["attempt"] for result in results[1:]] == [2, 2]
+    with open(summary_path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert records[0]["event"] == "batch_started"
+    assert records[0]["num_workers"] == 2
+    assert records[-1]["event"] == "batch_finished"
+    assert records[-1]["num_succeeded"] == 3
+    failed = [
+        (record["task_name"], record["attempt"])
+        for record in records
+        if record["event"] == "finished" and record["status"] == "failed"
+    ]
+    assert ("flaky", 1) in failed
+    assert ("crash", 1) in failed
@@ -0,0 +1,41 @@
+"""Test cases for the time budget of a task."""
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from machine_learning_engineering.shared_libraries import budget_util
+
+
+def test_no_budget():
+    """Never skips or shrinks anything without a budget."""
+    state = {"time_budget": 0, "start_time": time.time(), "exec_timeout": 600}
+    assert budget_util.get_stage_deadline(state, "refinement") is None
+    assert not budget_util.is_over_budget(state, "ensemble", required_time=1e9)
+    assert budget_util.get_exec_timeout(state, "plan_implement_agent_1") == 600
+
+
+def test_stage_deadlines_and_exec_timeout():
+    """Splits the budget into stages and reserves time for the submission."""
+    start_time = time.time() - 1000
+    state = {
+        "time_budget": 3000,
+        "start_time": start_time,
+        "submission_time_reserve": 1000,
+        "init_budget_ratio": 0.25,
+        "refinement_budget_ratio": 0.5,
+        "exec_timeout": 600,
+        "min_exec_timeout": 90,
+    }
+    assert budget_util.get_stage_deadline(state, "initialization") == start_time + 500
+    assert budget_util.get_stage_deadline(state, "refinement") == start_time + 1500
+    assert budget_util.get_stage_deadline(state, "ensemble") == start_time + 2000
+    assert budget_util.get_stage_deadline(state, "submission") == start_time + 3000
+    assert budget_util.is_over_budget(state, "initialization")
+    assert not budget_util.is_over_budget(state, "refinement", required_time=400)
+    assert budget_util.is_over_budget(state, "refinement", required_time=600)
+    assert budget_util.get_exec_timeout(state, "model_eval_agent_1_1") == 90
+    assert 490 <= budget_util.get_exec_timeout(state, "ablation_debug_agent_1") <= 500
+    assert budget_util.get_exec_timeout(state, "submission_agent") == 600
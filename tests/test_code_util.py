@@ -0,0 +1,92 @@
+"""Test cases for running the generated code."""
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from machine_learning_engineering.shared_libraries import code_util
+
+
+def test_profiling_reports_the_hot_lines(tmp_path):
+    """Charges the time of a slow function to its lines and tells the refinement."""
+    from machine_learning_engineering.sub_agents.refinement import agent as refinement_agent
+    from machine_learning_engineering.sub_agents.refinement import prompt
+
+    code = (
+        "import time\n"
+        "def load():\n"
+        "    time.sleep(0.05)\n"
+        "def train():\n"
+        "    time.sleep(0.5)\n"
+        "load()\n"
+        "train()\n"
+        "print('Final Validation Performance: 0.5')\n"
+    )
+    state = {
+        "workspace_dir": str(tmp_path),
+        "task_name": "task",
+        "use_profiling": True,
+        "profile_top_n": 3,
+    }
+    result_dict = code_util.execute_code(code, str(tmp_path), "train0.py", 60, state)
+    assert result_dict["returncode"] == 0
+    assert "Final Validation Performance" in result_dict["stdout"]
+    profile = result_dict["profile"]
+    assert profile["lines"][0]["code"] == "time.sleep(0.5)"
+    assert profile["functions"][0]["function"] == "train"
+    assert len(profile["lines"]) <= 3
+    with open(tmp_path / "train0.py") as f:
+        assert f.read() == code
+    state["train_code_exec_result_0_1"] = result_dict
+    description = refinement_agent.get_profile_description(
+        state, "1", 0, prompt.PROFILE_PLAN_TASK
+    )
+    assert "`time.sleep(0.5)`" in description
+
+
+def test_metrics_channel_takes_precedence_over_the_output(tmp_path):
+    """Reads the score, fold scores and stage times from the metrics file."""
+    code = (
+        "import numpy as np\n"
+        "import mle_runtime\n"
+        "def train_fold(X_train, y_train, X_valid, y_valid):\n"
+        "    return np.full(len(X_valid), y_train.mean())\n"
+        "X = np.arange(20.0).reshape(10, 2)\n"
+        "y = np.arange(10.0)\n"
+        "splits = [(np.arange(5, 10), np.arange(5)), (np.arange(5), np.arange(5, 10))]\n"
+        "with mle_runtime.timed('training'):\n"
+        "    cv = mle_runtime.run_cv(train_fold, X, y, splits, metric='mae', n_jobs=1)\n"
+        "mle_runtime.log_metric('ablation_score', 0.5, variant='no scaling')\n"
+        "mle_runtime.log_validation_score(0.75)\n"
+        "print('Final Validation Performance: 0.1')\n"
+    )
+    result_dict = code_util.execute_code(code, str(tmp_path), "train0.py", 60, {})
+    assert result_dict["returncode"] == 0, result_dict["stderr"]
+    metrics = result_dict["metrics"]
+    assert code_util.get_score(result_dict) == 0.75
+    assert metrics["fold_scores"] == [5.0, 5.0]
+    assert len(metrics["fold_times"]) == 2
+    assert metrics["metrics"]["cv_score"] == 5.0
+    assert "training" in metrics["stage_times"]
+    assert "ablation_score = 0.5 (variant: no scaling)" in code_util.format_metrics(metrics)
+    # Without metrics, the score is parsed from the output.
+    result_dict = code_util.execute_code(
+        "print('Final Validation Performance: 0.25')\n", str(tmp_path), "train0.py", 60, {}
+    )
+    assert "metrics" not in result_dict
+    assert code_util.get_score(result_dict) == 0.25
+
+
+def test_failing_listener_is_logged(caplog, capsys):
+    """Reports a failing execution listener as a warning, not on stdout."""
+    def listener(event, info):
+        raise RuntimeError("broken listener")
+
+    code_util.register_execution_listener(listener)
+    try:
+        code_util.notify_execution_listeners("started", {"py_filepath": "train0.py"})
+    finally:
+        code_util.unregister_execution_listener(listener)
+    assert "broken listener" not in capsys.readouterr().out
+    assert any("started" in record.getMessage() for record in caplog.records)
@@ -0,0 +1,43 @@
+"""Test cases for the profile of the task inputs."""
+
+import os
+import sys
+
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from machine_learning_engineering.shared_libraries import data_profile
+
+
+def test_profile_is_computed_once_per_fingerprint(tmp_path):
+    """Describes the columns, the target and the ids, and reuses the profile."""
+    task_dir = tmp_path / "data" / "task"
+    task_dir.mkdir(parents=True)
+    pd.DataFrame({
+        "id": [1, 2, 3, 4],
+        "size": [1.0, None, 3.0, 4.0],
+        "label": ["cat", "dog", "cat", "cat"],
+    }).to_csv(task_dir / "train.csv", index=False)
+    pd.DataFrame({"id": [4, 5], "size": [2.0, 5.0]}).to_csv(task_dir / "test.csv", index=False)
+    state = {
+        "data_dir": str(tmp_path / "data"),
+        "workspace_dir": str(tmp_path / "workspace"),
+        "task_name": "task",
+    }
+    profile = data_profile.get_data_profile(state)
+    assert "## `train.csv`: 4 rows, 3 columns" in profile
+    assert "- `size`: float64, 25.0% missing, 3 unique, min 1, max 4, mean 2.667" in profile
+    assert "- `label`: classes 'cat' 75.0%, 'dog' 25.0%" in profile
+    assert "- `id`: 1 of 2 test ids are also train ids" in profile
+    # The profile of the same files is read back instead of computed.
+    profile_dir = tmp_path / "workspace" / "task" / data_profile.PROFILE_DIR
+    (profile_path,) = profile_dir.iterdir()
+    profile_path.write_text("cached")
+    assert data_profile.get_data_profile(state) == "cached"
+    pd.DataFrame({"id": [6], "size": [1.0]}).to_csv(task_dir / "test.csv", index=False)
+    assert data_profile.get_data_profile(state) != "cached"
+    assert data_profile.get_data_profile_instruction({"data_profile": "- `id`: int64"}).endswith(
+        "- `id`: int64\n"
+    )
+    assert data_profile.get_data_profile_instruction({}) == ""
@@ -0,0 +1,58 @@
+"""Test cases for the conversion of the task inputs."""
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from machine_learning_engineering.shared_libraries import data_util
+
+
+@pytest.mark.skipif(not data_util.has_pyarrow(), reason="pyarrow is not installed")
+def test_inputs_are_converted_once_with_the_same_values(tmp_path):
+    """Keeps the values of the CSV files and links the files into the workspaces."""
+    task_dir = tmp_path / "data" / "task"
+    task_dir.mkdir(parents=True)
+    df = pd.DataFrame({
+        "id": range(6),
+        "count": [1, 2, 3, 4, 5, 300],
+        "half": [0.5, 1.5, None, 2.0, 3.25, 4.0],
+        "price": [0.1, 0.2, 0.3, 0.4, 0.5, 0.6],
+        "city": ["a", "b", "a", "b", "a", "a"],
+    })
+    df.to_csv(task_dir / "train.csv", index=False)
+    df.to_csv(task_dir / "answer.csv", index=False)
+    state = {
+        "data_dir": str(tmp_path / "data"),
+        "workspace_dir": str(tmp_path / "workspace"),
+        "task_name": "task",
+    }
+    data_util.prepare_fast_inputs(state)
+    assert [entry["source"] for entry in state["fast_inputs"]] == ["train.csv"]
+    fast_input_dir = data_util.get_fast_input_dir(state)
+    converted = pd.read_feather(os.path.join(fast_input_dir, "train.feather"))
+    assert str(converted["count"].dtype) == "int16"
+    assert str(converted["half"].dtype) == "float32"
+    # Downcasting would change the values.
+    assert str(converted["price"].dtype) == "float64"
+    assert isinstance(converted["city"].dtype, pd.CategoricalDtype)
+    pd.testing.assert_frame_equal(
+        converted.astype({"city": object}),
+        pd.read_csv(task_dir / "train.csv").astype({"city": object}),
+        check_dtype=False,
+    )
+    pd.testing.assert_frame_equal(
+        pd.read_parquet(os.path.join(fast_input_dir, "train.parquet")), converted
+    )
+    # The unchanged files are not converted again.
+    mtime = os.path.getmtime(os.path.join(fast_input_dir, "train.feather"))
+    data_util.prepare_fast_inputs(state)
+    assert os.path.getmtime(os.path.join(fast_input_dir, "train.feather")) == mtime
+    input_dir = tmp_path / "workspace" / "task" / "1" / "input"
+    input_dir.mkdir(parents=True)
+    data_util.link_fast_inputs(state, str(input_dir))
+    assert sorted(os.listdir(input_dir)) == ["train.feather", "train.parquet"]
+    assert "./input/train.feather" in data_util.get_fast_inputs_instruction(state)
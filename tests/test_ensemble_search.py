@@ -0,0 +1,186 @@
+"""Test cases for the numeric ensemble search."""
+
+import os
+import sys
+import types
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from machine_learning_engineering.shared_libraries import code_util
+from machine_learning_engineering.shared_libraries.runtime import mle_runtime
+from machine_learning_engineering.sub_agents.ensemble import agent as ensemble_agent
+from machine_learning_engineering.sub_agents.ensemble import ensemble_search
+
+
+def _make_predictions(num_samples=500, seed=0):
+    rng = np.random.default_rng(seed)
+    y_true = rng.normal(size=num_samples)
+    predictions = [
+        y_true + rng.normal(scale=0.5, size=num_samples),
+        y_true + rng.normal(scale=0.6, size=num_samples),
+        rng.normal(size=num_samples),
+    ]
+    return predictions, y_true
+
+
+def test_searches_beat_the_single_solutions():
+    """Finds ensembles better than the best single solution."""
+    predictions, y_true = _make_predictions()
+    candidates = ensemble_search.search_ensembles(predictions, y_true, "rmse")
+    single_scores = [
+        c.score for c in candidates if c.search.startswith("single_solution")
+    ]
+    best = candidates[0]
+    assert best.score < min(single_scores)
+    assert [c.score for c in candidates] == sorted(c.score for c in candidates)
+    searches = {c.search.split("(")[0] for c in candidates}
+    assert {"coordinate_descent", "hill_climb", "ridge_stack"} <= searches
+    hill_climb = next(c for c in candidates if c.search == "hill_climb")
+    # The noise-only solution gets no weight.
+    assert hill_climb.weights[2] == 0.0
+    combined = mle_runtime.combine_predictions(
+        predictions, best.method, best.weights, power=best.power, intercept=best.intercept
+    )
+    if best.search.startswith("single_solution"):
+        assert np.isclose(mle_runtime.score_predictions("rmse", y_true, combined), best.score)
+
+
+def test_weight_searches_are_scored_out_of_fold():
+    """Does not score the weights on the samples they were fitted on."""
+    rng = np.random.default_rng(0)
+    y_true = rng.normal(size=40)
+    # Noise only: the weights fitted on all the samples only overfit them.
+    predictions = rng.normal(size=(20, 40))
+    candidates = ensemble_search.search_ensembles(list(predictions), y_true, "rmse")
+    for search in ("coordinate_descent", "hill_climb"):
+        candidate = next(c for c in candidates if c.search == search)
+        in_sample = mle_runtime.score_predictions(
+            "rmse", y_true, np.tensordot(candidate.weights, predictions, axes=1)
+        )
+        assert candidate.score > in_sample
+
+
+def test_score_predictions():
+    """Scores the predictions with the task metrics."""
+    y_true = np.array([0, 0, 1, 1])
+    y_score = np.array([0.1, 0.6, 0.4, 0.8])
+    assert mle_runtime.score_predictions("auc", y_true, y_score) == 0.75
+    assert mle_runtime.score_predictions("accuracy", y_true, y_score) == 0.5
+    probs = np.array([[0.9, 0.1], [0.2, 0.8], [0.3, 0.7], [0.6, 0.4]])
+    assert mle_runtime.score_predictions("accuracy", y_true, probs) == 0.5
+    assert np.isclose(
+        mle_runtime.score_predictions("logloss", y_true, probs),
+        -np.mean(np.log([0.9, 0.2, 0.7, 0.4])),
+    )
+
+
+def test_ensemble_code_runs_on_stored_predictions(tmp_path):
+    """Applies the best ensemble to the stored predictions in generated code."""
+    prediction_dir = str(tmp_path / "predictions")
+    predictions, y_true = _make_predictions()
+    solution_hashes = []
+    for i, val_predictions in enumerate(predictions):
+        solution_hash = f"solution{i}"
+        output_dir = os.path.join(prediction_dir, solution_hash)
+        os.makedirs(output_dir)
+        np.save(os.path.join(output_dir, "val.npy"), val_predictions)
+        np.save(os.path.join(output_dir, "val_target.npy"), y_true)
+        np.save(os.path.join(output_dir, "test.npy"), val_predictions[:10])
+        solution_hashes.append(solution_hash)
+    best = ensemble_search.search_ensembles(predictions, y_true, "rmse")[0]
+    code = ensemble_search.get_ensemble_code(best, solution_hashes, "rmse")
+    result_dict = code_util.run_python_code(
+        code_text=code,
+        run_cwd=str(tmp_path),
+        py_filepath="ensemble_numeric.py",
+        exec_timeout=60,
+        env={
+            mle_runtime.SOLUTION_HASH_ENV: code_util.get_code_hash(code),
+            mle_runtime.PREDICTION_DIR_ENV: prediction_dir,
+        },
+    )
+    assert result_dict["returncode"] == 0, result_dict["stderr"]
+    score = code_util.extract_performance_from_text(result_dict["stdout"])
+    expected = mle_runtime.score_predictions(
+        "rmse",
+        y_true,
+        mle_runtime.combine_predictions(
+            predictions, best.method, best.weights, power=best.power, intercept=best.intercept
+        ),
+    )
+    assert np.isclose(score, expected)
+    test_ensemble = mle_runtime.load_predictions(
+        code_util.get_code_hash(code), "test", prediction_dir=prediction_dir
+    )
+    assert test_ensemble.shape == (10,)
+
+
+def test_score_rows_matches_score_predictions():
+    """Scores all the candidates at once like one at a time."""
+    predictions, y_true = _make_predictions(num_samples=50)
+    candidates = np.abs(np.stack(predictions))
+    y_true = np.abs(y_true)
+    for metric in ensemble_search.REGRESSION_METRICS:
+        expected = [mle_runtime.score_predictions(metric, y_true, c) for c in candidates]
+        np.testing.assert_allclose(
+            ensemble_search._score_rows(metric, y_true, candidates), expected
+        )
+
+
+def test_metric_is_never_guessed():
+    """Only uses the metric set explicitly."""
+    assert ensemble_search.get_metric_name({"lower": True}) is None
+    assert ensemble_search.get_metric_name({"eval_metric": "mae"}) == "mae"
+
+
+def _store_predictions(prediction_dir, solution_hash, val_predictions, y_true, test=True, index=True):
+    output_dir = os.path.join(prediction_dir, solution_hash)
+    os.makedirs(output_dir)
+    np.save(os.path.join(output_dir, "val.npy"), val_predictions)
+    np.save(os.path.join(output_dir, "val_target.npy"), y_true)
+    if index:
+        np.save(os.path.join(output_dir, "val_index.npy"), np.arange(len(y_true)))
+    if test:
+        np.save(os.path.join(output_dir, "test.npy"), val_predictions[:10])
+
+
+def _get_state(tmp_path, predictions):
+    state = {
+        "workspace_dir": str(tmp_path),
+        "task_name": "task",
+        "eval_metric": "rmse",
+        "lower": True,
+        "num_solutions": len(predictions),
+        "outer_loop_round": 1,
+    }
+    for task_id in range(1, len(predictions) + 1):
+        state[f"train_code_1_{task_id}"] = f"print({task_id})"
+        state[f"train_code_exec_result_1_{task_id}"] = {"code_hash": f"solution{task_id}"}
+    return state
+
+
+def test_numeric_ensemble_needs_test_predictions(tmp_path):
+    """Skips the search when a solution could not be submitted."""
+    predictions, y_true = _make_predictions(num_samples=50)
+    state = _get_state(tmp_path, predictions)
+    prediction_dir = code_util.get_prediction_dir(state)
+    for task_id, val_predictions in enumerate(predictions, start=1):
+        _store_predictions(prediction_dir, f"solution{task_id}", val_predictions, y_true, test=task_id != 2)
+    ensemble_agent.run_numeric_ensemble(types.SimpleNamespace(state=state, agent_name="ensemble_agent"))
+    assert "ensemble_code_exec_result_numeric" not in state
+
+
+def test_numeric_ensemble_skips_mismatched_predictions(tmp_path):
+    """Skips the search instead of failing on predictions that cannot be aligned."""
+    predictions, y_true = _make_predictions(num_samples=50)
+    state = _get_state(tmp_path, predictions)
+    prediction_dir = code_util.get_prediction_dir(state)
+    for task_id, val_predictions in enumerate(predictions, start=1):
+        # The last solution stored no ids for its validation rows.
+        _store_predictions(
+            prediction_dir, f"solution{task_id}", val_predictions, y_true, index=task_id != len(predictions)
+        )
+    ensemble_agent.run_numeric_ensemble(types.SimpleNamespace(state=state, agent_name="ensemble_agent"))
+    assert "ensemble_code_exec_result_numeric" not in state
@@ -0,0 +1,44 @@
+"""Test cases for the decoded image cache of `mle_runtime`."""
+
+import importlib.util
+import os
+import shutil
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from machine_learning_engineering.shared_libraries import code_util
+
+_CODE = """import numpy as np
+import mle_runtime
+images, paths = mle_runtime.load_images("./input/images", size=(8, 6), n_jobs=2)
+assert isinstance(images, np.memmap) and not images.flags.writeable
+print(images.shape, images[3, 0, 0].tolist(), paths[3])
+"""
+
+
+@pytest.mark.skipif(importlib.util.find_spec("PIL") is None, reason="Pillow is not installed")
+def test_images_are_decoded_once_for_all_workspaces(tmp_path):
+    """Decodes the images in the first workspace and maps them in the others."""
+    from PIL import Image
+    image_dir = tmp_path / "task" / "1" / "input" / "images"
+    image_dir.mkdir(parents=True)
+    for i in range(10):
+        Image.new("RGB", (20 + i, 30), (i, 2 * i, 3 * i)).save(image_dir / f"{i}.png")
+    shutil.copytree(tmp_path / "task" / "1", tmp_path / "task" / "2")
+    state = {"workspace_dir": str(tmp_path), "task_name": "task"}
+    outputs = []
+    for task_id in ("1", "2"):
+        result_dict = code_util.execute_code(
+            code_text=_CODE,
+            run_cwd=str(tmp_path / "task" / task_id),
+            py_filepath="solution.py",
+            exec_timeout=60,
+            state=state,
+        )
+        assert result_dict["returncode"] == 0, result_dict["stderr"]
+        outputs.append(result_dict["stdout"])
+    assert outputs[0] == outputs[1] == "(10, 8, 6, 3) [3, 6, 9] ./input/images/3.png\n"
+    assert len(os.listdir(code_util.get_image_cache_dir(state))) == 1
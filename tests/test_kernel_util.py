@@ -0,0 +1,65 @@
+"""Test cases for the kernel execution backend."""
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from machine_learning_engineering.shared_libraries import code_util
+from machine_learning_engineering.shared_libraries import kernel_util
+
+
+def _run(tmp_path, code, exec_timeout=60, **state):
+    return code_util.execute_code(
+        code_text=code,
+        run_cwd=str(tmp_path),
+        py_filepath="solution.py",
+        exec_timeout=exec_timeout,
+        state={"workspace_dir": str(tmp_path), "task_name": "task", **state},
+    )
+
+
+def test_kernel_matches_the_local_backend(tmp_path):
+    """Returns the same results as running the code in a new interpreter."""
+    codes = [
+        "import sys, mle_runtime\nprint('hello', __name__, sys.argv[0])\n",
+        "import os\nprint(os.environ['MLE_SOLUTION_HASH'])\nraise ValueError('bad value')\n",
+        "import sys\nprint('done')\nsys.exit(3)\n",
+        "import time\nprint('started', flush=True)\ntime.sleep(60)\n",
+    ]
+    for code in codes:
+        local_result = _run(tmp_path, code, exec_timeout=2, exec_backend="local")
+        kernel_result = _run(tmp_path, code, exec_timeout=2, exec_backend="kernel")
+        for key in ("returncode", "stdout", "failure_kind", "code_hash"):
+            assert kernel_result.get(key) == local_result.get(key), key
+        # The tracebacks show the same frames of the code.
+        local_lines = [line for line in local_result["stderr"].splitlines() if "solution.py" in line]
+        kernel_lines = [line for line in kernel_result["stderr"].splitlines() if "solution.py" in line]
+        assert kernel_lines == local_lines
+        assert kernel_result["stderr"].splitlines()[-1:] == local_result["stderr"].splitlines()[-1:]
+    kernel_util.shutdown_kernels()
+
+
+def test_kernel_isolates_codes_and_restarts(tmp_path):
+    """Runs every code in a fresh namespace and restarts a dead or large kernel."""
+    result_dict = _run(tmp_path, "leaked = 1\n", exec_backend="kernel")
+    assert result_dict["returncode"] == 0
+    result_dict = _run(tmp_path, "print(leaked)\n", exec_backend="kernel")
+    assert "NameError" in result_dict["stderr"]
+    kernel = kernel_util.get_kernel(str(tmp_path), 0)
+    assert kernel.num_restarts == 0
+    # The code kills the kernel it runs in.
+    result_dict = _run(
+        tmp_path, "import os, signal\nos.kill(os.getppid(), signal.SIGKILL)\n", exec_backend="kernel"
+    )
+    assert result_dict["returncode"] != 0
+    result_dict = _run(tmp_path, "print('alive')\n", exec_backend="kernel")
+    assert result_dict["stdout"] == "alive\n"
+    assert kernel.num_restarts == 1
+    # A kernel larger than `kernel_max_memory_gb` is restarted after the code.
+    kernel.max_memory_bytes = 0
+    _run(tmp_path, "print('large')\n", exec_backend="kernel")
+    _run(tmp_path, "print('large')\n", exec_backend="kernel")
+    assert kernel.num_restarts == 2
+    assert not kernel.is_alive()
+    kernel_util.shutdown_kernels()
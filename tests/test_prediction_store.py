@@ -0,0 +1,124 @@
+"""Test cases for the prediction store of the solutions."""
+
+import os
+import sys
+import types
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from machine_learning_engineering.shared_libraries import code_util
+from machine_learning_engineering.shared_libraries.runtime import mle_runtime
+from machine_learning_engineering.sub_agents.submission import agent as submission_agent
+
+_SOLUTION_CODE = """
+import numpy as np
+import mle_runtime
+val_index = np.array({val_index})
+mle_runtime.save_predictions("val", val_index * {scale}, index=val_index, target=val_index * 1.0)
+mle_runtime.save_predictions("test", np.ones(3) * {scale})
+print("Final Validation Performance: 0.5")
+"""
+
+
+def test_solutions_share_their_predictions(tmp_path):
+    """Saves predictions from generated code and aligns them across solutions."""
+    prediction_dir = str(tmp_path / "predictions")
+    solution_hashes = []
+    for val_index, scale in (([1, 2, 3, 4], 1.0), ([4, 3, 2, 5], 2.0)):
+        code = _SOLUTION_CODE.format(val_index=val_index, scale=scale)
+        solution_hash = code_util.get_code_hash(code)
+        result_dict = code_util.run_python_code(
+            code_text=code,
+            run_cwd=str(tmp_path),
+            py_filepath="solution.py",
+            exec_timeout=60,
+            env={
+                mle_runtime.SOLUTION_HASH_ENV: solution_hash,
+                mle_runtime.PREDICTION_DIR_ENV: prediction_dir,
+            },
+        )
+        assert result_dict["returncode"] == 0, result_dict["stderr"]
+        solution_hashes.append(solution_hash)
+    assert mle_runtime.list_solutions(prediction_dir) == sorted(solution_hashes)
+    val_index, val_predictions, y_val = mle_runtime.load_aligned_predictions(
+        solution_hashes, "val", prediction_dir=prediction_dir
+    )
+    np.testing.assert_array_equal(val_index, [2, 3, 4])
+    np.testing.assert_array_equal(val_predictions[0], [2.0, 3.0, 4.0])
+    np.testing.assert_array_equal(val_predictions[1], [4.0, 6.0, 8.0])
+    np.testing.assert_array_equal(y_val, [2.0, 3.0, 4.0])
+    test_predictions = mle_runtime.load_predictions(
+        solution_hashes[1], "test", prediction_dir=prediction_dir
+    )
+    np.testing.assert_array_equal(test_predictions, [2.0, 2.0, 2.0])
+
+
+_TRAIN_CODE = """
+import numpy as np
+import mle_runtime
+coefs = np.polyfit([0.0, 1.0, 2.0], [1.0, 3.0, 5.0], deg=1)
+mle_runtime.save_model({"coefs": coefs}, "model")
+print("Final Validation Performance: 0.0")
+"""
+
+_INFERENCE_CODE = """
+import numpy as np
+import mle_runtime
+model = mle_runtime.load_model("model", solution_hash="{solution_hash}")
+print(round(np.polyval(model["coefs"], 3.0), 6))
+"""
+
+
+def test_submission_loads_the_saved_model(tmp_path):
+    """Runs inference with the model saved by another code."""
+    env = {mle_runtime.ARTIFACT_DIR_ENV: str(tmp_path / "artifacts")}
+    solution_hash = code_util.get_code_hash(_TRAIN_CODE)
+    for code in (_TRAIN_CODE, _INFERENCE_CODE.format(solution_hash=solution_hash)):
+        result_dict = code_util.run_python_code(
+            code_text=code,
+            run_cwd=str(tmp_path),
+            py_filepath="solution.py",
+            exec_timeout=60,
+            env={**env, mle_runtime.SOLUTION_HASH_ENV: code_util.get_code_hash(code)},
+        )
+        assert result_dict["returncode"] == 0, result_dict["stderr"]
+    assert float(result_dict["stdout"]) == 7.0
+    assert mle_runtime.list_models(solution_hash, str(tmp_path / "artifacts")) == ["model"]
+
+
+_SUBMISSION_CODE = """
+import os
+import numpy as np
+import mle_runtime
+model = mle_runtime.load_model("model", solution_hash="{solution_hash}")
+os.makedirs("final", exist_ok=True)
+np.savetxt("final/submission.csv", np.polyval(model["coefs"], [3.0, 4.0]))
+mle_runtime.log_validation_score({score})
+"""
+
+
+def test_artifact_submission_is_scored(tmp_path):
+    """Scores a submission that only loads the saved model with the score of its solution."""
+    state = {"workspace_dir": str(tmp_path), "task_name": "task", "lower": True}
+    os.makedirs(tmp_path / "task" / "1")
+    os.makedirs(tmp_path / "task" / "ensemble")
+    train_result = code_util.execute_code(
+        code_text=_TRAIN_CODE,
+        run_cwd=str(tmp_path / "task" / "1"),
+        py_filepath="train0.py",
+        exec_timeout=60,
+        state=state,
+    )
+    assert train_result["returncode"] == 0, train_result["stderr"]
+    train_result["score"] = 0.25
+    description = submission_agent.get_saved_artifacts_description(state, train_result)
+    assert "mle_runtime.log_validation_score(0.25)" in description
+    state["submission_code"] = _SUBMISSION_CODE.format(
+        solution_hash=train_result["code_hash"], score=train_result["score"]
+    )
+    code_util.evaluate_code(types.SimpleNamespace(agent_name="submission_agent", state=state))
+    assert state["submission_code_exec_result"]["returncode"] == 0
+    assert state["submission_code_exec_result"]["score"] == 0.25
+    assert os.path.exists(submission_agent.get_submission_path(state))
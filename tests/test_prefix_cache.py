@@ -0,0 +1,73 @@
+"""Test cases for resuming refined codes after their unchanged prefix."""
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from machine_learning_engineering.shared_libraries import code_util
+
+_PREFIX = """import random
+import numpy as np
+
+with open("prefix_runs.txt", "a") as f:
+    f.write("run\\n")
+print("features ready")
+
+
+class Scaler:
+    def __init__(self, factor):
+        self.factor = factor
+
+
+random.seed(0)
+np.random.seed(0)
+features = np.arange(10.0)
+scaler = Scaler(2.0)
+same_features = features
+"""
+
+_BLOCK = """score = float((features * scaler.factor).sum()) + np.random.rand() + random.random()
+"""
+
+_SUFFIX = """assert same_features is features
+print(f"Final Validation Performance: {score}")
+"""
+
+
+def test_refined_codes_resume_after_the_prefix(tmp_path):
+    """Runs the shared prefix once and gets the same results as full runs."""
+    state = {
+        "workspace_dir": str(tmp_path),
+        "task_name": "task",
+        "use_prefix_cache": True,
+    }
+    prev_code = _PREFIX + _BLOCK + _SUFFIX
+    for use_prefix_cache in (True, False):
+        os.makedirs(tmp_path / "task" / str(use_prefix_cache))
+    outputs = []
+    for block in (_BLOCK, _BLOCK.replace("scaler.factor", "3.0"), "score = missing_name\n"):
+        code = prev_code.replace(_BLOCK, block)
+        prefix_length = code_util.get_refinement_prefix_length(code, prev_code, _BLOCK)
+        assert prefix_length == len(_PREFIX)
+        for use_prefix_cache in (True, False):
+            result_dict = code_util.execute_code(
+                code_text=code,
+                run_cwd=str(tmp_path / "task" / str(use_prefix_cache)),
+                py_filepath="train.py",
+                exec_timeout=60,
+                state={**state, "use_prefix_cache": use_prefix_cache},
+                prefix_length=prefix_length,
+            )
+            outputs.append((result_dict["returncode"], result_dict["stdout"]))
+            with open(tmp_path / "task" / str(use_prefix_cache) / "train.py") as f:
+                assert f.read() == code
+        assert outputs[-1] == outputs[-2]
+    assert outputs[0][0] == 0 and "features ready" in outputs[2][1]
+    assert outputs[4][0] != 0
+    # The error is reported on the line of the refined block.
+    assert f'train.py", line {_PREFIX.count(chr(10)) + 1}' in result_dict["stderr"]
+    with open(tmp_path / "task" / "True" / "prefix_runs.txt") as f:
+        assert f.read() == "run\n"
+    with open(tmp_path / "task" / "False" / "prefix_runs.txt") as f:
+        assert f.read() == "run\n" * 3
@@ -0,0 +1,85 @@
+"""Test cases for the live progress dashboard."""
+
+import json
+import os
+import sys
+import time
+import urllib.request
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from google.adk.events import event as event_module
+from google.adk.events import event_actions
+
+from machine_learning_engineering.shared_libraries import code_util
+from machine_learning_engineering.shared_libraries import progress_util
+
+
+def _event(author, branch=None, state_delta=None):
+    return event_module.Event(
+        author=author,
+        branch=branch,
+        actions=event_actions.EventActions(state_delta=state_delta or {}),
+    )
+
+
+def test_board_folds_the_updates_of_the_events(tmp_path):
+    """Keeps the agents, steps, best score, usage and running codes of a task."""
+    board = progress_util.ProgressBoard(["task_a", "task_b"])
+    board.apply({"event": "started", "task_dir": "/tasks/task_a/", "attempt": 1, "time": time.time()})
+    board.apply({"event": "update", "task_name": "task_a", "solution": "main", "agent": "", "lower": False})
+    events = [
+        _event("model_eval_agent_1_1", "init_parallel_agent.init_solution_gen_agent_1", {
+            "init_code_exec_result_1_1": {"returncode": 0, "score": 0.7},
+            "model_usage_model_eval_agent_1_1": {
+                "calls": 1, "model": "gemini-2.0-flash", "input_tokens": 1000, "output_tokens": 200,
+            },
+        }),
+        _event("plan_implement_agent_2", "refinement_agent.ablation_and_refine_loop_agent_2", {
+            "refine_step_2": 1,
+            "inner_iter_2": 3,
+            "train_code_improve_exec_result_2_1_2": {"returncode": 0, "score": 0.9},
+            "train_code_improve_exec_result_3_1_2": {"returncode": 1, "score": 0},
+        }),
+    ]
+    for event in events:
+        board.apply({**progress_util.get_event_update(event), "event": "update", "task_name": "task_a"})
+
+    def report_execution(event, info):
+        board.apply({**info, "event": f"execution_{event}", "task_name": "task_a", "time": time.time()})
+
+    running = []
+
+    def snapshot_running(event, info):
+        if event == "spawned":
+            running.extend(board.snapshot()["executions"])
+
+    code_util.register_execution_listener(report_execution)
+    code_util.register_execution_listener(snapshot_running)
+    try:
+        code_util.execute_code("import time\ntime.sleep(0.2)\n", str(tmp_path), "train0.py", 60, {})
+    finally:
+        code_util.unregister_execution_listener(report_execution)
+        code_util.unregister_execution_listener(snapshot_running)
+    assert running[0]["py_filepath"] == str(tmp_path / "train0.py")
+    assert running[0]["pid"] is not None
+    snapshot = board.snapshot()
+    assert snapshot["executions"] == []
+    task = snapshot["tasks"][0]
+    assert (task["status"], task["best_score"], task["tokens"]) == ("running", 0.9, 1200)
+    assert task["cost"] > 0
+    solutions = {solution["solution"]: solution for solution in task["solutions"]}
+    assert solutions["1"]["agent"] == "model_eval_agent_1_1"
+    assert (solutions["2"]["refine_step"], solutions["2"]["inner_iter"]) == (1, 3)
+    assert snapshot["num_waiting_tasks"] == 1
+
+    server = progress_util.DashboardServer(board, port=0)
+    server.start()
+    try:
+        with urllib.request.urlopen(server.url + "progress.json") as response:
+            served = json.load(response)
+        with urllib.request.urlopen(server.url) as response:
+            assert b"progress.json" in response.read()
+    finally:
+        server.stop()
+    assert served["tasks"][0]["best_score"] == 0.9
@@ -0,0 +1,44 @@
+"""Test cases for the parallel cross-validation of `mle_runtime`."""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from machine_learning_engineering.shared_libraries.runtime import mle_runtime
+
+
+def _train_fold(X_train, y_train, X_valid, y_valid, X_test, delay=0.0):
+    time.sleep(delay)
+    slope = float(np.dot(X_train[:, 0], y_train) / np.dot(X_train[:, 0], X_train[:, 0]))
+    return (
+        slope * X_valid[:, 0],
+        np.full(len(X_test), mle_runtime.get_cpu_slots(), dtype=np.float64),
+    )
+
+
+def test_folds_run_in_parallel_with_the_sequential_results(monkeypatch):
+    """Gets the out-of-fold predictions of a loop over the folds, faster."""
+    X = np.arange(1.0, 41.0).reshape(-1, 1)
+    y = 2.0 * X[:, 0]
+    X_test = np.ones((3, 1))
+    splits = [(np.setdiff1d(np.arange(40), fold), fold) for fold in np.array_split(np.arange(40), 4)]
+    monkeypatch.setenv(mle_runtime.CPU_SLOTS_ENV, "8")
+    results = {}
+    for n_jobs in (1, 4):
+        start_time = time.time()
+        results[n_jobs] = mle_runtime.run_cv(
+            _train_fold, X, y, splits, X_test=X_test, metric="rmse", n_jobs=n_jobs, delay=0.5
+        )
+        results[n_jobs]["wall_time"] = time.time() - start_time
+    np.testing.assert_allclose(results[4]["oof"], y)
+    np.testing.assert_allclose(results[4]["oof"], results[1]["oof"])
+    assert results[4]["score"] < 1e-9 and len(results[4]["fold_scores"]) == 4
+    # The CPUs are split between the folds run at once.
+    np.testing.assert_allclose(results[1]["test"], 8.0)
+    np.testing.assert_allclose(results[4]["test"], 2.0)
+    assert results[1]["wall_time"] > 2.0
+    assert results[4]["wall_time"] < 1.5
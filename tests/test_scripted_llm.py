@@ -0,0 +1,56 @@
+"""Test cases for the scripted model of the orchestration benchmark."""
+
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from google.adk.models import llm_request as llm_request_module
+from google.adk.models import registry
+from google.genai import types
+
+from benchmarks import scripted_llm
+from machine_learning_engineering.shared_libraries import code_util
+
+
+def _generate(agent_name, text):
+    llm_request = llm_request_module.LlmRequest(
+        model=scripted_llm.MODEL_NAME,
+        contents=[types.Content(role="user", parts=[types.Part(text=text)])],
+        config=types.GenerateContentConfig(labels={scripted_llm.AGENT_NAME_LABEL: agent_name}),
+    )
+    model = registry.LLMRegistry.new_llm(scripted_llm.MODEL_NAME)
+
+    async def _first_response():
+        async for llm_response in model.generate_content_async(llm_request):
+            return llm_response
+
+    return asyncio.run(_first_response())
+
+
+def test_responses_follow_the_agent_and_the_code():
+    """Answers by agent name and halves the ridge penalty of the request."""
+    llm_response = _generate("plan_implement_agent_1", scripted_llm.get_solution_code(0.5))
+    assert llm_response.content.parts[0].text == "```python\nalpha = 0.25\n```"
+    assert llm_response.usage_metadata.prompt_token_count > 0
+    buggy_code = _generate("model_eval_agent_1_2", "").content.parts[0].text
+    assert "Scripted bug" in buggy_code
+    assert "Scripted bug" not in _generate("model_eval_debug_agent_1_2", buggy_code).content.parts[0].text
+
+
+def test_solution_code_reports_its_performance(tmp_path):
+    """Runs the solution code on a tiny task."""
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    rows = [(k / 10, (k % 3) / 3, 2 * k / 10 + 1) for k in range(20)]
+    (input_dir / "train.csv").write_text(
+        "x0,x1,target\n" + "".join(f"{x0},{x1},{y}\n" for x0, x1, y in rows)
+    )
+    (input_dir / "test.csv").write_text("x0,x1,id\n0.5,0.1,0\n1.5,0.2,1\n")
+    result = code_util.execute_code(
+        scripted_llm.get_solution_code(0.01), str(tmp_path), "solution.py", 60, {}
+    )
+    assert result["returncode"] == 0
+    assert code_util.extract_performance_from_text(result["stdout"]) < 0.1
+    assert (tmp_path / "final" / "submission.csv").exists()
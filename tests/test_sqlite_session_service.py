@@ -0,0 +1,132 @@
+"""Test cases for the SQLite-backed session service."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from google.adk.events import event as event_module
+from google.adk.events import event_actions as event_actions_module
+
+from machine_learning_engineering.shared_libraries import sqlite_session_service
+
+
+def _state_event(state_delta: dict) -> event_module.Event:
+    return event_module.Event(
+        author="test_agent",
+        invocation_id="test_invocation",
+        actions=event_actions_module.EventActions(state_delta=state_delta),
+    )
+
+
+@pytest.mark.asyncio
+async def test_state_is_persisted_and_loaded_lazily(tmp_path):
+    """Writes state through events and reads it back from a new service."""
+    db_path = str(tmp_path / "sessions.db")
+    service = sqlite_session_service.SqliteSessionService(db_path)
+    session = await service.create_session(
+        app_name="app", user_id="user", state={"task_name": "california-housing-prices"}
+    )
+    await service.append_event(
+        session,
+        _state_event({
+            "train_code_exec_result_0_1": {"score": 0.5},
+            "train_code_exec_result_0_2": {"score": 0.4},
+            "user:quota": 3,
+            "temp:scratch": "not persisted",
+        }),
+    )
+    service.close()
+
+    service = sqlite_session_service.SqliteSessionService(db_path)
+    loaded = await service.get_session(
+        app_name="app", user_id="user", session_id=session.id
+    )
+    assert len(loaded.events) == 1
+    assert dict.__len__(loaded.state) == 0
+    assert loaded.state["task_name"] == "california-housing-prices"
+    assert loaded.state.get("temp:scratch") is None
+    assert loaded.state["user:quota"] == 3
+    assert loaded.state.with_prefix("train_code_exec_result_") == {
+        "train_code_exec_result_0_1": {"score": 0.5},
+        "train_code_exec_result_0_2": {"score": 0.4},
+    }
+    assert sorted(loaded.state.keys()) == [
+        "task_name",
+        "train_code_exec_result_0_1",
+        "train_code_exec_result_0_2",
+        "user:quota",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_list_and_delete_sessions(tmp_path):
+    """Lists and deletes sessions."""
+    service = sqlite_session_service.SqliteSessionService(str(tmp_path / "sessions.db"))
+    session = await service.create_session(app_name="app", user_id="user")
+    response = await service.list_sessions(app_name="app", user_id="user")
+    assert [s.id for s in response.sessions] == [session.id]
+    await service.delete_session(app_name="app", user_id="user", session_id=session.id)
+    assert await service.get_session(
+        app_name="app", user_id="user", session_id=session.id
+    ) is None
+
+
+@pytest.mark.asyncio
+async def test_untouched_keys_are_not_loaded(tmp_path):
+    """Loads neither the state through the events nor the keys never read."""
+    db_path = str(tmp_path / "sessions.db")
+    service = sqlite_session_service.SqliteSessionService(db_path)
+    session = await service.create_session(app_name="app", user_id="user")
+    await service.append_event(
+        session,
+        _state_event({"task_name": "task", "train_code_0_1": "x" * 100000}),
+    )
+    loaded = await service.get_session(
+        app_name="app", user_id="user", session_id=session.id
+    )
+    assert loaded.events[0].actions.state_delta == {}
+    assert loaded.state["task_name"] == "task"
+    assert dict.__contains__(loaded.state, "task_name")
+    assert not dict.__contains__(loaded.state, "train_code_0_1")
+
+
+@pytest.mark.asyncio
+async def test_cache_is_bounded(tmp_path):
+    """Evicts the least recently used values and keeps their mutations."""
+    service = sqlite_session_service.SqliteSessionService(
+        str(tmp_path / "sessions.db"), max_cached_values=2
+    )
+    session = await service.create_session(
+        app_name="app", user_id="user", state={"plans": [], "a": 1, "b": 2}
+    )
+    loaded = await service.get_session(
+        app_name="app", user_id="user", session_id=session.id
+    )
+    loaded.state["plans"].append("plan")
+    assert loaded.state["a"] == 1
+    assert loaded.state["b"] == 2
+    assert dict.__len__(loaded.state) == 2
+    assert not dict.__contains__(loaded.state, "plans")
+    assert loaded.state["plans"] == ["plan"]
+
+
+@pytest.mark.asyncio
+async def test_in_place_mutations_are_persisted(tmp_path):
+    """Writes back the cached values mutated in place with the next event."""
+    service = sqlite_session_service.SqliteSessionService(str(tmp_path / "sessions.db"))
+    session = await service.create_session(
+        app_name="app", user_id="user", state={"ensemble_plans": []}
+    )
+    loaded = await service.get_session(
+        app_name="app", user_id="user", session_id=session.id
+    )
+    loaded.state["ensemble_plans"].append("plan")
+    await service.append_event(loaded, _state_event({"ensemble_iter": 1}))
+    reloaded = await service.get_session(
+        app_name="app", user_id="user", session_id=session.id
+    )
+    assert reloaded.state["ensemble_plans"] == ["plan"]
+    assert reloaded.state["ensemble_iter"] == 1
@@ -0,0 +1,113 @@
+"""Test cases for the timeouts of the code executions."""
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from machine_learning_engineering.shared_libraries import code_util
+from machine_learning_engineering.shared_libraries import config
+from machine_learning_engineering.shared_libraries import timeout_util
+
+
+def _is_running(pid: int) -> bool:
+    """Checks if a process exists and is not a zombie."""
+    try:
+        with open(f"/proc/{pid}/stat", encoding="utf-8") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def test_timeout_kills_the_process_group(tmp_path):
+    """Stops a hung code together with the processes it started."""
+    code = (
+        "import subprocess, sys, time\n"
+        "child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+        "print(child.pid, flush=True)\n"
+        "time.sleep(60)\n"
+    )
+    start_time = time.time()
+    result_dict = code_util.run_python_code(
+        code_text=code,
+        run_cwd=str(tmp_path),
+        py_filepath="hung.py",
+        exec_timeout=2,
+    )
+    assert time.time() - start_time < 30
+    assert result_dict["returncode"] != 0
+    assert result_dict["failure_kind"] == "timeout"
+    assert result_dict["exec_timeout"] == 2
+    assert "TimeoutError" in result_dict["stderr"]
+    child_pid = int(result_dict["stdout"].split()[0])
+    for _ in range(50):
+        if not _is_running(child_pid):
+            break
+        time.sleep(0.1)
+    assert not _is_running(child_pid)
+
+
+def test_adaptive_exec_timeout():
+    """Learns the timeout from the previous versions of the solution."""
+    state = {
+        "exec_timeout": 600,
+        "exec_timeout_multiplier": 3.0,
+        "min_exec_timeout": 30,
+        "refine_step_1": 1,
+        "train_code_exec_result_1_1": {"returncode": 0, "execution_time": 20.0},
+    }
+    assert timeout_util.get_adaptive_exec_timeout(state, "model_eval_agent_1_1") == 600
+    assert timeout_util.get_adaptive_exec_timeout(state, "plan_implement_agent_1") == 60
+    assert timeout_util.get_adaptive_exec_timeout(state, "ablation_debug_agent_1") == 180
+    state["train_code_exec_result_1_1"]["execution_time"] = 5.0
+    assert timeout_util.get_adaptive_exec_timeout(state, "plan_implement_agent_1") == 30
+    state["train_code_exec_result_1_1"]["execution_time"] = 500.0
+    assert timeout_util.get_adaptive_exec_timeout(state, "plan_implement_agent_1") == 600
+    state["exec_timeout_multiplier"] = 0
+    state["train_code_exec_result_1_1"]["execution_time"] = 5.0
+    assert timeout_util.get_adaptive_exec_timeout(state, "plan_implement_agent_1") == 600
+
+
+def test_failed_versions_are_ignored():
+    """Only learns from the versions that ran successfully."""
+    state = {
+        "exec_timeout": 600,
+        "min_exec_timeout": 30,
+        "refine_step_1": 0,
+        "train_code_exec_result_0_1": {"returncode": 1, "execution_time": 5.0},
+    }
+    assert timeout_util.get_baseline_execution_time(state, "plan_implement_agent_1") is None
+    assert timeout_util.get_adaptive_exec_timeout(state, "plan_implement_agent_1") == 600
+
+
+def test_baseline_of_merges_and_ensembles():
+    """Sums the merged solutions and takes the slowest of the submission candidates."""
+    state = {
+        "best_idx_1": 0,
+        "merger_code_exec_result_1_0": {"returncode": 0, "execution_time": 10.0},
+        "performance_results_1": [
+            (0.5, "code", {"returncode": 0, "execution_time": 10.0}),
+            (0.6, "code", {"returncode": 0, "execution_time": 30.0}),
+        ],
+        "train_code_exec_result_1_1": {"returncode": 0, "execution_time": 20.0},
+        "train_code_exec_result_1_2": {"returncode": 0, "execution_time": 40.0},
+        "ensemble_code_exec_result_1": {"returncode": 0, "execution_time": 50.0},
+        "ensemble_code_exec_result_numeric": {"returncode": 0, "execution_time": 1.0},
+    }
+    assert timeout_util.get_baseline_execution_time(state, "merger_agent_1_1") == 40.0
+    assert timeout_util.get_baseline_execution_time(state, "ensemble_plan_implement_agent") == 60.0
+    assert timeout_util.get_baseline_execution_time(state, "submission_agent") == 50.0
+
+
+def test_rounds_default_to_the_config():
+    """Finds the final solutions of the default number of rounds."""
+    state = {
+        f"train_code_exec_result_{config.CONFIG.outer_loop_round}_{task_id}": {
+            "returncode": 0, "execution_time": 10.0,
+        }
+        for task_id in range(1, config.CONFIG.num_solutions + 1)
+    }
+    assert timeout_util.get_baseline_execution_time(state, "ensemble_plan_implement_agent") == (
+        10.0 * config.CONFIG.num_solutions
+    )
@@ -0,0 +1,74 @@
+"""Test cases for the critical path and idle time report of a traced run."""
+
+import json
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from machine_learning_engineering import trace_report
+
+
+def _write_trace(path):
+    """Writes a run whose two initialization branches share one code slot."""
+    spans = [
+        # (span id, parent id, name, category, kind, start, end)
+        ("root", "", "invocation", "adk", "", 0, 10),
+        ("pipeline", "root", "mle_pipeline_agent", "agent", "sequential", 0, 10),
+        ("prepare", "pipeline", "data_profile_agent", "agent", "sequential", 0, 1),
+        ("parallel", "pipeline", "init_parallel_agent", "agent", "parallel", 1, 9),
+        ("branch_1", "parallel", "init_solution_gen_agent_1", "agent", "sequential", 1, 9),
+        ("llm_1", "branch_1", "call_llm", "llm", "", 1, 3),
+        ("code_1", "branch_1", "run_python_code", "code", "", 3, 6),
+        ("branch_2", "parallel", "init_solution_gen_agent_2", "agent", "sequential", 1, 8),
+        ("llm_2", "branch_2", "call_llm", "llm", "", 1, 2),
+        # Waits for the code of the other branch.
+        ("code_2", "branch_2", "run_python_code", "code", "", 6, 8),
+    ]
+    events = [{"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "run"}}]
+    for span_id, parent_id, name, category, kind, start, end in spans:
+        args = {"span_id": span_id}
+        if parent_id:
+            args["parent_id"] = parent_id
+        if kind:
+            args["kind"] = kind
+        events.append({
+            "name": name, "cat": category, "ph": "X", "ts": start * 1e6,
+            "dur": (end - start) * 1e6, "pid": 1, "tid": 0, "args": args,
+        })
+    # Like a trace still being written, without the closing bracket.
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[\n" + "".join(json.dumps(event) + ",\n" for event in events))
+
+
+def test_report_finds_the_critical_path_and_idle_time(tmp_path):
+    """Rebuilds the graph of the run, leaving the blocked time out of the overhead."""
+    trace_path = os.path.join(tmp_path, "trace.json")
+    _write_trace(trace_path)
+    report = trace_report.analyze(
+        trace_report.load_spans(trace_path), llm_slots=[0, 1], code_slots=[0, 1]
+    )
+    assert report["makespan"] == 10
+    assert report["work"] == {"llm": 3, "code": 5, "overhead": 4}
+    assert [stage["name"] for stage in report["stages"]] == [
+        "data_profile_agent", "init_parallel_agent",
+    ]
+    # The data profile, the first branch and the wait after the pipeline.
+    critical_path = report["critical_path"]
+    assert critical_path["length"] == 8
+    assert critical_path["by_resource"] == {"llm": 2, "code": 3, "overhead": 3}
+    assert [entry["agent"] for entry in critical_path["agents"]] == [
+        "data_profile_agent", "init_solution_gen_agent_1", "mle_pipeline_agent",
+    ]
+    (parallel_agent,) = report["parallel_agents"]
+    assert parallel_agent["name"] == "init_parallel_agent"
+    assert parallel_agent["efficiency"] == 0.5
+    branch_1, branch_2 = parallel_agent["branches"]
+    assert (branch_1["busy_time"], branch_1["idle_within"], branch_1["idle_after"]) == (5, 3, 0)
+    assert (branch_2["busy_time"], branch_2["idle_within"], branch_2["idle_after"]) == (3, 4, 1)
+    makespans = {
+        (entry["llm_slots"], entry["code_slots"]): entry["makespan"]
+        for entry in report["simulated_makespans"]
+    }
+    assert makespans == {(0, 0): 8, (0, 1): 9, (1, 0): 8, (1, 1): 9}
+    assert "init_parallel_agent: 8.0s" in trace_report.format_report(report)
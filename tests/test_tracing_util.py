@@ -0,0 +1,109 @@
+"""Test cases for the Chrome trace files of the agent tree."""
+
+import asyncio
+import json
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from google.adk import agents
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+from opentelemetry import trace
+
+from machine_learning_engineering.shared_libraries import code_util
+from machine_learning_engineering.shared_libraries import tracing_util
+
+
+def _build_agent(tmp_path):
+    def prepare(callback_context):
+        callback_context.state["use_tracing"] = True
+        callback_context.state["workspace_dir"] = str(tmp_path)
+        callback_context.state["task_name"] = "task"
+        tracing_util.start_trace(callback_context.state)
+        return None
+
+    async def run_code(callback_context):
+        # Like a model call, lets the other branch start.
+        with trace.get_tracer(__name__).start_as_current_span("call_llm") as span:
+            await asyncio.sleep(0.1)
+            span.set_attribute(tracing_util.LLM_RESPONSE_ATTRIBUTE, json.dumps({
+                "usage_metadata": {"prompt_token_count": 120, "candidates_token_count": 30},
+            }))
+        code_util.execute_code(
+            code_text="import time\ntime.sleep(0.2)\n",
+            run_cwd=str(tmp_path),
+            py_filepath=f"{callback_context.agent_name}.py",
+            exec_timeout=60,
+            state=callback_context.state,
+        )
+        return None
+
+    branches = [
+        agents.SequentialAgent(
+            name=f"branch_agent_{task_id}",
+            sub_agents=[
+                agents.SequentialAgent(name=f"code_agent_{task_id}", before_agent_callback=run_code)
+            ],
+        )
+        for task_id in range(1, 3)
+    ]
+    return agents.SequentialAgent(
+        name="pipeline_agent",
+        sub_agents=[
+            agents.SequentialAgent(name="prepare_agent", before_agent_callback=prepare),
+            agents.ParallelAgent(name="parallel_agent", sub_agents=branches),
+        ],
+    )
+
+
+async def _run(root_agent):
+    runner = InMemoryRunner(agent=root_agent, app_name="tracing")
+    session = await runner.session_service.create_session(app_name="tracing", user_id="user")
+    content = types.Content(parts=[types.Part(text="Execute the task.")], role="user")
+    async for _ in runner.run_async(user_id="user", session_id=session.id, new_message=content):
+        pass
+    return await runner.session_service.get_session(
+        app_name="tracing", user_id="user", session_id=session.id
+    )
+
+
+def _contains(outer, inner):
+    return outer["ts"] <= inner["ts"] and inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"] + 1
+
+
+def test_trace_nests_the_spans_of_the_agent_tree(tmp_path):
+    """Writes the agents, model calls and code runs of a session, with a lane per branch."""
+    tracing_util.install()
+    session = asyncio.run(_run(_build_agent(tmp_path)))
+    trace_path = session.state["trace_path"]
+    assert os.path.dirname(trace_path) == os.path.join(str(tmp_path), "task", "traces")
+    events = [event for event in tracing_util.load_trace(trace_path) if event["ph"] == "X"]
+    by_name = {}
+    for event in events:
+        by_name.setdefault(event["name"], []).append(event)
+    pipeline = by_name["pipeline_agent"][0]
+    for name in ("prepare_agent", "parallel_agent", "branch_agent_1", "code_agent_2"):
+        assert by_name[name][0]["cat"] == "agent"
+        assert _contains(pipeline, by_name[name][0])
+    # The branches of the parallel agent run on their own lanes.
+    branch_1, branch_2 = by_name["branch_agent_1"][0], by_name["branch_agent_2"][0]
+    assert branch_1["tid"] != branch_2["tid"]
+    for task_id, branch in ((1, branch_1), (2, branch_2)):
+        code_agent = by_name[f"code_agent_{task_id}"][0]
+        code_run = next(
+            event for event in by_name["run_python_code"]
+            if event["args"]["py_filepath"].endswith(f"code_agent_{task_id}.py")
+        )
+        assert code_agent["tid"] == code_run["tid"] == branch["tid"]
+        assert _contains(branch, code_agent) and _contains(code_agent, code_run)
+        assert code_run["cat"] == "code" and code_run["args"]["returncode"] == 0
+        assert code_run["dur"] >= 0.2e6
+    llm_calls = by_name["call_llm"]
+    assert len(llm_calls) == 2
+    for llm_call in llm_calls:
+        assert llm_call["args"]["prompt_tokens"] == 120
+        assert llm_call["args"]["response_tokens"] == 30
+        assert llm_call["args"]["agent"].startswith("code_agent_")
+        assert tracing_util.LLM_RESPONSE_ATTRIBUTE not in llm_call["args"]
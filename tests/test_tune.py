@@ -0,0 +1,51 @@
+"""Test cases for the hyperparameter search of `mle_runtime`."""
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from machine_learning_engineering.shared_libraries import code_util
+from machine_learning_engineering.shared_libraries.runtime import mle_runtime
+
+_CODE = """import mle_runtime
+
+def objective(params, resource):
+    penalty = 0.0 if params["booster"] == "dart" else 1.0
+    return (params["x"] - 0.3) ** 2 + (params["lr"] - 0.01) ** 2 + penalty + 1.0 / resource
+
+space = {
+    "x": mle_runtime.uniform(-2.0, 2.0),
+    "lr": mle_runtime.loguniform(1e-4, 1.0),
+    "depth": mle_runtime.randint(2, 8),
+    "booster": mle_runtime.choice(["gbtree", "dart"]),
+    "seed": 42,
+}
+result = mle_runtime.tune(objective, space, max_resource=27, max_trials=60, n_jobs=2, budget=20)
+print(f"Final Validation Performance: {result['best_score']}")
+"""
+
+
+def test_search_finds_the_best_configuration(tmp_path):
+    """Stops the poor configurations early and saves the best one for the agents."""
+    state = {"workspace_dir": str(tmp_path), "task_name": "task"}
+    os.makedirs(tmp_path / "task" / "1")
+    result_dict = code_util.execute_code(
+        code_text=_CODE,
+        run_cwd=str(tmp_path / "task" / "1"),
+        py_filepath="train.py",
+        exec_timeout=60,
+        state=state,
+    )
+    assert result_dict["returncode"] == 0, result_dict["stderr"]
+    tune_result = mle_runtime.load_tune_result(
+        result_dict["code_hash"], code_util.get_artifact_dir(state)
+    )
+    best_params = tune_result["best_params"]
+    assert best_params["booster"] == "dart" and best_params["seed"] == 42
+    assert abs(best_params["x"] - 0.3) < 0.3 and 2 <= best_params["depth"] <= 8
+    assert tune_result["best_resource"] == 27
+    assert tune_result["num_trials"] == 60
+    # Most configurations are stopped at the first rungs.
+    assert tune_result["num_evaluations"] < 2 * tune_result["num_trials"]
+    assert f"Final Validation Performance: {tune_result['best_score']}" in result_dict["stdout"]
@@ -0,0 +1,77 @@
+"""Test cases for the accounting of the model calls."""
+
+import os
+import sys
+import types as python_types
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from google.adk import agents
+from google.adk.models import llm_request as llm_request_module
+from google.adk.models import llm_response as llm_response_module
+from google.genai import types
+
+from machine_learning_engineering.shared_libraries import usage_util
+
+
+def _call_model(state, agent_name, model, prompt_tokens, output_tokens, cached_tokens=0):
+    callback_context = python_types.SimpleNamespace(
+        invocation_id="invocation", agent_name=agent_name, state=state
+    )
+    usage_util.start_model_call(callback_context, llm_request_module.LlmRequest(model=model))
+    llm_response = llm_response_module.LlmResponse(
+        usage_metadata=types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=output_tokens,
+            cached_content_token_count=cached_tokens,
+        )
+    )
+    usage_util.record_model_call(callback_context, llm_response)
+
+
+def test_add_usage_callbacks_keeps_the_agent_callbacks():
+    """Starts the accounting after the callbacks skipping the call, and once."""
+    def skip_call(callback_context, llm_request):
+        return None
+
+    def get_code(callback_context, llm_response):
+        return None
+
+    llm_agent = agents.Agent(
+        name="model_eval_agent_1_1",
+        model="gemini-2.0-flash-001",
+        before_model_callback=skip_call,
+        after_model_callback=get_code,
+    )
+    root_agent = agents.SequentialAgent(name="pipeline_agent", sub_agents=[llm_agent])
+    usage_util.add_usage_callbacks(root_agent)
+    usage_util.add_usage_callbacks(root_agent)
+    assert llm_agent.before_model_callback == [skip_call, usage_util.start_model_call]
+    assert llm_agent.after_model_callback == [usage_util.record_model_call, get_code]
+
+
+def test_usage_is_aggregated_by_role():
+    """Sums the tokens, retries and costs of the agents of every role."""
+    state = {}
+    _call_model(state, "model_eval_agent_1_1", "gemini-2.0-flash-001", 1000, 200)
+    _call_model(state, "model_eval_agent_2_1", "gemini-2.0-flash-001", 3000, 400, cached_tokens=2000)
+    _call_model(state, "model_eval_debug_agent_1_1", "gemini-2.0-flash-001", 500, 100)
+    _call_model(state, "model_eval_debug_agent_1_1", "gemini-2.0-flash-001", 500, 100)
+    _call_model(state, "plan_refine_agent_1", "openrouter/horizon-beta", 800, 300)
+    assert state["model_usage_model_eval_debug_agent_1_1"]["retries"] == 1
+    summary = usage_util.summarize_usage(state)
+    assert list(summary["by_role"]) == ["model_eval", "debug", "plan_refine"]
+    model_eval = summary["by_role"]["model_eval"]
+    assert (model_eval["calls"], model_eval["input_tokens"], model_eval["output_tokens"]) == (2, 4000, 600)
+    expected_cost = ((4000 - 2000) * 0.10 + 2000 * 0.025 + 600 * 0.40) / 1e6
+    assert abs(model_eval["cost"] - expected_cost) < 1e-12
+    debug = summary["by_role"]["debug"]
+    assert (debug["calls"], debug["retries"]) == (2, 1)
+    assert summary["by_role"]["plan_refine"]["cost"] == 0.0
+    assert summary["unpriced_models"] == ["openrouter/horizon-beta"]
+    assert summary["total"]["calls"] == 5
+    assert summary["total"]["input_tokens"] == 5800
+    assert "model_eval" in usage_util.format_usage(summary)
+    assert usage_util.get_role("ablation_summary_agent_1") == "ablation"
+    assert usage_util.get_role("plan_implement_initial_check_leakage_agent_1") == "leakage"
+    assert usage_util.get_role("init_ensemble_plan_agent") == "ensemble"
@@ -0,0 +1,134 @@
+"""Test cases for the job queue of the code executions."""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(REPO_ROOT)
+
+from machine_learning_engineering.shared_libraries import work_queue
+
+
+def test_jobs_are_run_once_by_several_workers(tmp_path):
+    """Runs the jobs of the queue on several worker processes."""
+    queue_dir = str(tmp_path / "queue")
+    run_cwd = tmp_path / "workspace"
+    run_cwd.mkdir()
+    queue = work_queue.FileWorkQueue(queue_dir)
+    job_ids = [
+        queue.submit({
+            "code_text": f"import time\ntime.sleep(0.5)\nprint('Final Validation Performance: {i}')",
+            "run_cwd": str(run_cwd),
+            "py_filepath": f"job_{i}.py",
+            "exec_timeout": 60,
+        })
+        for i in range(6)
+    ]
+    workers = [
+        subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "machine_learning_engineering.shared_libraries.work_queue",
+                "--queue_dir",
+                queue_dir,
+                "--worker_id",
+                f"worker{i}",
+                "--poll_interval",
+                "0.1",
+                "--max_idle_time",
+                "5",
+            ],
+            cwd=REPO_ROOT,
+        )
+        for i in range(3)
+    ]
+    results = [queue.wait_result(job_id, lease_timeout=30, poll_interval=0.1) for job_id in job_ids]
+    for worker in workers:
+        worker.wait(timeout=60)
+    for i, result_dict in enumerate(results):
+        assert result_dict["returncode"] == 0
+        assert f"Final Validation Performance: {i}" in result_dict["stdout"]
+    assert len({result_dict["worker_id"] for result_dict in results}) > 1
+    assert not os.listdir(os.path.join(queue_dir, work_queue.PENDING_DIR))
+    assert not os.listdir(os.path.join(queue_dir, work_queue.CLAIMED_DIR))
+
+
+def test_stale_lease_is_requeued(tmp_path):
+    """Hands the job of a dead worker to another worker."""
+    queue = work_queue.FileWorkQueue(str(tmp_path / "queue"))
+    job_id = queue.submit({"code_text": "print(1)"})
+    claimed_id, job = queue.claim("dead_worker")
+    assert claimed_id == job_id and job["code_text"] == "print(1)"
+    assert queue.claim("other_worker") is None
+    assert queue.requeue_stale(lease_timeout=60) == []
+    lease_path = os.path.join(
+        queue.queue_dir, work_queue.CLAIMED_DIR, f"{job_id}.dead_worker.json"
+    )
+    stale_time = time.time() - 120
+    os.utime(lease_path, (stale_time, stale_time))
+    assert queue.requeue_stale(lease_timeout=60) == [job_id]
+    assert queue.claim("other_worker")[0] == job_id
+    assert not queue.heartbeat(job_id, "dead_worker")
+    assert queue.heartbeat(job_id, "other_worker")
+
+
+def test_job_times_out_without_workers(tmp_path):
+    """Removes a job that no worker runs and reports it as timed out."""
+    queue_dir = str(tmp_path / "queue")
+    state = {"exec_queue_dir": queue_dir, "exec_lease_timeout": 1, "exec_queue_wait": 1}
+    start_time = time.time()
+    result_dict = work_queue.run_python_code_in_queue(
+        "print(1)", str(tmp_path), "job.py", 1, state, {}
+    )
+    assert time.time() - start_time < 10
+    assert result_dict["returncode"] == 1
+    assert result_dict["failure_kind"] == "timeout"
+    assert not os.listdir(os.path.join(queue_dir, work_queue.PENDING_DIR))
+    assert not os.listdir(os.path.join(queue_dir, work_queue.CLAIMED_DIR))
+
+
+def test_worker_drops_a_lost_job(tmp_path):
+    """Kills the code of a job whose lease was handed to another worker."""
+    queue = work_queue.FileWorkQueue(str(tmp_path / "queue"))
+    job_id = queue.submit({
+        "code_text": "import time\ntime.sleep(30)\nopen('finished', 'w').close()",
+        "run_cwd": str(tmp_path / "workspace"),
+        "py_filepath": "job.py",
+        "exec_timeout": 60,
+    })
+    worker = threading.Thread(
+        target=work_queue.serve,
+        args=(queue.queue_dir, "worker"),
+        kwargs={"poll_interval": 0.1, "heartbeat_interval": 0.1, "max_idle_time": 1},
+    )
+    start_time = time.time()
+    worker.start()
+    while not os.path.exists(tmp_path / "workspace" / "job.py"):
+        time.sleep(0.05)
+    # The lease expired, e.g. while the worker was paused, and another worker took the job.
+    os.rename(
+        os.path.join(queue.queue_dir, work_queue.CLAIMED_DIR, f"{job_id}.worker.json"),
+        os.path.join(queue.queue_dir, work_queue.PENDING_DIR, f"{job_id}.json"),
+    )
+    assert queue.claim("other_worker")[0] == job_id
+    worker.join(timeout=20)
+    assert not worker.is_alive()
+    assert time.time() - start_time < 20
+    assert queue.get_status(job_id) == "claimed"
+    assert not os.path.exists(tmp_path / "workspace" / "finished")
+
+
+def test_failing_job_is_completed_with_its_error(tmp_path):
+    """Reports a job the worker cannot run instead of dying with it."""
+    queue = work_queue.FileWorkQueue(str(tmp_path / "queue"))
+    job_id = queue.submit({"run_cwd": str(tmp_path / "workspace"), "py_filepath": "job.py"})
+    assert work_queue.serve(queue.queue_dir, "worker", poll_interval=0.1, max_idle_time=0.5) == 1
+    result_dict = queue.pop_result(job_id)
+    assert result_dict["returncode"] == 1
+    assert result_dict["failure_kind"] == "error"
+    assert "KeyError" in result_dict["stderr"]
+    assert not os.listdir(os.path.join(queue.queue_dir, work_queue.CLAIMED_DIR))